@@ -2,10 +2,13 @@ import { app, BrowserWindow, ipcMain, dialog } from 'electron';
 import { spawn } from 'child_process';
 import fs from 'fs';
 import path from 'path';
-import os from 'os';
 import { checkKillSwitch } from './killswitch';
 
 const isDev = process.env.NODE_ENV === 'development' || !app.isPackaged;
+// Saída do gerador quando o Excel estoura o prazo de uma fase (ver pdf_export/excel_watchdog.py)
+const EXIT_TIMEOUT = 124;
+// Último recurso se o próprio gerador travar: soma dos prazos padrão por fase com folga
+const GENERATOR_TIMEOUT_MS = 10 * 60 * 1000;
 
 async function createWindow(): Promise<void> {
   // Ícone: no empacotado use process.resourcesPath (pasta onde extraResources são copiados)
@@ -65,9 +68,15 @@ async function createWindow(): Promise<void> {
       : path.join(appPath, 'resources', templateFileName);
 
     const exeName = process.platform === 'win32' ? 'fill_and_export_pdf.exe' : 'fill_and_export_pdf';
-    const exePath = app.isPackaged
-      ? path.join(installResourcesPath, 'pdf_export', exeName)
-      : path.join(appPath, 'pdf_export', exeName);
+    const exeDir = app.isPackaged
+      ? path.join(installResourcesPath, 'pdf_export')
+      : path.join(appPath, 'pdf_export');
+    // Build em pasta (partida rápida, sem extrair a cada execução); o .exe único antigo ainda é aceito
+    const exeCandidates = [
+      path.join(exeDir, 'fill_and_export_pdf', exeName),
+      path.join(exeDir, exeName),
+    ];
+    const exePath = exeCandidates.find((p) => fs.existsSync(p)) ?? exeCandidates[0];
     const scriptPath = path.join(appPath, 'pdf_export', 'fill_and_export_pdf.py');
 
     const tipoOrcamentoLabel = isPergolado
@@ -93,23 +102,43 @@ async function createWindow(): Promise<void> {
       return { success: false, error: 'canceled' };
     }
 
-    const dataPath = path.join(os.tmpdir(), `cobertura-data-${Date.now()}.json`);
-    fs.writeFileSync(dataPath, JSON.stringify(data, null, 2), 'utf-8');
+    // Payload pelo stdin (--data -): sem JSON temporário em disco
+    const payload = JSON.stringify(data);
+
+    // Excel travado: o gerador sai com 124 e uma linha JSON {"event": "timeout", "error", "phase", ...} no stderr
+    const timeoutMessage = (text: string) => {
+      for (const line of text.split(/\r?\n/).reverse()) {
+        try {
+          const info = JSON.parse(line);
+          if (info?.event === 'timeout' && info.error) return `${info.error}. Tente de novo.`;
+        } catch { /* linha que não é JSON */ }
+      }
+      return 'O Excel não respondeu a tempo. Tente de novo.';
+    };
 
     const runExe = (execPath: string, args: string[]) =>
       new Promise<{ success: boolean; error?: string }>((resolve) => {
-        const child = spawn(execPath, args, { stdio: ['ignore', 'pipe', 'pipe'] });
+        const child = spawn(execPath, args, { stdio: ['pipe', 'pipe', 'pipe'] });
         let stderr = '';
         child.stderr?.on('data', (chunk) => { stderr += chunk.toString(); });
+        child.stdin?.on('error', () => { /* processo encerrou antes de ler: o erro vem pelo close */ });
+        child.stdin?.end(payload, 'utf-8');
+        // O gerador já encerra o Excel travado (prazos por fase); isto só cobre o próprio gerador travado
+        const backstop = setTimeout(() => child.kill(), GENERATOR_TIMEOUT_MS);
         child.on('close', (code) => {
-          try { fs.unlinkSync(dataPath); } catch { /* ignore */ }
+          clearTimeout(backstop);
           if (code === 0) resolve({ success: true });
+          else if (code === EXIT_TIMEOUT) resolve({ success: false, error: timeoutMessage(stderr) });
+          else if (code === null) resolve({ success: false, error: 'O gerador de PDF não respondeu e foi encerrado.' });
           else resolve({ success: false, error: stderr.trim() || `Código de saída ${code}` });
         });
-        child.on('error', (err) => resolve({ success: false, error: err.message }));
+        child.on('error', (err) => {
+          clearTimeout(backstop);
+          resolve({ success: false, error: err.message });
+        });
       });
 
-    const args = ['--template', templatePath, '--data', dataPath, '--output', outputPath];
+    const args = ['--template', templatePath, '--data', '-', '--output', outputPath];
 
     const runAndOpen = (result: { success: boolean; error?: string }) => {
       if (result.success) {
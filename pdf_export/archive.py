@@ -0,0 +1,412 @@
+"""
+Arquivo local de propostas (SQLite): cada geração bem-sucedida vira uma linha consultável.
+Opcional: só grava com --archive (ou PDF_EXPORT_ARCHIVE_RUNS=1); --from-archive e as consultas
+leem o arquivo existente sem isso.
+
+Guarda o payload normalizado (com dataAtual, medidas e valorFormaPagamento), os totais
+calculados (pricing.quote), o hash do modelo, o caminho e o SHA-256 do PDF, os tempos da
+geração e o texto da D43. Índices em cpfCnpj (só dígitos), nomeCliente, tipoProposta e data;
+busca de texto (FTS5, sem acentos) na descrição da D43 — sem FTS5 no SQLite, cai para LIKE.
+Com --log-mask, cpfCnpj e celularFone entram mascarados como no log, e o índice de CPF guarda
+um hash dos dígitos (a busca por CPF continua funcionando; a regeneração não).
+
+Gravação em lote: record() só enfileira; uma thread grava o que estiver na fila numa única
+transação (WAL, synchronous=NORMAL). Na execução única o registro é gravado no close(),
+depois do PDF pronto; no --serve / --batch os jobs seguintes não esperam o disco.
+Vários processos (workers do --server) gravam no mesmo arquivo (busy_timeout).
+
+Arquivo: PDF_EXPORT_ARCHIVE ou %TEMP%/pdf_export_cache/archive.sqlite3.
+
+Consulta:
+  python archive.py search --cpf 123.456.789-00 --limit 1   (última proposta do CPF)
+  python archive.py search --name "Maria" --type pergolado --since 01/03/2025
+  python archive.py search --text "policarbonato alveolar"
+  python archive.py show 42                                  (linha completa, com payload)
+Regerar/recuperar: fill_and_export_pdf --from-archive 42 --output saida.pdf
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import metrics
+from export_log import SENSITIVE_KEYS, logger, mask_value, masking
+from template_manifest import MANIFEST_DIR, template_hash
+
+ARCHIVE_PATH = Path(os.environ.get("PDF_EXPORT_ARCHIVE") or MANIFEST_DIR.parent / "archive.sqlite3")
+
+# Registros por transação (o que estiver na fila além disso fica para a próxima)
+BATCH_SIZE = 200
+# Espera máxima do close() pela gravação (s)
+CLOSE_TIMEOUT = 10.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proposals (
+    id INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    data_atual TEXT,
+    data_iso TEXT,
+    tipo_proposta TEXT,
+    cpf_cnpj TEXT,
+    nome_cliente TEXT COLLATE NOCASE,
+    template TEXT,
+    template_sha256 TEXT,
+    output TEXT,
+    pdf_sha256 TEXT,
+    pdf_bytes INTEGER,
+    generator TEXT,
+    mode TEXT,
+    renderer TEXT,
+    fill_backend TEXT,
+    output_profile TEXT,
+    cache TEXT,
+    texto_d43 TEXT,
+    payload TEXT NOT NULL,
+    totals TEXT,
+    timings TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_proposals_cpf ON proposals (cpf_cnpj, data_iso);
+CREATE INDEX IF NOT EXISTS ix_proposals_nome ON proposals (nome_cliente);
+CREATE INDEX IF NOT EXISTS ix_proposals_tipo ON proposals (tipo_proposta, data_iso);
+CREATE INDEX IF NOT EXISTS ix_proposals_data ON proposals (data_iso);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS proposals_fts USING fts5(
+    texto_d43, content='proposals', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+_COLUMNS = (
+    "created", "data_atual", "data_iso", "tipo_proposta", "cpf_cnpj", "nome_cliente", "template",
+    "template_sha256", "output", "pdf_sha256", "pdf_bytes", "generator", "mode", "renderer",
+    "fill_backend", "output_profile", "cache", "texto_d43", "payload", "totals", "timings",
+)
+_JSON_COLUMNS = ("payload", "totals", "timings")
+# Colunas das listagens (search); show traz a linha inteira
+_SUMMARY = ("id", "created", "data_atual", "tipo_proposta", "cpf_cnpj", "nome_cliente", "output", "pdf_sha256")
+
+
+def digits(value) -> str:
+    """Só os dígitos (CPF/CNPJ com ou sem máscara dão a mesma chave)."""
+    return re.sub(r"\D", "", str(value or ""))
+
+
+def iso_date(text: str | None) -> str | None:
+    """dd/mm/yyyy ou yyyy-mm-dd -> yyyy-mm-dd (None se não for data)."""
+    if not text:
+        return None
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def cpf_digest(value) -> str | None:
+    """Chave de CPF/CNPJ de um registro mascarado: hash dos dígitos (os dígitos não ficam no arquivo)."""
+    number = digits(value)
+    return "sha256:" + hashlib.sha256(number.encode("ascii")).hexdigest() if number else None
+
+
+def is_masked(payload: dict) -> bool:
+    """Payload arquivado com --log-mask (cpfCnpj/celularFone trocados por asteriscos)."""
+    return any("*" in str(payload.get(key) or "") for key in SENSITIVE_KEYS)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_entry(
+    template_path: Path,
+    data: dict,
+    totais: dict,
+    output_path: Path | None,
+    manifest: dict | None = None,
+    timings: dict | None = None,
+    **meta,
+) -> dict:
+    """
+    Linha do arquivo para uma geração concluída. data e totais são os de prepare_data (o preço
+    não é recalculado); o payload não é alterado. output_path None: PDF não guardado em disco
+    (--output -). meta: generator, mode, renderer, fill_backend, output_profile, cache.
+    """
+    import fill_and_export_pdf as gen
+
+    payload = dict(data)
+    cpf_cnpj = digits(payload.get("cpfCnpj")) or None
+    if masking():
+        cpf_cnpj = cpf_digest(payload.get("cpfCnpj"))
+        for key in SENSITIVE_KEYS:
+            if payload.get(key):
+                payload[key] = mask_value(payload[key])
+    pdf_sha256 = pdf_bytes = None
+    if output_path is not None:
+        pdf_sha256 = file_sha256(output_path)
+        pdf_bytes = output_path.stat().st_size
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "data_atual": payload.get("dataAtual"),
+        "data_iso": iso_date(payload.get("dataAtual")),
+        "tipo_proposta": payload.get("tipoProposta"),
+        "cpf_cnpj": cpf_cnpj,
+        "nome_cliente": (payload.get("nomeCliente") or "").strip() or None,
+        "template": str(template_path.resolve()),
+        "template_sha256": manifest["sha256"] if manifest else template_hash(template_path),
+        "output": str(output_path.resolve()) if output_path is not None else None,
+        "pdf_sha256": pdf_sha256,
+        "pdf_bytes": pdf_bytes,
+        "texto_d43": gen.build_texto_d43(data),
+        "payload": payload,
+        "totals": totais["cotacao"],
+        "timings": timings,
+        **meta,
+    }
+
+
+def _connect(path: Path) -> tuple[sqlite3.Connection, bool]:
+    """Abre (e cria) o arquivo; retorna a conexão e se há FTS5."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30.0)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    try:
+        conn.execute(_FTS_SCHEMA)
+        fts = True
+    except sqlite3.OperationalError:
+        fts = False
+    conn.commit()
+    return conn, fts
+
+
+class Archive:
+    """Arquivo de propostas: gravação em lote numa thread própria e consultas na thread de quem chama."""
+
+    def __init__(self, path=None, batch_size: int = BATCH_SIZE):
+        self.path = Path(path or ARCHIVE_PATH)
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._reader: sqlite3.Connection | None = None
+        self._fts = False
+
+    # -- gravação ---------------------------------------------------------
+
+    def record(self, entry: dict) -> None:
+        """Enfileira a linha (não espera o disco)."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="archive-writer", daemon=True)
+                self._writer.start()
+        self._queue.put(entry)
+
+    def record_run(
+        self,
+        template_path: Path,
+        data: dict,
+        totais: dict,
+        output_path: Path | None,
+        manifest: dict | None = None,
+        timings: dict | None = None,
+        **meta,
+    ) -> None:
+        """build_entry + record; falha aqui só vira aviso no log (a geração já deu certo)."""
+        try:
+            with metrics.span("archive"):
+                self.record(build_entry(template_path, data, totais, output_path, manifest, timings, **meta))
+        except Exception as e:
+            logger.warning(f"Arquivo de propostas: geração não registrada: {e}")
+
+    def _write_loop(self) -> None:
+        conn = None
+        fts = False
+        done = False
+        while not done:
+            batch = []
+            item = self._queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                done = True  # None: close()
+            if not batch:
+                continue
+            try:
+                if conn is None:
+                    conn, fts = _connect(self.path)
+                t0 = time.perf_counter()
+                with conn:
+                    for entry in batch:
+                        self._insert(conn, fts, entry)
+                logger.debug(
+                    "Arquivo de propostas: %d registro(s) gravado(s) em %.1f ms",
+                    len(batch),
+                    (time.perf_counter() - t0) * 1000.0,
+                )
+            except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+                logger.warning(f"Arquivo de propostas: {len(batch)} registro(s) não gravado(s): {e}")
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, fts: bool, entry: dict) -> None:
+        values = [
+            json.dumps(entry.get(col), ensure_ascii=False, default=str) if col in _JSON_COLUMNS else entry.get(col)
+            for col in _COLUMNS
+        ]
+        cursor = conn.execute(
+            f"INSERT INTO proposals ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", values
+        )
+        if fts and entry.get("texto_d43"):
+            conn.execute(
+                "INSERT INTO proposals_fts (rowid, texto_d43) VALUES (?, ?)", (cursor.lastrowid, entry["texto_d43"])
+            )
+
+    def close(self) -> None:
+        """Grava o que ainda está na fila (espera até CLOSE_TIMEOUT) e fecha as conexões."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(CLOSE_TIMEOUT)
+            if writer.is_alive():
+                logger.warning("Arquivo de propostas: gravação não terminou a tempo; registros pendentes perdidos.")
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    # -- consulta ---------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self._reader, self._fts = _connect(self.path)
+        return self._reader
+
+    def get(self, proposal_id: int) -> dict | None:
+        """Linha completa (payload, totais e tempos já decodificados) ou None."""
+        row = self._conn().execute("SELECT * FROM proposals WHERE id = ?", (proposal_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        for col in _JSON_COLUMNS:
+            if entry.get(col) is not None:
+                entry[col] = json.loads(entry[col])
+        return entry
+
+    def search(
+        self,
+        cpf: str | None = None,
+        name: str | None = None,
+        tipo: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        text: str | None = None,
+        limit: int = 20,
+    ) -> list[dict]:
+        """
+        Propostas mais recentes primeiro. cpf: com ou sem máscara; name: prefixo (sem diferenciar
+        maiúsculas); since/until: dd/mm/yyyy ou yyyy-mm-dd; text: termos na descrição da D43.
+        """
+        conn = self._conn()
+        where, params = [], []
+        if cpf:
+            # Registros mascarados guardam o hash dos dígitos
+            where.append("p.cpf_cnpj IN (?, ?)")
+            params += [digits(cpf), cpf_digest(cpf)]
+        if name:
+            where.append("p.nome_cliente LIKE ?")
+            params.append(name.strip().replace("%", "").replace("_", "") + "%")
+        if tipo:
+            where.append("p.tipo_proposta = ?")
+            params.append(tipo)
+        for value, op in ((since, ">="), (until, "<=")):
+            if value:
+                day = iso_date(value)
+                if day is None:
+                    raise ValueError(f"data inválida: {value!r} (use dd/mm/aaaa ou aaaa-mm-dd)")
+                where.append(f"p.data_iso {op} ?")
+                params.append(day)
+        source = "proposals p"
+        if text:
+            if self._fts:
+                source += " JOIN proposals_fts ON proposals_fts.rowid = p.id"
+                where.append("proposals_fts MATCH ?")
+                # Cada termo entre aspas: pontuação do usuário não vira sintaxe do FTS5
+                params.append(" ".join('"%s"' % t.replace('"', "") for t in text.split()))
+            else:
+                for term in text.split():
+                    where.append("p.texto_d43 LIKE ?")
+                    params.append(f"%{term}%")
+        sql = f"SELECT {', '.join('p.' + c for c in _SUMMARY)} FROM {source}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY p.id DESC LIMIT ?"
+        params.append(int(limit))
+        return [dict(row) for row in conn.execute(sql, params)]
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Consulta o arquivo local de propostas (SQLite).")
+    parser.add_argument("--archive", help=f"Arquivo SQLite (padrão: {ARCHIVE_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search", help="Lista propostas (mais recentes primeiro), uma linha JSON cada")
+    search.add_argument("--cpf", help="cpfCnpj (com ou sem máscara)")
+    search.add_argument("--name", help="Início do nomeCliente")
+    search.add_argument("--type", dest="tipo", help="tipoProposta")
+    search.add_argument("--since", help="Data inicial (dd/mm/aaaa ou aaaa-mm-dd)")
+    search.add_argument("--until", help="Data final (dd/mm/aaaa ou aaaa-mm-dd)")
+    search.add_argument("--text", help="Termos na descrição da D43")
+    search.add_argument("--limit", type=int, default=20)
+    show = sub.add_parser("show", help="Linha completa de uma proposta (JSON)")
+    show.add_argument("id", type=int)
+    args = parser.parse_args(argv)
+
+    archive = Archive(args.archive)
+    try:
+        if args.command == "show":
+            entry = archive.get(args.id)
+            if entry is None:
+                print(f"Erro: proposta {args.id} não encontrada no arquivo.", file=sys.stderr)
+                return 1
+            print(json.dumps(entry, ensure_ascii=False, indent=2))
+            return 0
+        try:
+            rows = archive.search(args.cpf, args.name, args.tipo, args.since, args.until, args.text, args.limit)
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return 0
+    except sqlite3.Error as e:
+        print(f"Erro ao ler o arquivo de propostas: {e}", file=sys.stderr)
+        return 1
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,352 @@
+"""
+Geração em lote (--batch): uma lista de clientes (CSV ou XLSX exportado do CRM) vira um PDF por linha.
+
+Pipeline em streaming (geradores; memória limitada, não depende do tamanho da lista):
+  linhas do arquivo -> payload (colunas mapeadas para as chaves do JSON) -> modelo pelo tipoProposta
+  -> worker.handle_job numa única instância do Excel (cache de saída e métricas como no --serve)
+  -> uma linha por proposta no manifesto de resultados (JSON lines).
+
+Colunas: o cabeçalho pode usar a chave do payload ("nomeCliente"), o rótulo do placeholder
+("[Nome do Cliente]" ou "Nome do Cliente") ou outro nome mapeado com --batch-map (JSON
+{"Coluna do CRM": "chaveDoPayload"}). Maiúsculas, acentos, espaços e pontuação não importam.
+Colunas sem correspondência entram no payload com o nome do cabeçalho. Os valores chegam como
+texto e são convertidos para os tipos do app pelas chaves: bandeirola/alizar (sim/não, true/false,
+1/0) viram booleanos e as medidas da porta ("2,10") viram números; valor inválido falha só a linha.
+
+Modelo: --template fixa um modelo para todas as linhas; senão, escolhido pelo tipoProposta
+(mesma regra do app) na pasta --templates-dir (padrão: resources/ do projeto/instalação).
+
+Saída em --output (pasta): "00001 - Nome do Cliente.pdf", o manifesto batch_results.jsonl
+e o checkpoint batch_checkpoint.json, gravado a cada linha. Rodar de novo o mesmo comando
+retoma da linha seguinte à última concluída (--batch-restart recomeça do zero).
+
+Prazos do Excel (--deadlines, ver excel_watchdog): a linha cujo Excel travou sai com erro e o lote
+segue numa instância nova.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import unicodedata
+import zipfile
+from pathlib import Path
+
+import excel_watchdog
+import fill_and_export_pdf as gen
+from excel_backend import start_app
+from multi_export import safe_filename
+from worker import handle_job
+from xlsx_reader import iter_sheet_cells, read_shared_strings, sheet_parts, split_address
+
+RESULTS_FILE = "batch_results.jsonl"
+CHECKPOINT_FILE = "batch_checkpoint.json"
+
+# Modelo por tipoProposta (mesma escolha do app, electron/main.ts); outros tipos -> Cobertura Premium
+TEMPLATE_FILES = {
+    "pergolado": "PROPOSTA  - PERGOLADO.xlsx",
+    "cobertura_retratil": "PROPOSTA  - COBERTURA RETRÁTIL.xlsx",
+    "porta": "PROPOSTA  - PORTA.xlsx",
+}
+DEFAULT_TEMPLATE_FILE = "PROPOSTA  - COBERTURA PREMIUM.xlsx"
+
+# Chaves lidas pelo cálculo de preço e pelos textos da D43 (além das dos mapas de placeholders)
+PAYLOAD_KEYS = (
+    "tipoProposta", "tipoMedidas", "medidas", "valorM2", "custoDeslocamento", "temPilar", "valorPilar",
+    "corOuPintura", "descricaoAdicional", "dimensaoTubo", "modoAbertura", "quantidadeMotores",
+    "custoAberturaAutomatizada", "sistemaAbertura", "acondicionamentoEfetivo", "modoEntrega",
+    "modeloPorta", "medidasPortaGeral", "medidasPorta", "larguraPorta", "alturaPorta", "bandeirola",
+    "medidasBandeirola", "larguraBandeirola", "alturaBandeirola", "alizar", "medidaAlizar", "estiloFolha",
+    "espessuraChapa", "corPintura", "corParteSuperior", "corParteInferior", "modoPuxador",
+)
+
+# Chaves que o app envia como booleano e como número em metros (o CSV/XLSX traz texto)
+BOOLEAN_KEYS = ("bandeirola", "alizar")
+NUMBER_KEYS = ("alturaPorta", "larguraPorta", "alturaBandeirola", "larguraBandeirola")
+_TRUE = {"sim", "s", "true", "verdadeiro", "1", "x", "yes"}
+_FALSE = {"nao", "n", "false", "falso", "0", "no", ""}
+
+
+def default_templates_dir() -> Path:
+    """
+    resources/ com os modelos, ao lado da pasta pdf_export. No projeto: pdf_export/../resources.
+    Instalado, o .exe fica em resources/pdf_export/fill_and_export_pdf/ (build em pasta, one-dir) ou
+    em resources/pdf_export/ (.exe único antigo) e os modelos em resources/resources/: sobe a partir
+    da pasta do .exe até a primeira resources/ com o modelo padrão.
+    """
+    if not getattr(sys, "frozen", False):
+        return Path(__file__).resolve().parent.parent / "resources"
+    exe_dir = Path(sys.executable).resolve().parent
+    for base in exe_dir.parents:
+        if (base / "resources" / DEFAULT_TEMPLATE_FILE).is_file():
+            return base / "resources"
+    return exe_dir.parent / "resources"
+
+
+def template_for(tipo: str | None, templates_dir: Path) -> Path:
+    return templates_dir / TEMPLATE_FILES.get((tipo or "").strip(), DEFAULT_TEMPLATE_FILE)
+
+
+def _normalize(header: str) -> str:
+    text = unicodedata.normalize("NFKD", str(header)).encode("ascii", "ignore").decode("ascii")
+    return "".join(c for c in text.lower() if c.isalnum())
+
+
+def column_aliases() -> dict[str, str]:
+    """Nome de coluna normalizado -> chave do payload (chaves e rótulos dos placeholders)."""
+    aliases = {}
+    for mapping in (
+        gen.FIELD_PLACEHOLDER_REPLACE,
+        gen.FIELD_PLACEHOLDER_REPLACE_PERGOLADO,
+        gen.FIELD_PLACEHOLDER_REPLACE_COBERTURA_RETRATIL,
+        gen.FIELD_PLACEHOLDER_REPLACE_PORTA,
+    ):
+        for placeholder, key in mapping.items():
+            aliases.setdefault(_normalize(placeholder), key)
+            aliases[_normalize(key)] = key
+    for key in PAYLOAD_KEYS:
+        aliases[_normalize(key)] = key
+    return aliases
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_rows(path: Path):
+    """Linhas do CSV (separador detectado; UTF-8 com ou sem BOM) ou da 1ª planilha do XLSX: (cabeçalho, valores)."""
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        yield from _iter_xlsx_rows(path)
+        return
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        for values in reader:
+            yield header, values
+
+
+def _iter_xlsx_rows(path: Path):
+    with zipfile.ZipFile(path) as zf:
+        shared = read_shared_strings(zf)
+        parts = sheet_parts(zf)
+        if not parts:
+            return
+        header = None
+        current_row, values = None, {}
+
+        def flush():
+            width = max(values) if values else 0
+            return [values.get(c, "") for c in range(1, width + 1)]
+
+        for address, value, _formula, _style in iter_sheet_cells(zf, parts[0][1], shared):
+            row, col = split_address(address)
+            if current_row is not None and row != current_row:
+                if header is None:
+                    header = flush()
+                elif any(v != "" for v in values.values()):
+                    yield header, flush()
+                values = {}
+            current_row = row
+            values[col] = _cell_text(value)
+        if values:
+            if header is None:
+                return
+            if any(v != "" for v in values.values()):
+                yield header, flush()
+
+
+def coerce_value(key: str, value: str):
+    """
+    Texto da célula -> tipo do payload do app: sim/não/true/false/1/0 -> bool nas BOOLEAN_KEYS;
+    "2,10", "2.10" ou "2,10m" -> 2.1 nas NUMBER_KEYS (vazio fica ""). ValueError se não converter.
+    """
+    if key in BOOLEAN_KEYS:
+        flag = _normalize(value)
+        if flag in _TRUE:
+            return True
+        if flag in _FALSE:
+            return False
+        raise ValueError(f"coluna {key}: valor inválido {value!r} (use sim/não)")
+    if key in NUMBER_KEYS and value != "":
+        number = value.lower().removesuffix("m").strip().replace(",", ".")
+        try:
+            return float(number)
+        except ValueError:
+            raise ValueError(f"coluna {key}: número inválido {value!r}") from None
+    return value
+
+
+def row_payload(header: list[str], values: list[str], aliases: dict, overrides: dict, coerce: bool = True) -> dict:
+    """Payload da linha; coerce=False mantém o texto das células (ValueError da conversão não ocorre)."""
+    payload = {}
+    for name, value in zip(header, values):
+        name = str(name).strip()
+        if not name:
+            continue
+        key = overrides.get(name) or aliases.get(_normalize(name)) or name
+        value = value.strip() if isinstance(value, str) else _cell_text(value)
+        if value != "" or key not in payload:
+            payload[key] = coerce_value(key, value) if coerce else value
+    return payload
+
+
+def _fingerprint(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _save_checkpoint(path: Path, state: dict) -> None:
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _alive(app) -> bool:
+    """A instância do Excel ainda responde? (sem Excel: sempre True)"""
+    if app is None:
+        return True
+    try:
+        len(app.books)
+        return True
+    except Exception:
+        return False
+
+
+def run_batch(
+    source: Path,
+    output_dir: Path,
+    backend: str = "excel",
+    fill_backend: str = "excel",
+    renderer: str = "excel",
+    template: Path | None = None,
+    templates_dir: Path | None = None,
+    column_map: dict | None = None,
+    cache=None,
+    sink=None,
+    restart: bool = False,
+    output_profile: str | None = None,
+    archive=None,
+    deadlines: dict | None = None,
+    hang: dict | None = None,
+) -> dict:
+    """
+    Processa a lista (retomando do checkpoint) e devolve o resumo da execução.
+    archive: arquivo de propostas onde cada PDF gerado é registrado.
+    deadlines: prazos por fase do Excel (None: os padrões); hang: ver excel_backend.MemoryApp.
+    """
+    templates_dir = templates_dir or default_templates_dir()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / RESULTS_FILE
+    checkpoint_path = output_dir / CHECKPOINT_FILE
+    fingerprint = _fingerprint(source)
+
+    state = {"source": str(source.resolve()), "sha256": fingerprint, "next_row": 1, "ok": 0, "failed": 0}
+    if not restart and checkpoint_path.exists():
+        saved = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+        if saved.get("sha256") != fingerprint:
+            raise ValueError(
+                f"o checkpoint em {checkpoint_path} é de outra lista ({saved.get('source')}); use --batch-restart"
+            )
+        state.update({k: saved[k] for k in ("next_row", "ok", "failed") if k in saved})
+    elif results_path.exists():
+        results_path.unlink()
+    resumed_from = state["next_row"]
+    if resumed_from > 1:
+        gen._log(f"Lote: retomando da linha {resumed_from} ({state['ok']} ok, {state['failed']} com erro até aqui)")
+
+    aliases = column_aliases()
+    overrides = column_map or {}
+    t0 = time.perf_counter()
+    app = None
+    processed = 0
+    wd = excel_watchdog.Watchdog(deadlines) if renderer != "native" else None
+    with excel_watchdog.supervise(wd):
+        try:
+            if wd is not None:
+                app = wd.launch(start_app, backend, hang)
+            with open(results_path, "a", encoding="utf-8") as results:
+                for row, (header, values) in enumerate(iter_rows(source), start=1):
+                    if row < state["next_row"]:
+                        continue
+                    try:
+                        payload, error = row_payload(header, values, aliases, overrides), None
+                    except ValueError as e:
+                        payload, error = row_payload(header, values, aliases, overrides, coerce=False), str(e)
+                    template_path = template or template_for(payload.get("tipoProposta"), templates_dir)
+                    client = safe_filename(payload.get("nomeCliente"))
+                    output_path = output_dir / (f"{row:05d} - {client}.pdf" if client else f"{row:05d}.pdf")
+                    job = {"id": row, "template": str(template_path), "data": payload, "output": str(output_path)}
+                    if error:
+                        response = {"id": row, "ok": False, "error": error}
+                    else:
+                        response = handle_job(
+                            app,
+                            job,
+                            fill_backend,
+                            renderer,
+                            cache,
+                            sink,
+                            mode="batch",
+                            output_profile=output_profile,
+                            archive=archive,
+                        )
+                    record = {
+                        "row": row,
+                        "status": "ok" if response["ok"] else "failed",
+                        "output": str(output_path) if response["ok"] else None,
+                        "template": template_path.name,
+                        "tipoProposta": payload.get("tipoProposta"),
+                        "nomeCliente": payload.get("nomeCliente"),
+                    }
+                    for field in ("cache", "timings", "error"):
+                        if field in response:
+                            record[field] = response[field]
+                    results.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    results.flush()
+                    state["ok" if response["ok"] else "failed"] += 1
+                    state["next_row"] = row + 1
+                    _save_checkpoint(checkpoint_path, state)
+                    processed += 1
+                    if not response["ok"] and wd is not None and (wd.fired is not None or not _alive(app)):
+                        # Excel caiu (ou foi encerrado pelo prazo) no meio do lote: abre outra instância e segue
+                        gen._log("Lote: a instância do Excel não responde; reiniciando.")
+                        try:
+                            wd.quit(app)
+                        except Exception:
+                            pass
+                        app = None
+                        app = wd.launch(start_app, backend, hang)
+        finally:
+            if app is not None:
+                try:
+                    wd.quit(app)
+                except Exception:
+                    pass
+    total_ms = gen._ms(t0, time.perf_counter())
+    return {
+        "rows": state["next_row"] - 1,
+        "processed": processed,
+        "resumed_from": resumed_from,
+        "ok": state["ok"],
+        "failed": state["failed"],
+        "results": str(results_path),
+        "total_ms": total_ms,
+        "per_row_ms": round(total_ms / processed, 2) if processed else None,
+    }
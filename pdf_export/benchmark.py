@@ -0,0 +1,526 @@
+"""
+Benchmarks dos caminhos quentes do gerador (Linux, sem Excel), com comparação contra uma linha de base.
+
+Cobertura:
+  normalize/*   prepare_data (normalização do payload do main + preço + valorFormaPagamento)
+  m2/*          get_total_m2 / parse_medidas_m2 em todas as variantes de tipoMedidas
+  pricing/*     cada função de preço e quote por tipoProposta
+  text/*        build_texto_forma_pagamento, format_currency e os três textos da D43
+  template/*    abertura do modelo, descoberta de placeholders e preenchimento completo
+                (modelos reais de resources/ no backend em memória); placeholders/* contra
+                placeholders_legacy/* compara a substituição em uma passada com o laço antigo
+
+  startup/*     (com --startup) partida do processo do gerador: warm/* repete o mesmo comando;
+                cold/* usa a cada execução uma pasta vazia como TEMP e PYTHONPYCACHEPREFIX (script sem
+                bytecode em cache; .exe one-file extraindo para pasta nova). --exe mede o .exe em vez do
+                script. O resultado traz também o --startup-report do gerador (startup_report).
+
+Cada benchmark calibra o número de chamadas por rodada (~--min-time s) e mede --repeat rodadas;
+o resultado é a mediana do tempo por chamada (µs). Resultado em JSON (stdout ou --output).
+
+  python benchmark.py [--filter "pricing/*"] [--output atual.json]
+  python benchmark.py --save-baseline baseline.json
+  python benchmark.py --baseline baseline.json [--threshold 25] [--thresholds limites.json]
+
+Com --baseline, um benchmark regride quando fica mais de threshold % mais lento que a linha de base
+(--thresholds: {"template/*": 40, "text/format_currency": 10}, padrão glob -> %; o padrão mais
+específico vence). Com regressão, o código de saída é 1.
+
+Orçamento absoluto (ex.: a partida entre releases): --budget orcamento.json com {"startup/warm/*": 300,
+"startup/cold/*": 1500} (padrão glob -> mediana máxima em ms); estourou, código de saída 1.
+
+  python benchmark.py --startup --filter "startup/*" --budget orcamento.json [--exe dist\\fill_and_export_pdf\\fill_and_export_pdf.exe]
+"""
+
+import argparse
+import contextlib
+import copy
+import fnmatch
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import export_log
+import fill_and_export_pdf as gen
+import pricing
+from batch import default_templates_dir, template_for
+from excel_backend import MemoryApp
+from placeholder_fill import substitute
+from placeholder_index import PlaceholderIndex
+
+# Payloads realistas (como o app envia) para os quatro tipos de proposta e as variantes de medidas
+FIXTURES = {
+    "cobertura": {
+        "tipoProposta": "cobertura",
+        "tipoCobertura": "ACM",
+        "temPilar": "Sim",
+        "valorPilar": "85000",
+        "corOuPintura": "Preto fosco",
+        "telhaTermica": "30mm",
+        "forroPvc": "Vinílico",
+        "medidas": "6,50m x 4,20m",
+        "tipoMedidas": "area_unica",
+        "valorM2": "95000",
+        "custoDeslocamento": "20000",
+        "nomeCliente": "João Carlos da Silva",
+        "cpfCnpj": "123.456.789-00",
+        "endereco": "Rua das Acácias, 120, Setor Bueno",
+        "celularFone": "(62) 99999-0000",
+        "cidade": "Goiânia",
+        "descricaoAdicional": "Calha embutida no lado da garagem.\nRetirada da cobertura antiga inclusa.",
+    },
+    "pergolado": {
+        "tipoProposta": "pergolado",
+        "tipoPolicarbonato": "Compacto 3mm",
+        "dimensaoTubo": "150 x 50",
+        "corPolicarbonato": "Fumê",
+        "medidas": "4,00m x 3,00m",
+        "tipoMedidas": "area_unica",
+        "custoDeslocamento": "15000",
+        "nomeCliente": "Maria Aparecida Souza",
+        "cpfCnpj": "987.654.321-00",
+        "endereco": "Av. Brasil, 1500",
+        "celularFone": "(62) 98888-1111",
+        "cidade": "Anápolis",
+    },
+    "cobertura_retratil": {
+        "tipoProposta": "cobertura_retratil",
+        "tipoCobertura": "Telha Térmica",
+        "corParteSuperior": "Branco",
+        "corParteInferior": "Preto",
+        "modoAbertura": "Automatizada",
+        "quantidadeMotores": "2 motores",
+        "medidas1": "3,00m x 2,00m",
+        "medidas2": "1,50m x 1,00m",
+        "tipoMedidas": "duas_areas",
+        "valorM2": "100000",
+        "custoDeslocamento": "15000",
+        "custoAberturaAutomatizada": "350000",
+        "nomeCliente": "Ana Paula Ribeiro",
+        "cpfCnpj": "11.222.333/0001-44",
+        "endereco": "Rua 7, Qd. 12, Lt. 4",
+        "celularFone": "(62) 97777-2222",
+        "cidade": "Trindade",
+    },
+    "porta": {
+        "tipoProposta": "porta",
+        "modeloPorta": "Boiserie",
+        "modoPuxador": "Puxador Cava",
+        "medidasPortaGeral": "2,10m x 1,00m",
+        "medidasPorta": "porta 2,10m x 1,00m",
+        "sistemaAbertura": "Pivotante",
+        "estiloFolha": "Folha Única",
+        "acondicionamentoEfetivo": "Almofadada",
+        "espessuraChapa": "#18",
+        "corPintura": "Preto",
+        "modoEntrega": "Instalado no Local",
+        "bandeirola": True,
+        "alturaBandeirola": 0.4,
+        "larguraBandeirola": 0,
+        "medidasBandeirola": "0,40m x 1,00m",
+        "alizar": True,
+        "medidaAlizar": "10cm",
+        "alturaPorta": 2.1,
+        "larguraPorta": 1.0,
+        "valorM2": "180000",
+        "custoDeslocamento": "10000",
+        "nomeCliente": "Pedro Henrique Lima",
+        "cpfCnpj": "321.654.987-00",
+        "endereco": "Rua das Palmeiras, 45",
+        "celularFone": "(64) 96666-3333",
+        "cidade": "Rio Verde",
+        "descricaoAdicional": "Fechadura digital fornecida pelo cliente.",
+    },
+}
+
+# Variantes de tipoMedidas (sobre a Cobertura Premium)
+MEDIDAS_VARIANTS = {
+    "area_unica": {"tipoMedidas": "area_unica", "medidas": "6,50m x 4,20m"},
+    "duas_areas": {"tipoMedidas": "duas_areas", "medidas1": "3,00m x 2,00m", "medidas2": "1,50m x 1,00m"},
+    "tres_areas": {
+        "tipoMedidas": "tres_areas",
+        "medidas1": "3,00m x 2,00m",
+        "medidas2": "1,50m x 1,00m",
+        "medidas3": "2,25m x 1,10m",
+    },
+    "m2_direto": {"tipoMedidas": "m2_direto", "m2Direto": "25,50"},
+}
+
+DEFAULT_THRESHOLD = 25.0
+
+
+def _variant(name: str) -> dict:
+    data = {k: v for k, v in FIXTURES["cobertura"].items() if k not in ("medidas", "tipoMedidas")}
+    data.update(MEDIDAS_VARIANTS[name])
+    return data
+
+
+def _prepared(data: dict) -> tuple[dict, dict]:
+    data = copy.deepcopy(data)
+    totais = gen.prepare_data(data)
+    return data, totais
+
+
+def _legacy_substitute(index, data: dict, placeholder_map: dict) -> None:
+    """Laço antigo de placeholders (referência): find, leitura, str.replace e escrita por placeholder."""
+    for placeholder_text, json_key in placeholder_map.items():
+        sheet, address = index.find(placeholder_text)
+        if sheet is None:
+            continue
+        cell = sheet.range(address)
+        current_str = str(cell.value if cell.value is not None else "")
+        if json_key == "dataAtual":
+            cell.number_format = "@"
+        cell.value = current_str.replace(placeholder_text, gen.placeholder_value(data, json_key))
+
+
+def _placeholder_benchmarks(tipo: str, template: Path, data: dict, manifest: dict) -> dict:
+    """Substituição em uma passada x laço antigo, na mesma pasta (células restauradas a cada chamada)."""
+    book = MemoryApp().books.open(str(template))
+    index = PlaceholderIndex.from_manifest(book, manifest)
+    placeholder_map = gen.get_placeholder_map(data)
+    valores = {p: gen.placeholder_value(data, key) for p, key in placeholder_map.items()}
+    como_texto = [p for p, key in placeholder_map.items() if key == "dataAtual"]
+    originais = [
+        (sheet.range(address), sheet.range(address).value)
+        for p in placeholder_map
+        for sheet, address in index.find_all(p)
+    ]
+
+    def restore():
+        for cell, value in originais:
+            cell.value = value
+
+    def single_pass():
+        restore()
+        substitute(index, valores, como_texto)
+
+    def legacy():
+        restore()
+        _legacy_substitute(index, data, placeholder_map)
+
+    return {f"template/placeholders/{tipo}": single_pass, f"template/placeholders_legacy/{tipo}": legacy}
+
+
+def _template_benchmarks(templates_dir: Path) -> dict:
+    benches = {}
+    for tipo, payload in FIXTURES.items():
+        template = template_for(tipo, templates_dir)
+        if not template.exists():
+            continue
+        data, totais = _prepared(payload)
+        manifest = gen.check_template(template, data)
+        book = MemoryApp().books.open(str(template))
+
+        def open_book(template=template):
+            MemoryApp().books.open(str(template))
+
+        def discover(book=book):
+            PlaceholderIndex.build(book)
+
+        def fill(template=template, data=data, totais=totais, manifest=manifest):
+            gen.fill_workbook(MemoryApp().books.open(str(template)), dict(data), totais, manifest)
+
+        benches[f"template/open/{tipo}"] = open_book
+        benches[f"template/discover/{tipo}"] = discover
+        benches[f"template/fill/{tipo}"] = fill
+        if manifest is not None:
+            benches.update(_placeholder_benchmarks(tipo, template, data, manifest))
+    return benches
+
+
+def benchmarks(templates_dir: Path | None = None) -> dict:
+    """Nome -> função sem argumentos (dados preparados fora da medição)."""
+    benches = {}
+    for tipo, payload in FIXTURES.items():
+        benches[f"normalize/{tipo}"] = lambda payload=payload: gen.prepare_data(copy.deepcopy(payload))
+    for name in MEDIDAS_VARIANTS:
+        benches[f"m2/get_total_m2/{name}"] = lambda data=_variant(name): pricing.get_total_m2(data)
+    benches["m2/parse_medidas_m2"] = lambda: pricing.parse_medidas_m2("medidas 6,50m x 4,20m")
+    benches["m2/parse_m2_direto"] = lambda: pricing.parse_m2_direto("25,50")
+
+    cobertura, _t = _prepared(FIXTURES["cobertura"])
+    pergolado, _t = _prepared(FIXTURES["pergolado"])
+    retratil, _t = _prepared(FIXTURES["cobertura_retratil"])
+    porta, _t = _prepared(FIXTURES["porta"])
+    benches["pricing/get_valor_total_reais"] = lambda: pricing.get_valor_total_reais(cobertura)
+    benches["pricing/get_valor_total_reais_pergolado"] = lambda: pricing.get_valor_total_reais_pergolado(pergolado)
+    benches["pricing/get_valor_cobertura_retratil_reais"] = lambda: pricing.get_valor_cobertura_retratil_reais(retratil)
+    benches["pricing/get_valor_total_reais_cobertura_retratil"] = (
+        lambda: pricing.get_valor_total_reais_cobertura_retratil(retratil)
+    )
+    benches["pricing/get_m2_porta"] = lambda: pricing.get_m2_porta(porta)
+    benches["pricing/get_valor_total_reais_porta"] = lambda: pricing.get_valor_total_reais_porta(porta)
+    for tipo, payload in FIXTURES.items():
+        benches[f"pricing/quote/{tipo}"] = lambda payload=payload: pricing.quote(payload)
+
+    benches["text/format_currency"] = lambda: pricing.format_currency("1234567")
+    benches["text/build_texto_forma_pagamento"] = lambda: pricing.build_texto_forma_pagamento(12345.67)
+    benches["text/build_texto_forma_pagamento/geral"] = lambda: pricing.build_texto_forma_pagamento(12345.67, 15845.67)
+    benches["text/d43/cobertura"] = lambda: gen.build_texto_especificacao_d43(cobertura)
+    benches["text/d43/cobertura_retratil"] = lambda: gen.build_texto_especificacao_d43_retratil(retratil)
+    benches["text/d43/porta"] = lambda: gen.build_texto_especificacao_d43_porta(porta)
+
+    benches.update(_template_benchmarks(templates_dir or default_templates_dir()))
+    return benches
+
+
+def generator_command(exe: str | None = None) -> list[str]:
+    """Comando do gerador: o .exe indicado ou este Python com fill_and_export_pdf.py."""
+    if exe:
+        return [exe]
+    return [sys.executable, str(Path(gen.__file__).resolve())]
+
+
+def _startup_benchmarks(command: list[str], scratch: Path) -> dict:
+    """Partida do processo do gerador (ver o docstring do módulo); `scratch` guarda os arquivos temporários."""
+    payload = scratch / "payload.json"
+    payload.write_text(json.dumps(FIXTURES["cobertura"], ensure_ascii=False), encoding="utf-8")
+    modes = {
+        "help": ["--help"],
+        "price_only": ["--price-only", "--data", str(payload)],
+    }
+
+    def launch(args: list[str], cold: bool) -> None:
+        env = None
+        if cold:
+            fresh = tempfile.mkdtemp(dir=scratch)
+            env = {**os.environ, "TEMP": fresh, "TMP": fresh, "TMPDIR": fresh, "PYTHONPYCACHEPREFIX": fresh}
+        subprocess.run(
+            command + args,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+
+    benches = {}
+    for temperature in ("warm", "cold"):
+        for mode, args in modes.items():
+            benches[f"startup/{temperature}/{mode}"] = (
+                lambda args=args, cold=temperature == "cold": launch(args, cold)
+            )
+    return benches
+
+
+def startup_report(command: list[str]) -> dict:
+    """--startup-report do gerador (uma execução)."""
+    out = subprocess.run(command + ["--startup-report"], capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+def measure(fn, repeat: int = 7, min_time: float = 0.1) -> dict:
+    """Mediana/mínimo do tempo por chamada (µs), com o número de chamadas por rodada calibrado."""
+    fn()  # aquecimento (caches de manifesto, regex, imports tardios)
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) * 1e6 / loops)
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def run(
+    pattern: str | None = None,
+    repeat: int = 7,
+    min_time: float = 0.1,
+    templates_dir: Path | None = None,
+    startup: list[str] | None = None,
+) -> dict:
+    """`startup`: comando do gerador (generator_command) para incluir os benchmarks startup/*."""
+    results = {}
+    report = None
+    with tempfile.TemporaryDirectory(prefix="pdf_export_bench_") as scratch:
+        benches = benchmarks(templates_dir)
+        if startup:
+            benches.update(_startup_benchmarks(startup, Path(scratch)))
+        for name, fn in benches.items():
+            if pattern and not fnmatch.fnmatchcase(name, pattern):
+                continue
+            # Avisos do preenchimento (placeholders opcionais ausentes) não poluem a saída
+            with contextlib.redirect_stderr(io.StringIO()):
+                results[name] = measure(fn, repeat, min_time)
+        if startup:
+            report = startup_report(startup)
+    current = {
+        "event": "benchmark",
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "generator": gen.GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if report is not None:
+        current["startup_report"] = report
+    return current
+
+
+def _threshold_for(name: str, default: float | None, thresholds: dict) -> float | None:
+    matches = [p for p in thresholds if fnmatch.fnmatchcase(name, p)]
+    if not matches:
+        return default
+    # Padrão mais específico: o mais longo sem curingas
+    best = max(matches, key=lambda p: len(p.replace("*", "").replace("?", "")))
+    return float(thresholds[best])
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD, thresholds: dict | None = None) -> dict:
+    """Variação (%) de cada benchmark contra a linha de base; regressões acima do limite de cada um."""
+    thresholds = thresholds or {}
+    rows, regressions = {}, []
+    base = baseline.get("results") or {}
+    for name, result in current["results"].items():
+        if name not in base:
+            continue
+        before, after = base[name]["median_us"], result["median_us"]
+        change = (after - before) / before * 100.0 if before else 0.0
+        limit = _threshold_for(name, threshold, thresholds)
+        rows[name] = {"baseline_us": before, "current_us": after, "change_pct": round(change, 1), "limit_pct": limit}
+        if change > limit:
+            regressions.append(name)
+    return {
+        "compared": len(rows),
+        "missing": sorted(set(base) - set(current["results"])),
+        "new": sorted(set(current["results"]) - set(base)),
+        "regressions": regressions,
+        "rows": rows,
+    }
+
+
+def over_budget(current: dict, budget: dict) -> dict:
+    """Benchmarks cuja mediana passou do orçamento absoluto (ms) do padrão de nome mais específico."""
+    over = {}
+    for name, result in current["results"].items():
+        limit = _threshold_for(name, None, budget)
+        if limit is not None and result["median_us"] / 1000.0 > limit:
+            over[name] = {"median_ms": round(result["median_us"] / 1000.0, 1), "budget_ms": limit}
+    return over
+
+
+def _print_table(current: dict, comparison: dict | None) -> None:
+    results = current["results"]
+    if not results:
+        return
+    width = max(len(name) for name in results)
+    header = f"{'benchmark':<{width}}  {'mediana µs':>12}  {'mín µs':>12}"
+    if comparison is not None:
+        header += f"  {'base µs':>12}  {'var %':>7}"
+    print(header, file=sys.stderr)
+    for name, r in results.items():
+        line = f"{name:<{width}}  {r['median_us']:>12}  {r['min_us']:>12}"
+        row = (comparison or {}).get("rows", {}).get(name)
+        if row is not None:
+            flag = "  REGRESSÃO" if name in comparison["regressions"] else ""
+            line += f"  {row['baseline_us']:>12}  {row['change_pct']:>+7.1f}{flag}"
+        print(line, file=sys.stderr)
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do gerador (sem Excel).")
+    parser.add_argument("--filter", metavar="GLOB", help='Só os benchmarks cujo nome casa com o padrão (ex.: "pricing/*")')
+    parser.add_argument("--repeat", type=int, default=7, help="Rodadas por benchmark (padrão: 7)")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Duração mínima de cada rodada em s (padrão: 0.1)")
+    parser.add_argument("--templates-dir", help="Pasta dos modelos .xlsx (padrão: resources/)")
+    parser.add_argument("--output", metavar="JSON", help="Grava o resultado neste arquivo (além do stdout)")
+    parser.add_argument("--save-baseline", metavar="JSON", help="Grava o resultado como linha de base")
+    parser.add_argument("--baseline", metavar="JSON", help="Compara com a linha de base (regressão -> código 1)")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Regressão tolerada em %% (padrão: 25)"
+    )
+    parser.add_argument("--thresholds", metavar="JSON", help='Limites por padrão de nome: {"template/*": 40}')
+    parser.add_argument(
+        "--startup", action="store_true", help="Inclui a partida do processo do gerador (startup/warm/*, startup/cold/*)"
+    )
+    parser.add_argument("--exe", metavar="PATH", help="Com --startup: mede este .exe em vez do script Python")
+    parser.add_argument(
+        "--budget", metavar="JSON", help='Orçamento absoluto por padrão de nome, mediana em ms: {"startup/warm/*": 300}'
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.min_time <= 0:
+        print("Erro: --repeat e --min-time devem ser maiores que zero.", file=sys.stderr)
+        return 1
+
+    # Log só de erros: a gravação do log não deve pesar na medição
+    export_log.configure("error")
+    try:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+        thresholds = json.loads(Path(args.thresholds).read_text(encoding="utf-8")) if args.thresholds else {}
+        if not isinstance(thresholds, dict):
+            raise ValueError("--thresholds: esperado um objeto JSON {padrão: %}")
+        budget = json.loads(Path(args.budget).read_text(encoding="utf-8")) if args.budget else {}
+        if not isinstance(budget, dict):
+            raise ValueError("--budget: esperado um objeto JSON {padrão: ms}")
+        current = run(
+            args.filter,
+            args.repeat,
+            args.min_time,
+            Path(args.templates_dir) if args.templates_dir else None,
+            generator_command(args.exe) if args.startup else None,
+        )
+    except subprocess.CalledProcessError as e:
+        print(f"Erro: o gerador terminou com código {e.returncode}: {' '.join(e.cmd)}", file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    if not current["results"]:
+        print("Erro: nenhum benchmark selecionado.", file=sys.stderr)
+        return 1
+
+    comparison = None
+    if baseline is not None:
+        comparison = compare(current, baseline, args.threshold, thresholds)
+        current["comparison"] = comparison
+    over = over_budget(current, budget)
+    if budget:
+        current["budget"] = {"limits_ms": budget, "over": over}
+    _print_table(current, comparison)
+
+    text = json.dumps(current, ensure_ascii=False, indent=2)
+    try:
+        for path in (args.output, args.save_baseline):
+            if path:
+                Path(path).write_text(text + "\n", encoding="utf-8")
+    except OSError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    print(text)
+    status = 0
+    if comparison and comparison["regressions"]:
+        print(f"Erro: {len(comparison['regressions'])} benchmark(s) com regressão: "
+              + ", ".join(comparison["regressions"]), file=sys.stderr)
+        status = 1
+    if over:
+        print(f"Erro: {len(over)} benchmark(s) acima do orçamento: "
+              + ", ".join(f"{name} ({r['median_ms']} ms > {r['budget_ms']} ms)" for name, r in over.items()),
+              file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -1,18 +1,27 @@
 @echo off
 REM Gera fill_and_export_pdf.exe para que o app funcione sem Python instalado.
-REM Execute na pasta pdf_export: build_exe.bat
+REM Execute na pasta pdf_export: build_exe.bat  (pasta dist\fill_and_export_pdf\, partida rápida)
+REM                          ou: build_exe.bat onefile  (um .exe só, dist\fill_and_export_pdf.exe)
 REM Requer: Python instalado (só para este build), pip install pyinstaller xlwings
 
 set "SAVED_DIR=%CD%"
 cd /d "%~dp0"
 if not exist "fill_and_export_pdf.py" ( echo fill_and_export_pdf.py nao encontrado. & exit /b 1 )
 
+set "PDF_EXPORT_ONEFILE="
+set "BUILT=dist\fill_and_export_pdf\fill_and_export_pdf.exe"
+if /i "%~1"=="onefile" (
+  set "PDF_EXPORT_ONEFILE=1"
+  set "BUILT=dist\fill_and_export_pdf.exe"
+)
+
 pip install pyinstaller xlwings --quiet
 pyinstaller --noconfirm fill_and_export_pdf.spec
 
-if exist "dist\fill_and_export_pdf.exe" (
+if exist "%BUILT%" (
   echo.
-  echo build concluido: dist\fill_and_export_pdf.exe
+  echo build concluido: %BUILT%
+  "%BUILT%" --startup-report
   cd /d "%SAVED_DIR%"
 ) else (
   echo build falhou.
@@ -0,0 +1,720 @@
+"""
+Backends do Excel usados pelo gerador.
+
+- "excel": Microsoft Excel via xlwings (COM, só Windows) — o caminho de produção.
+- "memory": stand-in em memória que carrega o .xlsx modelo e imita o subconjunto do
+  modelo de objetos do xlwings que o gerador usa (sheets, range().value, number_format,
+  api.WrapText, characters[a:b].font.bold, api.MergeArea.GetValue/SetValue(11) (XML
+  Spreadsheet: texto com negrito/itálico/tamanho/cor e WrapText), api.Cells.Find/FindNext, sheet.copy,
+  api.PageSetup.Pages.Count, api.HPageBreaks, ExportAsFixedFormat com From/To).
+  Permite rodar e medir o pipeline inteiro no Linux, sem Excel.
+  Com hang={fase: s}, um processo de verdade faz o papel do EXCEL.EXE (pid) e o stand-in
+  trava na fase (launch, open, fill, export, quit) até o processo morrer ou os s passarem:
+  exercita o watchdog no Linux.
+"""
+
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from xlsx_reader import read_page_breaks, read_workbook, split_address, to_address
+
+BACKENDS = ("excel", "memory")
+
+# Constantes do Excel usadas pelo stand-in (mesmos valores do COM)
+XL_VALUES = -4163
+XL_FORMULAS = -4123
+XL_PART = 2
+XL_CALCULATION_MANUAL = -4135
+XL_RANGE_VALUE_XML = 11
+
+_SS_NS = "urn:schemas-microsoft-com:office:spreadsheet"
+_HTML_NS = "http://www.w3.org/TR/REC-html40"
+
+
+def start_app(backend: str = "excel", hang: dict | None = None):
+    """
+    Abre uma instância (invisível) do Excel para o backend indicado.
+    Para "excel" importa xlwings aqui (ImportError sobe para quem chamou).
+    hang ({fase: s}) só vale para "memory" (ver MemoryApp).
+    """
+    if backend == "memory":
+        return MemoryApp(hang)
+    import xlwings as xw
+
+    return xw.App(visible=False)
+
+
+def apply_session_profile(app) -> None:
+    """
+    Perfil de sessão para preencher rápido: sem atualização de tela, sem eventos,
+    sem alertas e com cálculo manual. Cada ajuste é opcional (falha é ignorada).
+    O cálculo manual só é aceito pelo Excel com uma pasta aberta; por isso é
+    reaplicado a cada job, logo após abrir o modelo.
+    """
+    for attr, value in (
+        ("screen_updating", False),
+        ("enable_events", False),
+        ("display_alerts", False),
+        ("calculation", "manual"),
+    ):
+        try:
+            setattr(app, attr, value)
+        except Exception:
+            pass
+
+
+def recalculate(app) -> None:
+    """Recalcula a pasta antes de exportar (o cálculo automático fica desligado durante o preenchimento)."""
+    try:
+        app.calculate()
+    except Exception:
+        pass
+
+
+def populated_page_count(wb) -> int | None:
+    """
+    Páginas da pasta até a última linha com conteúdo (valor ou imagem) da última planilha,
+    pelas quebras de página do Excel: limita o export quando a área de impressão sobra
+    em páginas vazias. None quando o Excel não informa (o export segue sem limite).
+    """
+    try:
+        sheets = list(wb.sheets)
+        pages = sum(int(sheet.api.PageSetup.Pages.Count) for sheet in sheets[:-1])
+        last = sheets[-1].api
+        found = last.Cells.Find(
+            What="*",
+            After=last.Cells(1, 1),
+            LookAt=XL_PART,
+            LookIn=XL_VALUES,
+            SearchOrder=1,
+            SearchDirection=2,  # xlPrevious: a última célula preenchida
+            MatchCase=False,
+        )
+        last_row = int(found.Row) if found is not None else 1
+        shapes = last.Shapes
+        for i in range(1, int(shapes.Count) + 1):
+            last_row = max(last_row, int(shapes.Item(i).BottomRightCell.Row))
+        breaks = last.HPageBreaks
+        rows = [int(breaks.Item(i).Location.Row) for i in range(1, int(breaks.Count) + 1)]
+        return pages + 1 + sum(1 for row in rows if row <= last_row)
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Stand-in em memória
+# ---------------------------------------------------------------------------
+
+
+class MemoryCell:
+    """
+    Estado de uma célula: valor, fórmula, formato de número, quebra de texto e rich text.
+    number_format e wrap_text ficam None enquanto não forem alterados (vale o estilo do modelo, índice `style`).
+    bold_spans: trechos em negrito (ordenados, sem sobreposição); font_runs: demais atributos de
+    fonte por trecho, (início, fim, atributo, valor) na ordem em que foram aplicados.
+    """
+
+    __slots__ = ("value", "formula", "number_format", "wrap_text", "bold_spans", "font_runs", "style")
+
+    def __init__(self, value=None, formula=None, style=None):
+        self.value = value
+        self.formula = formula
+        self.number_format = None
+        self.wrap_text = None
+        self.bold_spans = []
+        self.font_runs = []
+        self.style = style
+
+
+def _set_span(spans: list[tuple[int, int]], start: int, stop: int, on: bool) -> list[tuple[int, int]]:
+    """Liga/desliga [start, stop) num conjunto de trechos ordenados; devolve o conjunto normalizado."""
+    result = []
+    for a, b in spans:
+        if b <= start or a >= stop:
+            result.append((a, b))
+            continue
+        if a < start:
+            result.append((a, start))
+        if b > stop:
+            result.append((stop, b))
+    if on and stop > start:
+        result.append((start, stop))
+    merged = []
+    for a, b in sorted(result):
+        if merged and a <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+        else:
+            merged.append((a, b))
+    return merged
+
+
+class _Font:
+    def __init__(self, sheet: "MemorySheet", pos: tuple[int, int], start: int, stop: int):
+        self._sheet = sheet
+        self._pos = pos
+        self._cell = sheet._cell(*pos)
+        self._span = (start, stop)
+
+    @property
+    def bold(self) -> bool:
+        start, stop = self._span
+        return any(a <= start and stop <= b for a, b in self._cell.bold_spans)
+
+    @bold.setter
+    def bold(self, value: bool) -> None:
+        self._sheet._dirty.add(self._pos)
+        self._cell.bold_spans = _set_span(self._cell.bold_spans, *self._span, bool(value))
+
+    def _get(self, attr: str):
+        start, stop = self._span
+        found = None
+        for a, b, name, value in self._cell.font_runs:
+            if name == attr and a <= start and stop <= b:
+                found = value
+        return found
+
+    def _set(self, attr: str, value) -> None:
+        self._sheet._dirty.add(self._pos)
+        self._cell.font_runs.append((*self._span, attr, value))
+
+    italic = property(lambda self: self._get("italic"), lambda self, v: self._set("italic", bool(v)))
+    size = property(lambda self: self._get("size"), lambda self, v: self._set("size", v))
+    color = property(lambda self: self._get("color"), lambda self, v: self._set("color", tuple(v)))
+
+
+class _Characters:
+    def __init__(self, sheet: "MemorySheet", pos: tuple[int, int], start: int, stop: int):
+        self.font = _Font(sheet, pos, start, stop)
+
+
+class _CharactersAccessor:
+    """Imita range.characters[a:b] do xlwings."""
+
+    def __init__(self, sheet: "MemorySheet", pos: tuple[int, int]):
+        self._sheet = sheet
+        self._pos = pos
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            value = self._sheet._cell(*self._pos).value
+            text = "" if value is None else str(value)
+            start, stop, _step = key.indices(len(text))
+            return _Characters(self._sheet, self._pos, start, stop)
+        return _Characters(self._sheet, self._pos, key, key + 1)
+
+
+def _xml_escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def _xml_runs(node, style: dict, out: list) -> None:
+    """Percorre o <Data> do XML Spreadsheet: [(texto, estilo)] com B/I/Font aninhados."""
+    if node.text:
+        out.append((node.text, style))
+    for child in node:
+        tag = child.tag.rsplit("}", 1)[-1]
+        inner = dict(style)
+        if tag == "B":
+            inner["bold"] = True
+        elif tag == "I":
+            inner["italic"] = True
+        elif tag == "Font":
+            size = child.get(f"{{{_HTML_NS}}}Size")
+            color = child.get(f"{{{_HTML_NS}}}Color")
+            if size:
+                inner["size"] = float(size)
+            if color:
+                inner["color"] = tuple(int(color.lstrip("#")[i:i + 2], 16) for i in (0, 2, 4))
+        _xml_runs(child, inner, out)
+        if child.tail:
+            out.append((child.tail, style))
+
+
+class _RangeApi:
+    """Imita range.api (objeto COM Range): Address, WrapText, Row, Column, MergeArea, GetValue/SetValue(11)."""
+
+    def __init__(self, sheet: "MemorySheet", row: int, col: int):
+        self._sheet = sheet
+        self.Row = row
+        self.Column = col
+
+    @property
+    def Address(self) -> str:
+        return to_address(self.Row, self.Column, absolute=True)
+
+    @property
+    def WrapText(self) -> bool:
+        cell = self._sheet._cells.get((self.Row, self.Column))
+        return bool(cell and cell.wrap_text)
+
+    @WrapText.setter
+    def WrapText(self, value: bool) -> None:
+        cell = self._sheet._cell(self.Row, self.Column)
+        cell.wrap_text = bool(value)
+        self._sheet._dirty.add((self.Row, self.Column))
+
+    @property
+    def MergeArea(self) -> "_RangeApi":
+        # O stand-in não guarda mesclagens: a área é a própria célula
+        return self
+
+    def GetValue(self, RangeValueDataType=None):
+        cell = self._sheet._cells.get((self.Row, self.Column))
+        value = cell.value if cell else None
+        if RangeValueDataType != XL_RANGE_VALUE_XML:
+            return value
+        style_id = f"s{cell.style if cell and cell.style is not None else 0}"
+        alignment = '<Alignment ss:WrapText="1"/>' if cell and cell.wrap_text else ""
+        if value is None:
+            data = ""
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            data = f'<Data ss:Type="Number">{value}</Data>'
+        else:
+            data = f'<Data ss:Type="String">{_xml_escape(str(value))}</Data>'
+        return (
+            '<?xml version="1.0"?>\n'
+            f'<Workbook xmlns="{_SS_NS}" xmlns:ss="{_SS_NS}" xmlns:html="{_HTML_NS}">'
+            f'<Styles><Style ss:ID="{style_id}">{alignment}</Style></Styles>'
+            f'<Worksheet ss:Name="{_xml_escape(self._sheet.name)}"><Table><Row>'
+            f'<Cell ss:StyleID="{style_id}">{data}</Cell>'
+            "</Row></Table></Worksheet></Workbook>"
+        )
+
+    def SetValue(self, RangeValueDataType=None, value=None) -> None:
+        pos = (self.Row, self.Column)
+        cell = self._sheet._cell(*pos)
+        self._sheet._dirty.add(pos)
+        if RangeValueDataType != XL_RANGE_VALUE_XML:
+            cell.value, cell.formula, cell.bold_spans, cell.font_runs = value, None, [], []
+            return
+        root = ET.fromstring(value)
+        node = root.find(f".//{{{_SS_NS}}}Cell")
+        data = node.find(f"{{{_SS_NS}}}Data")
+        runs: list = []
+        if data is not None:
+            _xml_runs(data, {}, runs)
+        text = "".join(chunk for chunk, _style in runs)
+        cell.value = text if runs else None
+        cell.formula = None
+        cell.bold_spans, cell.font_runs = [], []
+        pos_char, spans = 0, []
+        for chunk, style in runs:
+            spans.append((pos_char, pos_char + len(chunk), style))
+            pos_char += len(chunk)
+        for start, stop, style in spans:
+            if style.get("bold"):
+                cell.bold_spans = _set_span(cell.bold_spans, start, stop, True)
+        for attr in ("italic", "size", "color"):
+            merged: list = []
+            for start, stop, style in spans:
+                if attr not in style:
+                    continue
+                if merged and merged[-1][1] == start and merged[-1][3] == style[attr]:
+                    merged[-1] = (merged[-1][0], stop, attr, style[attr])
+                else:
+                    merged.append((start, stop, attr, style[attr]))
+            cell.font_runs.extend(merged)
+        style_id = node.get(f"{{{_SS_NS}}}StyleID")
+        for style in root.iter(f"{{{_SS_NS}}}Style"):
+            if style.get(f"{{{_SS_NS}}}ID") == style_id:
+                alignment = style.find(f"{{{_SS_NS}}}Alignment")
+                wrap = alignment is not None and alignment.get(f"{{{_SS_NS}}}WrapText") == "1"
+                if wrap or cell.wrap_text is not None:
+                    cell.wrap_text = wrap
+
+
+class MemoryRange:
+    """Imita xlwings.Range para uma única célula."""
+
+    def __init__(self, sheet: "MemorySheet", row: int, col: int):
+        self.sheet = sheet
+        self.row = row
+        self.column = col
+        self.api = _RangeApi(sheet, row, col)
+
+    @property
+    def address(self) -> str:
+        return to_address(self.row, self.column, absolute=True)
+
+    @property
+    def value(self):
+        cell = self.sheet._cells.get((self.row, self.column))
+        return cell.value if cell else None
+
+    @value.setter
+    def value(self, value) -> None:
+        cell = self.sheet._cell(self.row, self.column)
+        cell.value = value
+        cell.formula = None
+        cell.bold_spans = []
+        cell.font_runs = []
+        self.sheet._dirty.add((self.row, self.column))
+
+    @property
+    def number_format(self) -> str:
+        cell = self.sheet._cells.get((self.row, self.column))
+        return (cell.number_format if cell else None) or "General"
+
+    @number_format.setter
+    def number_format(self, value: str) -> None:
+        self.sheet._cell(self.row, self.column).number_format = value
+        self.sheet._dirty.add((self.row, self.column))
+
+    @property
+    def characters(self) -> _CharactersAccessor:
+        return _CharactersAccessor(self.sheet, (self.row, self.column))
+
+
+class MemoryArea:
+    """Imita um Range retangular do xlwings (usado para UsedRange): leitura em lote de valores e fórmulas."""
+
+    def __init__(self, sheet: "MemorySheet", row: int, col: int, last_row: int, last_col: int):
+        self.sheet = sheet
+        self.row = row
+        self.column = col
+        self.last_cell = (last_row, last_col)
+
+    def options(self, ndim: int = 2, **_kwargs) -> "MemoryArea":
+        return self
+
+    def _matrix(self, getter) -> list:
+        last_row, last_col = self.last_cell
+        cells = self.sheet._cells
+        return [
+            [getter(cells.get((r, c))) for c in range(self.column, last_col + 1)]
+            for r in range(self.row, last_row + 1)
+        ]
+
+    @property
+    def value(self) -> list:
+        return self._matrix(lambda cell: cell.value if cell else None)
+
+    @property
+    def formula(self) -> tuple:
+        def _formula(cell):
+            if cell is None:
+                return ""
+            if cell.formula:
+                return cell.formula
+            return "" if cell.value is None else str(cell.value)
+
+        return tuple(tuple(row) for row in self._matrix(_formula))
+
+
+class _CellsApi:
+    """Imita sheet.api.Cells: Cells(linha, coluna), Find e FindNext (busca parcial, sem diferenciar maiúsculas)."""
+
+    def __init__(self, sheet: "MemorySheet"):
+        self._sheet = sheet
+
+    def __call__(self, row: int, col: int) -> _RangeApi:
+        return _RangeApi(self._sheet, row, col)
+
+    def _search(self, what: str, after: tuple[int, int], look_in: int):
+        needle = str(what).lower()
+        ordered = sorted(self._sheet._cells)
+        # Busca por linhas a partir da célula SEGUINTE a "after", com volta ao início (como o Excel)
+        start = 0
+        for i, pos in enumerate(ordered):
+            if pos > after:
+                start = i
+                break
+        else:
+            start = 0
+        for pos in ordered[start:] + ordered[:start]:
+            cell = self._sheet._cells[pos]
+            if look_in == XL_FORMULAS and cell.formula:
+                text = cell.formula
+            elif cell.value is None:
+                continue
+            else:
+                text = str(cell.value)
+            if needle in text.lower():
+                return _RangeApi(self._sheet, pos[0], pos[1])
+        return None
+
+    def Find(self, What, After=None, LookAt=XL_PART, LookIn=XL_VALUES, SearchOrder=1, SearchDirection=1, MatchCase=False):
+        after = (After.Row, After.Column) if After is not None else (0, 0)
+        found = self._search(What, after, LookIn)
+        if found is not None:
+            self._sheet._last_find = (What, LookIn)
+        return found
+
+    def FindNext(self, after: _RangeApi):
+        what, look_in = getattr(self._sheet, "_last_find", (None, XL_VALUES))
+        if what is None:
+            return None
+        return self._search(what, (after.Row, after.Column), look_in)
+
+
+class _Pages:
+    # Stand-in: uma página por trecho entre quebras manuais (sem quebras automáticas)
+    def __init__(self, sheet: "MemorySheet"):
+        self._sheet = sheet
+
+    @property
+    def Count(self) -> int:
+        return len(self._sheet._breaks) + 1
+
+
+class _PageSetup:
+    def __init__(self, sheet: "MemorySheet"):
+        self.Pages = _Pages(sheet)
+
+
+class _PageBreak:
+    def __init__(self, sheet: "MemorySheet", row: int):
+        self.Location = _RangeApi(sheet, row, 1)
+
+
+class _PageBreaks:
+    """Imita sheet.api.HPageBreaks/VPageBreaks: Count e Item(i) (base 1) com Location.Row."""
+
+    def __init__(self, sheet: "MemorySheet", horizontal: bool):
+        self._sheet = sheet
+        self._horizontal = horizontal
+
+    @property
+    def Count(self) -> int:
+        return len(self._sheet._breaks) if self._horizontal else 0
+
+    def Item(self, index: int) -> _PageBreak:
+        if not self._horizontal:
+            raise IndexError(index)
+        return _PageBreak(self._sheet, self._sheet._breaks[index - 1])
+
+
+class _SheetApi:
+    def __init__(self, sheet: "MemorySheet"):
+        self.Cells = _CellsApi(sheet)
+        self.PageSetup = _PageSetup(sheet)
+        self.HPageBreaks = _PageBreaks(sheet, True)
+        self.VPageBreaks = _PageBreaks(sheet, False)
+
+
+class MemorySheet:
+    """Imita xlwings.Sheet: name, range(endereço) e api.Cells."""
+
+    def __init__(self, book: "MemoryBook", name: str):
+        self.book = book
+        self.name = name
+        self._cells: dict[tuple[int, int], MemoryCell] = {}
+        # Células alteradas desde a abertura (usado pelo backend XML para regravar só o necessário)
+        self._dirty: set[tuple[int, int]] = set()
+        # Quebras de página manuais do modelo: primeira linha de cada página nova
+        self._breaks: list[int] = []
+        self.api = _SheetApi(self)
+
+    def _cell(self, row: int, col: int) -> MemoryCell:
+        cell = self._cells.get((row, col))
+        if cell is None:
+            cell = self._cells[(row, col)] = MemoryCell()
+        return cell
+
+    def range(self, address: str) -> MemoryRange:
+        row, col = split_address(address)
+        return MemoryRange(self, row, col)
+
+    def copy(self, before: "MemorySheet | None" = None, after: "MemorySheet | None" = None, name: str | None = None):
+        """Cópia da planilha na mesma pasta (como Sheet.copy do xlwings; sem posição, vai para o fim)."""
+        sheets = self.book.sheets
+        if name is None:
+            n = 2
+            while any(s.name == f"{self.name} ({n})" for s in sheets):
+                n += 1
+            name = f"{self.name} ({n})"
+        elif any(s.name == name for s in sheets):
+            raise ValueError(f"já existe uma planilha chamada {name!r}")
+        clone = MemorySheet(self.book, name)
+        for pos, cell in self._cells.items():
+            copied = MemoryCell(cell.value, cell.formula, cell.style)
+            copied.number_format = cell.number_format
+            copied.wrap_text = cell.wrap_text
+            copied.bold_spans = list(cell.bold_spans)
+            copied.font_runs = list(cell.font_runs)
+            clone._cells[pos] = copied
+        clone._dirty = set(self._dirty)
+        clone._breaks = list(self._breaks)
+        if before is not None:
+            sheets.insert(sheets.index(before), clone)
+        elif after is not None:
+            sheets.insert(sheets.index(after) + 1, clone)
+        else:
+            sheets.append(clone)
+        return clone
+
+    @property
+    def used_range(self) -> MemoryArea:
+        """Menor retângulo com todas as células preenchidas (A1 se a planilha estiver vazia)."""
+        if not self._cells:
+            return MemoryArea(self, 1, 1, 1, 1)
+        rows = [r for r, _c in self._cells]
+        cols = [c for _r, c in self._cells]
+        return MemoryArea(self, min(rows), min(cols), max(rows), max(cols))
+
+
+class _BookApi:
+    def __init__(self, book: "MemoryBook"):
+        self._book = book
+
+    def ExportAsFixedFormat(self, Type=0, Filename=None, *args, From=None, To=None, **kwargs) -> None:
+        if Filename is None:
+            raise ValueError("ExportAsFixedFormat: Filename é obrigatório")
+        self._book.app._maybe_hang("export")
+        pages = []
+        for sheet in self._book.sheets:
+            starts = [0, *sheet._breaks]
+            for i, start in enumerate(starts):
+                stop = starts[i + 1] if i + 1 < len(starts) else None
+                pages.append([
+                    f"{to_address(row, col)}: {cell.value}"
+                    for (row, col), cell in sorted(sheet._cells.items())
+                    if cell.value not in (None, "") and row >= start and (stop is None or row < stop)
+                ])
+        # From/To: intervalo de páginas (base 1), como no Excel
+        first = max(int(From or 1), 1)
+        last = min(int(To or len(pages)), len(pages))
+        if first > last:
+            raise ValueError(f"ExportAsFixedFormat: páginas {first}-{last} fora da pasta ({len(pages)} página(s))")
+        Path(Filename).write_bytes(_text_pdf(pages[first - 1 : last]))
+
+
+class _SheetList(list):
+    """Lista de planilhas com acesso por índice ou por nome (como wb.sheets do xlwings)."""
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for sheet in self:
+                if sheet.name == key:
+                    return sheet
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+
+class MemoryBook:
+    """Imita xlwings.Book carregado de um .xlsx."""
+
+    def __init__(self, app: "MemoryApp", path: str):
+        self.app = app
+        self.fullname = str(path)
+        self.sheets = _SheetList()
+        breaks = read_page_breaks(path)
+        for name, cells in read_workbook(path):
+            sheet = MemorySheet(self, name)
+            sheet._breaks = breaks.get(name, [])
+            for address, value, formula, style in cells:
+                if value is None and formula is None and style is None:
+                    continue
+                row, col = split_address(address)
+                sheet._cells[(row, col)] = MemoryCell(value, formula, style)
+            self.sheets.append(sheet)
+        self.api = _BookApi(self)
+
+    def close(self) -> None:
+        if self in self.app.books:
+            self.app.books.remove(self)
+
+
+class _Books(list):
+    def __init__(self, app: "MemoryApp"):
+        super().__init__()
+        self._app = app
+
+    def open(self, fullname: str) -> MemoryBook:
+        self._app._maybe_hang("open")
+        book = MemoryBook(self._app, fullname)
+        self.append(book)
+        return book
+
+
+# Stand-in do EXCEL.EXE para hang: ignora o pedido de saída (SIGTERM), como um Excel com diálogo aberto
+_HUNG_PROCESS = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN)\nwhile True: time.sleep(60)"
+
+
+class MemoryApp:
+    """
+    Imita xlwings.App: books.open, propriedades de sessão, calculate() e quit().
+    hang={fase: s}: trava na fase por s segundos (ou até o processo stand-in morrer, que
+    vira erro como a chamada COM a um Excel encerrado).
+    """
+
+    pid = None
+
+    def __init__(self, hang: dict | None = None):
+        self.books = _Books(self)
+        self.screen_updating = True
+        self.enable_events = True
+        self.display_alerts = True
+        self.calculation = "automatic"
+        self.visible = False
+        self._hang = dict(hang or {})
+        self._process = None
+        if self._hang:
+            self._process = subprocess.Popen([sys.executable, "-c", _HUNG_PROCESS], stdin=subprocess.DEVNULL)
+            self.pid = self._process.pid
+            self._maybe_hang("launch")
+
+    def _maybe_hang(self, phase: str) -> None:
+        seconds = self._hang.get(phase)
+        if seconds is None or self._process is None:
+            return
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Excel encerrado durante '{phase}' (código {self._process.returncode})")
+            time.sleep(0.05)
+
+    def calculate(self) -> None:
+        self._maybe_hang("fill")
+
+    def quit(self) -> None:
+        try:
+            self._maybe_hang("quit")
+        finally:
+            self.books.clear()
+            if self._process is not None and self._process.poll() is None:
+                self._process.kill()
+                self._process.wait()
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _text_pdf(pages: list[list[str]]) -> bytes:
+    """PDF mínimo (Helvetica): uma página por planilha, com uma linha por célula preenchida."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # árvore de páginas, preenchida no fim
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for lines in pages:
+        content = ["BT", "/F1 8 Tf", "40 800 Td", "10 TL"]
+        for line in lines:
+            for part in line.replace("\r\n", "\n").split("\n"):
+                safe = _pdf_escape(part).encode("cp1252", "replace").decode("latin-1")
+                content.append(f"({safe}) '")
+        content.append("ET")
+        stream = "\n".join(content).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
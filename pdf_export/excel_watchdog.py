@@ -0,0 +1,427 @@
+"""
+Supervisão da instância do Excel: prazo por fase, escalonamento e limpeza de instâncias órfãs.
+
+Excel preso (diálogo modal, modelo bloqueado, ExportAsFixedFormat que não volta) deixava o
+main() parado para sempre, e o app esperando o processo filho. Um processo que caía no meio
+deixava EXCEL.EXE invisível para trás (o app.quit() do finally não roda), pesando nas
+execuções seguintes.
+
+Fases e prazos padrão (s): launch 60, open 60, fill 120 (inclui o recálculo), export 180,
+quit 30 (fechar a pasta e o Excel). --deadlines "export=300,open=30" (ou PDF_EXPORT_DEADLINES)
+ajusta; 0 desliga a fase; "off" desliga todas.
+
+Prazo estourado (thread de supervisão):
+  1. pede para o Excel fechar (taskkill sem /F; SIGTERM fora do Windows) e espera GRACE_S;
+  2. se continua vivo, mata o processo (taskkill /F /T; SIGKILL);
+  3. a chamada COM presa volta com erro e vira ExcelTimeout na fase; se nem assim a thread
+     principal sair da fase em GRACE_S, o processo sai com EXIT_TIMEOUT.
+O erro vai para o stderr em duas linhas: "Erro: ..." e um JSON {"event": "timeout", "phase", ...};
+código de saída EXIT_TIMEOUT (124, como o timeout do coreutils).
+
+Instâncias órfãs: cada Excel aberto é anotado (PID + criação do processo, e o PID do gerador
+dono) em STATE_PATH e retirado ao fechar. Na próxima supervisão, entradas cujo dono já não existe
+e cujo Excel ainda está vivo (mesmo PID e mesma criação: PID reaproveitado não conta) são mortas.
+Os workers do --server anotam em paralelo: cada leitura + regravação do arquivo é feita sob o
+lock exclusivo de STATE_PATH.lock (flock / msvcrt.locking; o sistema solta o lock se o processo morrer).
+
+No Linux: --backend memory --fake-hang export[=s] faz o stand-in em memória travar na fase,
+com um processo de verdade no lugar do EXCEL.EXE (ver excel_backend.MemoryApp).
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from export_log import logger
+
+try:
+    import msvcrt
+except ImportError:  # fora do Windows
+    msvcrt = None
+    import fcntl
+from startup import process_start
+from template_manifest import MANIFEST_DIR
+
+PHASES = ("launch", "open", "fill", "export", "quit")
+DEFAULT_DEADLINES = {"launch": 60.0, "open": 60.0, "fill": 120.0, "export": 180.0, "quit": 30.0}
+# Espera entre os degraus do escalonamento (s)
+GRACE_S = 5.0
+EXIT_TIMEOUT = 124
+
+STATE_PATH = Path(os.environ.get("PDF_EXPORT_EXCEL_STATE") or MANIFEST_DIR.parent / "excel_instances.json")
+
+# Tolerância (s) ao comparar a criação do processo anotada com a atual
+_CREATED_SLACK = 1.0
+
+_current: "Watchdog | None" = None
+
+
+class ExcelTimeout(Exception):
+    """Prazo de uma fase estourado; `info` é o JSON do relatório (report_timeout)."""
+
+    def __init__(self, info: dict):
+        super().__init__(info["error"])
+        self.info = info
+
+
+def parse_deadlines(spec: str | None) -> dict[str, float]:
+    """
+    "export=300,open=30" -> prazos (os padrões para as fases não citadas); "off" -> nenhum.
+    ValueError se a fase ou o número for inválido.
+    """
+    deadlines = dict(DEFAULT_DEADLINES)
+    if not spec or not spec.strip():
+        return deadlines
+    if spec.strip().lower() == "off":
+        return {phase: 0.0 for phase in PHASES}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        phase, sep, value = item.partition("=")
+        phase = phase.strip().lower()
+        if not sep or phase not in PHASES:
+            raise ValueError(f"prazo inválido: {item.strip()!r} (use fase=segundos; fases: {', '.join(PHASES)})")
+        seconds = float(value.replace(",", "."))
+        if seconds < 0:
+            raise ValueError(f"prazo negativo: {item.strip()!r}")
+        deadlines[phase] = seconds
+    return deadlines
+
+
+def process_alive(pid: int | None, created: float | None = None) -> bool:
+    """Processo vivo (e, com `created`, o mesmo que foi anotado, não um PID reaproveitado)."""
+    if not pid:
+        return False
+    started = process_start(pid)
+    if started is None:
+        return False
+    return created is None or abs(started - created) <= _CREATED_SLACK
+
+
+def terminate(pid: int | None, force: bool = False) -> None:
+    """Pede para o processo sair (force=False) ou o mata, com os filhos no Windows; melhor esforço."""
+    if not pid:
+        return
+    try:
+        if os.name == "nt":
+            command = ["taskkill", "/T", "/PID", str(pid)]
+            if force:
+                command.insert(1, "/F")
+            subprocess.run(command, capture_output=True, timeout=10)
+        else:
+            os.kill(pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (OSError, subprocess.SubprocessError):
+        pass
+
+
+def _wait_exit(pid: int, created: float | None, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while process_alive(pid, created):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Arquivo de instâncias (reaproveitamento de órfãs)
+# ---------------------------------------------------------------------------
+
+
+def _load_state(path: Path) -> list[dict]:
+    try:
+        entries = json.loads(path.read_text(encoding="utf-8")).get("instances", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+    return [e for e in entries if isinstance(e, dict) and isinstance(e.get("pid"), int)]
+
+
+def _save_state(path: Path, entries: list[dict]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"instances": entries}), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Instâncias do Excel não anotadas (ignorado): {e}")
+
+
+@contextmanager
+def _state_lock(path: Path):
+    """Lock exclusivo entre processos do arquivo de instâncias (espera quem estiver com ele)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f"{path.name}.lock"), "a+b") as fh:
+        if msvcrt is not None:
+            # LK_LOCK tenta por ~10 s e então levanta OSError
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if msvcrt is not None:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _update_state(path: Path, change) -> None:
+    """Lê o arquivo, aplica change(entradas) -> entradas e grava se mudou, tudo sob o lock."""
+    try:
+        with _state_lock(path):
+            entries = _load_state(path)
+            updated = change(entries)
+            if updated != entries:
+                _save_state(path, updated)
+    except OSError as e:
+        logger.warning(f"Instâncias do Excel não anotadas (ignorado): {e}")
+
+
+def track(pid: int | None, path: Path = STATE_PATH) -> None:
+    """Anota a instância do Excel deste processo (retirada com untrack ao fechar)."""
+    if not pid:
+        return
+    entry = {
+        "pid": pid,
+        "created": process_start(pid),
+        "owner": os.getpid(),
+        "owner_created": process_start(os.getpid()),
+        "started": time.time(),
+    }
+    _update_state(path, lambda entries: [e for e in entries if e["pid"] != pid] + [entry])
+
+
+def untrack(pid: int | None, path: Path = STATE_PATH) -> None:
+    if not pid:
+        return
+    _update_state(path, lambda entries: [e for e in entries if e["pid"] != pid])
+
+
+def reap_orphans(path: Path = STATE_PATH) -> list[int]:
+    """
+    Mata as instâncias anotadas cujo gerador dono não existe mais e limpa o arquivo.
+    Retorna os PIDs encerrados.
+    """
+    # Só a leitura: o lock não fica preso durante a espera pelo encerramento
+    orphans = [
+        e for e in _load_state(path)
+        if not process_alive(e.get("owner"), e.get("owner_created"))  # senão outro gerador ainda a usa
+    ]
+    if not orphans:
+        return []
+    done, reaped = set(), []
+    for entry in orphans:
+        pid, created = entry["pid"], entry.get("created")
+        if process_alive(pid, created):
+            terminate(pid, force=True)
+            if not _wait_exit(pid, created, GRACE_S):
+                logger.warning(f"Excel órfão (PID {pid}) não encerrou; nova tentativa na próxima execução.")
+                continue
+            reaped.append(pid)
+        done.add((pid, created))
+    _update_state(path, lambda entries: [e for e in entries if (e["pid"], e.get("created")) not in done])
+    if reaped:
+        logger.info(f"Excel órfão de execução anterior encerrado: PID {', '.join(map(str, reaped))}")
+    return reaped
+
+
+# ---------------------------------------------------------------------------
+# Supervisão
+# ---------------------------------------------------------------------------
+
+
+class Watchdog:
+    """
+    Prazos por fase para UMA instância do Excel. A thread principal marca as fases
+    (phase(nome)); uma thread de supervisão escalona quando o prazo estoura.
+    """
+
+    def __init__(
+        self,
+        deadlines: dict[str, float] | None = None,
+        grace: float = GRACE_S,
+        state_path: Path = STATE_PATH,
+    ):
+        self.deadlines = dict(DEFAULT_DEADLINES if deadlines is None else deadlines)
+        self.grace = grace
+        self.state_path = state_path
+        self.pid: int | None = None
+        self.created: float | None = None
+        self.fired: dict | None = None
+        self._cond = threading.Condition()
+        self._phase: str | None = None
+        self._since = 0.0
+        self._deadline: float | None = None
+        self._left = threading.Event()
+        self._left.set()
+        self._escalated = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    # -- ciclo de vida --------------------------------------------------------
+
+    def start(self) -> None:
+        reap_orphans(self.state_path)
+        if any(self.deadlines.get(phase) for phase in PHASES):
+            self._thread = threading.Thread(target=self._run, name="excel-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def launch(self, start, *args, **kwargs):
+        """Abre o Excel (start(*args, **kwargs)) dentro da fase launch e anota a instância."""
+        with self.phase("launch"):
+            app = start(*args, **kwargs)
+        self.attach(app)
+        return app
+
+    def attach(self, app) -> None:
+        self.pid = getattr(app, "pid", None)
+        self.created = process_start(self.pid) if self.pid else None
+        track(self.pid, self.state_path)
+
+    def quit(self, app) -> None:
+        """
+        Fecha o Excel dentro da fase quit; se o processo não sair em `grace` s depois do
+        quit (ou o prazo já tiver estourado), mata. Em seguida retira a anotação.
+        """
+        try:
+            if self.fired is None:
+                with self.phase("quit"):
+                    app.quit()
+        finally:
+            if self.pid and not _wait_exit(self.pid, self.created, self.grace):
+                logger.warning(f"Excel (PID {self.pid}) continuou aberto depois do quit; encerrando o processo.")
+                terminate(self.pid, force=True)
+                _wait_exit(self.pid, self.created, self.grace)
+            if not process_alive(self.pid, self.created):
+                untrack(self.pid, self.state_path)
+
+    # -- fases ----------------------------------------------------------------
+
+    @contextmanager
+    def phase(self, name: str):
+        limit = float(self.deadlines.get(name) or 0.0)
+        with self._cond:
+            self.fired = None
+            self._phase = name
+            self._since = time.monotonic()
+            self._deadline = self._since + limit if limit > 0 else None
+            self._left.clear()
+            self._cond.notify_all()
+        try:
+            yield
+        except Exception as e:
+            if self.fired is not None:
+                raise self._timeout() from e
+            raise
+        finally:
+            with self._cond:
+                self._phase = None
+                self._deadline = None
+                self._left.set()
+                self._cond.notify_all()
+        if self.fired is not None:
+            raise self._timeout()
+
+    def _timeout(self) -> ExcelTimeout:
+        # A chamada presa pode voltar antes de o escalonamento terminar (ex.: logo após o SIGTERM)
+        self._escalated.wait(3 * self.grace)
+        return ExcelTimeout(self.fired)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping and (self._deadline is None or time.monotonic() < self._deadline):
+                    wait = None if self._deadline is None else max(0.0, self._deadline - time.monotonic())
+                    self._cond.wait(wait)
+                if self._stopping:
+                    return
+                phase, since, limit = self._phase, self._since, self._deadline - self._since
+                self._deadline = None
+                self._escalated.clear()
+                self.fired = info = {
+                    "error": f"Excel não respondeu na fase '{phase}' em {limit:g} s",
+                    "phase": phase,
+                    "deadline_s": round(limit, 3),
+                    "elapsed_s": round(time.monotonic() - since, 3),
+                    "excel_pid": self.pid,
+                    "escalation": [],
+                }
+            self._escalate(info)
+
+    def _escalate(self, info: dict) -> None:
+        phase, pid = info["phase"], self.pid
+        logger.error(f"{info['error']}" + (f" (PID {pid})" if pid else "") + "; encerrando.")
+        if pid and process_alive(pid, self.created):
+            info["escalation"].append("quit")
+            terminate(pid, force=False)
+            if not _wait_exit(pid, self.created, self.grace):
+                info["escalation"].append("kill")
+                terminate(pid, force=True)
+                _wait_exit(pid, self.created, self.grace)
+        if not process_alive(pid, self.created):
+            untrack(pid, self.state_path)
+        if info["escalation"]:
+            info["error"] += f"; instância encerrada ({' -> '.join(info['escalation'])})"
+        self._escalated.set()
+        # A chamada COM presa volta com erro quando o Excel morre; se a thread principal
+        # continuar presa (ex.: sem PID para matar), o processo sai daqui mesmo
+        if not self._left.wait(self.grace):
+            info["escalation"].append("exit")
+            info["error"] += "; gerador encerrado"
+            report_timeout(info)
+            for handler in logger.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    pass
+            os._exit(EXIT_TIMEOUT)
+
+
+def report_timeout(info: dict, stream=None) -> None:
+    """Erro de prazo no stderr: linha legível ("Erro: ...") e linha JSON {"event": "timeout", ...}."""
+    stream = stream or sys.stderr
+    print(f"Erro: {info['error']}", file=stream)
+    print(json.dumps({"event": "timeout", **info}, ensure_ascii=False), file=stream, flush=True)
+
+
+@contextmanager
+def supervise(watchdog: Watchdog | None):
+    """Ativa o watchdog (fases marcadas com phase() passam a ter prazo); None: sem supervisão."""
+    global _current
+    if watchdog is None:
+        yield None
+        return
+    previous = _current
+    watchdog.start()
+    _current = watchdog
+    try:
+        yield watchdog
+    finally:
+        _current = previous
+        watchdog.stop()
+
+
+def phase(name: str):
+    """Fase do watchdog ativo (supervise); sem supervisão, não faz nada."""
+    return _current.phase(name) if _current is not None else nullcontext()
+
+
+def fired() -> bool:
+    """O prazo de alguma fase estourou na supervisão ativa (o Excel foi ou está sendo encerrado)."""
+    return _current is not None and _current.fired is not None
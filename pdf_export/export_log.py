@@ -0,0 +1,163 @@
+"""
+Log do gerador (logging da biblioteca padrão), configurado uma vez por execução ou sessão do worker.
+
+- stderr: "[PDF Export] mensagem" a partir do nível configurado (o app mostra stderr em caso de erro).
+- Arquivo %TEMP%/cobertura_pdf_export_log.txt, com buffer em memória: vai para o disco quando o
+  buffer enche, num erro e na saída do processo (logging.shutdown). O arquivo só fica aberto enquanto
+  o buffer é gravado, então os processos que escrevem nele (execuções simultâneas, workers --serve
+  do --server) não o prendem entre uma gravação e outra.
+  Rotação por tamanho (LOG_MAX_BYTES, LOG_BACKUPS cópias .1, .2, ...) em vez de truncar a cada
+  execução; cada linha leva data/hora e PID, para execuções seguidas ou simultâneas não se misturarem.
+  No Windows a rotação falha se outro processo estiver gravando naquele instante: a linha vai para o
+  arquivo atual e a rotação é tentada de novo depois de ROLLOVER_RETRY_S (sem erro no stderr).
+- Níveis: info (padrão) registra as etapas; debug acrescenta o passo a passo por célula e o
+  payload completo. Mensagens de debug usam argumentos preguiçosos (logger.debug("%s", x)):
+  fora do modo debug não são nem formatadas.
+- Máscara opcional de cpfCnpj / celularFone (--log-mask ou PDF_EXPORT_LOG_MASK=1): os valores do
+  payload em andamento são trocados por asteriscos (mantém os 2 últimos caracteres) em toda linha.
+
+Nível também por variável de ambiente: PDF_EXPORT_LOG_LEVEL=debug|info|warning|error.
+"""
+
+import logging
+import logging.handlers
+import os
+import sys
+import time
+from pathlib import Path
+
+# Log provisório: arquivo em %TEMP% para inspeção após gerar o PDF
+LOG_PATH = Path(os.environ.get("TEMP", os.path.expanduser("~"))) / "cobertura_pdf_export_log.txt"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Rotação recusada (arquivo aberto por outro processo no Windows): espera antes de tentar de novo
+ROLLOVER_RETRY_S = 30.0
+# Registros guardados em memória antes de ir para o disco
+BUFFER_RECORDS = 5000
+
+LEVELS = ("debug", "info", "warning", "error")
+SENSITIVE_KEYS = ("cpfCnpj", "celularFone")
+MASK_MIN_LENGTH = 6
+
+logger = logging.getLogger("pdf_export")
+
+
+def mask_value(value) -> str:
+    """Troca letras e dígitos por "*", mantendo a pontuação e os 2 últimos caracteres."""
+    text = str(value)
+    head, tail = text[:-2], text[-2:]
+    return "".join("*" if c.isalnum() else c for c in head) + tail
+
+
+class MaskFilter(logging.Filter):
+    """Mascara, em toda mensagem, os valores sensíveis do payload em andamento."""
+
+    def __init__(self):
+        super().__init__()
+        self.values: dict[str, str] = {}
+
+    def watch(self, data: dict) -> None:
+        self.values = {}
+        for key in SENSITIVE_KEYS:
+            value = str(data.get(key) or "").strip()
+            # Valores curtos demais apareceriam em outros textos (ex.: "3" numa medida)
+            if len(value) >= MASK_MIN_LENGTH:
+                self.values[value] = mask_value(value)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.values:
+            message = record.getMessage()
+            for raw, masked in self.values.items():
+                message = message.replace(raw, masked)
+            record.msg, record.args = message, None
+        return True
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotação por tamanho num arquivo compartilhado entre processos: se a rotação falhar
+    (PermissionError no Windows), segue no arquivo atual e só tenta de novo após ROLLOVER_RETRY_S.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._retry_at = 0.0
+
+    def shouldRollover(self, record) -> bool:
+        if time.monotonic() < self._retry_at:
+            return False
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        try:
+            super().doRollover()
+        except OSError:
+            # O stream foi fechado antes da renomeação; com delay=True reabre na próxima linha
+            self.stream = None
+            self._retry_at = time.monotonic() + ROLLOVER_RETRY_S
+
+    def release_file(self) -> None:
+        """Fecha o arquivo (reaberto na próxima linha): outro processo pode rotacioná-lo."""
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.flush()
+                self.stream.close()
+                self.stream = None
+        finally:
+            self.release()
+
+
+class _LogBuffer(logging.handlers.MemoryHandler):
+    """Buffer em memória que grava no arquivo em lote e o fecha em seguida."""
+
+    def flush(self) -> None:
+        super().flush()
+        if isinstance(self.target, SharedRotatingFileHandler):
+            self.target.release_file()
+
+
+_mask: MaskFilter | None = None
+
+
+def masking() -> bool:
+    """Se a máscara de cpfCnpj/celularFone está ligada nesta execução."""
+    return _mask is not None
+
+
+def configure(level: str | None = None, mask: bool | None = None, path: Path | None = None) -> None:
+    """(Re)configura os handlers: stderr + arquivo com buffer e rotação. Idempotente."""
+    global _mask
+    level = (level or os.environ.get("PDF_EXPORT_LOG_LEVEL") or "info").lower()
+    if mask is None:
+        mask = os.environ.get("PDF_EXPORT_LOG_MASK", "") not in ("", "0")
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    for log_filter in list(logger.filters):
+        logger.removeFilter(log_filter)
+    logger.setLevel(level.upper() if level in LEVELS else logging.INFO)
+    logger.propagate = False
+
+    stderr = logging.StreamHandler(sys.stderr)
+    stderr.setFormatter(logging.Formatter("[PDF Export] %(message)s"))
+    logger.addHandler(stderr)
+
+    target = SharedRotatingFileHandler(
+        path or LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True
+    )
+    target.setFormatter(logging.Formatter("%(asctime)s [%(process)d] %(levelname)s %(message)s"))
+    logger.addHandler(
+        _LogBuffer(BUFFER_RECORDS, flushLevel=logging.ERROR, target=target, flushOnClose=True)
+    )
+
+    _mask = MaskFilter() if mask else None
+    if _mask is not None:
+        logger.addFilter(_mask)
+
+
+def watch_payload(data: dict) -> None:
+    """Registra os valores sensíveis do payload atual para a máscara (sem máscara: nada)."""
+    if _mask is not None:
+        _mask.watch(data)
@@ -13,26 +13,91 @@ Uso:
   ou: python fill_and_export_pdf.py --template ... --data ... --output ...
 """
 
+import startup  # primeiro import: marca a partida; com --startup-report mede os imports seguintes
+
+# Módulos só de alguns modos são importados onde são usados, não aqui: archive (--archive,
+# --from-archive), page_assembly (--assemble-pages), pdf_optimize (--output-profile), xlsx_writer
+# (--fill-backend xml), job_server (--server), batch (--batch), worker (--serve).
+
 import argparse
 import json
+import logging
 import os
-import re
+import shutil
 import sys
+import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
-
-# Log provisório: arquivo em %TEMP% para inspeção após gerar o PDF
-LOG_PATH = Path(os.environ.get("TEMP", os.path.expanduser("~"))) / "cobertura_pdf_export_log.txt"
-
-
-def _log(msg: str) -> None:
-    line = f"[PDF Export] {msg}\n"
-    sys.stderr.write(line)
-    try:
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(line)
-    except Exception:
-        pass
+from typing import TYPE_CHECKING
+
+import excel_watchdog
+import export_log
+import metrics
+from excel_backend import BACKENDS, MemoryApp, apply_session_profile, populated_page_count, recalculate, start_app
+from export_log import LOG_PATH, logger
+from output_cache import DEFAULT_MAX_MB, OutputCache, cache_key
+from placeholder_fill import substitute
+from placeholder_index import PlaceholderIndex
+from rich_text import parse_markup, style_from_payload, write_rich_text
+from pricing import (  # noqa: F401 (reexportados: o cálculo de preço mora em pricing.py)
+    CARTAO_5X_ACRECIMO,
+    CARTAO_10X_ACRECIMO,
+    FORRO_VINILICO_VALOR_M2,
+    PERGOLADO_VALOR_M2,
+    build_texto_forma_pagamento,
+    format_currency,
+    get_m2_porta,
+    get_total_m2,
+    get_valor_cobertura_retratil_reais,
+    get_valor_total_reais,
+    get_valor_total_reais_cobertura_retratil,
+    get_valor_total_reais_pergolado,
+    get_valor_total_reais_porta,
+    parse_m2_direto,
+    load_scenario,
+    parse_medidas_m2,
+    quote,
+    raw_to_reais,
+)
+from spec_template import compile_template
+from template_manifest import (
+    TemplateError,
+    compile_manifest,
+    load_manifest,
+    manifest_gaps,
+    save_manifest,
+    template_hash,
+    validate_manifest,
+)
+
+if TYPE_CHECKING:
+    from archive import Archive
+
+# Versão do gerador (acompanha o app); entra na chave do cache de saída — mudou a saída, mude a versão
+GENERATOR_VERSION = "4.6.0"
+
+# Destino padrão de --profile (cProfile; abrir com pstats ou snakeviz)
+PROFILE_PATH = LOG_PATH.with_name("pdf_export_profile.prof")
+
+# Perfis de saída (chaves de pdf_optimize.PROFILES, importado só quando há perfil)
+OUTPUT_PROFILES = ("email", "preview", "print")
+
+# --assemble-pages (ou PDF_EXPORT_ASSEMBLE_PAGES=1); page_assembly só é importado ligado
+_assemble_pages = os.environ.get("PDF_EXPORT_ASSEMBLE_PAGES") == "1"
+
+# "--data -" / "--output -": payload pelo stdin, PDF pelo stdout
+STDIO = "-"
+STDOUT_CHUNK = 1 << 20
+
+
+def _log(msg: str, level: int = logging.INFO) -> None:
+    logger.log(level, msg)
+
+
+def _debug(msg: str, *args) -> None:
+    """Passo a passo (por célula): só formatado com --log-level debug."""
+    logger.debug(msg, *args)
 
 # Constantes para busca no Excel: texto a localizar -> chave no JSON
 # Substitui o conteúdo INTEIRO da célula pelo valor formatado (ex.: valor monetário)
@@ -93,6 +158,15 @@ FIELD_PLACEHOLDER_REPLACE_PORTA = {
     "[Valor p/ Forma de Pagamento]": "valorFormaPagamento",
 }
 
+# Placeholders do mapa de Cobertura Premium que o modelo atual não tem (os dados vão na descrição D43);
+# não bloqueiam a geração quando ausentes do modelo
+PLACEHOLDERS_OPCIONAIS = {
+    "[Tipo de Cobertura]",
+    "[Medida do Pilar]",
+    "[Telha Térmica]",
+    "[Forro PVC]",
+}
+
 # Campos que recebem o valor parcelado em 10x (total + 10%); todas as células com esse texto são preenchidas
 FIELD_TOTAL_LABEL = "[Valor Total]"
 # Cobertura Retrátil: valor total geral (cobertura + automatização) à vista
@@ -105,379 +179,100 @@ D44_CELL = "D44"
 M44_CELL = "M44"
 N44_CELL = "N44"
 
-# Template do texto de especificação. Placeholders: [Medidas da Cobertura], [Tipo de Cobertura], [Pintura da Cobertura], [Espessura da Telha Térmica], [Tipo do Forro].
-# Regra Item 3 (situacional): se temPilar != "Sim", remove o bloco "Item 3: Pilar metálico..." e renumera 4->3, 5->4, 6->5, 7->6.
-TEXTO_ESPECIFICACAO_TEMPLATE = """Cobertura Premium medidas [Medidas da Cobertura]
+# Modelos dos textos de especificação da D43 (sintaxe em spec_template.py): {campo|transformações},
+# blocos {% if %}, itens numerados {#} e **negrito** (intervalos aplicados na célula pelo preenchimento).
 
-Item 1: Treliça metálica com 40 cm de altura. 
+# Cobertura Premium. Regra do Item 3 (situacional): sem pilar (temPilar != "Sim") o bloco do pilar some
+# e os itens seguintes são renumerados. O negrito do título inclui o espaço seguinte (como nas versões anteriores).
+TEXTO_ESPECIFICACAO_TEMPLATE = """**Cobertura Premium **medidas {medidas}
+
+**Item {#}:** Treliça metálica com 40 cm de altura. 
 Detalhamento de fabricação: Banzos superior e inferior em perfil U simples 75x40 #14, montantes e diagonais em perfil U simples 68x30 #14. A treliça contorna toda estrutura sendo o objeto principal de estruturação da cobertura.
 
-Item 2: Revestimento das treliças em [Tipo de Cobertura] [Pintura da Cobertura].
+**Item {#}:** Revestimento das treliças em {tipoCobertura} {corOuPintura}.
 
-Item 3: Pilar metálico de 100x100 #14.
+{% if temPilar == "Sim" %}
+**Item {#}:** Pilar metálico de 100x100 #14.
 
-Item 4: Vigas metálicas e terças metálicas em metalon 50 x 50 #18. Esse item está locado na parte interna da cobertura para receber telhas térmicas e calha.
+{% endif %}
+**Item {#}:** Vigas metálicas e terças metálicas em metalon 50 x 50 #18. Esse item está locado na parte interna da cobertura para receber telhas térmicas e calha.
 
-Item 5: Telha térmica EPS de [Espessura da Telha Térmica] com acabamento em filme para dar resistência na instalação e não ocorrer o desplacamento do EPS.
+**Item {#}:** Telha térmica EPS de {telhaTermica} com acabamento em filme para dar resistência na instalação e não ocorrer o desplacamento do EPS.
 
-Item 6: Calhas e rufos galvanizados afim de garantir a vedação por completo do telhado e escoamento da água.
+**Item {#}:** Calhas e rufos galvanizados afim de garantir a vedação por completo do telhado e escoamento da água.
 
-Item 7: Forro PVC [Tipo do Forro] amadeirado nivelado na parte de baixo da cobertura."""
+**Item {#}:** Forro PVC {forroPvc} amadeirado nivelado na parte de baixo da cobertura."""
 
-# Mapeamento placeholder -> chave no JSON para o texto de D43
-D43_PLACEHOLDERS = {
-    "[Medidas da Cobertura]": "medidas",
-    "[Tipo de Cobertura]": "tipoCobertura",
-    "[Pintura da Cobertura]": "corOuPintura",
-    "[Espessura da Telha Térmica]": "telhaTermica",
-    "[Tipo do Forro]": "forroPvc",
-}
+# Cobertura Retrátil: Telha Térmica (cores das partes superior/inferior) ou Policarbonato (material);
+# a frase do modo de abertura só entra quando NÃO for Automatizada.
+TEXTO_ESPECIFICACAO_RETRATIL_TEMPLATE = """Cobertura Metálica Retrátil, medidas: {medidas|strip|sem_prefixo_medidas}
 
-# Bloco do Item 3 (pilar); removido quando temPilar != "Sim". \n explícitos para garantir match.
-ITEM_3_BLOCO = "\n\nItem 3: Pilar metálico de 100x100 #14.\n\n"
+Cobertura metálica retrátil sendo uma folha de abrir e outra fixa com \
+{% if tipoCobertura == "Telha Térmica" %}\
+telha isotérmica sendo aço/aço 50mm, acabamento {corParteSuperior|strip|lower} na parte superior da telha \
+e acabamento em aço {corParteInferior|strip|lower} na parte inferior da telha\
+{% elif tipoCobertura == "Policarbonato Alveolar 6mm" %}policarbonato alveolar 6mm\
+{% else %}policarbonato compacto 3mm{% endif %}, \
+tendo calha e rufo. Acabamento na parte metálica sendo pintura automotiva cor preto fosco.\
+{% if modoAbertura != "Automatizada" %}
 
+Cobertura com modo de abertura {modoAbertura|strip|lower}
+{% endif %}"""
 
-def build_texto_especificacao_d43(data: dict) -> str:
-    """
-    Monta o texto de especificação com placeholders substituídos.
-    Aplica a regra do Item 3: se não tiver pilar, remove o bloco do Item 3 e renumera 4->3, 5->4, 6->5, 7->6.
-    """
-    text = TEXTO_ESPECIFICACAO_TEMPLATE
-    for placeholder, json_key in D43_PLACEHOLDERS.items():
-        value = data.get(json_key) or ""
-        text = text.replace(placeholder, str(value))
-
-    tem_pilar = (data.get("temPilar") or "").strip() == "Sim"
-    if not tem_pilar:
-        # Remove só a linha do pilar, mantendo \n\n entre Item 2 e o que vira Item 3 (evita "Preto.Item 4:" grudado)
-        bloco_completo = "\n\nItem 3: Pilar metálico de 100x100 #14.\n\n"
-        substitui_por = "\n\n"  # preserva parágrafo entre Item 2 e Item 3
-        if bloco_completo in text:
-            text = text.replace(bloco_completo, substitui_por)
-        else:
-            text = text.replace("\n\nItem 3: Pilar metálico de 100x100 #14.\n\n", substitui_por)
-        # Renumera em uma única passada: Item 4->3, 5->4, 6->5, 7->6
-        def _renum(match):
-            n = int(match.group(1))
-            return "\nItem {}:".format(n - 1)
-        text = re.sub(r"\nItem ([4-7]):", _renum, text)
+# Porta: valores em minúsculas; Bandeirola e Alizar só se selecionados; Ferro Forjado e Aço Corten
+# não levam o acondicionamento na linha da porta. Primeira linha e cabeçalhos em negrito.
+TEXTO_ESPECIFICACAO_PORTA_TEMPLATE = """**Porta modelo {modeloPorta|strip|lower}. Medida total: {medidasPortaGeral|strip}.**
 
-    return text
+**Porta:** {modoPuxador|strip|lower}, {sistemaAbertura|strip|lower}, {estiloFolha|strip|lower}\
+{% if modeloPorta not in ("Ferro Forjado", "Aço Corten") %}{% if acondicionamentoEfetivo %}, \
+{acondicionamentoEfetivo|strip|lower}{% endif %}{% endif %}. \
+Fabricada em chapa {espessuraChapa|strip|lower}. {medidasPorta|strip}.
+{% if bandeirola %}
 
+**Bandeirola:** {medidasBandeirola|strip}.
+{% endif %}
+{% if alizar %}
 
-def build_texto_especificacao_d43_retratil(data: dict) -> str:
-    """
-    Monta o texto de especificação D43 para Cobertura Retrátil.
-    - Telha Térmica: template com cor parte superior/inferior; linha do modo de abertura só se NÃO Automatizada.
-    - Policarbonato: template com material; linha do modo de abertura só se NÃO Automatizada.
-    - Evita duplicar a palavra "medidas" quando data["medidas"] já vem com prefixo "medidas ".
-    """
-    tipo = (data.get("tipoCobertura") or "").strip()
-    medidas_raw = (data.get("medidas") or "").strip()
-    # Evitar "medidas: medidas ..." na linha 1: usar só o restante se já vier com prefixo "medidas "
-    if medidas_raw.lower().startswith("medidas "):
-        medidas_display = medidas_raw[8:].strip()
-    else:
-        medidas_display = medidas_raw
-    modo_abertura = (data.get("modoAbertura") or "").strip()
-    is_automatizada = modo_abertura == "Automatizada"
-    # Frase do modo de abertura só quando NÃO for Automatizada (retirar quando for Automatizada).
-    sufixo_modo = "\n\nCobertura com modo de abertura [Modo de Abertura]\n" if not is_automatizada else ""
-
-    if tipo == "Telha Térmica":
-        template = (
-            "Cobertura Metálica Retrátil, medidas: [Medidas]\n\n"
-            "Cobertura metálica retrátil sendo uma folha de abrir e outra fixa com telha isotérmica sendo aço/aço 50mm, "
-            "acabamento [Cor da Parte Superior] na parte superior da telha e acabamento em aço [Cor da Parte Inferior] na parte inferior da telha, "
-            "tendo calha e rufo. Acabamento na parte metálica sendo pintura automotiva cor preto fosco."
-        )
-        cor_superior = (data.get("corParteSuperior") or "").strip().lower()
-        cor_inferior = (data.get("corParteInferior") or "").strip().lower()
-        texto = (
-            template.replace("[Medidas]", medidas_display)
-            .replace("[Cor da Parte Superior]", cor_superior)
-            .replace("[Cor da Parte Inferior]", cor_inferior)
-        )
-        if not is_automatizada:
-            texto += sufixo_modo.replace("[Modo de Abertura]", modo_abertura.strip().lower())
-        return texto
+**Alizar:** {medidaAlizar|strip}, em dobra especial.
+{% endif %}
 
-    # Policarbonato Compacto 3mm ou Alveolar 6mm
-    material = (
-        "policarbonato alveolar 6mm"
-        if tipo == "Policarbonato Alveolar 6mm"
-        else "policarbonato compacto 3mm"
-    )
-    template = (
-        "Cobertura Metálica Retrátil, medidas: [Medidas]\n\n"
-        "Cobertura metálica retrátil sendo uma folha de abrir e outra fixa com [material], "
-        "tendo calha e rufo. Acabamento na parte metálica sendo pintura automotiva cor preto fosco."
-    )
-    texto = template.replace("[Medidas]", medidas_display).replace("[material]", material)
-    if not is_automatizada:
-        texto += sufixo_modo.replace("[Modo de Abertura]", modo_abertura.strip().lower())
-    return texto
+**Acabamento:** {corPintura|strip|lower}, {modoEntrega|strip|lower}.
 
+**Incluso:** fechadura rolete ou maçaneta simples.
+**Não incluso:** vidro, puxadores especiais e fechadura eletrônica."""
 
-def build_texto_especificacao_d43_porta(data: dict) -> str:
-    """
-    Monta o texto de especificação D43 para Porta.
-    Todos os valores na descrição em minúsculas.
-    Linhas condicionais: Bandeirola e Alizar só se selecionados.
-    Para Ferro Forjado e Aço Corten, o trecho [Acondicionamento] é omitido da linha da porta.
-    """
-    def _(s: str) -> str:
-        return (s or "").strip().lower()
-
-    modelo = _(data.get("modeloPorta") or "")
-    modo_puxador = _(data.get("modoPuxador") or "")
-    medidas_geral = (data.get("medidasPortaGeral") or "").strip()
-    medidas_porta = (data.get("medidasPorta") or "").strip()
-    sistema = _(data.get("sistemaAbertura") or "")
-    estilo = _(data.get("estiloFolha") or "")
-    acond = (data.get("acondicionamentoEfetivo") or "").strip().lower()
-    espessura = (data.get("espessuraChapa") or "").strip().lower()
-    pintura = (data.get("corPintura") or "").strip().lower()
-    modo_entrega = _(data.get("modoEntrega") or "")
-
-    # Linha 1: Porta modelo [Modelo]. Medida total: [Medidas geral].
-    linha1 = f"Porta modelo {modelo}. Medida total: {medidas_geral}."
-
-    # Linha 2: Porta: [Modo Puxador], [Sistema], [Estilo] [, Acondicionamento]. Fabricada em chapa [Espessura]. [Medidas porta].
-    # Para Ferro Forjado e Aço Corten: sem [Acondicionamento].
-    modelo_raw = (data.get("modeloPorta") or "").strip()
-    sem_acondicionamento_na_linha = modelo_raw in ("Ferro Forjado", "Aço Corten")
-    if sem_acondicionamento_na_linha:
-        linha2 = f"Porta: {modo_puxador}, {sistema}, {estilo}. Fabricada em chapa {espessura}. {medidas_porta}."
-    else:
-        parte_acond = f", {acond}" if acond else ""
-        linha2 = f"Porta: {modo_puxador}, {sistema}, {estilo}{parte_acond}. Fabricada em chapa {espessura}. {medidas_porta}."
-
-    linhas = [linha1, "", linha2]
-
-    if data.get("bandeirola"):
-        med_band = (data.get("medidasBandeirola") or "").strip()
-        linhas.append("")
-        linhas.append(f"Bandeirola: {med_band}.")
-
-    if data.get("alizar"):
-        med_alizar = (data.get("medidaAlizar") or "").strip()
-        linhas.append("")
-        linhas.append(f"Alizar: {med_alizar}, em dobra especial.")
-
-    linhas.append("")
-    linhas.append(f"Acabamento: {pintura}, {modo_entrega}.")
-    linhas.append("")
-    linhas.append("Incluso: fechadura rolete ou maçaneta simples.")
-    linhas.append("Não incluso: vidro, puxadores especiais e fechadura eletrônica.")
-
-    return "\n".join(linhas)
-
-
-def format_currency(raw: str) -> str:
-    """Converte dígitos (ex: '150000') em 'R$ 1.500,00'."""
-    digits = "".join(c for c in (raw or "") if c.isdigit())
-    if not digits:
-        return "R$ 0,00"
-    cents = digits[-2:].rjust(2, "0")
-    int_part = digits[:-2] or "0"
-    if len(int_part) > 3:
-        parts = []
-        while int_part:
-            parts.append(int_part[-3:])
-            int_part = int_part[:-3]
-        int_part = ".".join(reversed(parts))
-    return f"R$ {int_part},{cents}"
-
-
-def raw_to_reais(raw: str) -> float:
-    """Converte string de dígitos (centavos) em valor em reais. Ex: '150000' -> 1500.00"""
-    digits = "".join(c for c in (raw or "") if c.isdigit())
-    if not digits:
-        return 0.0
-    return int(digits) / 100.0
-
-
-def parse_medidas_m2(medidas: str) -> float:
-    """Extrai as duas dimensões de '5,00m x 2,00m' e retorna m² (ex: 5 * 2 = 10.0)."""
-    s = (medidas or "").strip()
-    # Aceita "5,00m x 2,00m" ou "5.00 x 2.00" (opcional: m ou m² entre número e x)
-    m = re.search(r"(\d+[,.]?\d*)\s*m?\s*[xX×]\s*(\d+[,.]?\d*)\s*m?", s, re.IGNORECASE)
-    if not m:
-        return 0.0
-    a = float(m.group(1).replace(",", "."))
-    b = float(m.group(2).replace(",", "."))
-    return round(a * b, 2)
-
-
-def parse_m2_direto(value: str) -> float:
-    """Converte string de m² direto (ex: '25,50' ou '25.50') em float."""
-    s = (value or "").strip().replace(",", ".")
-    if not s:
-        return 0.0
-    try:
-        return round(float(s), 2)
-    except ValueError:
-        return 0.0
-
-
-def get_total_m2(data: dict) -> float:
-    """
-    Retorna a área total em m² a partir do payload.
-    - duas_areas: m²₁ + m²₂.
-    - tres_areas: m²₁ + m²₂ + m²₃.
-    - m2_direto: valor informado diretamente (ex: "25,50").
-    - Caso contrário (área única ou payload antigo): parse_medidas_m2(medidas).
-    """
-    if data.get("tipoMedidas") == "duas_areas":
-        m1 = data.get("medidas1") or ""
-        m2 = data.get("medidas2") or ""
-        if m1 or m2:
-            return round(parse_medidas_m2(m1) + parse_medidas_m2(m2), 2)
-    if data.get("tipoMedidas") == "tres_areas":
-        m1 = data.get("medidas1") or ""
-        m2 = data.get("medidas2") or ""
-        m3 = data.get("medidas3") or ""
-        if m1 or m2 or m3:
-            return round(
-                parse_medidas_m2(m1) + parse_medidas_m2(m2) + parse_medidas_m2(m3), 2
-            )
-    if data.get("tipoMedidas") == "m2_direto":
-        raw = (data.get("m2Direto") or "").strip()
-        if raw:
-            return parse_m2_direto(raw)
-    return parse_medidas_m2(data.get("medidas") or "")
-
-
-# Valor por m² do forro vinílico (R$), somado ao total quando Forro PVC = Vinílico
-FORRO_VINILICO_VALOR_M2 = 120.0
-
-# Acréscimos cartão: 5x = +6%, 10x = +10%
-CARTAO_5X_ACRECIMO = 0.06
-CARTAO_10X_ACRECIMO = 0.10
-
-
-def get_valor_total_reais(data: dict) -> float:
-    """
-    Retorna o valor total em reais (float) com a mesma lógica de compute_valor_total.
-    Usado para calcular o texto da forma de pagamento.
-    """
-    valor_m2_raw = data.get("valorM2") or ""
-    valor_pilar_raw = (data.get("valorPilar") or "") if data.get("temPilar") == "Sim" else ""
-    custo_raw = data.get("custoDeslocamento") or ""
-    forro_pvc = (data.get("forroPvc") or "").strip()
-
-    m2 = get_total_m2(data)
-    valor_m2_reais = raw_to_reais(valor_m2_raw)
-    valor_pilar_reais = raw_to_reais(valor_pilar_raw)
-    custo_reais = raw_to_reais(custo_raw)
-
-    parte_area = m2 * valor_m2_reais
-    total_reais = parte_area + valor_pilar_reais + custo_reais
-
-    if forro_pvc == "Vinílico":
-        total_reais += FORRO_VINILICO_VALOR_M2 * m2
-
-    return round(total_reais, 2)
-
-
-# Tabela fixa valor/m² para Pergolado (tipo policarbonato x dimensão tubo)
-PERGOLADO_VALOR_M2 = {
-    ("Compacto 3mm", "150 x 50"): 1300.0,
-    ("Compacto 3mm", "100 x 50"): 1200.0,
-    ("Alveolar 6mm", "150 x 50"): 800.0,
-    ("Alveolar 6mm", "100 x 50"): 700.0,
+# Tipo de proposta -> modelo da D43 (Pergolado não usa D43; demais tipos = Cobertura Premium)
+D43_TEMPLATES = {
+    "cobertura_retratil": TEXTO_ESPECIFICACAO_RETRATIL_TEMPLATE,
+    "porta": TEXTO_ESPECIFICACAO_PORTA_TEMPLATE,
+    "pergolado": None,
 }
 
 
-def get_valor_total_reais_pergolado(data: dict) -> float:
-    """
-    Valor total para Pergolado: m² × valor por m² + custo de deslocamento.
-    Se valorM2 veio no payload (dimensão manual), usa esse valor; senão usa a tabela fixa.
-    """
-    m2 = get_total_m2(data)
-    valor_m2_raw = data.get("valorM2")
-    if valor_m2_raw and str(valor_m2_raw).strip():
-        valor_m2_reais = raw_to_reais(str(valor_m2_raw))
-    else:
-        tipo = (data.get("tipoPolicarbonato") or "").strip()
-        dimensao = (data.get("dimensaoTubo") or "").strip()
-        valor_m2_reais = PERGOLADO_VALOR_M2.get((tipo, dimensao), 0.0)
-    custo_desloc_reais = raw_to_reais(data.get("custoDeslocamento") or "")
-    total_reais = m2 * valor_m2_reais + custo_desloc_reais
-    return round(total_reais, 2)
-
-
-def get_valor_cobertura_retratil_reais(data: dict) -> float:
+def render_texto_d43(data: dict, newline: str = "\n") -> tuple[str, list[tuple[int, int]]] | None:
     """
-    Valor da cobertura retrátil SEM o custo da abertura automatizada.
-    Usado como base para cálculo de juros (5x/10x) e para [Valor Total].
-    Fórmula: (m² × valor por m²) + custo deslocamento.
+    Texto de especificação da D43 e trechos em negrito [(início, fim)], numa passada do modelo compilado.
+    newline="\\r\\n" para a célula do Excel (os intervalos já contam o \\r). None para Pergolado.
     """
-    m2 = get_total_m2(data)
-    valor_m2_reais = raw_to_reais(data.get("valorM2") or "")
-    custo_desloc_reais = raw_to_reais(data.get("custoDeslocamento") or "")
-    return round(m2 * valor_m2_reais + custo_desloc_reais, 2)
-
+    source = D43_TEMPLATES.get(data.get("tipoProposta"), TEXTO_ESPECIFICACAO_TEMPLATE)
+    if source is None:
+        return None
+    return compile_template(source, newline).render(data)
 
-def get_valor_total_reais_cobertura_retratil(data: dict) -> float:
-    """
-    Valor total para Cobertura Retrátil (cobertura + automatização):
-    (m² × valor por m²) + custo deslocamento + custo da abertura automatizada.
-    Em modo Manual, custo da abertura é 0. Valores no JSON em centavos.
-    """
-    valor_cobertura = get_valor_cobertura_retratil_reais(data)
-    custo_abertura_reais = raw_to_reais(data.get("custoAberturaAutomatizada") or "")
-    return round(valor_cobertura + custo_abertura_reais, 2)
-
-
-def get_m2_porta(data: dict) -> float:
-    """
-    m² para Porta: (alturaPorta + alturaBandeirola) × (larguraPorta + larguraBandeirola).
-    Valores vêm em metros (número). Se não houver bandeirola, usa só porta.
-    """
-    alt_porta = float(data.get("alturaPorta") or 0)
-    larg_porta = float(data.get("larguraPorta") or 0)
-    if data.get("bandeirola"):
-        alt_band = float(data.get("alturaBandeirola") or 0)
-        larg_band = float(data.get("larguraBandeirola") or 0)
-        return round((alt_porta + alt_band) * (larg_porta + larg_band), 2)
-    return round(alt_porta * larg_porta, 2)
 
-
-def get_valor_total_reais_porta(data: dict) -> float:
-    """
-    Valor total para Porta: m² × valor por m² + custo de deslocamento.
-    Valores no JSON: valorM2 e custoDeslocamento em centavos.
-    """
-    m2 = get_m2_porta(data)
-    valor_m2_reais = raw_to_reais(data.get("valorM2") or "")
-    custo_reais = raw_to_reais(data.get("custoDeslocamento") or "")
-    return round(m2 * valor_m2_reais + custo_reais, 2)
+def build_texto_especificacao_d43(data: dict) -> str:
+    """Texto de especificação da Cobertura Premium (Item 3 só com pilar, itens renumerados)."""
+    return compile_template(TEXTO_ESPECIFICACAO_TEMPLATE).render(data)[0]
 
 
-def build_texto_forma_pagamento(
-    total_a_vista_reais: float,
-    total_a_vista_geral: float | None = None,
-) -> str:
-    """
-    Monta o texto para [Valor p/ Forma de Pagamento]:
-    "5x de R$ X,XX, 10x de R$ Y,YY ou R$ Z,ZZ A Vista"
-    - 5x: total_a_vista_reais * 1.06 / 5
-    - 10x: total_a_vista_reais * 1.10 / 10
-    - À vista: total_a_vista_geral se informado, senão total_a_vista_reais (Cobertura Retrátil: juros só na cobertura; à vista = total geral).
-    """
-    total_5x = total_a_vista_reais * (1 + CARTAO_5X_ACRECIMO)
-    total_10x = total_a_vista_reais * (1 + CARTAO_10X_ACRECIMO)
-    parcela_5x = total_5x / 5
-    parcela_10x = total_10x / 10
+def build_texto_especificacao_d43_retratil(data: dict) -> str:
+    """Texto de especificação D43 para Cobertura Retrátil."""
+    return compile_template(TEXTO_ESPECIFICACAO_RETRATIL_TEMPLATE).render(data)[0]
 
-    avista_reais = total_a_vista_geral if total_a_vista_geral is not None else total_a_vista_reais
-    s_avista = format_currency(str(int(round(avista_reais * 100))))
-    s_5x = format_currency(str(int(round(parcela_5x * 100))))
-    s_10x = format_currency(str(int(round(parcela_10x * 100))))
 
-    return f"5x de {s_5x}, 10x de {s_10x} ou {s_avista} A Vista"
+def build_texto_especificacao_d43_porta(data: dict) -> str:
+    """Texto de especificação D43 para Porta."""
+    return compile_template(TEXTO_ESPECIFICACAO_PORTA_TEMPLATE).render(data)[0]
 
 
 def compute_valor_total(data: dict) -> str:
@@ -505,113 +300,30 @@ def compute_valor_total(data: dict) -> str:
     if forro_pvc == "Vinílico":
         valor_forro_vinilico = FORRO_VINILICO_VALOR_M2 * m2
         total_reais += valor_forro_vinilico
-        _log(f"Forro Vinílico: 120 * m² = {valor_forro_vinilico} | total_reais após forro = {total_reais}")
+        _debug("Forro Vinílico: 120 * m² = %s | total_reais após forro = %s", valor_forro_vinilico, total_reais)
 
     total_cents = int(round(total_reais * 100))
     resultado_formatado = format_currency(str(total_cents))
 
-    _log(
-        f"compute_valor_total: m2={m2} | valor_m2_reais={valor_m2_reais} | "
-        f"pilar_reais={valor_pilar_reais} | custo_reais={custo_reais} | "
-        f"parte_area(m2*valor_m2)={parte_area} | total_reais={total_reais} | "
-        f"total_cents={total_cents} -> '{resultado_formatado}'"
+    _debug(
+        "compute_valor_total: m2=%s | valor_m2_reais=%s | pilar_reais=%s | custo_reais=%s | "
+        "parte_area(m2*valor_m2)=%s | total_reais=%s | total_cents=%s -> '%s'",
+        m2, valor_m2_reais, valor_pilar_reais, custo_reais, parte_area, total_reais, total_cents, resultado_formatado,
     )
     return resultado_formatado
 
 
-def find_cell_by_text(wb, text: str):
-    """
-    Localiza a primeira célula que CONTÉM o texto indicado (busca em todas as planilhas).
-    Retorna (sheet, endereço) ou (None, None) se não encontrar.
-    """
-    xlValues = -4163
-    xlFormulas = -4123
-    xlPart = 2
-
-    for sheet in wb.sheets:
-        for look_in in (xlValues, xlFormulas):
-            try:
-                found = sheet.api.Cells.Find(
-                    What=text,
-                    After=sheet.api.Cells(1, 1),
-                    LookAt=xlPart,
-                    LookIn=look_in,
-                    SearchOrder=1,
-                    SearchDirection=1,
-                    MatchCase=False,
-                )
-                if found is not None:
-                    addr = found.Address
-                    if addr:
-                        return (sheet, addr)
-            except Exception:
-                continue
-    return (None, None)
-
-
-def find_all_cells_by_text(wb, text: str):
+def prepare_data(data: dict) -> dict:
     """
-    Localiza TODAS as células que contêm o texto (em todas as planilhas).
-    Usa Find + FindNext. Retorna lista de (sheet, endereço).
+    Normaliza o payload para o preenchimento e calcula os valores da proposta.
+    - dataAtual: data da geração (dd/mm/yyyy).
+    - medidas: texto conforme o tipo de medição (1, 2 ou 3 áreas ou m² direto).
+    - valorFormaPagamento: texto de 5x/10x/à vista.
+    Altera `data` no lugar e retorna os totais usados no preenchimento
+    (total_a_vista_reais e, para Cobertura Retrátil, valor_cobertura_retratil_reais)
+    e a cotação completa (cotacao, a de pricing.quote, guardada no arquivo de propostas).
     """
-    xlValues = -4163
-    xlFormulas = -4123
-    xlPart = 2
-    results = []
-    seen = set()  # (sheet_name, address) para não duplicar
-
-    for sheet in wb.sheets:
-        for look_in in (xlValues, xlFormulas):
-            try:
-                found = sheet.api.Cells.Find(
-                    What=text,
-                    After=sheet.api.Cells(1, 1),
-                    LookAt=xlPart,
-                    LookIn=look_in,
-                    SearchOrder=1,
-                    SearchDirection=1,
-                    MatchCase=False,
-                )
-                if found is None:
-                    continue
-                first_addr = found.Address
-                while found is not None:
-                    addr = found.Address
-                    key = (sheet.name, addr)
-                    if key not in seen:
-                        seen.add(key)
-                        results.append((sheet, addr))
-                    found = sheet.api.Cells.FindNext(found)
-                    if found is None:
-                        break
-                    if found.Address == first_addr:
-                        break
-            except Exception:
-                continue
-    return results
-
-
-def main() -> int:
-    parser = argparse.ArgumentParser(description="Preenche Excel e exporta para PDF.")
-    parser.add_argument("--template", required=True, help="Caminho do arquivo .xlsx modelo")
-    parser.add_argument("--data", required=True, help="Caminho do arquivo .json com os dados")
-    parser.add_argument("--output", required=True, help="Caminho do arquivo .pdf de saída")
-    args = parser.parse_args()
-
-    template_path = Path(args.template)
-    data_path = Path(args.data)
-    output_path = Path(args.output)
-
-    if not template_path.exists():
-        print(f"Erro: modelo não encontrado: {template_path}", file=sys.stderr)
-        return 1
-    if not data_path.exists():
-        print(f"Erro: arquivo de dados não encontrado: {data_path}", file=sys.stderr)
-        return 1
-
-    with open(data_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
+    metrics.step("normalize")
     # Data atual = momento da geração do PDF; formato brasileiro dd/mm/yyyy (dia/mês/ano)
     _hoje = datetime.now()
     data["dataAtual"] = f"{_hoje.day:02d}/{_hoje.month:02d}/{_hoje.year}"
@@ -643,242 +355,1320 @@ def main() -> int:
         if med and not med.lower().startswith("medidas "):
             data["medidas"] = f"medidas {med}"
 
-    is_pergolado = data.get("tipoProposta") == "pergolado"
+    metrics.step("pricing")
+    # Mesmo cálculo do modo --price-only (pricing.quote)
+    cotacao = quote(data)
+    data["valorFormaPagamento"] = cotacao["valor_forma_pagamento"]
     is_cobertura_retratil = data.get("tipoProposta") == "cobertura_retratil"
-    is_porta = data.get("tipoProposta") == "porta"
-    valor_cobertura_retratil_reais: float | None = None  # só usado para Cobertura Retrátil (base para juros e [Valor Total])
-    if is_pergolado:
-        total_a_vista_reais = get_valor_total_reais_pergolado(data)
-        data["valorFormaPagamento"] = build_texto_forma_pagamento(total_a_vista_reais)
-    elif is_cobertura_retratil:
-        valor_cobertura_retratil_reais = get_valor_cobertura_retratil_reais(data)
-        total_a_vista_reais = get_valor_total_reais_cobertura_retratil(data)  # total geral (cobertura + automatização)
-        data["valorFormaPagamento"] = build_texto_forma_pagamento(
-            valor_cobertura_retratil_reais, total_a_vista_reais
-        )
-    elif is_porta:
-        total_a_vista_reais = get_valor_total_reais_porta(data)
-        data["valorFormaPagamento"] = build_texto_forma_pagamento(total_a_vista_reais)
-    else:
-        total_a_vista_reais = get_valor_total_reais(data)
-        data["valorFormaPagamento"] = build_texto_forma_pagamento(total_a_vista_reais)
+    return {
+        "total_a_vista_reais": cotacao["total_a_vista"],
+        # só usado para Cobertura Retrátil (base para juros e [Valor Total])
+        "valor_cobertura_retratil_reais": cotacao["base_parcelamento"] if is_cobertura_retratil else None,
+        "cotacao": cotacao,
+    }
+
 
-    # Limpar log anterior para esta execução
+def render_descricao_adicional(data: dict, newline: str = "\r\n") -> tuple[str, list] | None:
+    """
+    Descrição adicional da D44 (texto, trechos formatados) ou None se vazia.
+    **negrito** e __itálico__ no texto; estiloDescricaoAdicional vale para o texto inteiro.
+    """
+    desc = (data.get("descricaoAdicional") or "").strip()
+    if not desc:
+        return None
+    texto, trechos = parse_markup(desc.replace("\n", newline))
     try:
-        if LOG_PATH.exists():
-            LOG_PATH.write_text("", encoding="utf-8")
+        estilo = style_from_payload(data.get("estiloDescricaoAdicional"))
+    except (TypeError, ValueError) as e:
+        _log(f"estiloDescricaoAdicional ignorado: {e}", logging.WARNING)
+        estilo = {}
+    if estilo:
+        trechos.insert(0, (0, len(texto), estilo))
+    return texto, trechos
+
+
+def build_texto_d43(data: dict) -> str | None:
+    """Texto de especificação da D43 conforme o tipo de proposta (Pergolado não usa D43)."""
+    rendered = render_texto_d43(data)
+    return rendered[0] if rendered is not None else None
+
+
+def placeholder_value(data: dict, json_key: str) -> str:
+    """Texto que substitui o placeholder da chave (vazio se ausente; cor do Pergolado em minúsculas)."""
+    value = data.get(json_key, "")
+    if value is None:
+        value = ""
+    value_str = str(value)
+    if json_key == "corPolicarbonato" and data.get("tipoProposta") == "pergolado":
+        value_str = value_str.lower()
+    return value_str
+
+
+def get_placeholder_map(data: dict) -> dict:
+    """Mapa placeholder -> chave no JSON conforme o tipo de proposta."""
+    tipo = data.get("tipoProposta")
+    if tipo == "pergolado":
+        return FIELD_PLACEHOLDER_REPLACE_PERGOLADO
+    if tipo == "cobertura_retratil":
+        return FIELD_PLACEHOLDER_REPLACE_COBERTURA_RETRATIL
+    if tipo == "porta":
+        return FIELD_PLACEHOLDER_REPLACE_PORTA
+    return FIELD_PLACEHOLDER_REPLACE
+
+
+def check_template(template_path: Path, data: dict) -> dict | None:
+    """
+    Carrega o manifesto do modelo (compilado sem Excel, em cache pelo hash) e valida,
+    antes de abrir o Excel, os placeholders e células fixas que o tipo de proposta usa.
+    Levanta TemplateError se faltar algo; retorna None se o modelo não puder ser lido
+    (a descoberta volta a ser feita no Excel).
+    """
+    try:
+        manifest = load_manifest(template_path)
+    except Exception as e:
+        _log(f"Manifesto do modelo indisponível ({e}); placeholders serão buscados no Excel.", logging.WARNING)
+        return None
+    tipo = data.get("tipoProposta")
+    # Só os placeholders de FIELD_PLACEHOLDER_REPLACE_* impedem a geração; rótulos de total e
+    # células fixas ausentes apenas avisam, como antes do manifesto
+    required = [p for p in get_placeholder_map(data) if p not in PLACEHOLDERS_OPCIONAIS]
+    validate_manifest(manifest, required)
+    labels = [FIELD_TOTAL_LABEL]
+    if tipo == "cobertura_retratil":
+        labels.append(FIELD_TOTAL_GERAL_LABEL)
+        fixed = (D43_CELL, D44_CELL, M44_CELL, N44_CELL)
+    elif tipo == "pergolado":
+        fixed = (D44_CELL,)
+    else:
+        fixed = (D43_CELL, D44_CELL)
+    missing, missing_cells = manifest_gaps(manifest, labels, fixed)
+    for label in missing:
+        _log(f"Aviso: nenhuma célula com {label} encontrada no modelo.", logging.WARNING)
+    if missing_cells:
+        _log(f"Aviso: célula(s) fixa(s) ausente(s) na primeira planilha: {', '.join(missing_cells)}", logging.WARNING)
+    return manifest
+
+
+def output_cache_key(
+    manifest: dict | None,
+    data: dict,
+    output_path: Path,
+    fill_backend: str = "excel",
+    renderer: str = "excel",
+    output_profile: str | None = None,
+) -> str | None:
+    """
+    Chave do cache de saída: hash do modelo + payload normalizado (com valorFormaPagamento
+    e texto da D43) + dataAtual + versão do gerador + caminho de geração (+ perfil de saída).
+    `data` já passou por prepare_data (o preço não é recalculado aqui).
+    None quando não dá para montar a chave (modelo ilegível ou payload inválido): gera sem cache.
+    """
+    if manifest is None:
+        return None
+    try:
+        texto_d43 = build_texto_d43(data)
     except Exception:
-        pass
-
-    _log(f"Dados recebidos (JSON): {json.dumps(data, ensure_ascii=False)}")
-    _log(f"Campo 'custoDeslocamento' (bruto): {repr(data.get('custoDeslocamento'))}")
-
+        return None
+    fields = {
+        "generator": GENERATOR_VERSION,
+        "template": manifest["sha256"],
+        "payload": data,
+        "d43": texto_d43,
+        # dataAtual é injetada a cada geração: mesma data = mesma chave
+        "dataAtual": data.get("dataAtual"),
+        "fill_backend": fill_backend,
+        "renderer": renderer,
+        "format": output_path.suffix.lower(),
+    }
+    if output_profile:
+        # Só com perfil: as chaves já gravadas sem perfil continuam valendo
+        fields["profile"] = output_profile
+    return cache_key(fields)
+
+
+def fetch_cached(cache: OutputCache, key: str, output_path: Path) -> bool:
+    """Acerto do cache de saída copiado para output_path; falha do cache (disco, permissão) vira falta com aviso."""
     try:
-        import xlwings as xw
-    except ImportError:
-        print("Erro: xlwings não instalado. Execute: pip install xlwings", file=sys.stderr)
+        return cache.fetch(key, output_path)
+    except OSError as e:
+        _log(f"Cache de saída indisponível (ignorado): {e}", logging.WARNING)
+        return False
+
+
+def compile_templates(paths: list[str]) -> int:
+    """--compile-template: compila e grava o manifesto de cada modelo; imprime um resumo JSON por modelo."""
+    status = 0
+    for raw in paths:
+        path = Path(raw)
+        try:
+            manifest = compile_manifest(path)
+            target = save_manifest(manifest)
+        except Exception as e:
+            print(f"Erro: não foi possível compilar o modelo {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        print(json.dumps({
+            "template": str(path),
+            "sha256": manifest["sha256"],
+            "manifest": str(target),
+            "placeholders": {token: len(locs) for token, locs in manifest["placeholders"].items()},
+            "fixed_cells": manifest["fixed_cells"],
+        }, ensure_ascii=False))
+    return status
+
+
+def price_only(data_arg: str | None, scenario_arg: str | None = None) -> int:
+    """
+    --price-only: cotação sem Excel (pricing.quote), uma linha JSON por payload em stdout.
+    --data com um objeto JSON (ou lista) ou um arquivo JSON lines; sem --data, lê JSON lines do stdin
+    (responde linha a linha, para prévias ao vivo). O "id" do payload, se houver, volta na resposta.
+    """
+    try:
+        scenario = None
+        if scenario_arg:
+            with open(scenario_arg, "r", encoding="utf-8") as f:
+                scenario = load_scenario(json.load(f))
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"Erro: cenário inválido ({scenario_arg}): {e}", file=sys.stderr)
         return 1
 
-    app = None
-    try:
-        app = xw.App(visible=False)
-        wb = app.books.open(str(template_path.resolve()))
+    interactive = not data_arg or data_arg == STDIO
+    if interactive:
+        lines = sys.stdin
+    else:
+        data_path = Path(data_arg)
+        if not data_path.exists():
+            print(f"Erro: arquivo de dados não encontrado: {data_path}", file=sys.stderr)
+            return 1
+        text = data_path.read_text(encoding="utf-8")
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None  # JSON lines
+        if isinstance(parsed, dict):
+            print(json.dumps(quote(parsed, scenario), ensure_ascii=False))
+            return 0
+        lines = [json.dumps(item) for item in parsed] if isinstance(parsed, list) else text.splitlines()
+
+    status = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                raise ValueError("payload deve ser um objeto JSON")
+            result = quote(payload, scenario)
+            if "id" in payload:
+                result = {"id": payload["id"], **result}
+        except (ValueError, TypeError) as e:
+            result = {"ok": False, "error": str(e)}
+            status = 1
+        print(json.dumps(result, ensure_ascii=False), flush=interactive)
+    return status
+
+
+def fill_workbook(wb, data: dict, totais: dict, manifest: dict | None = None) -> None:
+    """
+    Preenche a pasta aberta com o payload já preparado por prepare_data:
+    campos, placeholders, [Valor Total]/[Valor Total Geral], D43 e D44.
+    Com o manifesto do modelo, as posições dos placeholders não são buscadas no Excel.
+    Com métricas ativas, cada etapa vira uma fase de "fill" e as chamadas à pasta são contadas.
+    """
+    with metrics.span("fill"):
+        _fill_workbook(metrics.instrument(wb), data, totais, manifest)
 
-        for excel_text, json_key in FIELD_SEARCH.items():
-            _log(f"Procurando no Excel (todas as planilhas) texto contendo: '{excel_text}' (campo JSON: '{json_key}')")
-            sheet, address = find_cell_by_text(wb, excel_text)
-            if sheet is None or address is None:
-                _log(f"AVISO: campo '{excel_text}' NÃO encontrado em nenhuma planilha.")
-                print(f"Aviso: campo '{excel_text}' não encontrado no Excel.", file=sys.stderr)
-                continue
-            _log(f"Célula encontrada: planilha '{sheet.name}', endereço {address}")
-            raw = data.get(json_key, "")
-            value = format_currency(raw) if raw else "R$ 0,00"
-            _log(f"Valor a preencher: bruto={repr(raw)} -> formatado='{value}'")
-            cell = sheet.range(address)
-            cell.value = value
-            _log(f"Valor escrito na célula {address}.")
-            try:
-                cell.number_format = "R$ #.##0,00"
-                _log("Formato de número aplicado.")
-            except Exception as fmt_err:
-                _log(f"Formato de número não aplicado: {fmt_err}")
-
-        # Placeholders: substituir apenas o placeholder dentro do texto da célula (resto do texto permanece)
-        if is_pergolado:
-            placeholder_map = FIELD_PLACEHOLDER_REPLACE_PERGOLADO
-        elif is_cobertura_retratil:
-            placeholder_map = FIELD_PLACEHOLDER_REPLACE_COBERTURA_RETRATIL
-        elif is_porta:
-            placeholder_map = FIELD_PLACEHOLDER_REPLACE_PORTA
-        else:
-            placeholder_map = FIELD_PLACEHOLDER_REPLACE
-        for placeholder_text, json_key in placeholder_map.items():
-            _log(f"Procurando placeholder no texto da célula: '{placeholder_text}' (campo JSON: '{json_key}')")
-            sheet, address = find_cell_by_text(wb, placeholder_text)
-            if sheet is None or address is None:
-                _log(f"AVISO: placeholder '{placeholder_text}' NÃO encontrado em nenhuma planilha.")
-                print(f"Aviso: placeholder '{placeholder_text}' não encontrado no Excel.", file=sys.stderr)
-                continue
-            _log(f"Célula encontrada: planilha '{sheet.name}', endereço {address}")
-            cell = sheet.range(address)
-            current = cell.value
-            if current is None:
-                current = ""
-            current_str = str(current)
-            value = data.get(json_key, "")
-            if value is None:
-                value = ""
-            value_str = str(value)
-            if is_pergolado and json_key == "corPolicarbonato":
-                value_str = value_str.lower()
-            new_text = current_str.replace(placeholder_text, value_str)
-            # Célula de data: forçar formato Texto para o Excel não reinterpretar dd/mm/yyyy como mm/dd/yyyy
-            if json_key == "dataAtual":
-                try:
-                    cell.number_format = "@"
-                except Exception:
-                    pass
-            cell.value = new_text
-            _log(f"Placeholder substituído: '{placeholder_text}' -> '{value_str}'; célula agora: '{new_text}'")
 
-        # Valor nas células "[Valor Total]": valor parcelado em 10x (base + 10%). Cobertura Retrátil: juros só na cobertura.
-        if is_cobertura_retratil and valor_cobertura_retratil_reais is not None:
-            valor_10x_reais = valor_cobertura_retratil_reais * (1 + CARTAO_10X_ACRECIMO)
-            _log(f"[Valor Total] Cobertura Retrátil: base cobertura={valor_cobertura_retratil_reais} -> 10x (só cobertura)")
-        else:
-            valor_10x_reais = total_a_vista_reais * (1 + CARTAO_10X_ACRECIMO)
-        valor_10x_cents = int(round(valor_10x_reais * 100))
-        valor_10x_str = format_currency(str(valor_10x_cents))
-        _log(f"Valor em 10x (para células [Valor Total]): 10x = '{valor_10x_str}'")
-        total_cells = find_all_cells_by_text(wb, FIELD_TOTAL_LABEL)
-        _log(f"Células com '{FIELD_TOTAL_LABEL}': {len(total_cells)} encontrada(s)")
-        for sheet, address in total_cells:
+def _fill_workbook(wb, data: dict, totais: dict, manifest: dict | None) -> None:
+    metrics.step("index")
+    is_cobertura_retratil = data.get("tipoProposta") == "cobertura_retratil"
+    total_a_vista_reais = totais["total_a_vista_reais"]
+    valor_cobertura_retratil_reais = totais["valor_cobertura_retratil_reais"]
+
+    if manifest is not None:
+        index = PlaceholderIndex.from_manifest(wb, manifest)
+    else:
+        # Uma leitura em lote de UsedRange por planilha substitui os Cells.Find por placeholder
+        index = PlaceholderIndex.build(wb)
+
+    metrics.step("fields")
+    for excel_text, json_key in FIELD_SEARCH.items():
+        _debug("Procurando no Excel (todas as planilhas) texto contendo: '%s' (campo JSON: '%s')", excel_text, json_key)
+        sheet, address = index.find(excel_text)
+        if sheet is None or address is None:
+            _log(f"AVISO: campo '{excel_text}' NÃO encontrado em nenhuma planilha.", logging.WARNING)
+            print(f"Aviso: campo '{excel_text}' não encontrado no Excel.", file=sys.stderr)
+            continue
+        _debug("Célula encontrada: planilha '%s', endereço %s", sheet.name, address)
+        raw = data.get(json_key, "")
+        value = format_currency(raw) if raw else "R$ 0,00"
+        _debug("Valor a preencher: bruto=%r -> formatado='%s'", raw, value)
+        cell = sheet.range(address)
+        cell.value = value
+        _debug("Valor escrito na célula %s.", address)
+        try:
+            cell.number_format = "R$ #.##0,00"
+            _debug("Formato de número aplicado.")
+        except Exception as fmt_err:
+            _log(f"Formato de número não aplicado: {fmt_err}", logging.WARNING)
+
+    # Placeholders: substituir apenas o placeholder dentro do texto da célula (resto do texto permanece)
+    metrics.step("placeholders")
+    placeholder_map = get_placeholder_map(data)
+
+    multi_labels = [FIELD_TOTAL_LABEL] + ([FIELD_TOTAL_GERAL_LABEL] if is_cobertura_retratil else [])
+    legacy = index.legacy_round_trips(list(FIELD_SEARCH) + list(placeholder_map), multi_labels)
+    _log(
+        f"Índice de placeholders: {len(index.tokens)} token(s) em {len(index.sheets)} planilha(s); "
+        f"round-trips COM na busca: {index.round_trips} (antes, com Cells.Find/FindNext: ~{legacy})"
+    )
+
+    # Uma passada por célula: todos os placeholders dela de uma vez, uma escrita (placeholder_fill)
+    valores = {placeholder_text: placeholder_value(data, json_key) for placeholder_text, json_key in placeholder_map.items()}
+    como_texto = [placeholder_text for placeholder_text, json_key in placeholder_map.items() if json_key == "dataAtual"]
+    substituicao = substitute(index, valores, como_texto)
+    for placeholder_text in substituicao["missing"]:
+        _log(f"AVISO: placeholder '{placeholder_text}' NÃO encontrado em nenhuma planilha.", logging.WARNING)
+        print(f"Aviso: placeholder '{placeholder_text}' não encontrado no Excel.", file=sys.stderr)
+    metrics.annotate(
+        placeholders={
+            "cells": substituicao["cells"],
+            "writes": substituicao["writes"],
+            "saved": substituicao["legacy_round_trips"] - substituicao["round_trips"],
+        }
+    )
+    _log(
+        f"Placeholders: {substituicao['cells']} célula(s), {substituicao['writes']} escrita(s); "
+        f"round-trips COM: {substituicao['round_trips']} (antes, leitura e escrita por placeholder: "
+        f"~{substituicao['legacy_round_trips']})"
+    )
+
+    metrics.step("totals")
+    # Valor nas células "[Valor Total]": valor parcelado em 10x (base + 10%). Cobertura Retrátil: juros só na cobertura.
+    if is_cobertura_retratil and valor_cobertura_retratil_reais is not None:
+        valor_10x_reais = valor_cobertura_retratil_reais * (1 + CARTAO_10X_ACRECIMO)
+        _debug("[Valor Total] Cobertura Retrátil: base cobertura=%s -> 10x (só cobertura)", valor_cobertura_retratil_reais)
+    else:
+        valor_10x_reais = total_a_vista_reais * (1 + CARTAO_10X_ACRECIMO)
+    valor_10x_cents = int(round(valor_10x_reais * 100))
+    valor_10x_str = format_currency(str(valor_10x_cents))
+    _debug("Valor em 10x (para células [Valor Total]): 10x = '%s'", valor_10x_str)
+    total_cells = index.find_all(FIELD_TOTAL_LABEL)
+    _debug("Células com '%s': %d encontrada(s)", FIELD_TOTAL_LABEL, len(total_cells))
+    for sheet, address in total_cells:
+        cell = sheet.range(address)
+        cell.value = valor_10x_str
+        try:
+            cell.number_format = "R$ #.##0,00"
+        except Exception:
+            pass
+        _debug("  Preenchido: planilha '%s', %s", sheet.name, address)
+
+    # Cobertura Retrátil: preencher [Valor Total Geral] = cobertura com juros 10% + valor da automatização
+    if is_cobertura_retratil:
+        cobertura_10x = valor_cobertura_retratil_reais * (1 + CARTAO_10X_ACRECIMO)
+        custo_abertura_reais = raw_to_reais(data.get("custoAberturaAutomatizada") or "")
+        total_geral_reais = round(cobertura_10x + custo_abertura_reais, 2)
+        total_geral_str = format_currency(str(int(round(total_geral_reais * 100))))
+        total_geral_cells = index.find_all(FIELD_TOTAL_GERAL_LABEL)
+        _debug("Células com '%s': %d encontrada(s)", FIELD_TOTAL_GERAL_LABEL, len(total_geral_cells))
+        for sheet, address in total_geral_cells:
             cell = sheet.range(address)
-            cell.value = valor_10x_str
+            cell.value = total_geral_str
             try:
                 cell.number_format = "R$ #.##0,00"
             except Exception:
                 pass
-            _log(f"  Preenchido: planilha '{sheet.name}', {address}")
-
-        # Cobertura Retrátil: preencher [Valor Total Geral] = cobertura com juros 10% + valor da automatização
-        if is_cobertura_retratil:
-            cobertura_10x = valor_cobertura_retratil_reais * (1 + CARTAO_10X_ACRECIMO)
-            custo_abertura_reais = raw_to_reais(data.get("custoAberturaAutomatizada") or "")
-            total_geral_reais = round(cobertura_10x + custo_abertura_reais, 2)
-            total_geral_str = format_currency(str(int(round(total_geral_reais * 100))))
-            total_geral_cells = find_all_cells_by_text(wb, FIELD_TOTAL_GERAL_LABEL)
-            _log(f"Células com '{FIELD_TOTAL_GERAL_LABEL}': {len(total_geral_cells)} encontrada(s)")
-            for sheet, address in total_geral_cells:
-                cell = sheet.range(address)
-                cell.value = total_geral_str
-                try:
-                    cell.number_format = "R$ #.##0,00"
-                except Exception:
-                    pass
-                _log(f"  Preenchido: planilha '{sheet.name}', {address}")
-
-        # Texto de especificação na célula D43 (Cobertura Premium, Cobertura Retrátil ou Porta; Pergolado não usa D43)
-        if is_cobertura_retratil:
-            texto_d43 = build_texto_especificacao_d43_retratil(data)
-            texto_d43_excel = texto_d43.replace("\n", "\r\n")
-            sheet_d43 = wb.sheets[0]
-            cell_d43 = sheet_d43.range(D43_CELL)
-            cell_d43.value = texto_d43_excel
+            _debug("  Preenchido: planilha '%s', %s", sheet.name, address)
+
+    metrics.step("d43")
+    # Texto de especificação na célula D43 (Cobertura Premium, Cobertura Retrátil ou Porta; Pergolado não usa D43).
+    # O modelo compilado devolve também os trechos em negrito, já com os offsets do texto com \r\n.
+    especificacao = render_texto_d43(data, newline="\r\n")
+    rich = []
+    if especificacao is not None:
+        texto_d43_excel, negrito = especificacao
+        sheet_d43 = wb.sheets[0]
+        cell_d43 = sheet_d43.range(D43_CELL)
+        metrics.step("d43.bold")
+        # Texto, WrapText e negrito numa ida só (XML Spreadsheet); caminho direto se o Excel recusar
+        stats = write_rich_text(cell_d43, texto_d43_excel, [(a, b, {"bold": True}) for a, b in negrito])
+        if "error" in stats:
+            _log(f"Negrito D43 não aplicado (ignorado): {stats['error']}", logging.WARNING)
+        else:
+            _debug("Negrito aplicado a %d trecho(s) da descrição na célula D43 (%s).", len(negrito), stats["method"])
+        rich.append(stats)
+        _debug("Célula %s preenchida com texto de especificação (planilha '%s').", D43_CELL, sheet_d43.name)
+
+    if is_cobertura_retratil:
+        # D44, M44, N44 só quando modo de abertura for Automatizada
+        modo_abertura = (data.get("modoAbertura") or "").strip()
+        if modo_abertura == "Automatizada":
+            sheet_ret = wb.sheets[0]
+            qtd_motores = (data.get("quantidadeMotores") or "").strip() or "[Quantidade de Motores]"
+            texto_d44 = f"Automatizador para cobertura retrátil marca PPA Jetflex {qtd_motores}"
+            sheet_ret.range(D44_CELL).value = texto_d44
+            custo_abertura_raw = data.get("custoAberturaAutomatizada") or ""
+            valor_abertura_fmt = format_currency(custo_abertura_raw)
+            sheet_ret.range(M44_CELL).value = valor_abertura_fmt
+            sheet_ret.range(N44_CELL).value = valor_abertura_fmt
             try:
-                cell_d43.api.WrapText = True
+                sheet_ret.range(M44_CELL).number_format = "R$ #.##0,00"
+                sheet_ret.range(N44_CELL).number_format = "R$ #.##0,00"
             except Exception:
                 pass
-            _log(f"Célula {D43_CELL} preenchida com texto de especificação Cobertura Retrátil (planilha '{sheet_d43.name}').")
-            # D44, M44, N44 só quando modo de abertura for Automatizada
-            modo_abertura = (data.get("modoAbertura") or "").strip()
-            if modo_abertura == "Automatizada":
-                sheet_ret = wb.sheets[0]
-                qtd_motores = (data.get("quantidadeMotores") or "").strip() or "[Quantidade de Motores]"
-                texto_d44 = f"Automatizador para cobertura retrátil marca PPA Jetflex {qtd_motores}"
-                sheet_ret.range(D44_CELL).value = texto_d44
-                custo_abertura_raw = data.get("custoAberturaAutomatizada") or ""
-                valor_abertura_fmt = format_currency(custo_abertura_raw)
-                sheet_ret.range(M44_CELL).value = valor_abertura_fmt
-                sheet_ret.range(N44_CELL).value = valor_abertura_fmt
+            _debug("Células %s, %s, %s preenchidas (modo Automatizada).", D44_CELL, M44_CELL, N44_CELL)
+
+    metrics.step("d44")
+    # Descrição adicional opcional na célula D44 (Pergolado e Cobertura Premium; Cobertura Retrátil usa D44 para automatizador)
+    if not is_cobertura_retratil:
+        descricao = render_descricao_adicional(data)
+        if descricao is not None:
+            texto_d44, trechos = descricao
+            sheet_d44 = wb.sheets[0]
+            cell_d44 = sheet_d44.range(D44_CELL)
+            stats = write_rich_text(cell_d44, texto_d44, trechos)
+            if "error" in stats:
+                _log(f"Formatação da D44 não aplicada (ignorado): {stats['error']}", logging.WARNING)
+            rich.append(stats)
+            _debug("Célula %s preenchida com descrição adicional (planilha '%s').", D44_CELL, sheet_d44.name)
+
+    if any(r["runs"] for r in rich):
+        calls = sum(r["calls"] for r in rich)
+        legacy = sum(r["legacy_calls"] for r in rich)
+        metrics.annotate(rich_text={"runs": sum(r["runs"] for r in rich), "calls": calls, "saved": legacy - calls})
+        _log(f"Rich text (D43/D44): {calls} round-trip(s) COM (value + WrapText + um por trecho e atributo: ~{legacy})")
+
+
+def export_pdf(wb, output_path: Path, profile: str | None = None, template_path: Path | None = None) -> None:
+    """
+    Exporta a pasta preenchida para PDF (cria a pasta de destino se preciso).
+    Com perfil de saída: qualidade do perfil e só as páginas até o último conteúdo.
+    Com --assemble-pages e o modelo de origem: páginas estáticas do cache + dinâmicas exportadas (page_assembly).
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    pdf_path = os.path.abspath(str(output_path.resolve()))
+    _log(f"Exportando para PDF: {pdf_path}")
+    options = {}
+    if profile:
+        from pdf_optimize import PROFILES
+
+        options["Quality"] = PROFILES[profile]["quality"]
+        with metrics.span("export.page_range"):
+            pages = populated_page_count(wb)
+        if pages:
+            options.update(From=1, To=pages)
+    book = metrics.instrument(wb)
+    if template_path is not None and _assemble_pages:
+        import page_assembly
+
+        if page_assembly.export(book, Path(template_path), pdf_path, options) is not None:
+            return
+    book.api.ExportAsFixedFormat(0, pdf_path, **options)  # 0 = xlTypePDF
+
+
+def configure_page_assembly(enabled: bool) -> None:
+    """Liga/desliga a montagem de páginas para os exports seguintes (main, a partir de --assemble-pages)."""
+    global _assemble_pages
+    _assemble_pages = bool(enabled)
+    if _assemble_pages:
+        import page_assembly
+
+        page_assembly.configure(True)
+
+
+def _ms(t0: float, t1: float) -> float:
+    return round((t1 - t0) * 1000.0, 2)
+
+
+def fill_xlsx_bytes(template_path: Path, data: dict, totais: dict, manifest: dict | None = None) -> bytes:
+    """
+    Backend de preenchimento XML: aplica fill_workbook sobre o modelo carregado em memória
+    e devolve o .xlsx preenchido (bytes), sem Excel.
+    """
+    with metrics.span("template.load"):
+        book = MemoryApp().books.open(str(template_path))
+    fill_workbook(book, data, totais, manifest)
+    with metrics.span("xlsx.write"):
+        from xlsx_writer import write_filled_xlsx
+
+        return write_filled_xlsx(template_path, book)
+
+
+def run_job(
+    app,
+    template_path: Path,
+    data: dict,
+    output_path: Path,
+    manifest: dict | None = None,
+    fill_backend: str = "excel",
+    renderer: str = "excel",
+    output_profile: str | None = None,
+    totais: dict | None = None,
+) -> dict:
+    """
+    Gera um PDF numa instância do Excel já aberta (não encerra o Excel).
+    Usado pela execução única (main) e pelo modo --serve, que mantém a instância entre jobs.
+    Sem manifesto informado, carrega e valida o do modelo (TemplateError antes de abrir a pasta).
+    fill_backend="xml": o preenchimento é feito no XML do .xlsx (sem Excel) e o Excel só exporta;
+    com saída .xlsx o Excel não é usado (app pode ser None).
+    renderer="native": preenche em memória e desenha o PDF direto (pdf_native), sem Excel (app pode ser None).
+    output_profile (email/print/preview): qualidade e páginas do export e pós-processamento do PDF
+    (pdf_optimize); o relatório vai para as métricas e o tempo para optimize_ms.
+    totais: os de prepare_data quando quem chamou já preparou `data` (antes de abrir o Excel).
+    Retorna os tempos de cada fase em ms.
+    """
+    timings = _render_job(
+        app, template_path, data, output_path, manifest, fill_backend, renderer, output_profile, totais
+    )
+    if output_profile and output_path.suffix.lower() == ".pdf":
+        report = optimize_output(output_path, output_profile)
+        timings["optimize_ms"] = report["ms"]
+        timings["total_ms"] = round(timings["total_ms"] + report["ms"], 2)
+    return timings
+
+
+def optimize_output(output_path: Path, profile: str) -> dict:
+    """Pós-processa o PDF gerado com o perfil de saída; registra o relatório no log e nas métricas."""
+    from pdf_optimize import apply_profile
+
+    with metrics.span("optimize"):
+        report = apply_profile(output_path, profile)
+    metrics.annotate(output_profile=report)
+    _log(
+        f"Perfil de saída '{profile}': {report['bytes_before']} -> {report['bytes_after']} bytes, "
+        f"{report['pages_before']} -> {report['pages_after']} página(s) em {report['ms']} ms"
+    )
+    return report
+
+
+def _render_job(
+    app,
+    template_path: Path,
+    data: dict,
+    output_path: Path,
+    manifest: dict | None,
+    fill_backend: str,
+    renderer: str,
+    output_profile: str | None,
+    totais: dict | None = None,
+) -> dict:
+    t0 = time.perf_counter()
+    if manifest is None:
+        with metrics.span("template.check"):
+            manifest = check_template(template_path, data)
+    if totais is None:
+        with metrics.span("prepare"):
+            totais = prepare_data(data)
+    export_log.watch_payload(data)
+    if logger.isEnabledFor(logging.DEBUG):
+        _debug("Dados recebidos (JSON): %s", json.dumps(data, ensure_ascii=False))
+        _debug("Campo 'custoDeslocamento' (bruto): %r", data.get("custoDeslocamento"))
+    t1 = time.perf_counter()
+
+    if renderer == "native":
+        from pdf_native import export_pdf_native
+
+        with metrics.span("workbook.open"):
+            book = MemoryApp().books.open(str(template_path))
+        t2 = time.perf_counter()
+        fill_workbook(book, data, totais, manifest)
+        t3 = time.perf_counter()
+        with metrics.span("export"):
+            export_pdf_native(book, template_path, output_path)
+        _log(f"PDF renderizado sem Excel (renderer nativo): {output_path}")
+        t4 = time.perf_counter()
+        return {
+            "prepare_ms": _ms(t0, t1),
+            "open_ms": _ms(t1, t2),
+            "fill_ms": _ms(t2, t3),
+            "export_ms": _ms(t3, t4),
+            "close_ms": 0.0,
+            "total_ms": _ms(t0, t4),
+        }
+
+    if fill_backend == "xml":
+        with metrics.span("xlsx.fill"):
+            xlsx_bytes = fill_xlsx_bytes(template_path, data, totais, manifest)
+        t2 = t3 = time.perf_counter()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.suffix.lower() == ".xlsx":
+            output_path.write_bytes(xlsx_bytes)
+            _log(f"Planilha preenchida gravada (sem Excel): {output_path}")
+            t4 = t5 = time.perf_counter()
+        else:
+            fd, tmp_name = tempfile.mkstemp(suffix=".xlsx", prefix="pdf_export_")
+            with os.fdopen(fd, "wb") as f:
+                f.write(xlsx_bytes)
+            try:
+                with excel_watchdog.phase("open"), metrics.span("workbook.open"):
+                    wb = app.books.open(tmp_name)
+                t3 = time.perf_counter()
+                try:
+                    with excel_watchdog.phase("fill"):
+                        apply_session_profile(app)
+                        with metrics.span("recalculate"):
+                            recalculate(app)
+                    with excel_watchdog.phase("export"), metrics.span("export"):
+                        export_pdf(wb, output_path, output_profile, template_path)
+                finally:
+                    t4 = time.perf_counter()
+                    # Excel encerrado pelo watchdog: não há pasta para fechar
+                    if not excel_watchdog.fired():
+                        with excel_watchdog.phase("quit"), metrics.span("workbook.close"):
+                            wb.close()
+            finally:
                 try:
-                    sheet_ret.range(M44_CELL).number_format = "R$ #.##0,00"
-                    sheet_ret.range(N44_CELL).number_format = "R$ #.##0,00"
-                except Exception:
+                    os.remove(tmp_name)
+                except OSError:
                     pass
-                _log(f"Células {D44_CELL}, {M44_CELL}, {N44_CELL} preenchidas (modo Automatizada).")
-        elif is_porta:
-            texto_d43 = build_texto_especificacao_d43_porta(data)
-            texto_d43_excel = texto_d43.replace("\n", "\r\n")
-            sheet_d43 = wb.sheets[0]
-            cell_d43 = sheet_d43.range(D43_CELL)
-            cell_d43.value = texto_d43_excel
+            t5 = time.perf_counter()
+        return {
+            "prepare_ms": _ms(t0, t1),
+            "open_ms": _ms(t2, t3),
+            "fill_ms": _ms(t1, t2),
+            "export_ms": _ms(t3, t4),
+            "close_ms": _ms(t4, t5),
+            "total_ms": _ms(t0, t5),
+        }
+
+    with excel_watchdog.phase("open"), metrics.span("workbook.open"):
+        wb = app.books.open(str(template_path.resolve()))
+    t2 = time.perf_counter()
+    try:
+        with excel_watchdog.phase("fill"):
+            apply_session_profile(app)
+            fill_workbook(wb, data, totais, manifest)
+            t3 = time.perf_counter()
+            with metrics.span("recalculate"):
+                recalculate(app)
+        with excel_watchdog.phase("export"), metrics.span("export"):
+            export_pdf(wb, output_path, output_profile, template_path)
+        t4 = time.perf_counter()
+    except Exception:
+        if not excel_watchdog.fired():
             try:
-                cell_d43.api.WrapText = True
+                wb.close()
             except Exception:
                 pass
-            # Negrito nos cabeçalhos da descrição Porta
+        raise
+    with excel_watchdog.phase("quit"), metrics.span("workbook.close"):
+        wb.close()
+    t5 = time.perf_counter()
+    return {
+        "prepare_ms": _ms(t0, t1),
+        "open_ms": _ms(t1, t2),
+        "fill_ms": _ms(t2, t3),
+        "export_ms": _ms(t3, t4),
+        "close_ms": _ms(t4, t5),
+        "total_ms": _ms(t0, t5),
+    }
+
+
+def main() -> int:
+    startup.mark("main")
+    parser = argparse.ArgumentParser(description="Preenche Excel e exporta para PDF.")
+    parser.add_argument("--template", help="Caminho do arquivo .xlsx modelo")
+    parser.add_argument("--data", help="Caminho do arquivo .json com os dados (- = ler do stdin)")
+    parser.add_argument("--output", help="Caminho do arquivo .pdf de saída (- = enviar o PDF para o stdout)")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Modo worker: lê jobs JSON (um por linha) do stdin e mantém o Excel aberto entre jobs",
+    )
+    parser.add_argument(
+        "--multi",
+        action="store_true",
+        help="Várias propostas (--data com array JSON ou JSON lines) numa pasta e num único export do Excel",
+    )
+    parser.add_argument(
+        "--split-dir", metavar="DIR", help="Com --multi: separa o PDF combinado em um PDF por proposta nesta pasta"
+    )
+    parser.add_argument(
+        "--multi-compare",
+        action="store_true",
+        help="Com --multi: mede também um processo por PDF e informa o custo amortizado por proposta",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="CSV_OU_XLSX",
+        help="Lote: um PDF por linha da lista (CSV/XLSX) em --output (pasta), com checkpoint e retomada",
+    )
+    parser.add_argument(
+        "--templates-dir", help="Com --batch: pasta dos modelos escolhidos pelo tipoProposta (padrão: resources/)"
+    )
+    parser.add_argument(
+        "--batch-map", metavar="JSON", help='Com --batch: nomes de coluna -> chaves do payload ({"Cliente": "nomeCliente"})'
+    )
+    parser.add_argument(
+        "--batch-restart", action="store_true", help="Com --batch: ignora o checkpoint e recomeça da primeira linha"
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Servidor local de jobs (HTTP/JSON) com pool de workers --serve, fila de prioridade e cancelamento",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Com --server: endereço de escuta (padrão: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Com --server: porta (0 = livre; padrão: 8765)")
+    parser.add_argument("--workers", type=int, default=2, help="Com --server: processos worker (um Excel cada)")
+    parser.add_argument(
+        "--recycle-after", type=int, default=200, metavar="N", help="Com --server: recicla o worker após N jobs"
+    )
+    parser.add_argument(
+        "--job-timeout",
+        type=float,
+        default=120.0,
+        metavar="S",
+        help="Com --server: prazo padrão por job em segundos (estourou: worker e Excel encerrados; 0 = sem prazo)",
+    )
+    parser.add_argument(
+        "--max-queue", type=int, default=500, help="Com --server: jobs na fila antes de recusar com 503"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="excel",
+        help="excel = Microsoft Excel via xlwings; memory = stand-in em memória (sem Excel, para medição)",
+    )
+    parser.add_argument(
+        "--com-latency",
+        metavar="MS_OU_JSON",
+        help="Com --backend memory e --metrics/--metrics-file: latência simulada por chamada ao COM "
+        '(ms, ou JSON {"default": ms, "members": {"Find()": ms}})',
+    )
+    parser.add_argument(
+        "--deadlines",
+        metavar="FASE=S,...",
+        default=os.environ.get("PDF_EXPORT_DEADLINES"),
+        help="Prazos do Excel por fase em segundos (launch, open, fill, export, quit; padrão "
+        + ",".join(f"{k}={v:g}" for k, v in excel_watchdog.DEFAULT_DEADLINES.items())
+        + "; 0 desliga a fase, off desliga todas; ou PDF_EXPORT_DEADLINES). Estourou: o Excel é "
+        f"encerrado e o gerador sai com o código {excel_watchdog.EXIT_TIMEOUT} e um JSON no stderr",
+    )
+    parser.add_argument(
+        "--fake-hang",
+        metavar="FASE[=S]",
+        help="Com --backend memory: o Excel simulado trava na fase (padrão: 1 h), para testar os prazos",
+    )
+    parser.add_argument(
+        "--fill-backend",
+        choices=("excel", "xml"),
+        default="excel",
+        help="excel = preenche via COM; xml = preenche o .xlsx em Python (Excel só exporta; saída .xlsx dispensa o Excel)",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("excel", "native"),
+        default="excel",
+        help="excel = ExportAsFixedFormat; native = desenha o PDF em Python a partir do modelo (sem Excel)",
+    )
+    parser.add_argument(
+        "--output-profile",
+        choices=OUTPUT_PROFILES,
+        help="Perfil do PDF: email (menor arquivo), print (qualidade de impressão) ou preview; "
+        "ajusta a qualidade do export, corta páginas vazias no fim e otimiza imagens, streams e recursos repetidos",
+    )
+    parser.add_argument(
+        "--assemble-pages",
+        action="store_true",
+        default=_assemble_pages,
+        help="Exporta pelo Excel só as páginas que variam por proposta e junta com as páginas estáticas do modelo, "
+        "guardadas em cache por hash do modelo (ou PDF_EXPORT_ASSEMBLE_PAGES=1)",
+    )
+    parser.add_argument(
+        "--compile-template",
+        nargs="+",
+        metavar="XLSX",
+        help="Compila o manifesto de placeholders do(s) modelo(s) (sem Excel) e grava no cache",
+    )
+    parser.add_argument("--cache-dir", help="Pasta do cache de saída (padrão: %%TEMP%%/pdf_export_cache/output)")
+    parser.add_argument(
+        "--cache-max-mb", type=float, default=DEFAULT_MAX_MB, help="Tamanho máximo do cache de saída (MB, LRU)"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Não consulta nem grava o cache de saída")
+    parser.add_argument(
+        "--cache-link", action="store_true", help="Num acerto, cria hardlink para --output em vez de copiar (o hash da entrada é conferido a cada acerto)"
+    )
+    parser.add_argument("--cache-stats", action="store_true", help="Imprime as estatísticas do cache de saída (JSON)")
+    parser.add_argument(
+        "--archive",
+        action=argparse.BooleanOptionalAction,
+        default=os.environ.get("PDF_EXPORT_ARCHIVE_RUNS", "") not in ("", "0"),
+        help="Registra a geração no arquivo local de propostas (SQLite; desligado por padrão, ou "
+        "PDF_EXPORT_ARCHIVE_RUNS=1); com --log-mask, cpfCnpj e celularFone são gravados mascarados",
+    )
+    parser.add_argument(
+        "--from-archive",
+        type=int,
+        metavar="ID",
+        help="Proposta do arquivo local (ver archive.py search): com --output copia o PDF arquivado ou, se ele "
+        "mudou/sumiu, gera de novo com o payload arquivado; sem --output imprime o registro (JSON)",
+    )
+    parser.add_argument(
+        "--regenerate", action="store_true", help="Com --from-archive: gera de novo mesmo com o PDF arquivado intacto"
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Imprime em stderr um resumo JSON com o tempo de cada fase e as chamadas ao Excel",
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="JSONL", help="Acrescenta o resumo de métricas (uma linha JSON por execução/job) ao arquivo"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(PROFILE_PATH),
+        metavar="PROF",
+        help="Grava um perfil cProfile da execução (padrão: %%TEMP%%/pdf_export_profile.prof)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=export_log.LEVELS,
+        help="Nível do log (padrão: info ou PDF_EXPORT_LOG_LEVEL); debug inclui o passo a passo por célula e o payload",
+    )
+    parser.add_argument(
+        "--log-mask", action="store_true", help="Mascara cpfCnpj e celularFone no log (ou PDF_EXPORT_LOG_MASK=1)"
+    )
+    parser.add_argument(
+        "--price-only",
+        action="store_true",
+        help="Só calcula os valores (m², à vista, 5x/10x, [Valor Total]) de --data ou de JSON lines no stdin, sem Excel",
+    )
+    parser.add_argument(
+        "--scenario", metavar="JSON", help="Com --price-only: cenário de preços (forro vinílico, tabela do Pergolado)"
+    )
+    parser.add_argument(
+        startup.FLAG,
+        action="store_true",
+        help="Só mostra o tempo de partida (extração do .exe, interpretador, imports, argumentos) em JSON e sai",
+    )
+    args = parser.parse_args()
+    startup.mark("args")
+    if args.startup_report:
+        print(json.dumps(startup.report(), ensure_ascii=False, indent=2))
+        return 0
+    export_log.configure(args.log_level, args.log_mask or None)
+
+    cache = None if args.no_cache else OutputCache(args.cache_dir, args.cache_max_mb, args.cache_link)
+    if args.cache_stats:
+        print(json.dumps(OutputCache(args.cache_dir, args.cache_max_mb).stats(), ensure_ascii=False))
+        return 0
+
+    if args.compile_template:
+        return compile_templates(args.compile_template)
+
+    if args.price_only:
+        return price_only(args.data, args.scenario)
+
+    try:
+        args.deadlines = excel_watchdog.parse_deadlines(args.deadlines)
+    except ValueError as e:
+        parser.error(f"--deadlines inválido: {e}")
+    if args.fake_hang:
+        if args.backend != "memory":
+            parser.error("--fake-hang requer --backend memory")
+        phase, _sep, seconds = args.fake_hang.partition("=")
+        if phase not in excel_watchdog.PHASES:
+            parser.error(f"--fake-hang: fase inválida: {phase} (fases: {', '.join(excel_watchdog.PHASES)})")
+        try:
+            args.fake_hang = {phase: float(seconds) if seconds else 3600.0}
+        except ValueError:
+            parser.error(f"--fake-hang: segundos inválidos: {seconds}")
+
+    if args.server:
+        return run_job_server(args)
+
+    if (args.batch or args.multi) and STDIO in (args.data, args.output):
+        parser.error("--data - e --output - valem só para a execução única")
+    if args.from_archive is not None:
+        if args.batch or args.multi or args.serve or args.data:
+            parser.error("--from-archive vale só para a execução única (sem --data, --batch, --multi ou --serve)")
+    elif args.regenerate:
+        parser.error("--regenerate requer --from-archive")
+    elif args.batch:
+        if not args.output:
+            parser.error("--batch requer --output (pasta de saída)")
+    elif args.multi:
+        if args.output_profile:
+            parser.error("--output-profile não vale com --multi (a separação por proposta depende das páginas do export)")
+        if not args.template or not args.data or not (args.output or args.split_dir):
+            parser.error("--multi requer --template, --data e --output (PDF combinado) e/ou --split-dir")
+    elif not args.serve:
+        missing = [f"--{name}" for name in ("template", "data", "output") if not getattr(args, name)]
+        if missing:
+            parser.error("os seguintes argumentos são obrigatórios: " + ", ".join(missing))
+
+    configure_page_assembly(args.assemble_pages)
+
+    sink = metrics.MetricsSink(args.metrics, args.metrics_file)
+    if args.com_latency:
+        if args.backend != "memory" or not sink.active:
+            parser.error("--com-latency requer --backend memory e --metrics ou --metrics-file")
+        try:
+            metrics.set_latency_model(metrics.LatencyModel.parse(args.com_latency))
+        except (OSError, ValueError) as e:
+            parser.error(f"--com-latency inválido: {e}")
+    archive = None
+    if args.archive:
+        from archive import Archive
+
+        archive = Archive()
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        if args.batch:
+            return generate_batch(args, cache, sink, archive)
+        if args.serve:
+            from worker import serve
+
+            return serve(
+                sys.stdin,
+                sys.stdout,
+                backend=args.backend,
+                fill_backend=args.fill_backend,
+                renderer=args.renderer,
+                cache=cache,
+                sink=sink,
+                output_profile=args.output_profile,
+                archive=archive,
+                hang=args.fake_hang,
+            )
+        with metrics.collecting(
+            sink,
+            generator=GENERATOR_VERSION,
+            backend=args.backend,
+            fill_backend=args.fill_backend,
+            renderer=args.renderer,
+            profile=args.profile,
+            mode="multi" if args.multi else None,
+        ):
+            if args.multi:
+                status = generate_multi(args)
+            elif args.from_archive is not None:
+                status = generate_from_archive(args, cache, archive)
+            elif args.output == STDIO:
+                status = generate_to_stdout(args, cache, archive)
+            else:
+                status = generate(args, cache, archive)
+            metrics.annotate(ok=status == 0)
+            return status
+    finally:
+        if archive is not None:
+            archive.close()
+        if profiler is not None:
+            profiler.disable()
             try:
-                # Primeira linha inteira em negrito
-                primeira_linha = texto_d43_excel.split("\r\n")[0]
-                if primeira_linha:
-                    cell_d43.characters[0 : len(primeira_linha)].font.bold = True
-                for cabecalho in ("Porta:", "Bandeirola:", "Alizar:", "Acabamento:", "Incluso:", "Não incluso:"):
-                    pos = texto_d43_excel.find(cabecalho)
-                    if pos >= 0:
-                        cell_d43.characters[pos : pos + len(cabecalho)].font.bold = True
-                _log("Negrito aplicado aos cabeçalhos da descrição Porta na célula D43.")
-            except Exception as fmt_err:
-                _log(f"Negrito D43 Porta não aplicado (ignorado): {fmt_err}")
-            _log(f"Célula {D43_CELL} preenchida com texto de especificação Porta (planilha '{sheet_d43.name}').")
-        elif not is_pergolado:
-            texto_d43 = build_texto_especificacao_d43(data)
-            texto_d43_excel = texto_d43.replace("\n", "\r\n")
-            sheet_d43 = wb.sheets[0]
-            cell_d43 = sheet_d43.range(D43_CELL)
-            cell_d43.value = texto_d43_excel
+                profiler.dump_stats(args.profile)
+                _log(f"Perfil cProfile gravado em: {args.profile}")
+            except OSError as e:
+                _log(f"Perfil cProfile não gravado: {e}", logging.WARNING)
+
+
+def run_job_server(args) -> int:
+    """--server: repassa aos workers as opções de geração (backend, cache, métricas, log)."""
+    from job_server import run_server
+
+    if args.workers < 1 or args.recycle_after < 1 or args.max_queue < 1:
+        print("Erro: --workers, --recycle-after e --max-queue devem ser maiores que zero.", file=sys.stderr)
+        return 1
+    if args.com_latency and (args.backend != "memory" or not args.metrics_file):
+        print("Erro: com --server, --com-latency requer --backend memory e --metrics-file.", file=sys.stderr)
+        return 1
+    worker_args = ["--backend", args.backend, "--fill-backend", args.fill_backend, "--renderer", args.renderer]
+    if args.fake_hang:
+        # Excel simulado travado nos workers: exercita o --job-timeout do servidor
+        (phase, seconds), = args.fake_hang.items()
+        worker_args += ["--fake-hang", f"{phase}={seconds:g}"]
+    if args.output_profile:
+        worker_args += ["--output-profile", args.output_profile]
+    if args.assemble_pages:
+        worker_args.append("--assemble-pages")
+    if args.no_cache:
+        worker_args.append("--no-cache")
+    else:
+        worker_args += ["--cache-max-mb", str(args.cache_max_mb)]
+        if args.cache_dir:
+            worker_args += ["--cache-dir", args.cache_dir]
+        if args.cache_link:
+            worker_args.append("--cache-link")
+    if args.metrics_file:
+        worker_args += ["--metrics-file", args.metrics_file]
+        if args.com_latency:
+            worker_args += ["--com-latency", args.com_latency]
+    if args.log_level:
+        worker_args += ["--log-level", args.log_level]
+    if args.log_mask:
+        worker_args.append("--log-mask")
+    if args.archive:
+        worker_args.append("--archive")
+    return run_server(
+        args.host,
+        args.port,
+        worker_args,
+        workers=args.workers,
+        recycle_after=args.recycle_after,
+        max_queue=args.max_queue,
+        job_timeout=args.job_timeout,
+    )
+
+
+def generate_to_stdout(args, cache: OutputCache | None, archive: "Archive | None" = None) -> int:
+    """
+    --output -: gera num diretório temporário privado (o ExportAsFixedFormat do Excel exige um arquivo)
+    e copia o PDF para stdout em binário. Durante a geração stdout aponta para stderr: só o PDF sai em stdout.
+    """
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory(prefix="pdf_export_") as tmp:
+        args.output = str(Path(tmp) / "proposta.pdf")
+        sys.stdout = sys.stderr
+        try:
+            status = generate(args, cache, archive, keep_output=False)
+        finally:
+            sys.stdout = stdout
+        if status != 0:
+            return status
+        try:
+            with metrics.span("stdout.write"), open(args.output, "rb") as f:
+                shutil.copyfileobj(f, stdout.buffer, STDOUT_CHUNK)
+                stdout.buffer.flush()
+        except (BrokenPipeError, OSError) as e:
+            print(f"Erro ao enviar o PDF para stdout: {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def generate(args, cache: OutputCache | None, archive: "Archive | None" = None, keep_output: bool = True) -> int:
+    """
+    Execução única (--template/--data/--output): valida, consulta o cache, gera e grava no cache.
+    Com o arquivo de propostas, registra a geração (keep_output=False: saída temporária, caminho não guardado).
+    """
+    template_path = Path(args.template)
+    data_path = Path(args.data)
+    output_path = Path(args.output)
+
+    if not template_path.exists():
+        print(f"Erro: modelo não encontrado: {template_path}", file=sys.stderr)
+        return 1
+    if args.data != STDIO and not data_path.exists():
+        print(f"Erro: arquivo de dados não encontrado: {data_path}", file=sys.stderr)
+        return 1
+
+    try:
+        with metrics.span("json.load"):
+            if args.data == STDIO:
+                data = json.loads(sys.stdin.buffer.read().decode("utf-8-sig"))
+            else:
+                with open(data_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+    except ValueError as e:
+        # JSONDecodeError e UnicodeDecodeError (payload que não é UTF-8)
+        print(f"Erro: JSON inválido em {'stdin' if args.data == STDIO else data_path}: {e}", file=sys.stderr)
+        return 1
+    if not isinstance(data, dict):
+        print(f"Erro: os dados da proposta devem ser um objeto JSON (recebido: {type(data).__name__})", file=sys.stderr)
+        return 1
+    metrics.annotate(template=template_path.name, tipoProposta=data.get("tipoProposta"))
+
+    # Valida o modelo pelo manifesto antes de abrir o Excel (falha rápida)
+    try:
+        with metrics.span("template.check"):
+            manifest = check_template(template_path, data)
+    except TemplateError as e:
+        print(f"Erro: {e} ({template_path})", file=sys.stderr)
+        return 1
+
+    # Normaliza e calcula o preço antes de abrir o Excel: payload inválido falha sem pagar a partida
+    try:
+        with metrics.span("prepare"):
+            totais = prepare_data(data)
+    except Exception as e:
+        _log(f"Erro: {e}", logging.ERROR)
+        print(f"Erro: dados da proposta inválidos: {e}", file=sys.stderr)
+        return 1
+
+    # Proposta idêntica já gerada: copia do cache sem abrir o Excel
+    with metrics.span("cache.lookup"):
+        key = (
+            output_cache_key(manifest, data, output_path, args.fill_backend, args.renderer, args.output_profile)
+            if cache
+            else None
+        )
+        if key:
+            t0 = time.perf_counter()
+            if fetch_cached(cache, key, output_path):
+                metrics.annotate(cache="hit")
+                _log(f"Cache de saída: acerto ({key[:12]}) em {_ms(t0, time.perf_counter())} ms -> {output_path}")
+                if archive is not None:
+                    archive.record_run(
+                        template_path, data, totais, output_path if keep_output else None, manifest,
+                        **_archive_meta(args, "hit"),
+                    )
+                return 0
+            metrics.annotate(cache="miss")
+            _log(f"Cache de saída: falta ({key[:12]})")
+
+    # Renderer nativo, ou preenchimento XML com saída .xlsx: nenhum Excel envolvido
+    needs_excel = args.renderer != "native" and not (
+        args.fill_backend == "xml" and output_path.suffix.lower() == ".xlsx"
+    )
+
+    app = None
+    wd = excel_watchdog.Watchdog(args.deadlines) if needs_excel else None
+    try:
+        with excel_watchdog.supervise(wd):
+            if needs_excel:
+                try:
+                    with metrics.span("excel.start"):
+                        app = wd.launch(start_app, args.backend, args.fake_hang)
+                except ImportError:
+                    print("Erro: xlwings não instalado. Execute: pip install xlwings", file=sys.stderr)
+                    return 1
             try:
-                cell_d43.api.WrapText = True
-            except Exception:
-                pass
+                timings = run_job(
+                    app, template_path, data, output_path, manifest, args.fill_backend, args.renderer,
+                    args.output_profile, totais,
+                )
+            finally:
+                if app:
+                    with metrics.span("excel.quit"):
+                        wd.quit(app)
+                    app = None
+        if archive is not None:
+            archive.record_run(
+                template_path, data, totais, output_path if keep_output else None, manifest, timings,
+                **_archive_meta(args, "miss" if key else None),
+            )
+        if key:
             try:
-                if texto_d43_excel.startswith("Cobertura Premium"):
-                    cell_d43.characters[0:18].font.bold = True
-                for m in re.finditer(r"Item \d+:", texto_d43_excel):
-                    cell_d43.characters[m.start() : m.end()].font.bold = True
-                _log("Negrito aplicado a 'Cobertura Premium' e aos 'Item N:' na célula D43.")
-            except Exception as fmt_err:
-                _log(f"Negrito D43 não aplicado (ignorado): {fmt_err}")
-            _log(f"Célula {D43_CELL} preenchida com texto de especificação (planilha '{sheet_d43.name}').")
-
-        # Descrição adicional opcional na célula D44 (Pergolado e Cobertura Premium; Cobertura Retrátil usa D44 para automatizador)
-        if not is_cobertura_retratil:
-            desc_adicional = (data.get("descricaoAdicional") or "").strip()
-            if desc_adicional:
-                sheet_d44 = wb.sheets[0]
-                sheet_d44.range(D44_CELL).value = desc_adicional.replace("\n", "\r\n")
-                try:
-                    sheet_d44.range(D44_CELL).api.WrapText = True
-                except Exception:
-                    pass
-                _log(f"Célula {D44_CELL} preenchida com descrição adicional (planilha '{sheet_d44.name}').")
-
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        pdf_path = os.path.abspath(str(output_path.resolve()))
-        _log(f"Exportando para PDF: {pdf_path}")
-        wb.api.ExportAsFixedFormat(0, pdf_path)  # 0 = xlTypePDF
-        wb.close()
+                with metrics.span("cache.store"):
+                    cache.store(key, output_path)
+            except OSError as e:
+                _log(f"Cache de saída não gravado (ignorado): {e}", logging.WARNING)
         _log(f"PDF gerado com sucesso. Log completo em: {LOG_PATH}")
         return 0
+    except excel_watchdog.ExcelTimeout as e:
+        _log(f"Erro: {e}", logging.ERROR)
+        metrics.annotate(timeout=e.info)
+        excel_watchdog.report_timeout(e.info)
+        return excel_watchdog.EXIT_TIMEOUT
     except Exception as e:
-        _log(f"Erro: {e}")
+        _log(f"Erro: {e}", logging.ERROR)
         print(f"Erro ao gerar PDF: {e}", file=sys.stderr)
         return 1
+
+
+def _archive_meta(args, cache_status: str | None) -> dict:
+    return {
+        "generator": GENERATOR_VERSION,
+        "mode": "from-archive" if args.from_archive is not None else "single",
+        "renderer": args.renderer,
+        "fill_backend": args.fill_backend,
+        "output_profile": args.output_profile,
+        "cache": cache_status,
+    }
+
+
+def generate_from_archive(args, cache: OutputCache | None, archive: "Archive | None") -> int:
+    """
+    --from-archive ID: sem --output imprime o registro. Com --output copia o PDF arquivado se ele
+    ainda existe com o mesmo SHA-256 (sem Excel); senão (ou com --regenerate) gera de novo com o
+    payload arquivado e o modelo arquivado (ou --template). A dataAtual passa a ser a de hoje.
+    """
+    from archive import Archive, file_sha256, is_masked
+
+    store = archive or Archive()
+    try:
+        entry = store.get(args.from_archive)
+    except Exception as e:
+        print(f"Erro ao ler o arquivo de propostas ({store.path}): {e}", file=sys.stderr)
+        return 1
     finally:
-        if app:
-            app.quit()
+        if archive is None:
+            store.close()
+    if entry is None:
+        print(f"Erro: proposta {args.from_archive} não encontrada no arquivo ({store.path}).", file=sys.stderr)
+        return 1
+    metrics.annotate(archive_id=entry["id"], tipoProposta=entry.get("tipo_proposta"))
+    if not args.output:
+        print(json.dumps(entry, ensure_ascii=False))
+        return 0
+
+    archived = Path(entry["output"]) if entry.get("output") else None
+    if not args.regenerate and archived is not None and archived.is_file():
+        with metrics.span("archive.verify"):
+            intact = file_sha256(archived) == entry.get("pdf_sha256")
+        if intact:
+            metrics.annotate(archive="retrieved")
+            try:
+                if args.output == STDIO:
+                    with metrics.span("stdout.write"), open(archived, "rb") as f:
+                        shutil.copyfileobj(f, sys.stdout.buffer, STDOUT_CHUNK)
+                        sys.stdout.buffer.flush()
+                elif Path(args.output).resolve() != archived.resolve():
+                    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(archived, args.output)
+            except OSError as e:
+                print(f"Erro ao copiar o PDF arquivado: {e}", file=sys.stderr)
+                return 1
+            _log(f"Proposta {entry['id']} recuperada do arquivo: {archived} -> {args.output}")
+            return 0
+        _log(f"PDF arquivado da proposta {entry['id']} foi alterado; gerando de novo.", logging.WARNING)
+
+    if is_masked(entry["payload"]):
+        print(
+            f"Erro: a proposta {entry['id']} foi arquivada com --log-mask (cpfCnpj/celularFone mascarados) "
+            "e não pode ser gerada de novo; só o PDF arquivado intacto pode ser recuperado.",
+            file=sys.stderr,
+        )
+        return 1
+    metrics.annotate(archive="regenerated")
+    args.template = args.template or entry["template"]
+    if Path(args.template).exists() and entry.get("template_sha256"):
+        if template_hash(args.template) != entry["template_sha256"]:
+            _log(f"Modelo mudou desde a proposta {entry['id']}; gerando com o modelo atual.", logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="pdf_export_") as tmp:
+        args.data = str(Path(tmp) / "payload.json")
+        with open(args.data, "w", encoding="utf-8") as f:
+            json.dump(entry["payload"], f, ensure_ascii=False)
+        if args.output == STDIO:
+            return generate_to_stdout(args, cache, archive)
+        return generate(args, cache, archive)
+
+
+def generate_batch(args, cache: OutputCache | None, sink, archive: "Archive | None" = None) -> int:
+    """--batch: gera a lista inteira numa única instância do Excel; imprime o resumo (JSON) em stdout."""
+    from batch import run_batch
+
+    source = Path(args.batch)
+    if not source.exists():
+        print(f"Erro: lista não encontrada: {source}", file=sys.stderr)
+        return 1
+    column_map = None
+    if args.batch_map:
+        try:
+            with open(args.batch_map, "r", encoding="utf-8") as f:
+                column_map = json.load(f)
+            if not isinstance(column_map, dict):
+                raise ValueError("esperado um objeto JSON")
+        except (OSError, ValueError) as e:
+            print(f"Erro: mapa de colunas inválido ({args.batch_map}): {e}", file=sys.stderr)
+            return 1
+    try:
+        summary = run_batch(
+            source,
+            Path(args.output),
+            backend=args.backend,
+            fill_backend=args.fill_backend,
+            renderer=args.renderer,
+            template=Path(args.template) if args.template else None,
+            templates_dir=Path(args.templates_dir) if args.templates_dir else None,
+            column_map=column_map,
+            cache=cache,
+            sink=sink,
+            restart=args.batch_restart,
+            output_profile=args.output_profile,
+            archive=archive,
+            deadlines=args.deadlines,
+            hang=args.fake_hang,
+        )
+    except ImportError:
+        print("Erro: xlwings não instalado. Execute: pip install xlwings", file=sys.stderr)
+        return 1
+    except excel_watchdog.ExcelTimeout as e:
+        excel_watchdog.report_timeout(e.info)
+        return excel_watchdog.EXIT_TIMEOUT
+    except KeyboardInterrupt:
+        print("Erro: lote interrompido; rode o mesmo comando para retomar.", file=sys.stderr)
+        return 1
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        print(f"Erro no lote: {e}", file=sys.stderr)
+        return 1
+    _log(f"Lote: {summary['ok']} ok, {summary['failed']} com erro; resultados em {summary['results']}")
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0 if summary["failed"] == 0 else 1
+
+
+def generate_multi(args) -> int:
+    """--multi: todas as propostas de --data numa pasta e num único ExportAsFixedFormat (sem cache de saída)."""
+    from multi_export import baseline, read_payloads, run_multi
+
+    if args.renderer != "excel" or args.fill_backend != "excel":
+        print(
+            "Erro: --multi preenche e exporta pelo Excel (não combina com --renderer native / --fill-backend xml).",
+            file=sys.stderr,
+        )
+        return 1
+    template_path = Path(args.template)
+    data_path = Path(args.data)
+    if not template_path.exists():
+        print(f"Erro: modelo não encontrado: {template_path}", file=sys.stderr)
+        return 1
+    if not data_path.exists():
+        print(f"Erro: arquivo de dados não encontrado: {data_path}", file=sys.stderr)
+        return 1
+    try:
+        with metrics.span("json.load"):
+            payloads = read_payloads(data_path)
+    except ValueError as e:
+        print(f"Erro: dados inválidos ({data_path}): {e}", file=sys.stderr)
+        return 1
+    metrics.annotate(template=template_path.name, proposals=len(payloads))
+
+    app = None
+    wd = excel_watchdog.Watchdog(args.deadlines)
+    try:
+        with excel_watchdog.supervise(wd):
+            try:
+                with metrics.span("excel.start"):
+                    app = wd.launch(start_app, args.backend, args.fake_hang)
+            except ImportError:
+                print("Erro: xlwings não instalado. Execute: pip install xlwings", file=sys.stderr)
+                return 1
+            try:
+                report = run_multi(
+                    app,
+                    template_path,
+                    payloads,
+                    Path(args.output) if args.output else None,
+                    Path(args.split_dir) if args.split_dir else None,
+                )
+            finally:
+                if app:
+                    with metrics.span("excel.quit"):
+                        wd.quit(app)
+    except TemplateError as e:
+        print(f"Erro: {e} ({template_path})", file=sys.stderr)
+        return 1
+    except excel_watchdog.ExcelTimeout as e:
+        _log(f"Erro: {e}", logging.ERROR)
+        excel_watchdog.report_timeout(e.info)
+        return excel_watchdog.EXIT_TIMEOUT
+    except Exception as e:
+        _log(f"Erro: {e}", logging.ERROR)
+        print(f"Erro ao gerar PDFs: {e}", file=sys.stderr)
+        return 1
+
+    if args.multi_compare:
+        try:
+            reference = baseline(template_path, payloads, args.backend)
+        except Exception as e:
+            print(f"Erro na medição de referência: {e}", file=sys.stderr)
+            return 1
+        report["baseline"] = reference
+        report["speedup"] = round(reference["per_proposal_ms"] / report["per_proposal_ms"], 2)
+    _log(f"{report['proposals']} proposta(s) geradas em {report['timings']['total_ms']} ms ({report['per_proposal_ms']} ms cada)")
+    print(json.dumps(report, ensure_ascii=False))
+    return 0
 
 
 if __name__ == "__main__":
+    # Módulos irmãos (worker, ...) importam "fill_and_export_pdf"; reaproveita este módulo em vez de carregá-lo de novo
+    sys.modules.setdefault("fill_and_export_pdf", sys.modules[__name__])
     sys.exit(main())
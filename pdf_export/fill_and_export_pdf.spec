@@ -1,6 +1,16 @@
 # PyInstaller spec: gera fill_and_export_pdf.exe (sem precisar instalar Python no PC do usuário)
 # Uso: pyinstaller fill_and_export_pdf.spec
 # Requer: pip install pyinstaller xlwings
+#
+# Padrão: pasta (one-dir) dist/fill_and_export_pdf/ com o .exe e as DLLs já extraídas. O one-file
+# extrai tudo para %TEMP%\_MEIxxxxxx a cada execução, antes do main() — é a maior parte da partida.
+# PDF_EXPORT_ONEFILE=1 gera o .exe único antigo (dist/fill_and_export_pdf.exe).
+# UPX desligado nos dois: cada partida teria de descompactar as DLLs (e o antivírus as examina de novo).
+# fill_and_export_pdf.exe --startup-report mostra o custo de cada parte.
+
+import os
+
+ONEFILE = os.environ.get('PDF_EXPORT_ONEFILE') == '1'
 
 a = Analysis(
     ['fill_and_export_pdf.py'],
@@ -11,28 +21,58 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # numpy é opcional (só o sweep vetorizado de pricing.py; sem ele, laço em Python)
+    excludes=['numpy', 'tkinter'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='fill_and_export_pdf',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=True,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+
+if ONEFILE:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='fill_and_export_pdf',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='fill_and_export_pdf',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=True,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='fill_and_export_pdf',
+    )
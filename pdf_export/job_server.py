@@ -0,0 +1,610 @@
+"""
+Servidor local de jobs (--server): HTTP/JSON em 127.0.0.1 na frente de um pool de workers --serve.
+
+Cada worker é um processo "fill_and_export_pdf --serve" com a SUA instância do Excel; é reciclado
+depois de N jobs (--recycle-after) e recriado se cair. Os jobs entram numa fila de prioridade
+(maior primeiro; empate = ordem de chegada), com limite de tamanho (503 quando cheia).
+
+Endpoints:
+  POST   /jobs                 {"template", "data" (objeto ou caminho), "output", "priority"?, "timeout"?, "profile"?,
+                                "session"?, "export"?}
+                               -> 202 {"id", "status"}; job idêntico (modelo + dados + saída + perfil + sessão)
+                               na fila ou em execução não é enfileirado de novo: devolve o id existente ("dedup": true)
+  GET    /jobs/<id>?wait=S     estado do job (espera até S segundos pelo fim)
+  GET    /jobs/<id>/events?since=N&wait=S
+                               eventos a partir do N-ésimo (queued, started, phase, done/failed/...),
+                               com espera longa até S segundos por eventos novos
+  DELETE /jobs/<id>            cancela: na fila sai da fila; em execução o worker (e o Excel) é encerrado
+  GET    /stats                fila, workers e contadores
+
+Jobs com "session" preferem o worker que atendeu a sessão por último (a pasta preenchida está
+aberta nele; ver session_fill); se esse worker estiver ocupado, outro assume e a sessão recomeça lá.
+"export": false pré-preenche a sessão sem exportar (dispensa "output").
+
+Estados: queued, running, done, failed, cancelled, expired (prazo estourado: worker e Excel encerrados).
+Com --backend memory (ou --renderer native) roda no Linux, sem Excel, para teste de carga.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import signal
+import subprocess
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from excel_watchdog import terminate
+from export_log import logger
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_RECYCLE_AFTER = 200
+DEFAULT_MAX_QUEUE = 500
+# Prazo padrão por job (s) contado a partir do início da execução; 0 = sem prazo
+DEFAULT_JOB_TIMEOUT = 120.0
+# Jobs terminados guardados para consulta
+FINISHED_KEEP = 2000
+
+FINAL_STATES = ("done", "failed", "cancelled", "expired")
+
+
+def worker_command(args: list[str]) -> list[str]:
+    """Linha de comando de um worker --serve (executável PyInstaller ou script)."""
+    if getattr(sys, "frozen", False):
+        return [sys.executable, "--serve", *args]
+    return [sys.executable, str(Path(__file__).with_name("fill_and_export_pdf.py")), "--serve", *args]
+
+
+def _kill_pid(pid: int | None) -> None:
+    """Encerra um processo pelo PID (Excel travado); melhor esforço."""
+    terminate(pid, force=True)
+
+
+def dedup_key(
+    template: str, data, output: str | None, profile: str | None = None, session: str | None = None, export: bool = True
+) -> str:
+    blob = json.dumps(
+        [str(Path(template).resolve()), data, str(Path(output).resolve()) if output else None, profile, session, export],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class Job:
+    def __init__(self, job_id: str, spec: dict, priority: int, timeout: float, key: str):
+        self.id = job_id
+        self.spec = spec
+        self.priority = priority
+        self.timeout = timeout
+        self.key = key
+        self.status = "queued"
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.deadline: float | None = None
+        self.worker: int | None = None
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.events: list[dict] = []
+
+    def to_dict(self, events: bool = False) -> dict:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "worker": self.worker,
+            "phase": next((e["phase"] for e in reversed(self.events) if e["event"] == "phase"), None),
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        if events:
+            data["events"] = self.events
+        return data
+
+
+class JobServer:
+    """Fila de prioridade + pool de workers; thread-safe (um único lock + condição)."""
+
+    def __init__(
+        self,
+        worker_args: list[str],
+        workers: int = DEFAULT_WORKERS,
+        recycle_after: int = DEFAULT_RECYCLE_AFTER,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+    ):
+        self.worker_args = worker_args
+        self.recycle_after = recycle_after
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.queue: list = []  # heap de (-prioridade, seq, job)
+        self.seq = itertools.count()
+        self.ids = itertools.count(1)
+        self.jobs: dict[str, Job] = {}
+        self.in_flight: dict[str, Job] = {}  # chave de dedup -> job na fila/em execução
+        self.finished: list[str] = []
+        self.session_slots: dict[str, int] = {}  # sessão -> índice do worker que a atendeu por último
+        self.counters = {"submitted": 0, "deduplicated": 0, "rejected": 0, "recycled": 0, "crashed": 0}
+        for state in FINAL_STATES:
+            self.counters[state] = 0
+        self.closing = False
+        self.slots = [WorkerSlot(self, i) for i in range(workers)]
+
+    # -- fila -------------------------------------------------------------
+
+    def submit(self, spec: dict) -> tuple[Job, bool]:
+        """Enfileira (ou devolve o job idêntico em andamento). Levanta ValueError/OverflowError."""
+        template, output = spec.get("template"), spec.get("output")
+        prefill = spec.get("export") is False
+        if prefill and not spec.get("session"):
+            raise ValueError("'export': false exige 'session'")
+        if not template or not (output or prefill) or spec.get("data") in (None, ""):
+            raise ValueError("job sem 'template', 'data' ou 'output'")
+        priority = int(spec.get("priority") or 0)
+        timeout = float(spec.get("timeout") if spec.get("timeout") is not None else self.job_timeout)
+        key = dedup_key(template, spec.get("data"), output, spec.get("profile"), spec.get("session"), not prefill)
+        with self.lock:
+            existing = self.in_flight.get(key)
+            if existing is not None:
+                self.counters["deduplicated"] += 1
+                return existing, True
+            pending = sum(1 for _p, _s, job in self.queue if job.status == "queued")
+            if pending >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise OverflowError(f"fila cheia ({pending} jobs)")
+            job_id = str(spec.get("id") or f"j{next(self.ids)}")
+            if job_id in self.jobs:
+                raise ValueError(f"id de job já usado: {job_id}")
+            job = Job(job_id, spec, priority, timeout, key)
+            self.jobs[job_id] = job
+            self.in_flight[key] = job
+            heapq.heappush(self.queue, (-priority, next(self.seq), job))
+            self.counters["submitted"] += 1
+            self._event(job, "queued")
+            return job, False
+
+    def take(self, slot: "WorkerSlot | None" = None) -> Job | None:
+        """
+        Próximo job da fila para o worker (bloqueia); None quando o servidor está fechando.
+        Job de sessão cujo worker está livre fica para ele (os outros pegam o seguinte da fila).
+        """
+        with self.lock:
+            while True:
+                while self.queue and self.queue[0][2].status != "queued":
+                    heapq.heappop(self.queue)  # cancelado enquanto esperava
+                if self.queue:
+                    entry = self._pick(slot)
+                    if entry is not None:
+                        self.queue.remove(entry)
+                        heapq.heapify(self.queue)
+                        return entry[2]
+                if self.closing:
+                    return None
+                self.changed.wait()
+
+    def _pick(self, slot: "WorkerSlot | None"):
+        # Chamado com o lock
+        for entry in sorted(self.queue):
+            job = entry[2]
+            if job.status != "queued":
+                continue
+            owner = self.session_slots.get(job.spec.get("session"))
+            if slot is None or owner is None or owner == slot.index or self.slots[owner].current is not None:
+                return entry
+        return None
+
+    def _event(self, job: Job, event: str, **fields) -> None:
+        # Chamado com o lock
+        job.events.append({"event": event, "t": round(time.time() - job.created, 4), **fields})
+        self.changed.notify_all()
+
+    def event(self, job: Job, event: str, **fields) -> None:
+        with self.lock:
+            self._event(job, event, **fields)
+
+    def start(self, job: Job, slot: "WorkerSlot") -> bool:
+        with self.lock:
+            if job.status != "queued":
+                return False
+            job.status = "running"
+            job.started = time.time()
+            job.worker = slot.index
+            session = job.spec.get("session")
+            if session:
+                self.session_slots.pop(session, None)
+                self.session_slots[session] = slot.index
+                while len(self.session_slots) > FINISHED_KEEP:
+                    self.session_slots.pop(next(iter(self.session_slots)))
+            if job.timeout > 0:
+                job.deadline = time.monotonic() + job.timeout
+            self._event(job, "started", worker=slot.index)
+            return True
+
+    def finish(self, job: Job, status: str, result: dict | None = None, error: str | None = None) -> None:
+        with self.lock:
+            if job.status in FINAL_STATES:
+                return
+            job.status = status
+            job.finished = time.time()
+            job.result = result
+            job.error = error
+            job.deadline = None
+            self.counters[status] += 1
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+            self.finished.append(job.id)
+            while len(self.finished) > FINISHED_KEEP:
+                self.jobs.pop(self.finished.pop(0), None)
+            self._event(job, status, **({"error": error} if error else {}))
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINAL_STATES:
+                return job
+            running = job.status == "running"
+            slot = self.slots[job.worker] if running else None
+        if running:
+            slot.abort(job, "cancelled", "cancelado")
+        else:
+            self.finish(job, "cancelled", error="cancelado")
+        return job
+
+    def wait(self, job: Job, timeout: float, since: int | None = None) -> None:
+        """Espera o job terminar (ou, com since, haver mais de `since` eventos)."""
+        end = time.monotonic() + timeout
+        with self.lock:
+            while job.status not in FINAL_STATES and (since is None or len(job.events) <= since):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return
+                self.changed.wait(remaining)
+
+    # -- ciclo de vida ----------------------------------------------------
+
+    def watchdog(self) -> None:
+        """Encerra jobs que passaram do prazo (mata o worker e o Excel dele)."""
+        while not self.closing:
+            time.sleep(0.2)
+            now = time.monotonic()
+            with self.lock:
+                expired = [
+                    job for job in self.jobs.values()
+                    if job.status == "running" and job.deadline is not None and now > job.deadline
+                ]
+            for job in expired:
+                logger.warning(f"Job {job.id} passou do prazo ({job.timeout}s); encerrando o worker {job.worker}.")
+                self.slots[job.worker].abort(job, "expired", f"prazo de {job.timeout}s excedido")
+
+    def start_workers(self) -> None:
+        for slot in self.slots:
+            slot.thread.start()
+        threading.Thread(target=self.watchdog, name="watchdog", daemon=True).start()
+
+    def close(self) -> None:
+        with self.lock:
+            self.closing = True
+            for _p, _s, job in self.queue:
+                if job.status == "queued":
+                    job.status = "cancelled"
+            self.changed.notify_all()
+        for slot in self.slots:
+            slot.stop()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "queued": sum(1 for _p, _s, job in self.queue if job.status == "queued"),
+                "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+                "workers": [slot.describe() for slot in self.slots],
+                "counters": dict(self.counters),
+            }
+
+
+class WorkerSlot:
+    """Uma vaga do pool: mantém um processo worker vivo e executa nele um job por vez."""
+
+    def __init__(self, server: JobServer, index: int):
+        self.server = server
+        self.index = index
+        self.proc: subprocess.Popen | None = None
+        self.ready: dict = {}
+        self.jobs_done = 0
+        self.current: Job | None = None
+        self.aborted: tuple[str, str] | None = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name=f"worker-{index}", daemon=True)
+
+    def describe(self) -> dict:
+        return {
+            "index": self.index,
+            "pid": self.proc.pid if self.proc else None,
+            "excel_pid": self.ready.get("excel_pid"),
+            "jobs": self.jobs_done,
+            "job": self.current.id if self.current else None,
+        }
+
+    def spawn(self) -> None:
+        proc = subprocess.Popen(
+            worker_command(self.server.worker_args),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+        line = proc.stdout.readline()
+        try:
+            ready = json.loads(line) if line else {}
+        except ValueError:
+            ready = {}
+        if ready.get("event") != "ready":
+            proc.kill()
+            proc.wait()
+            raise RuntimeError(ready.get("error") or "worker não iniciou")
+        with self.lock:
+            self.proc, self.ready, self.jobs_done = proc, ready, 0
+        logger.info(f"Worker {self.index} pronto (pid {proc.pid}, {ready.get('startup_ms')} ms)")
+
+    def retire(self) -> None:
+        """Fecha o stdin (o worker fecha o Excel e sai); mata se não sair a tempo."""
+        with self.lock:
+            proc, self.proc = self.proc, None
+            excel_pid = self.ready.get("excel_pid")
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+            _kill_pid(excel_pid)
+
+    def kill(self) -> None:
+        with self.lock:
+            proc, self.proc = self.proc, None
+            excel_pid = self.ready.get("excel_pid")
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+        _kill_pid(excel_pid)
+
+    def abort(self, job: Job, status: str, error: str) -> None:
+        """Interrompe o job em execução neste worker (cancelamento/prazo): mata o worker e o Excel."""
+        with self.lock:
+            if self.current is not job:
+                return
+            self.aborted = (status, error)
+            proc = self.proc
+        if proc is not None:
+            proc.kill()  # o readline do job recebe EOF; o laço em run() finaliza e recria o worker
+        _kill_pid(self.ready.get("excel_pid"))
+
+    def stop(self) -> None:
+        self.retire()
+
+    def run(self) -> None:
+        server = self.server
+        while True:
+            job = server.take(self)
+            if job is None:
+                break
+            if not server.start(job, self):
+                continue
+            with self.lock:
+                self.current, self.aborted = job, None
+            try:
+                if self.proc is None or self.proc.poll() is not None:
+                    self.spawn()
+                status, result, error = self.execute(job)
+            except Exception as e:
+                status, result, error = "failed", None, f"worker indisponível: {e}"
+            with self.lock:
+                self.current = None
+                aborted, self.aborted = self.aborted, None
+            if aborted is not None:
+                status, result, error = aborted[0], None, aborted[1]
+                self.kill()
+            server.finish(job, status, result, error)
+            self.jobs_done += 1
+            if self.proc is not None and self.jobs_done >= server.recycle_after:
+                with server.lock:
+                    server.counters["recycled"] += 1
+                self.retire()
+
+    def execute(self, job: Job) -> tuple[str, dict | None, str | None]:
+        spec = job.spec
+        request = {
+            "id": job.id,
+            "template": spec["template"],
+            "data": spec["data"],
+            "output": spec.get("output"),
+            "progress": True,
+        }
+        for field in ("profile", "session", "export"):
+            if field in spec:
+                request[field] = spec[field]
+        proc = self.proc
+        proc.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+        proc.stdin.flush()
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("event") == "phase":
+                self.server.event(job, "phase", phase=message.get("phase"))
+                continue
+            if message.get("id") != job.id:
+                continue
+            if message.get("ok"):
+                return "done", {k: v for k, v in message.items() if k not in ("id", "ok")}, None
+            return "failed", None, message.get("error") or "erro desconhecido"
+        # EOF: o worker caiu (ou foi encerrado por cancelamento/prazo)
+        if not self.aborted:
+            with self.server.lock:
+                self.server.counters["crashed"] += 1
+        self.kill()
+        return "failed", None, "o worker encerrou durante o job"
+
+
+def _query_number(query: dict, name: str, cast, limit: float | None = None):
+    """Parâmetro numérico não negativo da query string (0 se ausente); ValueError se inválido."""
+    raw = query.get(name) or "0"
+    try:
+        value = cast(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"parâmetro {name} inválido: {raw!r}") from None
+    if not value >= 0 or value == float("inf"):  # também rejeita nan
+        raise ValueError(f"parâmetro {name} inválido: {raw!r}")
+    return value if limit is None else min(value, limit)
+
+
+def _make_handler(server: JobServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            logger.debug("HTTP %s", fmt % args)
+
+        def _reply(self, status: int, body: dict, headers: dict | None = None) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _route(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return parts, query
+
+        def _job(self, job_id: str) -> Job | None:
+            with server.lock:
+                job = server.jobs.get(job_id)
+            if job is None:
+                self._reply(HTTPStatus.NOT_FOUND, {"error": f"job não encontrado: {job_id}"})
+            return job
+
+        def do_POST(self):
+            parts, _query = self._route()
+            if parts != ["jobs"]:
+                self._reply(HTTPStatus.NOT_FOUND, {"error": "rota inexistente"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                spec = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(spec, dict):
+                    raise ValueError("job deve ser um objeto JSON")
+                job, dedup = server.submit(spec)
+            except OverflowError as e:
+                self._reply(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}, {"Retry-After": "1"})
+                return
+            except (ValueError, TypeError) as e:
+                self._reply(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+            body = job.to_dict()
+            if dedup:
+                body["dedup"] = True
+            self._reply(HTTPStatus.ACCEPTED, body)
+
+        def do_GET(self):
+            parts, query = self._route()
+            try:
+                wait = _query_number(query, "wait", float, 300.0)
+                since = _query_number(query, "since", int)
+            except ValueError as e:
+                self._reply(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+            if parts == ["stats"]:
+                self._reply(HTTPStatus.OK, server.stats())
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = self._job(parts[1])
+                if job is not None:
+                    if wait:
+                        server.wait(job, wait)
+                    with server.lock:
+                        body = job.to_dict()
+                    self._reply(HTTPStatus.OK, body)
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+                job = self._job(parts[1])
+                if job is not None:
+                    if wait:
+                        server.wait(job, wait, since=since)
+                    with server.lock:
+                        body = {"id": job.id, "status": job.status, "events": job.events[since:]}
+                    self._reply(HTTPStatus.OK, body)
+            else:
+                self._reply(HTTPStatus.NOT_FOUND, {"error": "rota inexistente"})
+
+        def do_DELETE(self):
+            parts, _query = self._route()
+            if len(parts) != 2 or parts[0] != "jobs":
+                self._reply(HTTPStatus.NOT_FOUND, {"error": "rota inexistente"})
+                return
+            job = server.cancel(parts[1])
+            if job is None:
+                self._reply(HTTPStatus.NOT_FOUND, {"error": f"job não encontrado: {parts[1]}"})
+                return
+            # Em execução: espera o worker ser encerrado para responder com o estado final
+            server.wait(job, 5.0)
+            with server.lock:
+                body = job.to_dict()
+            self._reply(HTTPStatus.OK, body)
+
+    return Handler
+
+
+def run_server(
+    host: str,
+    port: int,
+    worker_args: list[str],
+    workers: int = DEFAULT_WORKERS,
+    recycle_after: int = DEFAULT_RECYCLE_AFTER,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+    job_timeout: float = DEFAULT_JOB_TIMEOUT,
+) -> int:
+    """Sobe o pool e atende HTTP até Ctrl+C (ou SIGTERM)."""
+    jobs = JobServer(worker_args, workers, recycle_after, max_queue, job_timeout)
+    try:
+        httpd = ThreadingHTTPServer((host, port), _make_handler(jobs))
+    except OSError as e:
+        print(f"Erro: não foi possível abrir {host}:{port}: {e}", file=sys.stderr)
+        return 1
+    httpd.daemon_threads = True
+    jobs.start_workers()
+    # Antes do "listening": quem recebe a porta já pode encerrar com SIGTERM
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=httpd.shutdown, daemon=True).start())
+    # Uma linha em stdout para quem sobe o servidor saber a porta (útil com --port 0)
+    print(json.dumps({"event": "listening", "host": host, "port": httpd.server_address[1], "workers": workers}), flush=True)
+    try:
+        httpd.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        jobs.close()
+    logger.log(logging.INFO, "Servidor de jobs encerrado.")
+    return 0
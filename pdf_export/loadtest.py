@@ -0,0 +1,576 @@
+"""
+Teste de carga: simula vários vendedores gerando propostas ao mesmo tempo (fechamento do mês).
+
+Alvos:
+  cli     um processo do gerador por pedido, como o app faz hoje (--data - pelo stdin)
+  server  o servidor de jobs (--server): sobe um com --workers N ou usa um já rodando (--url)
+
+Carga:
+  --concurrency N   N vendedores em laço fechado (cada um pede a próxima quando a anterior termina)
+  --rate R          R pedidos/s em laço aberto (chegadas fixas ou --poisson); a latência conta
+                    desde o horário agendado, então fila acumulada aparece no p99
+  --requests N / --duration S   tamanho da rodada
+  --mix cobertura=50,pergolado=20,cobertura_retratil=20,porta=10   proporção por tipoProposta
+
+No Linux, use --backend memory (padrão fora do Windows) ou --renderer native: sem Excel.
+
+Relatório (JSON): latência p50/p95/p99 e histograma, vazão, taxa de erro (geral e por tipo),
+pico de RSS e de processos filhos (árvore do teste de carga), processos do Excel antes/depois
+(vazados) e filhos que sobraram no fim. Medição de processos com psutil quando instalado;
+sem ele, /proc (Linux).
+
+Comparação de duas builds:
+  python loadtest.py --generator build_a/fill_and_export_pdf.exe --report a.json ...
+  python loadtest.py --generator build_b/fill_and_export_pdf.exe --report b.json ...
+  python loadtest.py --compare a.json b.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from batch import default_templates_dir, template_for
+from benchmark import FIXTURES
+from metrics import percentile
+from multi_export import generator_command
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_MIX = {"cobertura": 40, "pergolado": 20, "cobertura_retratil": 20, "porta": 20}
+# Limites superiores (ms) das faixas do histograma
+HISTOGRAM_BOUNDS = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+SAMPLE_INTERVAL = 0.25
+# Tempo para o Excel de um processo encerrado sumir da lista antes da contagem final
+SETTLE_SECONDS = 2.0
+
+
+# ---------------------------------------------------------------------------
+# Processos (RSS, filhos, Excel)
+# ---------------------------------------------------------------------------
+
+
+def _proc_table() -> dict[int, tuple[int, str, int]]:
+    """pid -> (ppid, nome, rss em bytes) via /proc (Linux, sem psutil)."""
+    table = {}
+    page = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read().decode("latin-1")
+            with open(f"/proc/{entry}/statm", "rb") as f:
+                rss = int(f.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+        name = stat[stat.index("(") + 1 : stat.rindex(")")]
+        ppid = int(stat[stat.rindex(")") + 2 :].split()[1])
+        table[int(entry)] = (ppid, name, rss)
+    return table
+
+
+def process_snapshot(root: int) -> dict | None:
+    """Descendentes de `root` (quantidade e RSS somado, incluindo o root) e processos do Excel no sistema."""
+    if psutil is not None:
+        try:
+            parent = psutil.Process(root)
+            children = parent.children(recursive=True)
+            rss = parent.memory_info().rss
+            for child in children:
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            excel = sum(1 for p in psutil.process_iter(["name"]) if "excel" in (p.info["name"] or "").lower())
+            return {"children": len(children), "child_pids": [c.pid for c in children], "rss": rss, "excel": excel}
+        except psutil.Error:
+            return None
+    if not os.path.isdir("/proc"):
+        return None
+    table = _proc_table()
+    kids: dict[int, list[int]] = {}
+    for pid, (ppid, _name, _rss) in table.items():
+        kids.setdefault(ppid, []).append(pid)
+    descendants, stack = [], list(kids.get(root, []))
+    while stack:
+        pid = stack.pop()
+        descendants.append(pid)
+        stack.extend(kids.get(pid, []))
+    rss = sum(table[pid][2] for pid in [root, *descendants] if pid in table)
+    excel = sum(1 for _ppid, name, _rss in table.values() if "excel" in name.lower())
+    return {"children": len(descendants), "child_pids": descendants, "rss": rss, "excel": excel}
+
+
+class ProcessSampler(threading.Thread):
+    """Amostra a árvore de processos periodicamente e guarda os picos."""
+
+    def __init__(self, root: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.root = root
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children = 0
+        self.peak_excel = 0
+        self.available = process_snapshot(root) is not None
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.is_set():
+            snap = process_snapshot(self.root)
+            if snap is not None:
+                self.peak_rss = max(self.peak_rss, snap["rss"])
+                self.peak_children = max(self.peak_children, snap["children"])
+                self.peak_excel = max(self.peak_excel, snap["excel"])
+            self._halt.wait(self.interval)
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+
+# ---------------------------------------------------------------------------
+# Pedidos e alvos
+# ---------------------------------------------------------------------------
+
+
+def parse_mix(text: str | None) -> dict[str, float]:
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in FIXTURES:
+            raise ValueError(f"tipo desconhecido no --mix: {name!r} (use {', '.join(FIXTURES)})")
+        mix[name] = float(weight or 1)
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("--mix sem peso positivo")
+    return mix
+
+
+def make_request(index: int, tipo: str) -> dict:
+    """Payload do tipo com cliente único (sem acerto de cache nem deduplicação entre pedidos)."""
+    data = dict(FIXTURES[tipo])
+    data["nomeCliente"] = f"{data['nomeCliente']} {index:05d}"
+    return data
+
+
+def _command(generator: str | None, args: list[str]) -> list[str]:
+    if not generator:
+        return generator_command(args)
+    if generator.endswith(".py"):
+        return [sys.executable, generator, *args]
+    return [generator, *args]
+
+
+class CliTarget:
+    """Um processo do gerador por pedido (como o handler do Electron)."""
+
+    name = "cli"
+
+    def __init__(self, generator: str | None, generator_args: list[str], templates_dir: Path, workdir: Path):
+        self.generator = generator
+        self.generator_args = generator_args
+        self.templates_dir = templates_dir
+        self.workdir = workdir
+
+    def start(self) -> None:
+        pass
+
+    def run(self, index: int, tipo: str, data: dict) -> str | None:
+        """None = sucesso; senão a mensagem de erro."""
+        output = self.workdir / f"{index:05d}.pdf"
+        command = _command(self.generator, [
+            "--template", str(template_for(tipo, self.templates_dir)),
+            "--data", "-",
+            "--output", str(output),
+            *self.generator_args,
+        ])
+        result = subprocess.run(command, input=json.dumps(data, ensure_ascii=False).encode("utf-8"), capture_output=True)
+        if result.returncode != 0:
+            return result.stderr.decode("utf-8", "replace").strip()[-300:] or f"código {result.returncode}"
+        if not output.exists():
+            return "PDF não gerado"
+        output.unlink()
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class ServerTarget:
+    """Servidor de jobs (--server): POST /jobs e espera longa em GET /jobs/<id>?wait=."""
+
+    name = "server"
+
+    def __init__(
+        self,
+        generator: str | None,
+        generator_args: list[str],
+        templates_dir: Path,
+        workdir: Path,
+        url: str | None = None,
+        workers: int = 2,
+        timeout: float = 300.0,
+    ):
+        self.generator = generator
+        self.generator_args = generator_args
+        self.templates_dir = templates_dir
+        self.workdir = workdir
+        self.url = url.rstrip("/") if url else None
+        self.workers = workers
+        self.timeout = timeout
+        self.proc = None
+
+    def start(self) -> None:
+        if self.url:
+            return
+        command = _command(
+            self.generator,
+            ["--server", "--port", "0", "--workers", str(self.workers), "--max-queue", "100000", *self.generator_args],
+        )
+        self.proc = subprocess.Popen(
+            command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        line = self.proc.stdout.readline()
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.close()
+            raise RuntimeError(f"o servidor não subiu: {line.strip() or 'sem saída'}")
+        self.url = f"http://127.0.0.1:{event['port']}"
+
+    def _call(self, method: str, path: str, body: dict | None = None, timeout: float = 30.0) -> dict:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return {"status": "failed", "error": f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')[:200]}"}
+
+    def run(self, index: int, tipo: str, data: dict) -> str | None:
+        output = self.workdir / f"{index:05d}.pdf"
+        job = self._call("POST", "/jobs", {
+            "template": str(template_for(tipo, self.templates_dir)),
+            "data": data,
+            "output": str(output),
+        })
+        deadline = time.monotonic() + self.timeout
+        while job.get("status") in ("queued", "running") and time.monotonic() < deadline:
+            job = self._call("GET", f"/jobs/{job['id']}?wait=30", timeout=60.0)
+        if job.get("status") != "done":
+            return job.get("error") or f"estado final: {job.get('status')}"
+        try:
+            output.unlink()
+        except OSError:
+            pass
+        return None
+
+    def close(self) -> None:
+        if self.proc is None:
+            return
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        finally:
+            self.proc = None
+
+
+# ---------------------------------------------------------------------------
+# Execução e relatório
+# ---------------------------------------------------------------------------
+
+
+def _latency_stats(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def histogram(values: list[float]) -> list[dict]:
+    counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+    for v in values:
+        counts[next((i for i, b in enumerate(HISTOGRAM_BOUNDS) if v <= b), len(HISTOGRAM_BOUNDS))] += 1
+    buckets = [{"le_ms": b, "count": c} for b, c in zip(HISTOGRAM_BOUNDS, counts)]
+    buckets.append({"le_ms": None, "count": counts[-1]})
+    return buckets
+
+
+def run_load(
+    target,
+    mix: dict[str, float],
+    requests: int | None,
+    duration: float | None,
+    concurrency: int | None = None,
+    rate: float | None = None,
+    poisson: bool = False,
+    seed: int = 1,
+) -> dict:
+    """Executa a rodada e devolve o relatório (sem os campos de identificação da build)."""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    plan_lock = threading.Lock()
+    counter = itertools.count()
+    results: list[tuple[str, float, str | None]] = []
+    results_lock = threading.Lock()
+
+    before = process_snapshot(os.getpid())
+    target.start()
+    sampler = ProcessSampler(os.getpid())
+    sampler.start()
+    t0 = time.perf_counter()
+    stop_at = t0 + duration if duration else None
+
+    def next_request():
+        with plan_lock:
+            index = next(counter)
+            if requests is not None and index >= requests:
+                return None
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return None
+            return index, rng.choices(kinds, weights)[0]
+
+    def execute(index: int, tipo: str, scheduled: float) -> None:
+        try:
+            error = target.run(index, tipo, make_request(index, tipo))
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        latency = (time.perf_counter() - scheduled) * 1000.0
+        with results_lock:
+            results.append((tipo, latency, error))
+
+    try:
+        if rate:
+            # Laço aberto: chegadas no horário agendado, independentemente das respostas
+            with ThreadPoolExecutor(max_workers=concurrency or 256) as pool:
+                scheduled = t0
+                while True:
+                    item = next_request()
+                    if item is None:
+                        break
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    pool.submit(execute, item[0], item[1], scheduled)
+                    scheduled += rng.expovariate(rate) if poisson else 1.0 / rate
+        else:
+
+            def seller():
+                while True:
+                    item = next_request()
+                    if item is None:
+                        return
+                    execute(item[0], item[1], time.perf_counter())
+
+            threads = [threading.Thread(target=seller) for _ in range(concurrency or 1)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        target.close()
+        sampler.stop()
+
+    time.sleep(SETTLE_SECONDS)
+    after = process_snapshot(os.getpid())
+
+    latencies = [ms for _tipo, ms, error in results if error is None]
+    errors = [(tipo, error) for tipo, _ms, error in results if error is not None]
+    by_type = {}
+    for tipo in kinds:
+        ok = [ms for t, ms, error in results if t == tipo and error is None]
+        failed = sum(1 for t, _e in errors if t == tipo)
+        if ok or failed:
+            by_type[tipo] = {**_latency_stats(ok), "errors": failed}
+    report = {
+        "requests": len(results),
+        "ok": len(latencies),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": _latency_stats(latencies),
+        "histogram": histogram(latencies),
+        "by_type": by_type,
+        "error_samples": sorted({error for _tipo, error in errors})[:10],
+    }
+    if sampler.available:
+        report["processes"] = {
+            "peak_rss_mb": round(sampler.peak_rss / 1048576, 1),
+            "peak_children": sampler.peak_children,
+            "leftover_children": after["children"] if after else None,
+            "excel_before": before["excel"] if before else None,
+            "excel_peak": sampler.peak_excel,
+            "excel_after": after["excel"] if after else None,
+            "excel_leaked": max(0, after["excel"] - before["excel"]) if before and after else None,
+        }
+    return report
+
+
+# Métricas comparadas: caminho no relatório -> maior é melhor?
+COMPARED = (
+    ("throughput_rps", True),
+    ("error_rate", False),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("processes.peak_rss_mb", False),
+    ("processes.peak_children", False),
+    ("processes.excel_leaked", False),
+)
+
+
+def _get(report: dict, path: str):
+    value = report
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare_reports(a: dict, b: dict) -> dict:
+    """Variação de B em relação a A em cada métrica (pct e se melhorou)."""
+    rows = {}
+    for path, higher_is_better in COMPARED:
+        va, vb = _get(a, path), _get(b, path)
+        if va is None or vb is None:
+            continue
+        change = (vb - va) / va * 100.0 if va else (0.0 if vb == va else None)
+        rows[path] = {
+            "a": va,
+            "b": vb,
+            "change_pct": round(change, 1) if change is not None else None,
+            "better": vb == va or (vb > va) == higher_is_better,
+        }
+    return {"a": a.get("build"), "b": b.get("build"), "metrics": rows}
+
+
+def _print_comparison(result: dict) -> None:
+    print(f"A = {result['a']}\nB = {result['b']}", file=sys.stderr)
+    for path, row in result["metrics"].items():
+        change = "" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        mark = "" if row["a"] == row["b"] else ("melhor" if row["better"] else "PIOR")
+        print(f"{path:<26} {row['a']:>12} {row['b']:>12} {change:>9}  {mark}", file=sys.stderr)
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do gerador (vários vendedores ao mesmo tempo).")
+    parser.add_argument("--target", choices=("cli", "server"), default="cli")
+    parser.add_argument("--generator", help="Executável ou script do gerador (padrão: o desta pasta)")
+    parser.add_argument("--url", help="Com --target server: servidor já rodando (senão sobe um)")
+    parser.add_argument("--workers", type=int, default=2, help="Com --target server: workers do servidor iniciado")
+    parser.add_argument(
+        "--backend",
+        choices=("excel", "memory"),
+        default="excel" if sys.platform == "win32" else "memory",
+        help="Backend passado ao gerador (padrão: memory fora do Windows)",
+    )
+    parser.add_argument("--renderer", choices=("excel", "native"), default="excel")
+    parser.add_argument("--cache", action="store_true", help="Deixa o cache de saída ligado (padrão: --no-cache)")
+    parser.add_argument("--concurrency", type=int, help="Vendedores simultâneos (laço fechado; com --rate: limite)")
+    parser.add_argument("--rate", type=float, help="Pedidos por segundo (laço aberto)")
+    parser.add_argument("--poisson", action="store_true", help="Com --rate: chegadas de Poisson em vez de fixas")
+    parser.add_argument("--requests", type=int, help="Total de pedidos (padrão: 50 sem --duration)")
+    parser.add_argument("--duration", type=float, help="Duração da rodada em segundos")
+    parser.add_argument("--mix", help="Proporção por tipo: cobertura=40,pergolado=20,...")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--templates-dir", help="Pasta dos modelos (padrão: resources/)")
+    parser.add_argument("--label", help="Nome da build no relatório (padrão: --generator)")
+    parser.add_argument("--report", metavar="JSON", help="Grava o relatório neste arquivo (além do stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("A.json", "B.json"), help="Compara dois relatórios e sai")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        try:
+            a, b = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        except (OSError, ValueError) as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+        result = compare_reports(a, b)
+        _print_comparison(result)
+        print(json.dumps(result, ensure_ascii=False))
+        return 0
+
+    if (args.concurrency is not None and args.concurrency < 1) or (args.rate is not None and args.rate <= 0):
+        print("Erro: --concurrency e --rate devem ser maiores que zero.", file=sys.stderr)
+        return 1
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    requests = args.requests if args.requests or args.duration else 50
+    generator_args = ["--backend", args.backend, "--renderer", args.renderer]
+    if not args.cache:
+        generator_args.append("--no-cache")
+    templates_dir = Path(args.templates_dir) if args.templates_dir else default_templates_dir()
+
+    with tempfile.TemporaryDirectory(prefix="pdf_export_load_") as tmp:
+        if args.target == "server":
+            target = ServerTarget(args.generator, generator_args, templates_dir, Path(tmp), args.url, args.workers)
+        else:
+            target = CliTarget(args.generator, generator_args, templates_dir, Path(tmp))
+        try:
+            report = run_load(
+                target, mix, requests, args.duration, args.concurrency, args.rate, args.poisson, args.seed
+            )
+        except (OSError, RuntimeError) as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+    report = {
+        "event": "loadtest",
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "build": args.label or args.generator or "local",
+        "target": args.target,
+        "load": {
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "poisson": args.poisson if args.rate else None,
+            "mix": mix,
+            "backend": args.backend,
+            "renderer": args.renderer,
+        },
+        **report,
+    }
+    text = json.dumps(report, ensure_ascii=False)
+    if args.report:
+        try:
+            Path(args.report).write_text(text + "\n", encoding="utf-8")
+        except OSError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+    print(text)
+    return 0 if report["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
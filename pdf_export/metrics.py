@@ -0,0 +1,434 @@
+"""
+Métricas de execução: tempo por fase (spans) e contagem de chamadas ao modelo de objetos do Excel.
+
+Uso no código:
+  with metrics.span("workbook.open"): ...      # fase com início e fim
+  metrics.step("placeholders")                 # etapa sequencial: fecha a anterior do mesmo span
+  wb = metrics.instrument(wb)                  # conta acessos via sheet.api / range / characters
+  metrics.annotate(template="modelo.xlsx")     # campos extras no resumo
+
+Sem coletor ativo (padrão) tudo vira no-op: instrument() devolve o próprio objeto e span()
+um contexto vazio, então o caminho normal não paga nada. O resumo é uma linha JSON
+({"event": "metrics", ...}) em stderr e/ou acrescentada a um arquivo (--metrics / --metrics-file).
+
+As chamadas contadas são acessos ao modelo de objetos (leitura/escrita de propriedade,
+chamada de método, indexação) — com o Excel, cada uma é no máximo uma ida ao COM.
+Cada chamada também é cronometrada (com_ms por membro). Com um modelo de latência
+(--com-latency, só com --backend memory) cada chamada custa ainda o tempo simulado de
+uma ida ao COM, para medir no Linux quanto uma redução de chamadas economiza no Excel.
+
+Agregado por release (p50/p95 por fase) a partir do arquivo de métricas:
+  python metrics.py metricas.jsonl [--by generator]
+"""
+
+import argparse
+import json
+import sys
+import time
+import types
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# O mesmo que inspect.isroutine, sem importar inspect (ast, dis, tokenize) na partida do gerador
+_ROUTINES = (
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.MethodDescriptorType,
+    types.WrapperDescriptorType,
+    types.MethodWrapperType,
+    types.ClassMethodDescriptorType,
+)
+
+# Valores devolvidos como estão (não passam pelo proxy de contagem)
+_PLAIN = (str, bytes, int, float, bool, type(None), tuple, list, dict, set, datetime)
+
+# Nome de tipo -> nome no resumo (iguala as classes do stand-in às do xlwings)
+_KIND_ALIASES = {"SheetList": "Sheets", "CharactersAccessor": "Characters", "Area": "Range"}
+
+
+class _Frame:
+    __slots__ = ("path", "start", "step", "step_start")
+
+    def __init__(self, path: str, start: float):
+        self.path = path
+        self.start = start
+        self.step = None
+        self.step_start = 0.0
+
+
+class LatencyModel:
+    """
+    Custo simulado (ms) de uma ida ao COM por chamada: um padrão para todas e valores
+    por membro, casados pelo fim do rótulo ("Find()", "ExportAsFixedFormat()", "Value=");
+    o sufixo mais longo vence.
+    """
+
+    def __init__(self, default_ms: float = 0.0, members: dict[str, float] | None = None):
+        self.default_ms = float(default_ms)
+        self.members = {k: float(v) for k, v in (members or {}).items()}
+        self._suffixes = sorted(self.members, key=len, reverse=True)
+        self._cache: dict[str, float] = {}
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """"0.3" (ms por chamada) ou arquivo JSON {"default": 0.3, "members": {"Find()": 2}}."""
+        try:
+            return cls(float(spec))
+        except ValueError:
+            pass
+        with open(spec, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if not isinstance(config, dict) or not isinstance(config.get("members", {}), dict):
+            raise ValueError('esperado {"default": ms, "members": {"Membro()": ms}}')
+        return cls(config.get("default", 0.0), config.get("members"))
+
+    def cost(self, label: str) -> float:
+        ms = self._cache.get(label)
+        if ms is None:
+            ms = next((self.members[s] for s in self._suffixes if label.endswith(s)), self.default_ms)
+            self._cache[label] = ms
+        return ms
+
+    def describe(self) -> dict:
+        return {"default_ms": self.default_ms, "members": self.members}
+
+
+# Modelo de latência ativo (set_latency_model); None = sem simulação
+_latency: LatencyModel | None = None
+
+
+def set_latency_model(model: LatencyModel | None) -> None:
+    """Liga (ou desliga, com None) a latência simulada das chamadas contadas."""
+    global _latency
+    _latency = model
+
+
+class Metrics:
+    """Coletor de uma execução (ou de um job do worker)."""
+
+    def __init__(self, listener=None):
+        # listener(caminho): chamado no início de cada span/etapa (eventos de progresso do worker)
+        self.listener = listener
+        self.started = time.perf_counter()
+        self.phases: dict[str, list] = {}  # caminho -> [vezes, ms]
+        self.com_calls: Counter = Counter()
+        self.com_ms: Counter = Counter()
+        self.simulated_ms = 0.0
+        self.attrs: dict = {}
+        self._stack = [_Frame("", self.started)]
+
+    def com_call(self, label: str, start: float) -> None:
+        """Uma chamada ao modelo de objetos iniciada em `start` (aplica a latência simulada, se houver)."""
+        if _latency is not None:
+            ms = _latency.cost(label)
+            if ms:
+                time.sleep(ms / 1000.0)
+                self.simulated_ms += ms
+        self.com_calls[label] += 1
+        self.com_ms[label] += (time.perf_counter() - start) * 1000.0
+
+    def _record(self, path: str, start: float, end: float) -> None:
+        entry = self.phases.setdefault(path, [0, 0.0])
+        entry[0] += 1
+        entry[1] += (end - start) * 1000.0
+
+    def _close_step(self, frame: _Frame, now: float) -> None:
+        if frame.step is not None:
+            self._record(frame.step, frame.step_start, now)
+            frame.step = None
+
+    def _parent_path(self) -> str:
+        frame = self._stack[-1]
+        return frame.step or frame.path
+
+    @contextmanager
+    def span(self, name: str):
+        parent = self._parent_path()
+        frame = _Frame(f"{parent}/{name}" if parent else name, time.perf_counter())
+        self._stack.append(frame)
+        if self.listener is not None:
+            self.listener(frame.path)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._close_step(frame, now)
+            self._stack.pop()
+            self._record(frame.path, frame.start, now)
+
+    def step(self, name: str) -> None:
+        frame = self._stack[-1]
+        now = time.perf_counter()
+        self._close_step(frame, now)
+        frame.step = f"{frame.path}/{name}" if frame.path else name
+        frame.step_start = now
+        if self.listener is not None:
+            self.listener(frame.step)
+
+    def summary(self, **extra) -> dict:
+        """Resumo JSON: ms por fase (caminho "pai/filho"), chamadas ao Excel e campos extras."""
+        now = time.perf_counter()
+        for frame in self._stack:
+            self._close_step(frame, now)
+        phases = {path: round(ms, 3) for path, (_n, ms) in self.phases.items()}
+        repeated = {path: n for path, (n, _ms) in self.phases.items() if n > 1}
+        result = {
+            "event": "metrics",
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            **{k: v for k, v in {**self.attrs, **extra}.items() if v is not None},
+            "total_ms": round((now - self.started) * 1000.0, 3),
+            "phases": phases,
+            "com_calls": {"total": sum(self.com_calls.values()), "by_member": dict(self.com_calls.most_common())},
+            "com_ms": {
+                "total": round(sum(self.com_ms.values()), 3),
+                "by_member": {label: round(ms, 3) for label, ms in self.com_ms.most_common()},
+            },
+        }
+        if _latency is not None:
+            result["com_latency"] = {**_latency.describe(), "simulated_ms": round(self.simulated_ms, 3)}
+        if repeated:
+            result["phase_counts"] = repeated
+        return result
+
+
+_active: Metrics | None = None
+
+
+def start(listener=None) -> Metrics:
+    """Ativa um coletor novo (substitui o anterior)."""
+    global _active
+    _active = Metrics(listener)
+    return _active
+
+
+def stop() -> Metrics | None:
+    """Desativa e devolve o coletor atual."""
+    global _active
+    collector, _active = _active, None
+    return collector
+
+
+def span(name: str):
+    return _active.span(name) if _active is not None else nullcontext()
+
+
+def step(name: str) -> None:
+    if _active is not None:
+        _active.step(name)
+
+
+def annotate(**attrs) -> None:
+    if _active is not None:
+        _active.attrs.update(attrs)
+
+
+def instrument(obj):
+    """Envolve a pasta num proxy que conta as chamadas ao modelo de objetos (sem coletor: devolve obj)."""
+    if _active is None or isinstance(obj, _Counting):
+        return obj
+    return _Counting(obj, _kind(obj), _active)
+
+
+def _kind(obj) -> str:
+    name = type(obj).__name__.lstrip("_")
+    if name.startswith("Memory"):
+        name = name[len("Memory"):]
+    return _KIND_ALIASES.get(name, name)
+
+
+def _api_root(label: str) -> str:
+    return label[: label.index(".api") + 4]
+
+
+def _unwrap(value):
+    return object.__getattribute__(value, "_target") if isinstance(value, _Counting) else value
+
+
+class _Counting:
+    """Proxy de contagem: propriedade lida/escrita, método chamado ou item indexado = 1 chamada (cronometrada)."""
+
+    __slots__ = ("_target", "_label", "_metrics")
+
+    def __init__(self, target, label: str, collector: Metrics):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_label", label)
+        object.__setattr__(self, "_metrics", collector)
+
+    def _wrap(self, value, label: str):
+        if type(value) in _PLAIN:
+            return value
+        return _Counting(value, label, object.__getattribute__(self, "_metrics"))
+
+    def _child_label(self, name: str, value) -> str:
+        label = object.__getattribute__(self, "_label")
+        if ".api" in label:
+            # Objetos COM crus: rótulo "<Dono>.api.<membro>"
+            return f"{_api_root(label)}.{name}"
+        if name == "api":
+            return f"{label}.api"
+        return _kind(value)
+
+    def __getattr__(self, name: str):
+        t0 = time.perf_counter()
+        target = object.__getattribute__(self, "_target")
+        value = getattr(target, name)
+        if name.startswith("_"):
+            return value
+        label = object.__getattribute__(self, "_label")
+        if isinstance(value, _ROUTINES):
+            # Método: conta na chamada, não na leitura do atributo
+            return _Counting(value, f"{label}.{name}", object.__getattribute__(self, "_metrics"))
+        object.__getattribute__(self, "_metrics").com_call(f"{label}.{name}", t0)
+        return self._wrap(value, self._child_label(name, value))
+
+    def __setattr__(self, name: str, value) -> None:
+        t0 = time.perf_counter()
+        label = object.__getattribute__(self, "_label")
+        setattr(object.__getattribute__(self, "_target"), name, _unwrap(value))
+        object.__getattribute__(self, "_metrics").com_call(f"{label}.{name}=", t0)
+
+    def __call__(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        label = object.__getattribute__(self, "_label")
+        try:
+            result = object.__getattribute__(self, "_target")(
+                *(_unwrap(a) for a in args), **{k: _unwrap(v) for k, v in kwargs.items()}
+            )
+        finally:
+            object.__getattribute__(self, "_metrics").com_call(f"{label}()", t0)
+        if ".api" in label:
+            return self._wrap(result, _api_root(label))
+        return self._wrap(result, _kind(result))
+
+    def __getitem__(self, key):
+        t0 = time.perf_counter()
+        label = object.__getattribute__(self, "_label")
+        value = object.__getattribute__(self, "_target")[key]
+        object.__getattribute__(self, "_metrics").com_call(f"{label}[]", t0)
+        return self._wrap(value, _api_root(label) if ".api" in label else _kind(value))
+
+    def __iter__(self):
+        for item in object.__getattribute__(self, "_target"):
+            yield self._wrap(item, _kind(item))
+
+    def __len__(self) -> int:
+        return len(object.__getattribute__(self, "_target"))
+
+    def __bool__(self) -> bool:
+        return bool(object.__getattribute__(self, "_target"))
+
+    def __repr__(self) -> str:
+        return f"<contado {object.__getattribute__(self, '_target')!r}>"
+
+
+class MetricsSink:
+    """Destino do resumo: uma linha JSON em stderr e/ou acrescentada a um arquivo (JSON lines)."""
+
+    def __init__(self, to_stderr: bool = False, path: str | None = None):
+        self.to_stderr = to_stderr
+        self.path = path
+
+    @property
+    def active(self) -> bool:
+        return self.to_stderr or bool(self.path)
+
+    def emit(self, summary: dict) -> None:
+        line = json.dumps(summary, ensure_ascii=False, default=str)
+        if self.to_stderr:
+            sys.stderr.write(line + "\n")
+            sys.stderr.flush()
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                sys.stderr.write(f"[PDF Export] Métricas não gravadas em {self.path}: {e}\n")
+
+
+@contextmanager
+def collecting(sink: MetricsSink | None, listener=None, **extra):
+    """
+    Coleta durante o bloco e emite o resumo no fim (mesmo com erro).
+    listener(caminho) recebe o início de cada fase. Sem sink ativo nem listener, não faz nada.
+    """
+    emit = sink is not None and sink.active
+    if not emit and listener is None:
+        yield None
+        return
+    collector = start(listener)
+    try:
+        yield collector
+    finally:
+        stop()
+        if emit:
+            sink.emit(collector.summary(**extra))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentil por posição mais próxima (nearest-rank)."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def aggregate(lines, by: str | None = None) -> dict:
+    """{grupo: {fase: {n, p50, p95, max}}} a partir de linhas JSON de métricas."""
+    samples: dict = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("event") != "metrics":
+            continue
+        group = str(record.get(by)) if by else "*"
+        phases = samples.setdefault(group, {})
+        for path, ms in (record.get("phases") or {}).items():
+            phases.setdefault(path, []).append(float(ms))
+        phases.setdefault("total", []).append(float(record.get("total_ms") or 0.0))
+        phases.setdefault("com_calls", []).append(float((record.get("com_calls") or {}).get("total") or 0))
+        if record.get("com_ms"):
+            phases.setdefault("com_ms", []).append(float(record["com_ms"].get("total") or 0.0))
+    return {
+        group: {
+            path: {
+                "n": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "max": round(max(values), 3),
+            }
+            for path, values in sorted(phases.items())
+        }
+        for group, phases in samples.items()
+    }
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="p50/p95 por fase a partir de um arquivo de métricas (JSON lines).")
+    parser.add_argument("arquivo", help="Arquivo gravado com --metrics-file")
+    parser.add_argument("--by", help="Agrupa por um campo do resumo (ex.: generator, renderer, tipoProposta)")
+    args = parser.parse_args(argv)
+    try:
+        with open(args.arquivo, "r", encoding="utf-8") as f:
+            result = aggregate(f, args.by)
+    except OSError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    for group, phases in result.items():
+        if args.by:
+            print(f"{args.by} = {group}")
+        width = max(len(path) for path in phases)
+        print(f"{'fase':<{width}}  {'n':>5}  {'p50 ms':>10}  {'p95 ms':>10}  {'max ms':>10}")
+        for path, stats in phases.items():
+            print(f"{path:<{width}}  {stats['n']:>5}  {stats['p50']:>10}  {stats['p95']:>10}  {stats['max']:>10}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,235 @@
+"""
+Modo --multi: várias propostas do mesmo modelo numa única pasta e um único ExportAsFixedFormat.
+
+As planilhas do modelo são copiadas uma vez por payload dentro da pasta aberta (ainda sem
+preenchimento); cada grupo de cópias é preenchido pela mesma lógica da execução única
+(fill_workbook: placeholders, [Valor Total], D43/D44) e a pasta inteira é exportada de uma vez.
+O PDF combinado pode ficar como está (--output) e/ou ser separado num PDF por proposta
+(--split-dir), pelas contagens de página de cada planilha (PageSetup.Pages.Count).
+
+Com --multi-compare o relatório traz também o custo de referência: um processo do gerador
+por PDF (execução única, sem cache), para comparar o custo amortizado por proposta.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import excel_watchdog
+import export_log
+import fill_and_export_pdf as gen
+import metrics
+from excel_backend import apply_session_profile, recalculate
+from pdf_tools import PdfDocument, PdfError, split_pdf
+
+# Nome de planilha do Excel: até 31 caracteres
+SHEET_NAME_MAX = 31
+_UNSAFE_FILENAME = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+
+
+class _Sheets(list):
+    """Planilhas de um grupo (índice/iteração como wb.sheets)."""
+
+
+class SheetGroup:
+    """Vista da pasta restrita às planilhas de uma proposta: é o que fill_workbook enxerga."""
+
+    def __init__(self, book, sheets: list):
+        self.book = book
+        self.sheets = _Sheets(sheets)
+
+
+def read_payloads(path: Path) -> list[dict]:
+    """Lista de payloads: array JSON, objeto JSON único ou JSON lines."""
+    text = path.read_text(encoding="utf-8")
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        parsed = [json.loads(line) for line in text.splitlines() if line.strip()]
+    payloads = [parsed] if isinstance(parsed, dict) else parsed
+    if not isinstance(payloads, list) or not all(isinstance(p, dict) for p in payloads):
+        raise ValueError("esperado um array de objetos JSON (ou JSON lines)")
+    if not payloads:
+        raise ValueError("nenhum payload")
+    return payloads
+
+
+def safe_filename(text) -> str:
+    """Texto livre (ex.: nome do cliente) como parte de nome de arquivo do Windows."""
+    return _UNSAFE_FILENAME.sub(" ", str(text or "").strip()).strip(" .")[:80]
+
+
+def output_names(payloads: list[dict], directory: Path) -> list[Path]:
+    """Um PDF por proposta: "001 - Nome do Cliente.pdf" (nomes repetidos continuam únicos pelo número)."""
+    names = []
+    for i, data in enumerate(payloads, start=1):
+        client = safe_filename(data.get("nomeCliente"))
+        names.append(directory / (f"{i:03d} - {client}.pdf" if client else f"{i:03d}.pdf"))
+    return names
+
+
+def _sheet_name(index: int, base: str) -> str:
+    prefix = f"{index:03d} "
+    return prefix + base[: SHEET_NAME_MAX - len(prefix)]
+
+
+def clone_groups(wb, count: int) -> list[list]:
+    """Copia as planilhas do modelo (ainda vazias) até haver `count` grupos; o grupo 0 é o original."""
+    base = list(wb.sheets)
+    groups = [base]
+    last = base[-1]
+    for i in range(2, count + 1):
+        group = []
+        for sheet in base:
+            last = sheet.copy(after=last, name=_sheet_name(i, sheet.name))
+            group.append(last)
+        groups.append(group)
+    return groups
+
+
+def _page_ranges(groups: list[list], total_pages: int) -> list[tuple[int, int]]:
+    """[início, fim) de páginas de cada grupo, pelas contagens de página de cada planilha."""
+    try:
+        counts = [sum(int(sheet.api.PageSetup.Pages.Count) for sheet in group) for group in groups]
+    except Exception as e:
+        gen._log(f"Contagem de páginas por planilha indisponível ({e}); dividindo o PDF em partes iguais.")
+        counts = []
+    if sum(counts) != total_pages or not all(counts):
+        if total_pages % len(groups):
+            raise PdfError(
+                f"não foi possível separar {total_pages} página(s) entre {len(groups)} propostas "
+                f"(contagens por planilha: {counts or 'indisponíveis'})"
+            )
+        counts = [total_pages // len(groups)] * len(groups)
+    ranges, start = [], 0
+    for n in counts:
+        ranges.append((start, start + n))
+        start += n
+    return ranges
+
+
+def run_multi(
+    app,
+    template_path: Path,
+    payloads: list[dict],
+    bundle_path: Path | None,
+    split_dir: Path | None,
+) -> dict:
+    """
+    Gera todas as propostas numa pasta e num único export; devolve o relatório
+    (tempos por fase em ms, páginas e custo amortizado por proposta).
+    Erros de modelo (TemplateError) sobem antes de abrir a pasta.
+    """
+    t0 = time.perf_counter()
+    prepared = []
+    with metrics.span("prepare"):
+        for data in payloads:
+            data = dict(data)
+            manifest = gen.check_template(template_path, data)
+            prepared.append((data, gen.prepare_data(data), manifest))
+    t1 = time.perf_counter()
+
+    with excel_watchdog.phase("open"), metrics.span("workbook.open"):
+        wb = app.books.open(str(template_path.resolve()))
+    t2 = time.perf_counter()
+    keep_bundle = bundle_path is not None
+    if bundle_path is None:
+        fd, tmp_name = tempfile.mkstemp(suffix=".pdf", prefix="pdf_export_multi_")
+        os.close(fd)
+        bundle_path = Path(tmp_name)
+    try:
+        with excel_watchdog.phase("fill"):
+            apply_session_profile(app)
+            with metrics.span("clone"):
+                groups = clone_groups(wb, len(prepared))
+            t3 = time.perf_counter()
+            for group, (data, totais, manifest) in zip(groups, prepared):
+                export_log.watch_payload(data)
+                gen.fill_workbook(SheetGroup(wb, group), data, totais, manifest)
+            t4 = time.perf_counter()
+            with metrics.span("recalculate"):
+                recalculate(app)
+        with excel_watchdog.phase("export"), metrics.span("export"):
+            gen.export_pdf(wb, bundle_path)
+        t5 = time.perf_counter()
+        outputs = []
+        pages = None
+        if split_dir is not None:
+            with metrics.span("split"):
+                pages = len(PdfDocument.open(bundle_path).pages)
+                ranges = _page_ranges(groups, pages)
+                outputs = output_names(payloads, split_dir)
+                split_pdf(bundle_path, ranges, outputs)
+            gen._log(f"PDF combinado separado em {len(outputs)} arquivo(s) em {split_dir}")
+        t6 = time.perf_counter()
+    finally:
+        t_close = time.perf_counter()
+        # Excel encerrado pelo watchdog: não há pasta para fechar
+        if not excel_watchdog.fired():
+            with excel_watchdog.phase("quit"), metrics.span("workbook.close"):
+                try:
+                    wb.close()
+                except Exception:
+                    pass
+        if not keep_bundle:
+            try:
+                bundle_path.unlink()
+            except OSError:
+                pass
+    t7 = time.perf_counter()
+    n = len(prepared)
+    return {
+        "proposals": n,
+        "pages": pages,
+        "bundle": str(bundle_path) if keep_bundle else None,
+        "outputs": [str(p) for p in outputs],
+        "timings": {
+            "prepare_ms": gen._ms(t0, t1),
+            "open_ms": gen._ms(t1, t2),
+            "clone_ms": gen._ms(t2, t3),
+            "fill_ms": gen._ms(t3, t4),
+            "export_ms": gen._ms(t4, t5),
+            "split_ms": gen._ms(t5, t6),
+            "close_ms": gen._ms(t_close, t7),
+            "total_ms": gen._ms(t0, t7),
+        },
+        "per_proposal_ms": round((t7 - t0) * 1000.0 / n, 2),
+    }
+
+
+def generator_command(args: list[str]) -> list[str]:
+    """Linha de comando de uma execução única do gerador (executável PyInstaller ou script)."""
+    if getattr(sys, "frozen", False):
+        return [sys.executable, *args]
+    return [sys.executable, str(Path(__file__).with_name("fill_and_export_pdf.py")), *args]
+
+
+def baseline(template_path: Path, payloads: list[dict], backend: str) -> dict:
+    """Custo de referência: um processo do gerador por PDF (sem cache), medido de ponta a ponta."""
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="pdf_export_baseline_") as tmp:
+        for i, data in enumerate(payloads, start=1):
+            data_path = Path(tmp) / f"{i}.json"
+            data_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            command = generator_command([
+                "--template", str(template_path),
+                "--data", str(data_path),
+                "--output", str(Path(tmp) / f"{i}.pdf"),
+                "--backend", backend,
+                "--no-cache",
+            ])
+            t0 = time.perf_counter()
+            result = subprocess.run(command, capture_output=True, text=True, encoding="utf-8", errors="replace")
+            samples.append((time.perf_counter() - t0) * 1000.0)
+            if result.returncode != 0:
+                raise RuntimeError(f"execução de referência {i} falhou: {result.stderr.strip()[-300:]}")
+    return {
+        "proposals": len(samples),
+        "total_ms": round(sum(samples), 2),
+        "per_proposal_ms": round(sum(samples) / len(samples), 2),
+    }
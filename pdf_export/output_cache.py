@@ -0,0 +1,194 @@
+"""
+Cache de saída endereçado por conteúdo: a mesma proposta não é exportada de novo.
+
+A chave é o SHA-256 de um JSON canônico com o hash do modelo, o payload normalizado
+(já com valorFormaPagamento e o texto da D43), a dataAtual, a versão do gerador e o
+caminho de geração (renderer / backend de preenchimento / formato de saída). Num acerto
+o arquivo guardado é copiado (ou, opcionalmente, ligado por hardlink) para --output,
+sem abrir o Excel. Cada entrada tem ao lado o SHA-256 do conteúdo (<chave>.pdf.sha256),
+conferido a cada acerto: com hardlink o PDF entregue e a entrada são o mesmo arquivo, e
+editar ou sobrescrever o PDF entregue não pode virar acerto com conteúdo errado — a entrada
+divergente é descartada e a proposta é gerada de novo.
+
+Tamanho limitado com despejo LRU: cada acerto atualiza o mtime da entrada; ao gravar,
+as entradas mais antigas saem até o total caber no limite. Estatísticas (acertos,
+faltas, gravações, despejos) ficam em stats.json na própria pasta do cache.
+
+Pasta: PDF_EXPORT_CACHE_DIR ou %TEMP%/pdf_export_cache/output (--cache-dir na linha de comando).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from template_manifest import MANIFEST_DIR
+
+OUTPUT_CACHE_DIR = Path(os.environ.get("PDF_EXPORT_CACHE_DIR") or MANIFEST_DIR.parent / "output")
+DEFAULT_MAX_MB = 256
+
+_STATS_FILE = "stats.json"
+_DIGEST_SUFFIX = ".sha256"
+_COUNTERS = ("hits", "misses", "stores", "evictions")
+
+
+def cache_key(parts: dict) -> str:
+    """SHA-256 do JSON canônico (chaves ordenadas) das partes da chave."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """Arquivos gerados por chave, com limite de tamanho (LRU por mtime) e estatísticas."""
+
+    def __init__(self, directory=None, max_mb: float = DEFAULT_MAX_MB, link: bool = False):
+        self.directory = Path(directory or OUTPUT_CACHE_DIR)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.link = link
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        return self.directory / f"{key}{suffix.lower()}"
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """
+        Copia (ou liga) a entrada para output_path; False se não houver entrada ou se o conteúdo
+        não bater com o SHA-256 gravado junto (a entrada é removida). OSError sobe para quem chamou.
+        """
+        source = self.path_for(key, output_path.suffix)
+        if not source.is_file():
+            self._bump("misses")
+            return False
+        if not self._intact(source):
+            _remove(source)
+            self._bump("misses")
+            return False
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        _place(source, output_path, self.link)
+        try:
+            os.utime(source)
+        except OSError:
+            pass
+        self._bump("hits")
+        return True
+
+    def store(self, key: str, output_path: Path) -> None:
+        """Guarda o arquivo gerado e o SHA-256 dele (escrita atômica) e aplica o limite de tamanho."""
+        if not output_path.is_file():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self.path_for(key, output_path.suffix)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        shutil.copyfile(output_path, tmp)
+        digest = _file_sha256(tmp)
+        digest_tmp = target.with_name(f"{target.name}{_DIGEST_SUFFIX}.{os.getpid()}.tmp")
+        digest_tmp.write_text(digest, encoding="ascii")
+        # O hash antes do arquivo: uma entrada nunca fica visível sem o hash que a confere
+        os.replace(digest_tmp, _digest_path(target))
+        os.replace(tmp, target)
+        evicted = self.evict(keep=target)
+        self._bump("stores", evictions=evicted)
+
+    def _intact(self, source: Path) -> bool:
+        try:
+            expected = _digest_path(source).read_text(encoding="ascii").strip()
+        except OSError:
+            return False  # entrada sem hash (gravada por versão anterior): gera de novo
+        return _file_sha256(source) == expected
+
+    def _entries(self) -> list[os.DirEntry]:
+        try:
+            return [
+                e for e in os.scandir(self.directory)
+                if e.is_file() and e.name != _STATS_FILE and not e.name.endswith((".tmp", _DIGEST_SUFFIX))
+            ]
+        except OSError:
+            return []
+
+    def evict(self, keep: Path | None = None) -> int:
+        """Remove as entradas menos usadas até o total caber em max_bytes (exceto `keep`); retorna quantas saíram."""
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()]
+        total = sum(size for _mtime, size, _path in entries)
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and Path(path) == keep:
+                continue
+            if not _remove(Path(path)):
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _read_stats(self) -> dict:
+        try:
+            stats = json.loads((self.directory / _STATS_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            stats = {}
+        return {name: int(stats.get(name, 0)) for name in _COUNTERS}
+
+    def _bump(self, counter: str, evictions: int = 0) -> None:
+        """Atualiza os contadores em stats.json (melhor esforço: falha de disco não interrompe a geração)."""
+        try:
+            stats = self._read_stats()
+            stats[counter] += 1
+            stats["evictions"] += evictions
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f"{_STATS_FILE}.{os.getpid()}.tmp"
+            tmp.write_text(json.dumps(stats), encoding="utf-8")
+            os.replace(tmp, self.directory / _STATS_FILE)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        """Contadores + ocupação atual do cache."""
+        stats = self._read_stats()
+        entries = self._entries()
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "dir": str(self.directory),
+            "entries": len(entries),
+            "bytes": sum(e.stat().st_size for e in entries),
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+        })
+        return stats
+
+
+def _digest_path(entry: Path) -> Path:
+    return entry.with_name(entry.name + _DIGEST_SUFFIX)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove(entry: Path) -> bool:
+    """Remove a entrada e o hash dela; False se a entrada não pôde ser removida."""
+    try:
+        os.remove(entry)
+    except OSError:
+        return False
+    try:
+        os.remove(_digest_path(entry))
+    except OSError:
+        pass
+    return True
+
+
+def _place(source: Path, output_path: Path, link: bool) -> None:
+    """Hardlink quando pedido e possível (mesmo volume; o hash da entrada é conferido a cada acerto); senão cópia."""
+    if link:
+        try:
+            if output_path.exists():
+                output_path.unlink()
+            os.link(source, output_path)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, output_path)
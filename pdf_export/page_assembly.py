@@ -0,0 +1,429 @@
+"""
+Montagem incremental de páginas (--assemble-pages): páginas estáticas do modelo vêm de um cache,
+só as páginas que variam por proposta passam pelo ExportAsFixedFormat.
+
+Plano do modelo (sem Excel, pelo .xlsx; cache por hash como o manifesto):
+  - cada planilha impressa é dividida em trechos pelas quebras de página MANUAIS (<rowBreaks>);
+    o trecho seguinte a uma quebra manual começa sempre numa página nova, então o que muda num
+    trecho (linha que cresce com o texto da D43, página automática a mais) não mexe nos outros;
+  - um trecho é dinâmico se tem célula preenchida pelo gerador (placeholders do manifesto,
+    D43/D44/M44/N44 na primeira planilha) ou fórmula, ou se divide uma mesclagem com um trecho
+    dinâmico. Os demais são estáticos (apresentação, termos, garantia);
+  - a planilha inteira é dinâmica com ajuste à página (fitToPage: a escala depende do conteúdo) ou
+    títulos de impressão com célula dinâmica; cabeçalho/rodapé com número de página, total de
+    páginas, data ou hora (&P, &N, &D, &T...) desliga o plano.
+
+Na geração (depois de preencher e recalcular):
+  - as páginas da pasta saem de sheet.api.HPageBreaks (a primeira linha de cada página) e são
+    atribuídas aos trechos; quebras verticais (VPageBreaks) desligam a montagem;
+  - sem o PDF das páginas estáticas no cache (por hash do modelo e qualidade do export), o export
+    é o normal, da pasta inteira, e as páginas estáticas são recortadas dele para o cache;
+  - com o cache, cada sequência de páginas dinâmicas é exportada com From/To e o PDF final é
+    montado em Python (pdf_tools.merge_pages: recursos iguais gravados uma vez). O cache só é usado
+    se cada trecho estático tiver hoje o mesmo número de páginas que tinha quando foi gravado.
+
+Modelo alterado = hash novo = plano e cache novos (os antigos deixam de ser lidos).
+Sem nenhum trecho estático (todos os modelos atuais de resources/ são uma página só, com o bloco
+do cliente), o export é o normal.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from xml.etree.ElementTree import fromstring, iterparse
+
+import metrics
+from export_log import logger
+from pdf_tools import PdfDocument, PdfError, merge_pages
+from template_manifest import FIXED_CELLS, MANIFEST_DIR, load_manifest, template_hash
+from xlsx_reader import NS_MAIN, read_row_breaks, sheet_parts, split_address
+
+PLAN_VERSION = 1
+PAGES_DIR = Path(os.environ.get("PDF_EXPORT_PAGES_DIR") or MANIFEST_DIR.parent / "pages")
+
+_M = "{%s}" % NS_MAIN
+# Códigos de cabeçalho/rodapé que mudam entre exports: página, total de páginas, data, hora
+_VARIABLE_HEADER_RE = re.compile(r"&[PNDT]")
+_REF_RE = re.compile(r"\$?([A-Za-z]{0,3})\$?(\d*)")
+
+_enabled = os.environ.get("PDF_EXPORT_ASSEMBLE_PAGES") == "1"
+_cache_dir: Path | None = None
+_memo: dict = {}
+# Modelos cuja paginação não bateu com o PDF do Excel nesta execução (export normal)
+_disabled: set[str] = set()
+
+
+def configure(enabled: bool, cache_dir=None) -> None:
+    """Liga/desliga a montagem para os exports seguintes (main, a partir de --assemble-pages)."""
+    global _enabled, _cache_dir
+    _enabled = bool(enabled)
+    _cache_dir = Path(cache_dir) if cache_dir else None
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _pages_dir() -> Path:
+    return _cache_dir or PAGES_DIR
+
+
+# ---------------------------------------------------------------------------
+# Plano do modelo
+# ---------------------------------------------------------------------------
+
+
+def _range_rows(ref: str) -> tuple[int, int, int, int] | None:
+    """'$A$1:$P$59' / '$1:$3' -> (linha1, col1, linha2, col2); colunas ausentes = 1..16384."""
+    a, _, b = ref.replace("'", "").split("!")[-1].partition(":")
+    ma, mb = _REF_RE.fullmatch(a), _REF_RE.fullmatch(b or a)
+    if ma is None or mb is None or not ma.group(2):
+        return None
+    r1, r2 = int(ma.group(2)), int(mb.group(2) or ma.group(2))
+    c1 = split_address(f"{ma.group(1)}1")[1] if ma.group(1) else 1
+    c2 = split_address(f"{mb.group(1)}1")[1] if mb.group(1) else 16384
+    return r1, c1, r2, c2
+
+
+def _workbook_info(zf: zipfile.ZipFile) -> tuple[dict, dict, set]:
+    """({planilha: área de impressão}, {planilha: (linha1, linha2) dos títulos}, {planilhas ocultas})."""
+    root = fromstring(zf.read("xl/workbook.xml"))
+    hidden = {
+        i for i, sheet in enumerate(root.iter(_M + "sheet")) if sheet.get("state") in ("hidden", "veryHidden")
+    }
+    areas, titles = {}, {}
+    for dn in root.iter(_M + "definedName"):
+        sheet_id, text = dn.get("localSheetId"), dn.text or ""
+        if sheet_id is None or not text:
+            continue
+        if dn.get("name") == "_xlnm.Print_Area":
+            area = _range_rows(text.split(",")[0])
+            if area is not None:
+                areas[int(sheet_id)] = area
+        elif dn.get("name") == "_xlnm.Print_Titles":
+            for part in text.split(","):
+                rows = _range_rows(part)
+                if rows is not None and rows[1] == 1 and rows[3] == 16384:
+                    titles[int(sheet_id)] = (rows[0], rows[2])
+    return areas, titles, hidden
+
+
+def _sheet_info(zf: zipfile.ZipFile, part: str) -> dict:
+    """Fórmulas, mesclagens, última linha, ajuste à página e cabeçalho/rodapé variável de uma planilha."""
+    formulas, merges = [], []
+    max_row = 1
+    fit = variable_header = False
+    with zf.open(part) as fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            tag = elem.tag
+            if tag == _M + "c":
+                row, _col = split_address(elem.get("r"))
+                max_row = max(max_row, row)
+                if elem.find(_M + "f") is not None:
+                    formulas.append(row)
+                elem.clear()
+            elif tag == _M + "row":
+                elem.clear()
+            elif tag == _M + "mergeCell":
+                a, _, b = elem.get("ref", "").partition(":")
+                (r1, c1), (r2, c2) = split_address(a), split_address(b or a)
+                merges.append((r1, c1, r2, c2))
+            elif tag == _M + "pageSetUpPr":
+                fit = elem.get("fitToPage") in ("1", "true")
+            elif tag in (_M + "oddHeader", _M + "oddFooter", _M + "evenHeader", _M + "evenFooter",
+                         _M + "firstHeader", _M + "firstFooter"):
+                variable_header = variable_header or bool(_VARIABLE_HEADER_RE.search(elem.text or ""))
+    return {
+        "formulas": formulas,
+        "merges": merges,
+        "max_row": max_row,
+        "fit": fit,
+        "variable_header": variable_header,
+        "breaks": read_row_breaks(zf, part),
+    }
+
+
+def compile_plan(path) -> dict:
+    """Lê o .xlsx e o manifesto (sem Excel) e classifica os trechos de cada planilha impressa."""
+    path = Path(path)
+    manifest = load_manifest(path)
+    dynamic_cells: dict[int, set] = {0: {split_address(cell) for cell in FIXED_CELLS}}
+    for positions in manifest["placeholders"].values():
+        for sheet_idx, address in positions:
+            dynamic_cells.setdefault(sheet_idx, set()).add(split_address(address))
+
+    sheets = []
+    reason = None
+    with zipfile.ZipFile(path) as zf:
+        areas, titles, hidden = _workbook_info(zf)
+        for idx, (name, part) in enumerate(sheet_parts(zf)):
+            if idx in hidden:
+                continue
+            info = _sheet_info(zf, part)
+            if info["variable_header"]:
+                reason = f"cabeçalho/rodapé com página, total de páginas, data ou hora ({name})"
+            r1, _c1, r2, _c2 = areas.get(idx) or (1, 1, info["max_row"], 16384)
+            starts = [r1] + [row for row in info["breaks"] if r1 < row <= r2]
+            bounds = [(start, (starts[i + 1] - 1) if i + 1 < len(starts) else r2) for i, start in enumerate(starts)]
+            rows = {row for row, _col in dynamic_cells.get(idx, ())} | set(info["formulas"])
+
+            def segment_of(row: int) -> int | None:
+                for i, (top, bottom) in enumerate(bounds):
+                    if top <= row <= bottom:
+                        return i
+                return None
+
+            dynamic = [any(top <= row <= bottom for row in rows) for top, bottom in bounds]
+            # Mesclagem que atravessa a quebra com parte dinâmica: os trechos dela variam juntos
+            for m1, _mc1, m2, _mc2 in info["merges"]:
+                touched = {segment_of(row) for row in (m1, m2)} - {None}
+                if len(touched) > 1 and any(dynamic[i] for i in touched):
+                    for i in range(min(touched), max(touched) + 1):
+                        dynamic[i] = True
+            title = titles.get(idx)
+            if info["fit"] or (title and any(title[0] <= row <= title[1] for row in rows)):
+                dynamic = [True] * len(bounds)
+            sheets.append({
+                "index": idx,
+                "name": name,
+                "area": [r1, r2],
+                "segments": [[top, bottom, flag] for (top, bottom), flag in zip(bounds, dynamic)],
+            })
+    static = 0 if reason else sum(1 for sheet in sheets for *_rows, flag in sheet["segments"] if not flag)
+    return {
+        "version": PLAN_VERSION,
+        "sha256": manifest["sha256"],
+        "sheets": sheets,
+        "static_segments": static,
+        "reason": reason or (None if static else "nenhum trecho sem conteúdo da proposta"),
+    }
+
+
+def load_plan(path) -> dict:
+    """Plano do modelo: memória do processo -> cache em disco (por hash) -> compilação."""
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns, str(_pages_dir()))
+    cached = _memo.get(memo_key)
+    if cached is not None:
+        return cached
+    sha = template_hash(path)
+    target = _pages_dir() / f"{sha}.plan.json"
+    plan = None
+    try:
+        plan = json.loads(target.read_text(encoding="utf-8"))
+        if plan.get("version") != PLAN_VERSION or plan.get("sha256") != sha:
+            plan = None
+    except (OSError, ValueError):
+        plan = None
+    if plan is None:
+        plan = compile_plan(path)
+        _write_atomic(target, json.dumps(plan, ensure_ascii=False).encode("utf-8"))
+    _memo[memo_key] = plan
+    return plan
+
+
+def _write_atomic(target: Path, data: bytes) -> bool:
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+        return True
+    except OSError:
+        return False  # sem cache em disco: segue sem ele
+
+
+# ---------------------------------------------------------------------------
+# Páginas da pasta preenchida
+# ---------------------------------------------------------------------------
+
+
+def page_map(wb, plan: dict) -> list[tuple[int, int]] | None:
+    """
+    (planilha, trecho) de cada página que o export vai gerar, pelas quebras do Excel depois do
+    preenchimento. None se o Excel não informar ou se houver quebras verticais.
+    """
+    pages = []
+    try:
+        for sheet in plan["sheets"]:
+            api = wb.sheets[sheet["index"]].api
+            if int(api.VPageBreaks.Count):
+                return None
+            breaks = api.HPageBreaks
+            r1, r2 = sheet["area"]
+            rows = sorted({int(breaks.Item(i).Location.Row) for i in range(1, int(breaks.Count) + 1)})
+            for start in [r1] + [row for row in rows if r1 < row <= r2]:
+                segment = next(
+                    (i for i, (top, bottom, _flag) in enumerate(sheet["segments"]) if top <= start <= bottom), None
+                )
+                if segment is None:
+                    return None
+                pages.append((sheet["index"], segment))
+    except Exception:
+        return None
+    return pages
+
+
+def _is_static(plan: dict, key: tuple[int, int]) -> bool:
+    for sheet in plan["sheets"]:
+        if sheet["index"] == key[0]:
+            return not sheet["segments"][key[1]][2]
+    return False
+
+
+def _runs(numbers: list[int]) -> list[tuple[int, int]]:
+    """[1, 2, 3, 6, 7] -> [(1, 3), (6, 7)]."""
+    runs: list[list[int]] = []
+    for n in numbers:
+        if runs and n == runs[-1][1] + 1:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return [(a, b) for a, b in runs]
+
+
+def _static_paths(sha: str, quality) -> tuple[Path, Path]:
+    base = _pages_dir() / f"{sha}.q{int(quality or 0)}"
+    return base.with_name(base.name + ".pdf"), base.with_name(base.name + ".json")
+
+
+def _load_static(sha: str, quality) -> tuple[PdfDocument, list] | None:
+    pdf_path, meta_path = _static_paths(sha, quality)
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != PLAN_VERSION or meta.get("sha256") != sha:
+            return None
+        document = PdfDocument.open(pdf_path)
+    except (OSError, ValueError):
+        return None
+    keys = [tuple(key) for key in meta.get("pages", [])]
+    if len(keys) != len(document.pages):
+        return None
+    return document, keys
+
+
+def _store_static(plan: dict, quality, pages: list[tuple[int, int]], pdf_path: str) -> int:
+    """Recorta as páginas estáticas do PDF completo recém-exportado para o cache; devolve quantas."""
+    document = PdfDocument.open(pdf_path)
+    if len(document.pages) != len(pages):
+        _disabled.add(plan["sha256"])
+        logger.warning(
+            f"Montagem de páginas desligada para o modelo {plan['sha256'][:12]}: o Excel exportou "
+            f"{len(document.pages)} página(s), as quebras indicavam {len(pages)}."
+        )
+        return 0
+    indexes = [i for i, key in enumerate(pages) if _is_static(plan, key)]
+    if not indexes:
+        return 0
+    target, meta_path = _static_paths(plan["sha256"], quality)
+    meta = {"version": PLAN_VERSION, "sha256": plan["sha256"], "pages": [list(pages[i]) for i in indexes]}
+    # PDF antes do índice: um leitor concorrente nunca vê índice novo com PDF velho
+    if _write_atomic(target, document.extract(indexes)):
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    return len(indexes)
+
+
+def _group(keys: list) -> dict[tuple[int, int], list[int]]:
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(key, []).append(i)
+    return groups
+
+
+def export(wb, template_path: Path, pdf_path: str, options: dict) -> dict | None:
+    """
+    Exporta a pasta preenchida (aberta a partir de `template_path`) para `pdf_path` montando as
+    páginas estáticas do cache com as dinâmicas exportadas agora. `options` são as do
+    ExportAsFixedFormat (Quality; From/To do perfil de saída). None: montagem não se aplica e o
+    export normal fica com quem chamou.
+    """
+    t0 = time.perf_counter()
+    plan = load_plan(template_path)
+    if not plan["static_segments"] or plan["sha256"] in _disabled:
+        metrics.annotate(page_assembly={"mode": "off", "reason": plan["reason"] or "paginação divergente"})
+        return None
+    with metrics.span("export.page_map"):
+        pages = page_map(wb, plan)
+    if pages is None:
+        metrics.annotate(page_assembly={"mode": "off", "reason": "quebras de página indisponíveis"})
+        return None
+    first, last = int(options.get("From") or 1), int(options.get("To") or len(pages))
+    pages = pages[first - 1 : last]
+    quality = options.get("Quality")
+    export_options = {k: v for k, v in options.items() if k not in ("From", "To")}
+    static_now = _group([key for key in pages if _is_static(plan, key)])
+
+    cached = _load_static(plan["sha256"], quality)
+    if cached is not None:
+        static_doc, static_keys = cached
+        stored = _group(static_keys)
+        if any(len(stored.get(key, ())) != len(indexes) for key, indexes in static_now.items()):
+            cached = None  # um trecho estático mudou de tamanho (impressora, fonte): refaz o cache
+    if cached is None or first != 1:
+        # Export completo (From/To do perfil só cortam o fim); recorta o cache dele
+        wb.api.ExportAsFixedFormat(0, pdf_path, **options)
+        stored = _store_static(plan, quality, pages, pdf_path) if first == 1 else 0
+        report = {"mode": "full", "pages": len(pages), "cached": stored, "ms": round((time.perf_counter() - t0) * 1000, 2)}
+        metrics.annotate(page_assembly=report)
+        if stored:
+            logger.info(f"Montagem de páginas: {stored} página(s) estática(s) gravada(s) no cache (export completo)")
+        return report
+
+    # Páginas dinâmicas: uma chamada ao export por sequência contígua
+    dynamic = [n for n, key in enumerate(pages, start=1) if not _is_static(plan, key)]
+    runs = _runs(dynamic)
+    sources: dict[int, tuple[PdfDocument, int]] = {}
+    tmp_dir = tempfile.mkdtemp(prefix="pdf_export_pages_")
+    try:
+        with metrics.span("export.dynamic"):
+            for a, b in runs:
+                part = os.path.join(tmp_dir, f"{a}-{b}.pdf")
+                wb.api.ExportAsFixedFormat(0, part, From=a, To=b, **export_options)
+                document = PdfDocument.open(part)
+                if len(document.pages) != b - a + 1:
+                    raise PdfError(f"export das páginas {a}-{b} gerou {len(document.pages)} página(s)")
+                for offset, n in enumerate(range(a, b + 1)):
+                    sources[n] = (document, offset)
+    except PdfError as e:
+        logger.warning(f"Montagem de páginas: {e}; exportando a pasta inteira.")
+        _disabled.add(plan["sha256"])
+        wb.api.ExportAsFixedFormat(0, pdf_path, **options)
+        metrics.annotate(page_assembly={"mode": "full", "reason": str(e)})
+        return {"mode": "full", "pages": len(pages), "cached": 0}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with metrics.span("export.merge"):
+        taken: dict[tuple[int, int], int] = {}
+        parts: list[tuple[PdfDocument, list[int]]] = []
+        for n, key in enumerate(pages, start=1):
+            if n in sources:
+                document, index = sources[n]
+            else:
+                document, index = static_doc, stored[key][taken.get(key, 0)]
+                taken[key] = taken.get(key, 0) + 1
+            if parts and parts[-1][0] is document:
+                parts[-1][1].append(index)
+            else:
+                parts.append((document, [index]))
+        Path(pdf_path).write_bytes(merge_pages(parts))
+    report = {
+        "mode": "assembled",
+        "pages": len(pages),
+        "static": len(pages) - len(dynamic),
+        "dynamic": len(dynamic),
+        "exports": len(runs),
+        "ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+    metrics.annotate(page_assembly=report)
+    logger.info(
+        f"Montagem de páginas: {report['static']} página(s) do cache + {report['dynamic']} exportada(s) "
+        f"em {len(runs)} chamada(s) ao export"
+    )
+    return report
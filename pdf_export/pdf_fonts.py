@@ -0,0 +1,467 @@
+"""
+Fontes do renderizador nativo (pdf_native): TrueType embutida com subset, ou Helvetica.
+
+As fontes dos modelos (Arial, Calibri, Cambria, Arial Black) são procuradas na pasta de
+fontes do Windows e nas pastas comuns do Linux, com substitutas métricas (Liberation,
+Carlito, Caladea) e, por fim, DejaVu. A fonte encontrada é embutida no PDF como
+CIDFontType2 (Identity-H) contendo só os glifos usados: os demais ficam com contorno
+vazio (os índices de glifo não mudam), e um ToUnicode mantém o texto copiável/pesquisável.
+Sem nenhuma TrueType disponível, cai para Helvetica / Helvetica-Bold (fontes padrão do
+PDF, não embutidas, WinAnsiEncoding).
+
+Pasta extra de fontes: variável de ambiente PDF_EXPORT_FONT_DIR.
+"""
+
+import bisect
+import hashlib
+import os
+import struct
+import unicodedata
+from pathlib import Path
+
+# Arquivos candidatos por família (minúsculas), na ordem de preferência; (negrito, itálico) -> nomes
+_ARIAL = {
+    (False, False): ["arial.ttf", "liberationsans-regular.ttf", "dejavusans.ttf"],
+    (True, False): ["arialbd.ttf", "liberationsans-bold.ttf", "dejavusans-bold.ttf"],
+    (False, True): ["ariali.ttf", "liberationsans-italic.ttf", "dejavusans-oblique.ttf"],
+    (True, True): ["arialbi.ttf", "liberationsans-bolditalic.ttf", "dejavusans-boldoblique.ttf"],
+}
+FONT_FILES = {
+    "arial": _ARIAL,
+    "calibri": {
+        (False, False): ["calibri.ttf", "carlito-regular.ttf"] + _ARIAL[(False, False)],
+        (True, False): ["calibrib.ttf", "carlito-bold.ttf"] + _ARIAL[(True, False)],
+        (False, True): ["calibrii.ttf", "carlito-italic.ttf"] + _ARIAL[(False, True)],
+        (True, True): ["calibriz.ttf", "carlito-bolditalic.ttf"] + _ARIAL[(True, True)],
+    },
+    "cambria": {
+        (False, False): ["caladea-regular.ttf", "dejavuserif.ttf"] + _ARIAL[(False, False)],
+        (True, False): ["caladea-bold.ttf", "dejavuserif-bold.ttf"] + _ARIAL[(True, False)],
+        (False, True): ["caladea-italic.ttf", "dejavuserif-italic.ttf"] + _ARIAL[(False, True)],
+        (True, True): ["caladea-bolditalic.ttf", "dejavuserif-bolditalic.ttf"] + _ARIAL[(True, True)],
+    },
+    "arial black": {
+        (False, False): ["ariblk.ttf"] + _ARIAL[(True, False)],
+        (True, False): ["ariblk.ttf"] + _ARIAL[(True, False)],
+        (False, True): ["ariblk.ttf"] + _ARIAL[(True, True)],
+        (True, True): ["ariblk.ttf"] + _ARIAL[(True, True)],
+    },
+}
+
+# Larguras (1/1000 em) da Helvetica para ASCII 32..126 (AFM padrão)
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+
+_font_index: dict[str, str] | None = None
+_ttf_cache: dict[str, "TrueTypeFont"] = {}
+
+
+def _font_dirs() -> list[Path]:
+    dirs = []
+    extra = os.environ.get("PDF_EXPORT_FONT_DIR")
+    if extra:
+        dirs.append(Path(extra))
+    windir = os.environ.get("WINDIR") or os.environ.get("SystemRoot")
+    if windir:
+        dirs.append(Path(windir) / "Fonts")
+    local = os.environ.get("LOCALAPPDATA")
+    if local:
+        dirs.append(Path(local) / "Microsoft" / "Windows" / "Fonts")
+    dirs += [
+        Path("/usr/share/fonts"),
+        Path("/usr/local/share/fonts"),
+        Path.home() / ".fonts",
+        Path.home() / ".local" / "share" / "fonts",
+        Path("/Library/Fonts"),
+    ]
+    return dirs
+
+
+def _index_fonts() -> dict[str, str]:
+    """nome do arquivo (minúsculas) -> caminho; a primeira pasta que tiver o arquivo vence."""
+    global _font_index
+    if _font_index is None:
+        index: dict[str, str] = {}
+        for base in _font_dirs():
+            if not base.is_dir():
+                continue
+            for root, _dirs, files in os.walk(base):
+                for name in files:
+                    if name.lower().endswith(".ttf"):
+                        index.setdefault(name.lower(), os.path.join(root, name))
+        _font_index = index
+    return _font_index
+
+
+def find_font_file(family: str, bold: bool = False, italic: bool = False) -> str | None:
+    """Caminho da TrueType para a família/estilo (com substitutas), ou None."""
+    index = _index_fonts()
+    candidates = FONT_FILES.get(family.lower(), _ARIAL)[(bool(bold), bool(italic))]
+    for name in candidates:
+        if name in index:
+            return index[name]
+    return None
+
+
+def font_signature(paths) -> str:
+    """Identifica um conjunto de arquivos de fonte (caminho, tamanho, mtime) para chaves de cache."""
+    h = hashlib.sha256()
+    for path in sorted(p for p in paths if p):
+        st = os.stat(path)
+        h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class TrueTypeFont:
+    """Leitura das tabelas de uma TrueType (glyf) necessárias para medir, mapear e gerar subset."""
+
+    def __init__(self, path: str):
+        self.path = path
+        data = Path(path).read_bytes()
+        self.data = data
+        if data[:4] not in (b"\x00\x01\x00\x00", b"true"):
+            raise ValueError(f"fonte não suportada (apenas TrueType com glyf): {path}")
+        num_tables = struct.unpack_from(">H", data, 4)[0]
+        self.tables: dict[str, tuple[int, int]] = {}
+        for i in range(num_tables):
+            tag, _checksum, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+            self.tables[tag.decode("latin-1")] = (offset, length)
+        if "glyf" not in self.tables or "loca" not in self.tables:
+            raise ValueError(f"fonte não suportada (sem glyf/loca): {path}")
+
+        head = self.tables["head"][0]
+        self.units_per_em = struct.unpack_from(">H", data, head + 18)[0]
+        self.bbox = struct.unpack_from(">hhhh", data, head + 36)
+        self.loca_long = struct.unpack_from(">h", data, head + 50)[0] == 1
+        hhea = self.tables["hhea"][0]
+        self.ascent, self.descent = struct.unpack_from(">hh", data, hhea + 4)
+        num_hmetrics = struct.unpack_from(">H", data, hhea + 34)[0]
+        self.num_glyphs = struct.unpack_from(">H", data, self.tables["maxp"][0] + 4)[0]
+        hmtx = self.tables["hmtx"][0]
+        advances = struct.unpack_from(">" + "Hh" * num_hmetrics, data, hmtx)[0::2]
+        last = advances[-1] if advances else 0
+        self.advances = list(advances) + [last] * (self.num_glyphs - num_hmetrics)
+        self.cap_height = self.ascent
+        if "OS/2" in self.tables:
+            os2, length = self.tables["OS/2"]
+            version = struct.unpack_from(">H", data, os2)[0]
+            if version >= 2 and length >= 90:
+                self.cap_height = struct.unpack_from(">h", data, os2 + 88)[0]
+        self.italic_angle = 0.0
+        if "post" in self.tables:
+            self.italic_angle = struct.unpack_from(">i", data, self.tables["post"][0] + 4)[0] / 65536.0
+        self.postscript_name = self._postscript_name() or Path(path).stem.replace(" ", "")
+        self._cmap_lookup = self._load_cmap()
+        self._gid_cache: dict[str, int] = {}
+        self._loca: list[int] | None = None
+
+    def _postscript_name(self) -> str | None:
+        if "name" not in self.tables:
+            return None
+        base = self.tables["name"][0]
+        count, string_offset = struct.unpack_from(">HH", self.data, base + 2)
+        for i in range(count):
+            platform, encoding, _lang, name_id, length, offset = struct.unpack_from(">HHHHHH", self.data, base + 6 + 12 * i)
+            if name_id != 6:
+                continue
+            raw = self.data[base + string_offset + offset: base + string_offset + offset + length]
+            if platform in (0, 3):
+                return raw.decode("utf-16-be", "ignore")
+            if platform == 1 and encoding == 0:
+                return raw.decode("latin-1")
+        return None
+
+    def _load_cmap(self):
+        """Função code point -> glifo a partir da subtabela Unicode (formato 12 ou 4)."""
+        data = self.data
+        base = self.tables["cmap"][0]
+        count = struct.unpack_from(">H", data, base + 2)[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack_from(">HHI", data, base + 4 + 8 * i)
+            subtables[(platform, encoding)] = base + offset
+        for key in ((3, 10), (0, 4), (0, 6)):
+            if key in subtables and struct.unpack_from(">H", data, subtables[key])[0] == 12:
+                return self._cmap12(subtables[key])
+        for key in ((3, 1), (0, 3), (0, 1), (0, 0)):
+            if key in subtables and struct.unpack_from(">H", data, subtables[key])[0] == 4:
+                return self._cmap4(subtables[key])
+        raise ValueError(f"fonte sem cmap Unicode: {self.path}")
+
+    def _cmap4(self, offset: int):
+        data = self.data
+        seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+        ends = struct.unpack_from(">%dH" % seg_count, data, offset + 14)
+        starts_at = offset + 16 + 2 * seg_count
+        starts = struct.unpack_from(">%dH" % seg_count, data, starts_at)
+        deltas = struct.unpack_from(">%dh" % seg_count, data, starts_at + 2 * seg_count)
+        range_at = starts_at + 4 * seg_count
+        ranges = struct.unpack_from(">%dH" % seg_count, data, range_at)
+
+        def lookup(code: int) -> int:
+            i = bisect.bisect_left(ends, code)
+            if i >= seg_count or starts[i] > code:
+                return 0
+            if ranges[i] == 0:
+                return (code + deltas[i]) & 0xFFFF
+            at = range_at + 2 * i + ranges[i] + 2 * (code - starts[i])
+            gid = struct.unpack_from(">H", data, at)[0]
+            return (gid + deltas[i]) & 0xFFFF if gid else 0
+
+        return lookup
+
+    def _cmap12(self, offset: int):
+        data = self.data
+        n = struct.unpack_from(">I", data, offset + 12)[0]
+        groups = [struct.unpack_from(">III", data, offset + 16 + 12 * i) for i in range(n)]
+        ends = [g[1] for g in groups]
+
+        def lookup(code: int) -> int:
+            i = bisect.bisect_left(ends, code)
+            if i >= n or groups[i][0] > code:
+                return 0
+            return groups[i][2] + code - groups[i][0]
+
+        return lookup
+
+    def glyph(self, ch: str) -> int:
+        gid = self._gid_cache.get(ch)
+        if gid is None:
+            gid = self._gid_cache[ch] = self._cmap_lookup(ord(ch))
+        return gid
+
+    def _glyph_offsets(self) -> list[int]:
+        if self._loca is None:
+            offset, length = self.tables["loca"]
+            n = self.num_glyphs + 1
+            if self.loca_long:
+                self._loca = list(struct.unpack_from(">%dI" % n, self.data, offset))
+            else:
+                self._loca = [v * 2 for v in struct.unpack_from(">%dH" % n, self.data, offset)]
+        return self._loca
+
+    def _components(self, gid: int) -> list[int]:
+        """Glifos referenciados por um glifo composto."""
+        loca = self._glyph_offsets()
+        start = self.tables["glyf"][0] + loca[gid]
+        if loca[gid + 1] - loca[gid] < 10 or struct.unpack_from(">h", self.data, start)[0] >= 0:
+            return []
+        result = []
+        pos = start + 10
+        while True:
+            flags, component = struct.unpack_from(">HH", self.data, pos)
+            result.append(component)
+            pos += 4 + (4 if flags & 0x0001 else 2)
+            if flags & 0x0008:
+                pos += 2
+            elif flags & 0x0040:
+                pos += 4
+            elif flags & 0x0080:
+                pos += 8
+            if not flags & 0x0020:
+                return result
+
+    def subset(self, gids) -> bytes:
+        """TrueType com o contorno só dos glifos usados (mesmos índices; loca longa)."""
+        loca = self._glyph_offsets()
+        keep = {0}
+        pending = [g for g in gids if 0 <= g < self.num_glyphs]
+        while pending:
+            gid = pending.pop()
+            if gid in keep and gid != 0:
+                continue
+            keep.add(gid)
+            pending.extend(c for c in self._components(gid) if c not in keep)
+
+        glyf_base = self.tables["glyf"][0]
+        glyf = bytearray()
+        new_loca = []
+        for gid in range(self.num_glyphs):
+            new_loca.append(len(glyf))
+            if gid in keep:
+                glyf += self.data[glyf_base + loca[gid]: glyf_base + loca[gid + 1]]
+                glyf += b"\0" * (-len(glyf) % 4)
+        new_loca.append(len(glyf))
+
+        head_off, head_len = self.tables["head"]
+        head = bytearray(self.data[head_off: head_off + head_len])
+        struct.pack_into(">I", head, 8, 0)
+        struct.pack_into(">h", head, 50, 1)
+        tables = {
+            "head": bytes(head),
+            "loca": struct.pack(">%dI" % len(new_loca), *new_loca),
+            "glyf": bytes(glyf),
+        }
+        for tag in ("hhea", "maxp", "hmtx", "cvt ", "fpgm", "prep"):
+            if tag in self.tables:
+                offset, length = self.tables[tag]
+                tables[tag] = self.data[offset: offset + length]
+        return _build_sfnt(tables)
+
+
+def _checksum(data: bytes) -> int:
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(">%dI" % (len(data) // 4), data)) & 0xFFFFFFFF
+
+
+def _build_sfnt(tables: dict[str, bytes]) -> bytes:
+    tags = sorted(tables)
+    n = len(tags)
+    entry_selector = max(n.bit_length() - 1, 0)
+    search_range = (1 << entry_selector) * 16
+    out = bytearray(struct.pack(">IHHHH", 0x00010000, n, search_range, entry_selector, n * 16 - search_range))
+    offset = 12 + 16 * n
+    body = bytearray()
+    head_at = 0
+    for tag in tags:
+        data = tables[tag]
+        if tag == "head":
+            head_at = offset + len(body)
+        out += struct.pack(">4sIII", tag.encode("latin-1"), _checksum(data), offset + len(body), len(data))
+        body += data + b"\0" * (-len(data) % 4)
+    font = out + body
+    adjustment = (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF
+    struct.pack_into(">I", font, head_at + 8, adjustment)
+    return bytes(font)
+
+
+def load_truetype(path: str) -> TrueTypeFont:
+    """TrueTypeFont com cache em processo (modo --serve reaproveita a leitura e o cmap)."""
+    font = _ttf_cache.get(path)
+    if font is None:
+        font = _ttf_cache[path] = TrueTypeFont(path)
+    return font
+
+
+class EmbeddedFont:
+    """Uma face TrueType usada num PDF: mede texto, registra glifos e gera os objetos (Type0/Identity-H)."""
+
+    def __init__(self, ttf: TrueTypeFont):
+        self.ttf = ttf
+        self.scale = 1000.0 / ttf.units_per_em
+        self.ascent = ttf.ascent * self.scale
+        self.descent = ttf.descent * self.scale
+        self.used: dict[int, str] = {}
+        self._widths: dict[str, float] = {}
+
+    def width(self, text: str) -> float:
+        """Largura do texto em 1/1000 em."""
+        total = 0.0
+        widths = self._widths
+        for ch in text:
+            w = widths.get(ch)
+            if w is None:
+                w = widths[ch] = self.ttf.advances[self.ttf.glyph(ch)] * self.scale
+            total += w
+        return total
+
+    def encode(self, text: str) -> str:
+        """Texto -> string hexadecimal <...> com os índices de glifo (e registra os glifos usados)."""
+        parts = []
+        for ch in text:
+            gid = self.ttf.glyph(ch)
+            if gid not in self.used:
+                self.used[gid] = ch
+            parts.append("%04X" % gid)
+        return "<" + "".join(parts) + ">"
+
+    def write(self, writer) -> int:
+        """Grava fonte, descritor, CIDFont e ToUnicode; devolve o número do objeto Type0."""
+        ttf = self.ttf
+        gids = sorted(self.used)
+        tag = "".join(chr(65 + b % 26) for b in hashlib.sha1(repr(gids).encode()).digest()[:6])
+        base_font = f"{tag}+{ttf.postscript_name}"
+        font_file = ttf.subset(gids)
+        file_ref = writer.add_stream(f"/Length1 {len(font_file)}", font_file)
+        flags = 32 | (64 if ttf.italic_angle else 0)
+        bbox = " ".join(str(round(v * self.scale)) for v in ttf.bbox)
+        descriptor = writer.add(
+            f"<< /Type /FontDescriptor /FontName /{base_font} /Flags {flags} /FontBBox [{bbox}] "
+            f"/ItalicAngle {ttf.italic_angle:g} /Ascent {round(self.ascent)} /Descent {round(self.descent)} "
+            f"/CapHeight {round(ttf.cap_height * self.scale)} /StemV 80 /FontFile2 {file_ref} 0 R >>"
+        )
+        widths = " ".join(f"{gid} [{round(ttf.advances[gid] * self.scale)}]" for gid in gids)
+        cid_font = writer.add(
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{base_font} "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor} 0 R /W [{widths}] /CIDToGIDMap /Identity >>"
+        )
+        to_unicode = writer.add_stream("", _to_unicode_cmap(self.used).encode("ascii"))
+        return writer.add(
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H "
+            f"/DescendantFonts [{cid_font} 0 R] /ToUnicode {to_unicode} 0 R >>"
+        )
+
+
+def _to_unicode_cmap(used: dict[int, str]) -> str:
+    lines = [
+        "/CIDInit /ProcSet findresource begin",
+        "12 dict begin",
+        "begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def",
+        "/CMapType 2 def",
+        "1 begincodespacerange",
+        "<0000> <FFFF>",
+        "endcodespacerange",
+    ]
+    items = sorted(used.items())
+    for i in range(0, len(items), 100):
+        chunk = items[i: i + 100]
+        lines.append(f"{len(chunk)} beginbfchar")
+        for gid, ch in chunk:
+            lines.append("<%04X> <%s>" % (gid, ch.encode("utf-16-be").hex().upper()))
+        lines.append("endbfchar")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    return "\n".join(lines)
+
+
+class StandardFont:
+    """Helvetica / Helvetica-Bold (não embutida, WinAnsiEncoding) — reserva sem TrueType disponível."""
+
+    ascent = 718.0
+    descent = -207.0
+
+    def __init__(self, bold: bool = False):
+        self.base_font = "Helvetica-Bold" if bold else "Helvetica"
+        self._table = _HELVETICA_BOLD_WIDTHS if bold else _HELVETICA_WIDTHS
+        self._widths: dict[str, float] = {}
+
+    def _char_width(self, ch: str) -> float:
+        code = ord(ch)
+        if 32 <= code <= 126:
+            return self._table[code - 32]
+        base = unicodedata.normalize("NFD", ch)[:1]
+        if base and 32 <= ord(base) <= 126:
+            return self._table[ord(base) - 32]
+        return 556.0
+
+    def width(self, text: str) -> float:
+        total = 0.0
+        for ch in text:
+            w = self._widths.get(ch)
+            if w is None:
+                w = self._widths[ch] = self._char_width(ch)
+            total += w
+        return total
+
+    def encode(self, text: str) -> str:
+        raw = text.encode("cp1252", "replace")
+        return "(" + raw.decode("latin-1").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+    def write(self, writer) -> int:
+        return writer.add(f"<< /Type /Font /Subtype /Type1 /BaseFont /{self.base_font} /Encoding /WinAnsiEncoding >>")
@@ -0,0 +1,1216 @@
+"""
+Renderizador nativo de PDF (--renderer native): desenha a proposta sem Excel.
+
+O modelo .xlsx é compilado uma vez num layout (geometria da área de impressão,
+larguras de coluna/alturas de linha, estilos de célula resolvidos, mesclagens,
+textos e rich text do modelo, configuração de página e imagens já decodificadas),
+guardado em cache pelo SHA-256 do modelo. Na geração, a pasta preenchida em memória
+(excel_backend.MemoryBook + fill_workbook, a mesma lógica do caminho COM) é desenhada
+direto em PDF: preenchimentos, bordas, texto com quebra de linha e trechos em negrito,
+e o logo/ícones como XObjects (PNG com transparência vira imagem + SMask).
+
+Fontes: TrueType embutida com subset (pdf_fonts); sem TrueType, Helvetica.
+
+Medição / comparação (Linux, sem Excel):
+  python pdf_native.py modelo.xlsx dados.json saida.pdf [--repeat N] [--excel]
+"""
+
+import base64
+import colorsys
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import zipfile
+import zlib
+from pathlib import Path
+from xml.etree.ElementTree import fromstring
+
+import rich_text
+from pdf_fonts import EmbeddedFont, StandardFont, find_font_file, load_truetype
+from template_manifest import MANIFEST_DIR, template_hash
+from xlsx_reader import NS_MAIN, NS_PKG_REL, NS_REL, decode_ooxml_text, sheet_parts, split_address
+
+LAYOUT_VERSION = 1
+
+# Cache dos layouts compilados (um arquivo por hash de modelo)
+LAYOUT_DIR = MANIFEST_DIR.parent / "native"
+
+_M = "{%s}" % NS_MAIN
+_XDR = "{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_R = "{%s}" % NS_REL
+_PR = "{%s}" % NS_PKG_REL
+
+# Tamanhos de papel (pontos) por paperSize do Excel
+PAPER_SIZES = {1: (612.0, 792.0), 5: (612.0, 1008.0), 8: (841.89, 1190.55), 9: (595.28, 841.89), 11: (419.53, 595.28)}
+
+# Largura máxima de dígito (px a 96 dpi) da fonte padrão dos modelos (Arial 10 / Calibri 11)
+MAX_DIGIT_WIDTH = 7
+EMU_PER_POINT = 12700
+
+# Espaçamento do texto dentro da célula e entre linhas
+CELL_PADDING = 2.0
+LINE_SPACING = 1.2
+
+# Bordas: espessura (pt, antes da escala de impressão), padrão de traço e peso para resolver conflitos
+BORDER_STYLES = {
+    "hair": (0.4, "[1 1] 0", 1),
+    "thin": (0.75, "", 2),
+    "dotted": (0.75, "[1 1] 0", 2),
+    "dashed": (0.75, "[3 1] 0", 2),
+    "dashDot": (0.75, "[3 1 1 1] 0", 2),
+    "dashDotDot": (0.75, "[3 1 1 1 1 1] 0", 2),
+    "medium": (1.5, "", 3),
+    "mediumDashed": (1.5, "[4 2] 0", 3),
+    "mediumDashDot": (1.5, "[4 2 1 2] 0", 3),
+    "mediumDashDotDot": (1.5, "[4 2 1 2 1 2] 0", 3),
+    "slantDashDot": (1.5, "[4 2 1 2] 0", 3),
+    "double": (0.6, "", 4),
+    "thick": (2.25, "", 5),
+}
+
+# Paleta indexada padrão do Excel (0-63; 64 = cor do sistema para texto, 65 = fundo)
+INDEXED_COLORS = (
+    "000000 FFFFFF FF0000 00FF00 0000FF FFFF00 FF00FF 00FFFF "
+    "000000 FFFFFF FF0000 00FF00 0000FF FFFF00 FF00FF 00FFFF "
+    "800000 008000 000080 808000 800080 008080 C0C0C0 808080 "
+    "9999FF 993366 FFFFCC CCFFFF 660066 FF8080 0066CC CCCCFF "
+    "000080 FF00FF FFFF00 00FFFF 800080 800000 008080 0000FF "
+    "00CCFF CCFFFF CCFFCC FFFF99 99CCFF FF99CC CC99FF FFCC99 "
+    "3366FF 33CCCC 99CC00 FFCC00 FF9900 FF6600 666699 969696 "
+    "003366 339966 003300 333300 993300 993366 333399 333333 "
+    "000000 FFFFFF"
+).split()
+
+_memo: dict = {}
+
+
+# ---------------------------------------------------------------------------
+# Compilação do layout (a partir do .xlsx, sem Excel)
+# ---------------------------------------------------------------------------
+
+
+def _rgb(hex_color: str) -> list[float]:
+    hex_color = hex_color[-6:]
+    return [round(int(hex_color[i: i + 2], 16) / 255.0, 4) for i in (0, 2, 4)]
+
+
+def _tinted(rgb: list[float], tint: float) -> list[float]:
+    if not tint:
+        return rgb
+    h, l, s = colorsys.rgb_to_hls(*rgb)
+    l = l * (1 + tint) if tint < 0 else l * (1 - tint) + tint
+    return [round(v, 4) for v in colorsys.hls_to_rgb(h, l, s)]
+
+
+def _theme_colors(zf: zipfile.ZipFile) -> list[str]:
+    """Cores do tema na ordem do atributo theme= (lt1, dk1, lt2, dk2, accent1..6, hlink, folHlink)."""
+    try:
+        root = fromstring(zf.read("xl/theme/theme1.xml"))
+    except KeyError:
+        return []
+    scheme = root.find(f".//{_A}clrScheme")
+    if scheme is None:
+        return []
+    colors = []
+    for child in scheme:
+        value = "000000"
+        for c in child:
+            value = c.get("lastClr") or c.get("val") or value
+        colors.append(value)
+    if len(colors) >= 4:
+        colors[0], colors[1], colors[2], colors[3] = colors[1], colors[0], colors[3], colors[2]
+    return colors
+
+
+def _color(elem, theme: list[str], indexed: list[str], default=None):
+    """Elemento <color>/<fgColor> -> [r, g, b] (0..1) ou default (automático)."""
+    if elem is None or elem.get("auto") == "1":
+        return default
+    rgb = None
+    if elem.get("rgb"):
+        rgb = _rgb(elem.get("rgb"))
+    elif elem.get("theme") is not None:
+        i = int(elem.get("theme"))
+        if i < len(theme):
+            rgb = _rgb(theme[i])
+    elif elem.get("indexed") is not None:
+        i = int(elem.get("indexed"))
+        if i < len(indexed):
+            rgb = _rgb(indexed[i])
+    if rgb is None:
+        return default
+    return _tinted(rgb, float(elem.get("tint", "0") or 0))
+
+
+def _flag(elem, tag: str) -> bool:
+    child = elem.find(_M + tag)
+    return child is not None and child.get("val", "1") not in ("0", "false", "none")
+
+
+def _font_spec(elem, theme, indexed, base=None) -> list:
+    """<font>/<rPr> -> [família, tamanho, negrito, itálico, sublinhado, cor]; campos ausentes vêm de base."""
+    base = base or ["Arial", 10.0, False, False, False, [0.0, 0.0, 0.0]]
+    name = elem.find(_M + "name")
+    if name is None:
+        name = elem.find(_M + "rFont")
+    size = elem.find(_M + "sz")
+    color = elem.find(_M + "color")
+    return [
+        name.get("val") if name is not None else base[0],
+        float(size.get("val")) if size is not None else base[1],
+        _flag(elem, "b") if elem.find(_M + "b") is not None else base[2],
+        _flag(elem, "i") if elem.find(_M + "i") is not None else base[3],
+        _flag(elem, "u") if elem.find(_M + "u") is not None else base[4],
+        _color(color, theme, indexed, [0.0, 0.0, 0.0]) if color is not None else base[5],
+    ]
+
+
+def _children(root, tag: str) -> list:
+    elem = root.find(_M + tag)
+    return list(elem) if elem is not None else []
+
+
+def _read_styles(zf: zipfile.ZipFile) -> tuple:
+    """cellXfs resolvidos: fonte, preenchimento, bordas, alinhamento e formato de número."""
+    theme = _theme_colors(zf)
+    root = fromstring(zf.read("xl/styles.xml"))
+    indexed = list(INDEXED_COLORS)
+    custom = root.find(f"{_M}colors/{_M}indexedColors")
+    if custom is not None:
+        for i, c in enumerate(custom):
+            if i < len(indexed):
+                indexed[i] = c.get("rgb", indexed[i])
+    num_fmts = {int(n.get("numFmtId")): n.get("formatCode", "General") for n in root.iter(_M + "numFmt")}
+    fonts = [_font_spec(f, theme, indexed) for f in _children(root, "fonts")]
+    fills = []
+    for fill in _children(root, "fills"):
+        pattern = fill.find(_M + "patternFill")
+        color = None
+        if pattern is not None and pattern.get("patternType") == "solid":
+            color = _color(pattern.find(_M + "fgColor"), theme, indexed, [1.0, 1.0, 1.0])
+        fills.append(color)
+    borders = []
+    for border in _children(root, "borders"):
+        sides = {}
+        for side, key in (("left", "l"), ("right", "r"), ("top", "t"), ("bottom", "b")):
+            elem = border.find(_M + side)
+            if elem is not None and elem.get("style") in BORDER_STYLES:
+                sides[key] = [elem.get("style"), _color(elem.find(_M + "color"), theme, indexed, [0.0, 0.0, 0.0])]
+        borders.append(sides)
+    styles = []
+    for xf in _children(root, "cellXfs"):
+        align = xf.find(_M + "alignment")
+        font_id = int(xf.get("fontId", 0))
+        fill_id = int(xf.get("fillId", 0))
+        border_id = int(xf.get("borderId", 0))
+        fmt_id = int(xf.get("numFmtId", 0))
+        styles.append({
+            "font": fonts[font_id] if font_id < len(fonts) else fonts[0],
+            "fill": fills[fill_id] if fill_id < len(fills) else None,
+            "borders": borders[border_id] if border_id < len(borders) else {},
+            "h": align.get("horizontal", "general") if align is not None else "general",
+            "v": align.get("vertical", "bottom") if align is not None else "bottom",
+            "wrap": align is not None and align.get("wrapText") in ("1", "true"),
+            "indent": int(align.get("indent", 0)) if align is not None else 0,
+            "fmt": num_fmts.get(fmt_id, BUILTIN_FORMATS.get(fmt_id, "General")),
+        })
+    return styles, fonts, theme, indexed
+
+
+BUILTIN_FORMATS = {0: "General", 1: "0", 2: "0.00", 3: "#,##0", 4: "#,##0.00", 9: "0%", 10: "0.00%", 49: "@"}
+
+
+def _read_shared_strings(zf: zipfile.ZipFile) -> list:
+    """Strings compartilhadas: texto simples, ou [[texto, fonte ou None], ...] quando há rich text."""
+    try:
+        root = fromstring(zf.read("xl/sharedStrings.xml"))
+    except KeyError:
+        return []
+    result = []
+    for si in root.iter(_M + "si"):
+        runs = si.findall(_M + "r")
+        if not runs:
+            result.append("".join(t.text or "" for t in si.iter(_M + "t")))
+            continue
+        items = []
+        for r in runs:
+            t = r.find(_M + "t")
+            rpr = r.find(_M + "rPr")
+            items.append([decode_ooxml_text(t.text or "") if t is not None else "", rpr])
+        result.append(items)
+    return result
+
+
+def _print_area(zf: zipfile.ZipFile, sheet_name: str):
+    """(linha1, col1, linha2, col2) da área de impressão da primeira planilha, ou None."""
+    root = fromstring(zf.read("xl/workbook.xml"))
+    for dn in root.iter(_M + "definedName"):
+        if dn.get("name") == "_xlnm.Print_Area" and dn.get("localSheetId", "0") == "0" and dn.text:
+            ref = dn.text.split(",")[0].split("!")[-1].replace("$", "")
+            if ":" in ref:
+                a, b = ref.split(":")
+                r1, c1 = split_address(a)
+                r2, c2 = split_address(b)
+                return r1, c1, r2, c2
+    return None
+
+
+def _rels(zf: zipfile.ZipFile, part: str) -> dict[str, str]:
+    """Relacionamentos de uma parte do zip: Id -> caminho absoluto no zip."""
+    folder, name = part.rsplit("/", 1)
+    try:
+        root = fromstring(zf.read(f"{folder}/_rels/{name}.rels"))
+    except KeyError:
+        return {}
+    result = {}
+    for rel in root.iter(_PR + "Relationship"):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            path = target[1:]
+        else:
+            parts = folder.split("/")
+            for piece in target.split("/"):
+                if piece == "..":
+                    parts.pop()
+                elif piece != ".":
+                    parts.append(piece)
+            path = "/".join(parts)
+        result[rel.get("Id")] = path
+    return result
+
+
+def _png_image(data: bytes) -> dict:
+    """Decodifica PNG (8 bits, sem entrelaçamento) em RGB + alfa, já comprimidos para o PDF."""
+    width, height, depth, color_type, _c, _f, interlace = struct.unpack(">IIBBBBB", data[16:29])
+    if interlace:
+        raise ValueError("PNG entrelaçado não suportado")
+    pos = 8
+    idat = bytearray()
+    palette = b""
+    transparency = b""
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos: pos + 8])
+        chunk = data[pos + 8: pos + 8 + length]
+        if kind == b"IDAT":
+            idat += chunk
+        elif kind == b"PLTE":
+            palette = chunk
+        elif kind == b"tRNS":
+            transparency = chunk
+        pos += 12 + length
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    if depth == 16:
+        bpp = channels * 2
+    elif depth == 8:
+        bpp = channels
+    elif color_type in (0, 3):
+        bpp = 1
+    else:
+        raise ValueError(f"PNG com profundidade {depth} não suportado")
+    stride = (width * channels * depth + 7) // 8
+    raw = _unfilter(zlib.decompress(bytes(idat)), stride, height, bpp)
+    if depth == 16:
+        raw = raw[0::2]
+    elif depth < 8:
+        raw = _unpack_bits(raw, width, height, depth, stride)
+        if color_type == 0:
+            scale = 255 // ((1 << depth) - 1)
+            raw = bytes(v * scale for v in raw)
+    alpha = None
+    if color_type == 6:
+        rgb = bytearray(width * height * 3)
+        for i in range(3):
+            rgb[i::3] = raw[i::4]
+        alpha = bytes(raw[3::4])
+        gray = False
+    elif color_type == 4:
+        rgb, alpha, gray = bytes(raw[0::2]), bytes(raw[1::2]), True
+    elif color_type == 3:
+        lookup = [palette[i * 3: i * 3 + 3] for i in range(len(palette) // 3)]
+        rgb = b"".join(lookup[v] if v < len(lookup) else b"\0\0\0" for v in raw)
+        if transparency:
+            table = bytes(transparency) + b"\xff" * (256 - len(transparency))
+            alpha = bytes(table[v] for v in raw)
+        gray = False
+    else:
+        rgb, gray = bytes(raw), color_type == 0
+    if alpha is not None and alpha.count(255) == len(alpha):
+        alpha = None
+    return {
+        "w": width,
+        "h": height,
+        "cs": "DeviceGray" if gray else "DeviceRGB",
+        "filter": "FlateDecode",
+        "data": base64.b64encode(zlib.compress(bytes(rgb), 9)).decode("ascii"),
+        "alpha": base64.b64encode(zlib.compress(alpha, 9)).decode("ascii") if alpha is not None else None,
+    }
+
+
+def _unfilter(data: bytes, stride: int, height: int, bpp: int) -> bytearray:
+    """Desfaz os filtros de linha do PNG (None, Sub, Up, Average, Paeth)."""
+    out = bytearray(stride * height)
+    prev = bytearray(stride)
+    pos = 0
+    for y in range(height):
+        kind = data[pos]
+        line = bytearray(data[pos + 1: pos + 1 + stride])
+        pos += stride + 1
+        if kind == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif kind == 2:
+            line = bytearray((a + b) & 0xFF for a, b in zip(line, prev))
+        elif kind == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif kind == 4:
+            for i in range(stride):
+                a = line[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                line[i] = (line[i] + pred) & 0xFF
+        out[y * stride: (y + 1) * stride] = line
+        prev = line
+    return out
+
+
+def _unpack_bits(raw: bytes, width: int, height: int, depth: int, stride: int) -> bytes:
+    mask = (1 << depth) - 1
+    out = bytearray()
+    for y in range(height):
+        row = raw[y * stride: (y + 1) * stride]
+        for x in range(width):
+            bit = x * depth
+            out.append((row[bit // 8] >> (8 - depth - bit % 8)) & mask)
+    return bytes(out)
+
+
+def _jpeg_image(data: bytes) -> dict:
+    """JPEG vai direto para o PDF (DCTDecode); só lê dimensões e componentes."""
+    pos = 2
+    while pos < len(data):
+        marker, length = struct.unpack(">HH", data[pos: pos + 4])
+        if marker in (0xFFC0, 0xFFC1, 0xFFC2):
+            height, width, comps = struct.unpack(">HHB", data[pos + 5: pos + 10])
+            return {
+                "w": width,
+                "h": height,
+                "cs": {1: "DeviceGray", 4: "DeviceCMYK"}.get(comps, "DeviceRGB"),
+                "filter": "DCTDecode",
+                "data": base64.b64encode(data).decode("ascii"),
+                "alpha": None,
+            }
+        pos += 2 + length
+    raise ValueError("JPEG sem cabeçalho SOF")
+
+
+def _read_images(zf: zipfile.ZipFile, sheet_part: str, sheet_root, col_x, row_y, area) -> tuple[list, dict]:
+    """Imagens ancoradas na planilha: posições (pt, relativas à área) e dados decodificados por hash."""
+    placements, images = [], {}
+    drawing = sheet_root.find(_M + "drawing")
+    if drawing is None:
+        return placements, images
+    drawing_part = _rels(zf, sheet_part).get(drawing.get(_R + "id"))
+    if not drawing_part:
+        return placements, images
+    media = _rels(zf, drawing_part)
+    root = fromstring(zf.read(drawing_part))
+    r1, c1, r2, c2 = area
+
+    def anchor_point(elem):
+        col = int(elem.find(_XDR + "col").text) + 1
+        row = int(elem.find(_XDR + "row").text) + 1
+        x = col_x(col) + int(elem.find(_XDR + "colOff").text) / EMU_PER_POINT
+        y = row_y(row) + int(elem.find(_XDR + "rowOff").text) / EMU_PER_POINT
+        return x, y
+
+    for anchor in root:
+        pic = anchor.find(_XDR + "pic")
+        if pic is None:
+            continue
+        blip = pic.find(f".//{_A}blip")
+        target = media.get(blip.get(_R + "embed")) if blip is not None else None
+        if not target:
+            continue
+        ext = pic.find(f"{_XDR}spPr/{_A}xfrm/{_A}ext")
+        kind = anchor.tag.replace(_XDR, "")
+        if kind == "absoluteAnchor":
+            pos = anchor.find(_XDR + "pos")
+            x0, y0 = int(pos.get("x")) / EMU_PER_POINT - col_x(c1), int(pos.get("y")) / EMU_PER_POINT - row_y(r1)
+        else:
+            x0, y0 = anchor_point(anchor.find(_XDR + "from"))
+        if kind == "twoCellAnchor" and anchor.get("editAs", "twoCell") == "twoCell":
+            x1, y1 = anchor_point(anchor.find(_XDR + "to"))
+            w, h = x1 - x0, y1 - y0
+        elif ext is not None:
+            w, h = int(ext.get("cx")) / EMU_PER_POINT, int(ext.get("cy")) / EMU_PER_POINT
+        else:
+            x1, y1 = anchor_point(anchor.find(_XDR + "to"))
+            w, h = x1 - x0, y1 - y0
+        raw = zf.read(target)
+        key = hashlib.sha256(raw).hexdigest()
+        if key not in images:
+            try:
+                images[key] = _png_image(raw) if raw[:8] == b"\x89PNG\r\n\x1a\n" else _jpeg_image(raw)
+            except (ValueError, KeyError, struct.error, zlib.error) as e:
+                print(f"Aviso: imagem {target} ignorada no PDF nativo: {e}", file=sys.stderr)
+                continue
+        placements.append({"key": key, "x": round(x0, 3), "y": round(y0, 3), "w": round(w, 3), "h": round(h, 3)})
+    return placements, images
+
+
+def compile_layout(path) -> dict:
+    """Lê o .xlsx (sem Excel) e monta o layout da primeira planilha para o renderizador nativo."""
+    path = Path(path)
+    with zipfile.ZipFile(path) as zf:
+        styles, _fonts, theme, indexed = _read_styles(zf)
+        shared = _read_shared_strings(zf)
+        sheet_name, sheet_part = sheet_parts(zf)[0]
+        root = fromstring(zf.read(sheet_part))
+
+        fmt = root.find(_M + "sheetFormatPr")
+        default_width = float(fmt.get("defaultColWidth", 8.43)) if fmt is not None else 8.43
+        default_height = float(fmt.get("defaultRowHeight", 12.75)) if fmt is not None else 12.75
+        col_widths, col_styles = {}, {}
+        for col in root.iter(_M + "col"):
+            width = 0.0 if col.get("hidden") in ("1", "true") else float(col.get("width", default_width))
+            for c in range(int(col.get("min")), min(int(col.get("max")), 16384) + 1):
+                col_widths[c] = width
+                if col.get("style"):
+                    col_styles[c] = int(col.get("style"))
+                if c > 512:
+                    break
+
+        row_heights, row_styles, cells = {}, {}, {}
+        max_row = max_col = 1
+        for row in root.iter(_M + "row"):
+            r = int(row.get("r"))
+            if row.get("hidden") in ("1", "true"):
+                row_heights[r] = 0.0
+            elif row.get("ht"):
+                row_heights[r] = float(row.get("ht"))
+            if row.get("customFormat") in ("1", "true") and row.get("s"):
+                row_styles[r] = int(row.get("s"))
+            for c in row.iter(_M + "c"):
+                rr, cc = split_address(c.get("r"))
+                style = int(c.get("s", 0))
+                kind = c.get("t")
+                v = c.find(_M + "v")
+                runs = None
+                text = None
+                if kind == "s" and v is not None:
+                    item = shared[int(v.text)]
+                    if isinstance(item, list):
+                        runs = [[t, _font_spec(rpr, theme, indexed, styles[style]["font"]) if rpr is not None else None] for t, rpr in item]
+                        text = "".join(t for t, _ in item)
+                    else:
+                        text = decode_ooxml_text(item)
+                elif kind == "inlineStr":
+                    text = decode_ooxml_text("".join(t.text or "" for t in c.iter(_M + "t")))
+                elif v is not None and v.text is not None:
+                    text = v.text
+                cells[f"{rr},{cc}"] = [style, text, runs]
+                max_row, max_col = max(max_row, rr), max(max_col, cc)
+
+        area = _print_area(zf, sheet_name) or (1, 1, max_row, max_col)
+        r1, c1, r2, c2 = area
+
+        def width_pt(c):
+            w = col_widths.get(c, default_width)
+            if w <= 0:
+                return 0.0
+            px = int(((256 * w + int(128 / MAX_DIGIT_WIDTH)) / 256) * MAX_DIGIT_WIDTH)
+            return px * 0.75
+
+        cols = [0.0]
+        for c in range(c1, c2 + 1):
+            cols.append(round(cols[-1] + width_pt(c), 3))
+        rows = [0.0]
+        for r in range(r1, r2 + 1):
+            rows.append(round(rows[-1] + row_heights.get(r, default_height), 3))
+
+        def col_x(c):
+            if c < c1:
+                return -sum(width_pt(i) for i in range(c, c1))
+            if c > c2 + 1:
+                return cols[-1] + sum(width_pt(i) for i in range(c2 + 1, c))
+            return cols[c - c1]
+
+        def row_y(r):
+            if r < r1:
+                return -sum(row_heights.get(i, default_height) for i in range(r, r1))
+            if r > r2 + 1:
+                return rows[-1] + sum(row_heights.get(i, default_height) for i in range(r2 + 1, r))
+            return rows[r - r1]
+
+        merges = []
+        for m in root.iter(_M + "mergeCell"):
+            a, _, b = m.get("ref").partition(":")
+            ma, mb = split_address(a), split_address(b or a)
+            merges.append([ma[0], ma[1], mb[0], mb[1]])
+
+        margins = root.find(_M + "pageMargins")
+        setup = root.find(_M + "pageSetup")
+        options = root.find(_M + "printOptions")
+        fit = root.find(f"{_M}sheetPr/{_M}pageSetUpPr")
+        page_w, page_h = PAPER_SIZES.get(int(setup.get("paperSize", 9)) if setup is not None else 9, PAPER_SIZES[9])
+        if setup is not None and setup.get("orientation") == "landscape":
+            page_w, page_h = page_h, page_w
+        margin = {k: float(margins.get(k, d)) * 72 if margins is not None else d * 72 for k, d in (("left", 0.7), ("right", 0.7), ("top", 0.75), ("bottom", 0.75))}
+        avail_w = page_w - margin["left"] - margin["right"]
+        avail_h = page_h - margin["top"] - margin["bottom"]
+        scale = int(setup.get("scale", 100)) / 100.0 if setup is not None else 1.0
+        if fit is not None and fit.get("fitToPage") in ("1", "true"):
+            scale = min(avail_w / max(cols[-1], 1), avail_h / max(rows[-1], 1), 1.0)
+        x = margin["left"]
+        y = margin["top"]
+        if options is not None and options.get("horizontalCentered") in ("1", "true"):
+            x += max(avail_w - cols[-1] * scale, 0) / 2
+        if options is not None and options.get("verticalCentered") in ("1", "true"):
+            y += max(avail_h - rows[-1] * scale, 0) / 2
+
+        placements, images = _read_images(zf, sheet_part, root, col_x, row_y, area)
+
+    used_styles = {str(s) for s in set(col_styles.values()) | set(row_styles.values()) | {v[0] for v in cells.values()} | {0}}
+    return {
+        "version": LAYOUT_VERSION,
+        "sha256": template_hash(path),
+        "sheet": sheet_name,
+        "area": list(area),
+        "cols": cols,
+        "rows": rows,
+        "col_styles": {str(c): s for c, s in col_styles.items() if c1 <= c <= c2},
+        "row_styles": {str(r): s for r, s in row_styles.items() if r1 <= r <= r2},
+        "styles": {s: styles[int(s)] for s in used_styles if int(s) < len(styles)},
+        "cells": {k: v for k, v in cells.items() if r1 <= int(k.split(",")[0]) <= r2 and c1 <= int(k.split(",")[1]) <= c2},
+        "merges": [m for m in merges if m[0] <= r2 and m[2] >= r1 and m[1] <= c2 and m[3] >= c1],
+        "page": {"width": page_w, "height": page_h, "scale": scale, "x": round(x, 3), "y": round(y, 3)},
+        "images": placements,
+        "image_data": images,
+    }
+
+
+def load_layout(path, cache_dir=None) -> dict:
+    """Layout do modelo: memória do processo -> cache em disco (por hash) -> compilação."""
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns, str(cache_dir or LAYOUT_DIR))
+    cached = _memo.get(memo_key)
+    if cached is not None:
+        return cached
+    sha = template_hash(path)
+    target = Path(cache_dir or LAYOUT_DIR) / f"{sha}.json"
+    layout = None
+    try:
+        layout = json.loads(target.read_text(encoding="utf-8"))
+        if layout.get("version") != LAYOUT_VERSION or layout.get("sha256") != sha:
+            layout = None
+    except (OSError, ValueError):
+        layout = None
+    if layout is None:
+        layout = compile_layout(path)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(layout, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, target)
+        except OSError:
+            pass  # sem cache em disco: segue com o layout em memória
+    _memo[memo_key] = layout
+    return layout
+
+
+# ---------------------------------------------------------------------------
+# Formatação de valores (exibição como no Excel pt-BR)
+# ---------------------------------------------------------------------------
+
+_FORMAT_TOKEN_RE = re.compile(r'"([^"]*)"|\\(.)|_(.)|\*(.)|\[[^\]]*\]|([#0?,.]+)|(.)')
+_DATE_CODE_RE = re.compile(r'(?<!\\)[dmyhsDMYHS]')
+
+
+def _general(value: float) -> str:
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.10g}".replace(".", ",")
+
+
+def format_number(value: float, code: str | None) -> str:
+    """Número -> texto pelo formato da célula (General, 0, 0.00, #,##0.00, literais, %, seções ;)."""
+    if not code or code in ("General", "@"):
+        return _general(value)
+    sections = []
+    current, quoted = "", False
+    for ch in code:
+        if ch == '"':
+            quoted = not quoted
+        if ch == ";" and not quoted:
+            sections.append(current)
+            current = ""
+        else:
+            current += ch
+    sections.append(current)
+    section = sections[0]
+    negative_section = len(sections) > 1 and value < 0
+    if negative_section:
+        section = sections[1]
+    elif len(sections) > 2 and value == 0:
+        section = sections[2]
+    if _DATE_CODE_RE.search(re.sub(r'"[^"]*"', "", section)):
+        return _general(value)
+    number = abs(value) if negative_section else value
+    if "%" in section:
+        number *= 100
+    out = []
+    for quoted_text, escaped, pad, _fill, pattern, other in _FORMAT_TOKEN_RE.findall(section):
+        if quoted_text or escaped:
+            out.append(quoted_text or escaped)
+        elif pad:
+            out.append(" ")
+        elif pattern:
+            integer, _, decimals = pattern.partition(".")
+            places = sum(1 for ch in decimals if ch in "0#?")
+            text = f"{abs(number):,.{places}f}" if "," in integer else f"{abs(number):.{places}f}"
+            text = text.replace(",", "\0").replace(".", ",").replace("\0", ".")
+            out.append(("-" if number < 0 else "") + text)
+        elif other:
+            out.append(other)
+    return "".join(out).strip()
+
+
+def display_text(value, number_format: str | None) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "VERDADEIRO" if value else "FALSO"
+    if isinstance(value, (int, float)):
+        return format_number(float(value), number_format)
+    return str(value)
+
+
+# ---------------------------------------------------------------------------
+# Escrita do PDF
+# ---------------------------------------------------------------------------
+
+
+class PdfWriter:
+    """Montagem mínima de um PDF: objetos numerados, streams comprimidos e xref."""
+
+    def __init__(self):
+        self.objects: list[bytes | None] = []
+
+    def reserve(self) -> int:
+        self.objects.append(None)
+        return len(self.objects)
+
+    def set(self, num: int, body) -> int:
+        self.objects[num - 1] = body.encode("latin-1") if isinstance(body, str) else body
+        return num
+
+    def add(self, body) -> int:
+        return self.set(self.reserve(), body)
+
+    def add_stream(self, extra: str, data: bytes, filtered: str | None = None) -> int:
+        """Stream com FlateDecode (ou já codificado com `filtered`, ex.: DCTDecode)."""
+        if filtered is None:
+            data = zlib.compress(data, 6)
+            filtered = "FlateDecode"
+        head = f"<< {extra} /Filter /{filtered} /Length {len(data)} >>\nstream\n".replace("<<  ", "<< ")
+        return self.add(head.encode("latin-1") + data + b"\nendstream")
+
+    def to_bytes(self, root: int, info: int | None = None) -> bytes:
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, body in enumerate(self.objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % i + (body or b"null") + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.objects) + 1)
+        for off in offsets:
+            out += b"%010d 00000 n \n" % off
+        trailer = b"<< /Size %d /Root %d 0 R" % (len(self.objects) + 1, root)
+        if info:
+            trailer += b" /Info %d 0 R" % info
+        out += b"trailer\n" + trailer + b" >>\nstartxref\n%d\n%%%%EOF\n" % xref
+        return bytes(out)
+
+
+class _Fonts:
+    """Faces usadas no documento: (família, negrito, itálico) -> (nome do recurso, fonte)."""
+
+    def __init__(self):
+        self._by_key: dict[tuple, tuple[str, object]] = {}
+        self._by_file: dict[str, tuple[str, object]] = {}
+
+    def get(self, family: str, bold: bool, italic: bool):
+        key = (family.lower(), bold, italic)
+        entry = self._by_key.get(key)
+        if entry is None:
+            path = find_font_file(family, bold, italic)
+            if path and path in self._by_file:
+                entry = self._by_file[path]
+            else:
+                font = None
+                if path:
+                    try:
+                        font = EmbeddedFont(load_truetype(path))
+                    except (OSError, ValueError, struct.error):
+                        font = None
+                if font is None:
+                    font = StandardFont(bold)
+                entry = (f"F{len(self._by_file) + 1}", font)
+                self._by_file[path or f"standard:{bold}"] = entry
+            self._by_key[key] = entry
+        return entry
+
+    def name_of(self, face) -> str:
+        for name, f in self._by_file.values():
+            if f is face:
+                return name
+        raise KeyError(face)
+
+    def resources(self, writer: PdfWriter) -> str:
+        return " ".join(f"/{name} {font.write(writer)} 0 R" for name, font in self._by_file.values())
+
+
+def _styled_spec(base: list, style: dict) -> list:
+    """Fonte da célula com o estilo de um trecho do rich text (rich_text.pieces) por cima."""
+    family, size, bold, italic, underline, color = base
+    if "color" in style:
+        color = [round(v / 255.0, 4) for v in style["color"]]
+    return [
+        family,
+        float(style.get("size", size)),
+        style.get("bold", bold),
+        style.get("italic", italic),
+        underline,
+        color,
+    ]
+
+
+def _wrap(pieces, width: float, wrap: bool) -> list[list]:
+    """
+    Quebra o texto (pedaços com fonte) em linhas que cabem em `width`.
+    Cada pedaço: (texto, face, tamanho, cor, sublinhado). Retorna linhas de pedaços.
+    """
+    paragraphs = [[]]
+    for text, face, size, color, underline in pieces:
+        parts = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        for i, part in enumerate(parts):
+            if i:
+                if wrap:
+                    paragraphs.append([])
+                else:
+                    continue
+            if part:
+                paragraphs[-1].append((part, face, size, color, underline))
+    if not wrap:
+        return [[p for para in paragraphs for p in para]]
+
+    lines = []
+    for para in paragraphs:
+        # Palavras (sequências sem espaço, podendo atravessar pedaços) e espaços
+        tokens = []
+        for text, face, size, color, underline in para:
+            for tok in re.findall(r"\s+|\S+", text):
+                piece = (tok, face, size, color, underline)
+                if tokens and not tok.isspace() and not tokens[-1][0] and tokens[-1][1]:
+                    tokens[-1][1].append(piece)
+                else:
+                    tokens.append([tok.isspace(), [piece]])
+                if not tok.isspace():
+                    tokens[-1][0] = False
+        line, line_w = [], 0.0
+        for is_space, group in tokens:
+            w = sum(face.width(t) * s / 1000 for t, face, s, _c, _u in group)
+            if is_space:
+                if line:
+                    line.extend(group)
+                    line_w += w
+                continue
+            if line and line_w + w > width:
+                while line and line[-1][0].isspace():
+                    line_w -= line[-1][1].width(line[-1][0]) * line[-1][2] / 1000
+                    line.pop()
+                lines.append(line)
+                line, line_w = [], 0.0
+            if w > width and not line:
+                # Palavra maior que a célula: quebra por caractere
+                for t, face, s, c, u in group:
+                    for ch in t:
+                        cw = face.width(ch) * s / 1000
+                        if line and line_w + cw > width:
+                            lines.append(line)
+                            line, line_w = [], 0.0
+                        line.append((ch, face, s, c, u))
+                        line_w += cw
+                continue
+            line.extend(group)
+            line_w += w
+        while line and line[-1][0].isspace():
+            line.pop()
+        lines.append(line)
+    return lines
+
+
+def _num(v: float) -> str:
+    text = f"{v:.3f}".rstrip("0").rstrip(".")
+    return text if text not in ("-0", "") else "0"
+
+
+class _Page:
+    """Desenho da área de impressão em coordenadas da planilha (pt; y cresce para baixo a partir do topo)."""
+
+    def __init__(self, layout: dict, book_sheet):
+        self.layout = layout
+        self.sheet = book_sheet
+        self.r1, self.c1, self.r2, self.c2 = layout["area"]
+        self.cols = layout["cols"]
+        self.rows = layout["rows"]
+        self.height = self.rows[-1]
+        self.ops: list[str] = []
+        self.fonts = _Fonts()
+        self.anchor: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+        self.covered: set[tuple[int, int]] = set()
+        for r0, c0, r1, c1 in layout["merges"]:
+            self.anchor[(r0, c0)] = (r0, c0, r1, c1)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    if (r, c) != (r0, c0):
+                        self.covered.add((r, c))
+
+    def style_of(self, r: int, c: int, cell=None) -> dict:
+        styles = self.layout["styles"]
+        if cell is not None and cell.style is not None and str(cell.style) in styles:
+            return styles[str(cell.style)]
+        tpl = self.layout["cells"].get(f"{r},{c}")
+        if tpl is not None and str(tpl[0]) in styles:
+            return styles[str(tpl[0])]
+        s = self.layout["row_styles"].get(str(r), self.layout["col_styles"].get(str(c), 0))
+        return styles.get(str(s), styles.get("0"))
+
+    def rect(self, r0: int, c0: int, r1: int, c1: int) -> tuple[float, float, float, float]:
+        """(x0, y0, x1, y1) da faixa de células, recortada à área de impressão."""
+        r0, c0 = max(r0, self.r1), max(c0, self.c1)
+        r1, c1 = min(r1, self.r2), min(c1, self.c2)
+        return self.cols[c0 - self.c1], self.rows[r0 - self.r1], self.cols[c1 - self.c1 + 1], self.rows[r1 - self.r1 + 1]
+
+    def Y(self, y: float) -> float:
+        return self.height - y
+
+    def draw_fills(self) -> None:
+        by_color: dict[tuple, list[str]] = {}
+        for r in range(self.r1, self.r2 + 1):
+            if self.rows[r - self.r1 + 1] == self.rows[r - self.r1]:
+                continue
+            for c in range(self.c1, self.c2 + 1):
+                fill = self.style_of(r, c, self.sheet._cells.get((r, c)))["fill"]
+                if not fill:
+                    continue
+                x0, y0, x1, y1 = self.rect(r, c, r, c)
+                if x1 > x0:
+                    by_color.setdefault(tuple(fill), []).append(f"{_num(x0)} {_num(self.Y(y1))} {_num(x1 - x0)} {_num(y1 - y0)} re")
+        for color, rects in by_color.items():
+            self.ops.append("%s %s %s rg" % tuple(_num(v) for v in color))
+            self.ops.append("\n".join(rects) + "\nf")
+
+    def draw_borders(self) -> None:
+        edges: dict[tuple, list] = {}
+
+        def put(key, spec):
+            old = edges.get(key)
+            if old is None or BORDER_STYLES[spec[0]][2] > BORDER_STYLES[old[0]][2]:
+                edges[key] = spec
+
+        merged_of: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+        for rng in self.anchor.values():
+            for r in range(rng[0], rng[2] + 1):
+                for c in range(rng[1], rng[3] + 1):
+                    merged_of[(r, c)] = rng
+        for r in range(self.r1, self.r2 + 1):
+            for c in range(self.c1, self.c2 + 1):
+                borders = self.style_of(r, c, self.sheet._cells.get((r, c)))["borders"]
+                if not borders:
+                    continue
+                rng = merged_of.get((r, c))
+                for side, spec in borders.items():
+                    # Bordas internas de uma mesclagem não aparecem
+                    if rng and ((side == "l" and c > rng[1]) or (side == "r" and c < rng[3]) or (side == "t" and r > rng[0]) or (side == "b" and r < rng[2])):
+                        continue
+                    if side == "l":
+                        put(("v", c, r), spec)
+                    elif side == "r":
+                        put(("v", c + 1, r), spec)
+                    elif side == "t":
+                        put(("h", r, c), spec)
+                    else:
+                        put(("h", r + 1, c), spec)
+
+        groups: dict[tuple, list[str]] = {}
+        for (kind, line, i), (style, color) in edges.items():
+            width, dash, _weight = BORDER_STYLES[style]
+            if kind == "h":
+                if not (self.r1 <= line <= self.r2 + 1) or not (self.c1 <= i <= self.c2):
+                    continue
+                y = self.rows[line - self.r1]
+                x0, x1 = self.cols[i - self.c1], self.cols[i - self.c1 + 1]
+                if x1 <= x0:
+                    continue
+                segs = [(x0, y, x1, y)]
+                if style == "double":
+                    segs = [(x0, y - 0.9, x1, y - 0.9), (x0, y + 0.9, x1, y + 0.9)]
+            else:
+                if not (self.c1 <= line <= self.c2 + 1) or not (self.r1 <= i <= self.r2):
+                    continue
+                x = self.cols[line - self.c1]
+                y0, y1 = self.rows[i - self.r1], self.rows[i - self.r1 + 1]
+                if y1 <= y0:
+                    continue
+                segs = [(x, y0, x, y1)]
+                if style == "double":
+                    segs = [(x - 0.9, y0, x - 0.9, y1), (x + 0.9, y0, x + 0.9, y1)]
+            path = groups.setdefault((width, dash, tuple(color)), [])
+            for ax, ay, bx, by in segs:
+                path.append(f"{_num(ax)} {_num(self.Y(ay))} m {_num(bx)} {_num(self.Y(by))} l")
+        self.ops.append("2 J")
+        for (width, dash, color), path in groups.items():
+            self.ops.append(f"{_num(width)} w {dash or '[] 0'} d")
+            self.ops.append("%s %s %s RG" % tuple(_num(v) for v in color))
+            self.ops.append("\n".join(path) + "\nS")
+        self.ops.append("0 J [] 0 d")
+
+    def _pieces(self, r: int, c: int, cell, style: dict, text: str) -> list[tuple]:
+        """Pedaços (texto, fonte, tamanho, cor, sublinhado) da célula: rich text do modelo ou o aplicado no preenchimento."""
+        tpl = self.layout["cells"].get(f"{r},{c}")
+        base = style["font"]
+        if tpl is not None and tpl[2] and tpl[1] == text and not cell.bold_spans and not cell.font_runs:
+            runs = [(t, spec or base) for t, spec in tpl[2]]
+        elif cell.bold_spans or cell.font_runs:
+            runs = [(t, _styled_spec(base, st)) for t, st in rich_text.pieces(text, rich_text.cell_runs(cell))]
+        else:
+            runs = [(text, base)]
+        pieces = []
+        for t, (family, size, bold, italic, underline, color) in runs:
+            _name, face = self.fonts.get(family, bold, italic)
+            pieces.append((t, face, size, color, underline))
+        return pieces
+
+    def _spill(self, r: int, c: int, align: str) -> tuple[int, int]:
+        """Colunas ocupadas por um texto sem quebra (transborda para vizinhas vazias, como no Excel)."""
+        def empty(col):
+            if (r, col) in self.covered or (r, col) in self.anchor:
+                return False
+            cell = self.sheet._cells.get((r, col))
+            return cell is None or cell.value in (None, "")
+
+        left = right = c
+        if align in ("left", "general", "center"):
+            while right < self.c2 and empty(right + 1):
+                right += 1
+        if align in ("right", "center"):
+            while left > self.c1 and empty(left - 1):
+                left -= 1
+        return left, right
+
+    def draw_text(self) -> None:
+        for (r, c), cell in sorted(self.sheet._cells.items()):
+            if not (self.r1 <= r <= self.r2 and self.c1 <= c <= self.c2) or (r, c) in self.covered:
+                continue
+            if cell.value in (None, ""):
+                continue
+            style = self.style_of(r, c, cell)
+            text = display_text(cell.value, cell.number_format or style["fmt"])
+            if not text:
+                continue
+            rng = self.anchor.get((r, c), (r, c, r, c))
+            x0, y0, x1, y1 = self.rect(*rng)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            wrap = cell.wrap_text if cell.wrap_text is not None else style["wrap"]
+            align = style["h"]
+            if align == "general":
+                align = "right" if isinstance(cell.value, (int, float)) and not isinstance(cell.value, bool) else "left"
+            elif align in ("centerContinuous", "distributed"):
+                align = "center"
+            elif align in ("justify", "fill"):
+                align = "left"
+            clip = (x0, y0, x1, y1)
+            if not wrap and rng[:2] == rng[2:]:
+                left, right = self._spill(r, c, align)
+                clip = (self.cols[left - self.c1], y0, self.cols[right - self.c1 + 1], y1)
+
+            pieces = self._pieces(r, c, cell, style, text)
+            indent = style["indent"] * 9.0
+            avail = x1 - x0 - 2 * CELL_PADDING - indent
+            lines = _wrap(pieces, max(avail, 1.0), wrap)
+            metrics = []
+            for line in lines:
+                size = max((p[2] for p in line), default=style["font"][1])
+                ascent = max((p[1].ascent * p[2] / 1000 for p in line), default=size * 0.9)
+                descent = min((p[1].descent * p[2] / 1000 for p in line), default=-size * 0.2)
+                width = sum(p[1].width(p[0]) * p[2] / 1000 for p in line)
+                metrics.append((size * LINE_SPACING, ascent, descent, width))
+            block = sum(m[0] for m in metrics)
+            valign = style["v"]
+            if valign == "top":
+                top = y0 + 1.0
+            elif valign in ("center", "distributed", "justify"):
+                top = y0 + (y1 - y0 - block) / 2
+            else:
+                top = y1 - 1.0 - block
+
+            out = [f"q {_num(clip[0])} {_num(self.Y(clip[3]))} {_num(clip[2] - clip[0])} {_num(clip[3] - clip[1])} re W n BT"]
+            state = None
+            underlines = []
+            for line, (line_h, ascent, descent, line_w) in zip(lines, metrics):
+                if align == "right":
+                    x = x1 - CELL_PADDING - indent - line_w
+                elif align == "center":
+                    x = (x0 + x1 - line_w) / 2
+                else:
+                    x = x0 + CELL_PADDING + indent
+                baseline = top + (line_h - (ascent - descent)) / 2 + ascent
+                out.append(f"1 0 0 1 {_num(x)} {_num(self.Y(baseline))} Tm")
+                for t, face, size, color, underline in line:
+                    name = self.fonts.name_of(face)
+                    if state != (name, size, tuple(color)):
+                        out.append(f"/{name} {_num(size)} Tf %s %s %s rg" % tuple(_num(v) for v in color))
+                        state = (name, size, tuple(color))
+                    out.append(face.encode(t) + " Tj")
+                    w = face.width(t) * size / 1000
+                    if underline:
+                        underlines.append((x, baseline + size * 0.12, w, size * 0.06, color))
+                    x += w
+                top += line_h
+            out.append("ET")
+            for ux, uy, uw, uh, color in underlines:
+                out.append("%s %s %s rg " % tuple(_num(v) for v in color) + f"{_num(ux)} {_num(self.Y(uy))} {_num(uw)} {_num(uh)} re f")
+            out.append("Q")
+            self.ops.append("\n".join(out))
+
+    def draw_images(self, writer: PdfWriter, image_refs: dict) -> str:
+        """Logo/ícones do modelo (XObjects gravados uma vez por documento)."""
+        for placement in self.layout["images"]:
+            key = placement["key"]
+            if key not in image_refs:
+                image = self.layout["image_data"][key]
+                extra = (
+                    f"/Type /XObject /Subtype /Image /Width {image['w']} /Height {image['h']} "
+                    f"/ColorSpace /{image['cs']} /BitsPerComponent 8"
+                )
+                if image["alpha"]:
+                    smask = writer.add_stream(
+                        f"/Type /XObject /Subtype /Image /Width {image['w']} /Height {image['h']} "
+                        "/ColorSpace /DeviceGray /BitsPerComponent 8",
+                        base64.b64decode(image["alpha"]),
+                        "FlateDecode",
+                    )
+                    extra += f" /SMask {smask} 0 R"
+                image_refs[key] = (f"Im{len(image_refs) + 1}", writer.add_stream(extra, base64.b64decode(image["data"]), image["filter"]))
+            name, _ref = image_refs[key]
+            x, y, w, h = placement["x"], placement["y"], placement["w"], placement["h"]
+            self.ops.append(f"q {_num(w)} 0 0 {_num(h)} {_num(x)} {_num(self.Y(y + h))} cm /{name} Do Q")
+        return " ".join(f"/{name} {ref} 0 R" for name, ref in image_refs.values())
+
+
+def render_pdf(book, template_path, layout: dict | None = None) -> bytes:
+    """Desenha a primeira planilha da pasta preenchida (MemoryBook) e devolve o PDF (uma página)."""
+    layout = layout or load_layout(template_path)
+    page = _Page(layout, book.sheets[0])
+    page.draw_fills()
+    page.draw_text()
+    page.draw_borders()
+
+    writer = PdfWriter()
+    catalog = writer.reserve()
+    pages = writer.reserve()
+    page_obj = writer.reserve()
+    images = page.draw_images(writer, {})
+    geometry = layout["page"]
+    scale = geometry["scale"]
+    origin_y = geometry["height"] - geometry["y"] - page.height * scale
+    content = f"{_num(scale)} 0 0 {_num(scale)} {_num(geometry['x'])} {_num(origin_y)} cm\n" + "\n".join(page.ops)
+    content_ref = writer.add_stream("", content.encode("latin-1"))
+    fonts = page.fonts.resources(writer)
+    resources = f"/Font << {fonts} >>" + (f" /XObject << {images} >>" if images else "")
+    writer.set(catalog, f"<< /Type /Catalog /Pages {pages} 0 R >>")
+    writer.set(pages, f"<< /Type /Pages /Kids [{page_obj} 0 R] /Count 1 >>")
+    writer.set(
+        page_obj,
+        f"<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {_num(geometry['width'])} {_num(geometry['height'])}] "
+        f"/Resources << {resources} >> /Contents {content_ref} 0 R >>",
+    )
+    info = writer.add("<< /Producer (pdf_export native) >>")
+    return writer.to_bytes(catalog, info)
+
+
+def export_pdf_native(book, template_path, output_path: Path) -> None:
+    """Renderiza a pasta preenchida e grava o PDF (cria a pasta de destino se preciso)."""
+    pdf = render_pdf(book, template_path)
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(pdf)
+
+
+def _bench(argv: list[str]) -> int:
+    """Mede o renderizador nativo (e, com --excel, o caminho Excel) para um modelo + payload."""
+    import argparse
+    import statistics
+    import time
+
+    import fill_and_export_pdf as gen
+    from excel_backend import MemoryApp, start_app
+
+    parser = argparse.ArgumentParser(description="Mede o renderizador nativo de PDF.")
+    parser.add_argument("template")
+    parser.add_argument("data")
+    parser.add_argument("output")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--excel", action="store_true", help="Mede também o caminho Excel (ExportAsFixedFormat)")
+    args = parser.parse_args(argv)
+
+    template_path = Path(args.template)
+    with open(args.data, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    manifest = gen.check_template(template_path, dict(payload))
+    load_layout(template_path)
+
+    def measure(label, fn):
+        samples = []
+        for _ in range(max(args.repeat, 1)):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        print(f"{label}: mediana {statistics.median(samples):.1f} ms, mínimo {min(samples):.1f} ms ({len(samples)}x)")
+
+    def native():
+        data = dict(payload)
+        totais = gen.prepare_data(data)
+        book = MemoryApp().books.open(str(template_path))
+        gen.fill_workbook(book, data, totais, manifest)
+        export_pdf_native(book, template_path, Path(args.output))
+
+    measure("nativo", native)
+    if args.excel:
+        try:
+            app = start_app("excel")
+        except ImportError:
+            print("Erro: xlwings não instalado. Execute: pip install xlwings", file=sys.stderr)
+            return 1
+        try:
+            excel_output = Path(args.output).with_suffix(".excel.pdf")
+            measure("excel", lambda: gen.run_job(app, template_path, dict(payload), excel_output, manifest))
+        finally:
+            app.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_bench(sys.argv[1:]))
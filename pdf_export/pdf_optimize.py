@@ -0,0 +1,373 @@
+"""
+Perfis de saída do PDF (--output-profile email|print|preview) e pós-processamento em Python puro.
+
+Cada perfil escolhe a qualidade do ExportAsFixedFormat (xlQualityStandard / xlQualityMinimum),
+limita a exportação às páginas com conteúdo e pós-processa o PDF gerado:
+- páginas em branco no fim (área de impressão maior que o conteúdo) são removidas;
+- imagens FlateDecode de 8 bits (RGB/cinza, com ou sem preditor PNG) maiores que o necessário
+  para o tamanho em que aparecem na página são reduzidas (média de blocos) até o DPI do perfil,
+  junto com a máscara de transparência (/SMask); JPEG (DCTDecode) fica como está;
+- streams sem filtro ou FlateDecode são recomprimidos (zlib nível 9; só troca se diminuir);
+- objetos idênticos (fontes, logo repetido, dicionários de recursos) são gravados uma vez só.
+
+O relatório traz tamanho antes/depois, páginas e o tempo do pós-processamento.
+
+Uso avulso (Linux, sem Excel):
+  python pdf_optimize.py entrada.pdf saida.pdf [--output-profile email]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from pdf_native import _unfilter
+from pdf_tools import Name, PdfDocument, PdfError, Raw, Ref, _int, _Parser, decode_stream, serialize
+
+# Qualidade do ExportAsFixedFormat (XlFixedFormatQuality)
+XL_QUALITY_STANDARD = 0
+XL_QUALITY_MINIMUM = 1
+
+PROFILES = {
+    # Envio por WhatsApp / e-mail: menor arquivo com leitura confortável na tela
+    "email": {"quality": XL_QUALITY_MINIMUM, "max_dpi": 150},
+    # Impressão: qualidade padrão do Excel; só corta excessos acima de 300 DPI
+    "print": {"quality": XL_QUALITY_STANDARD, "max_dpi": 300},
+    # Pré-visualização no app: o menor possível
+    "preview": {"quality": XL_QUALITY_MINIMUM, "max_dpi": 96},
+}
+
+# Operadores que desenham algo (página com algum deles não está em branco)
+_PAINT_OPS = {b"Tj", b"TJ", b"'", b'"', b"Do", b"sh", b"BI", b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"S", b"s"}
+_MAX_FORM_DEPTH = 8
+
+
+def _is_operator(value) -> bool:
+    return isinstance(value, Raw) and value[:1].isalpha() or value in (b"'", b'"')
+
+
+def iter_operations(content: bytes):
+    """(operador, operandos) de um content stream; imagens inline (BI ... ID ... EI) são puladas."""
+    parser = _Parser(content)
+    operands: list = []
+    while True:
+        parser.skip()
+        if parser.pos >= len(content):
+            return
+        value = parser.value()
+        if not _is_operator(value):
+            operands.append(value)
+            continue
+        yield bytes(value), operands
+        operands = []
+        if value == b"ID":
+            end = content.find(b"EI", parser.pos + 1)
+            while end > 0 and content[end - 1] not in b" \t\r\n":
+                end = content.find(b"EI", end + 2)
+            parser.pos = len(content) if end < 0 else end + 2
+
+
+def _multiply(m, n):
+    """m × n (matrizes PDF [a b c d e f])."""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + b * c2, a * b2 + b * d2,
+        c * a2 + d * c2, c * b2 + d * d2,
+        e * a2 + f * c2 + e2, e * b2 + f * d2 + f2,
+    )
+
+
+class PdfOptimizer:
+    """Pós-processamento de um PDF lido por pdf_tools.PdfDocument."""
+
+    def __init__(self, document: PdfDocument, max_dpi: float | None = None):
+        self.doc = document
+        self.max_dpi = max_dpi
+        self.report = {"trimmed_pages": 0, "images_downsampled": 0, "streams_recompressed": 0, "objects_deduplicated": 0}
+
+    # -- páginas ----------------------------------------------------------
+
+    def _resolve(self, value):
+        return self.doc.resolve(value)
+
+    def _page_content(self, page: dict) -> bytes:
+        contents = self._resolve(page.get("Contents"))
+        refs = contents if isinstance(contents, list) else [page.get("Contents")]
+        parts = []
+        for ref in refs:
+            if isinstance(ref, Ref) and ref.num in self.doc.objects:
+                obj = self.doc.objects[ref.num]
+                if obj.stream is not None:
+                    parts.append(decode_stream(obj.value, obj.stream))
+        return b"\n".join(parts)
+
+    def _page(self, index: int) -> tuple[dict, dict]:
+        num, inherited = self.doc.pages[index]
+        page = self._resolve(Ref(num))
+        return page, {**inherited, **page}
+
+    def page_is_blank(self, index: int) -> bool:
+        """Sem nenhum operador de desenho no conteúdo (na dúvida, não está em branco)."""
+        page, _attrs = self._page(index)
+        try:
+            content = self._page_content(page)
+            return not any(op in _PAINT_OPS for op, _operands in iter_operations(content))
+        except (PdfError, ValueError, IndexError, zlib.error):
+            return False
+
+    def trim(self) -> list[int]:
+        """Índices das páginas mantidas: sem as páginas em branco do fim (sempre ao menos uma)."""
+        keep = len(self.doc.pages)
+        while keep > 1 and self.page_is_blank(keep - 1):
+            keep -= 1
+        self.report["trimmed_pages"] = len(self.doc.pages) - keep
+        return list(range(keep))
+
+    # -- imagens ----------------------------------------------------------
+
+    def _image_sizes(self, pages: list[int]) -> dict[int, tuple[float, float]]:
+        """Objeto de imagem -> maior tamanho (pt) em que aparece nas páginas."""
+        sizes: dict[int, tuple[float, float]] = {}
+        for index in pages:
+            _page, attrs = self._page(index)
+            try:
+                content = self._page_content(_page)
+                self._scan(content, self._resolve(attrs.get("Resources")) or {}, (1, 0, 0, 1, 0, 0), sizes, 0)
+            except (PdfError, ValueError, IndexError, zlib.error):
+                continue
+        return sizes
+
+    def _scan(self, content: bytes, resources: dict, ctm, sizes: dict, depth: int) -> None:
+        xobjects = self._resolve(resources.get("XObject")) or {}
+        stack = []
+        for op, operands in iter_operations(content):
+            if op == b"q":
+                stack.append(ctm)
+            elif op == b"Q":
+                ctm = stack.pop() if stack else ctm
+            elif op == b"cm" and len(operands) == 6:
+                ctm = _multiply(tuple(float(v) for v in operands), ctm)
+            elif op == b"Do" and operands and isinstance(operands[0], Name):
+                ref = xobjects.get(operands[0])
+                if not isinstance(ref, Ref) or ref.num not in self.doc.objects:
+                    continue
+                obj = self.doc.objects[ref.num]
+                kind = obj.value.get("Subtype") if isinstance(obj.value, dict) else None
+                if kind == "Image":
+                    a, b, c, d, _e, _f = ctm
+                    w, h = math.hypot(a, b), math.hypot(c, d)
+                    old = sizes.get(ref.num, (0.0, 0.0))
+                    sizes[ref.num] = (max(old[0], w), max(old[1], h))
+                elif kind == "Form" and depth < _MAX_FORM_DEPTH and obj.stream is not None:
+                    matrix = self._resolve(obj.value.get("Matrix"))
+                    form_ctm = _multiply(tuple(float(v) for v in matrix), ctm) if isinstance(matrix, list) else ctm
+                    form_resources = self._resolve(obj.value.get("Resources")) or resources
+                    self._scan(decode_stream(obj.value, obj.stream), form_resources, form_ctm, sizes, depth + 1)
+
+    def _decode_image(self, value: dict, stream: bytes, components: int):
+        """Amostras cruas (8 bits) de uma imagem FlateDecode; None se o formato não for suportado."""
+        if value.get("Filter") not in (None, "FlateDecode", ["FlateDecode"]) or _int(value.get("BitsPerComponent")) != 8:
+            return None
+        width, height = _int(value.get("Width")), _int(value.get("Height"))
+        if not width or not height:
+            return None
+        raw = zlib.decompress(stream) if value.get("Filter") is not None else bytes(stream)
+        params = self._resolve(value.get("DecodeParms"))
+        if isinstance(params, list):
+            params = params[0] if params else None
+        predictor = _int(params.get("Predictor")) if isinstance(params, dict) else None
+        stride = width * components
+        if predictor and predictor >= 10:
+            raw = bytes(_unfilter(raw, stride, height, components))
+        elif predictor and predictor != 1:
+            return None  # preditor TIFF: raro, fica como está
+        if len(raw) < stride * height:
+            return None
+        return raw[: stride * height]
+
+    @staticmethod
+    def _box_downsample(raw: bytes, width: int, height: int, components: int, factor: int) -> tuple[bytes, int, int]:
+        """Média de blocos factor × factor (por componente)."""
+        new_w, new_h = width // factor, height // factor
+        stride = width * components
+        out = bytearray()
+        area = factor * factor
+        count = new_w * components
+        for y in range(new_h):
+            acc = [0] * count
+            for dy in range(factor):
+                row = raw[(y * factor + dy) * stride : (y * factor + dy + 1) * stride]
+                for dx in range(factor):
+                    for c in range(components):
+                        samples = row[dx * components + c :: factor * components][:new_w]
+                        acc[c::components] = map(int.__add__, acc[c::components], samples)
+            out += bytes(v // area for v in acc)
+        return bytes(out), new_w, new_h
+
+    def _components(self, colorspace) -> int | None:
+        """Componentes por pixel de DeviceRGB/DeviceGray/ICCBased; outros espaços não são reduzidos."""
+        if colorspace == "DeviceRGB":
+            return 3
+        if colorspace == "DeviceGray":
+            return 1
+        if isinstance(colorspace, list) and len(colorspace) == 2 and colorspace[0] == "ICCBased":
+            profile = self._resolve(colorspace[1])
+            n = _int(profile.get("N")) if isinstance(profile, dict) else None
+            return n if n in (1, 3) else None
+        return None
+
+    def _replace_image(self, num: int, factor: int) -> bool:
+        obj = self.doc.objects[num]
+        value = obj.value
+        if value.get("SMaskInData") or value.get("Decode") is not None:
+            return False
+        components = self._components(self._resolve(value.get("ColorSpace")))
+        if components is None:
+            return False
+        raw = self._decode_image(value, obj.stream, components)
+        if raw is None:
+            return False
+        data, width, height = self._box_downsample(raw, _int(value["Width"]), _int(value["Height"]), components, factor)
+        obj.stream = zlib.compress(data, 9)
+        value.pop("DecodeParms", None)
+        value["Filter"] = Name("FlateDecode")
+        value["Width"], value["Height"], value["Length"] = width, height, len(obj.stream)
+        return True
+
+    def downsample(self, pages: list[int]) -> None:
+        if not self.max_dpi:
+            return
+        done = set()
+        for num, (w_pt, h_pt) in self._image_sizes(pages).items():
+            value = self.doc.objects[num].value
+            width, height = _int(value.get("Width")) or 0, _int(value.get("Height")) or 0
+            target_w = max(1.0, w_pt / 72.0 * self.max_dpi)
+            target_h = max(1.0, h_pt / 72.0 * self.max_dpi)
+            factor = int(min(width / target_w, height / target_h))
+            if factor < 2 or num in done:
+                continue
+            mask = value.get("SMask")
+            try:
+                if not self._replace_image(num, factor):
+                    continue
+            except (zlib.error, ValueError, IndexError):
+                continue
+            done.add(num)
+            self.report["images_downsampled"] += 1
+            if isinstance(mask, Ref) and mask.num in self.doc.objects and mask.num not in done:
+                try:
+                    if self._replace_image(mask.num, factor):
+                        done.add(mask.num)
+                except (zlib.error, ValueError, IndexError):
+                    pass
+
+    # -- streams e duplicatas ---------------------------------------------
+
+    def recompress(self) -> None:
+        for obj in self.doc.objects.values():
+            value = obj.value
+            if obj.stream is None or not isinstance(value, dict) or value.get("Type") in ("ObjStm", "XRef"):
+                continue
+            filters = value.get("Filter")
+            if filters not in (None, "FlateDecode", ["FlateDecode"]) or self._resolve(value.get("DecodeParms")):
+                continue
+            try:
+                raw = zlib.decompress(obj.stream) if filters is not None else obj.stream
+            except zlib.error:
+                continue
+            packed = zlib.compress(raw, 9)
+            if len(packed) < len(obj.stream):
+                obj.stream = packed
+                value.pop("DecodeParms", None)
+                value["Filter"] = Name("FlateDecode")
+                value["Length"] = len(packed)
+                self.report["streams_recompressed"] += 1
+
+    def deduplicate(self) -> dict[int, int]:
+        """Objeto -> objeto idêntico que fica no lugar dele (até não haver novas igualdades)."""
+        pages = {num for num, _inh in self.doc.pages}
+        alias: dict[int, int] = {}
+
+        def canonical(ref: Ref) -> int:
+            return alias.get(ref.num, ref.num)
+
+        while True:
+            seen: dict[bytes, int] = {}
+            changed = False
+            for num in sorted(self.doc.objects):
+                if num in pages or num in alias:
+                    continue
+                obj = self.doc.objects[num]
+                if isinstance(obj.value, dict) and obj.value.get("Type") in ("ObjStm", "XRef", "Catalog", "Pages"):
+                    continue
+                digest = hashlib.sha256(serialize(obj.value, canonical))
+                if obj.stream is not None:
+                    digest.update(b"\0stream\0" + obj.stream)
+                key = digest.digest()
+                first = seen.setdefault(key, num)
+                if first != num:
+                    alias[num] = first
+                    changed = True
+            if not changed:
+                break
+        self.report["objects_deduplicated"] = len(alias)
+        return alias
+
+
+def optimize_pdf(data: bytes, max_dpi: float | None = None) -> tuple[bytes, dict]:
+    """PDF otimizado + relatório (páginas, imagens reduzidas, streams recomprimidos, objetos unificados)."""
+    document = PdfDocument(data)
+    optimizer = PdfOptimizer(document, max_dpi)
+    pages = optimizer.trim()
+    optimizer.downsample(pages)
+    optimizer.recompress()
+    alias = optimizer.deduplicate()
+    result = document.extract(pages, alias)
+    if len(result) >= len(data) and not optimizer.report["trimmed_pages"]:
+        result = data  # nada a ganhar: mantém o original
+    return result, {"pages_before": len(document.pages), "pages_after": len(pages), **optimizer.report}
+
+
+def apply_profile(path: Path, profile: str) -> dict:
+    """Pós-processa o PDF gravado em `path` (no lugar) e devolve o relatório com tamanhos e tempo."""
+    settings = PROFILES[profile]
+    t0 = time.perf_counter()
+    data = path.read_bytes()
+    result, report = optimize_pdf(data, settings["max_dpi"])
+    if result is not data:
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_bytes(result)
+        tmp.replace(path)
+    return {
+        "profile": profile,
+        "bytes_before": len(data),
+        "bytes_after": len(result),
+        **report,
+        "ms": round((time.perf_counter() - t0) * 1000.0, 2),
+    }
+
+
+def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pós-processa um PDF com um perfil de saída (sem Excel).")
+    parser.add_argument("entrada")
+    parser.add_argument("saida")
+    parser.add_argument("--output-profile", choices=sorted(PROFILES), default="email")
+    args = parser.parse_args(argv)
+    try:
+        output = Path(args.saida)
+        output.write_bytes(Path(args.entrada).read_bytes())
+        report = apply_profile(output, args.output_profile)
+    except (OSError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(report, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,548 @@
+"""
+Leitura, recorte e junção de PDFs sem dependências: separa páginas de um PDF em arquivos novos
+e monta um PDF com páginas de vários (merge_pages).
+
+Usado pelo modo --multi, que exporta várias propostas num único ExportAsFixedFormat e depois
+separa o PDF por cliente. Lê os PDFs do Excel (tabela xref clássica ou híbrida, com object
+streams), do renderizador nativo e do stand-in em memória:
+- os objetos são lidos em sequência ("N G obj ... endobj"), pulando os dados de cada stream
+  pelo /Length, e os de object streams (/Type /ObjStm, FlateDecode) são desempacotados;
+- a árvore de páginas é percorrida a partir do /Root, com herança de /Resources, /MediaBox,
+  /CropBox e /Rotate;
+- cada arquivo de saída leva só os objetos alcançáveis a partir das suas páginas (renumerados),
+  um catálogo novo e uma árvore de páginas plana. Estrutura de acessibilidade (/StructTreeRoot),
+  esboço e referências para páginas de fora do recorte não são copiados;
+- na junção, objetos iguais de documentos diferentes (fonte, imagem, perfil de cor com o mesmo
+  conteúdo e os mesmos objetos por baixo) são gravados uma vez só.
+
+Uso avulso:
+  python pdf_tools.py entrada.pdf saida.pdf 1-2 [3 ...]   (intervalos de páginas, base 1)
+"""
+
+import re
+import sys
+import zlib
+from pathlib import Path
+
+from pdf_native import PdfWriter
+
+
+class PdfError(ValueError):
+    """PDF que este leitor não entende (criptografado, filtro não suportado, sem árvore de páginas...)."""
+
+
+class Ref:
+    __slots__ = ("num", "gen")
+
+    def __init__(self, num: int, gen: int = 0):
+        self.num = num
+        self.gen = gen
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Ref) and (other.num, other.gen) == (self.num, self.gen)
+
+    def __hash__(self) -> int:
+        return hash((self.num, self.gen))
+
+    def __repr__(self) -> str:
+        return f"{self.num} {self.gen} R"
+
+
+class Name(str):
+    """Nome PDF sem a barra (/Type -> Name("Type"))."""
+
+
+class Raw(bytes):
+    """Token copiado como está (strings literais e hexadecimais, números)."""
+
+
+_WS = b" \t\r\n\f\x00"
+_DELIMS = b"()<>[]{}/%"
+_OBJ_HEADER = re.compile(rb"(?<![0-9])(\d+)[ \t\r\n]+(\d+)[ \t\r\n]+obj\b")
+_INT_OBJECT = re.compile(rb"(?<![0-9])(\d+)[ \t\r\n]+(\d+)[ \t\r\n]+obj[ \t\r\n]*(\d+)[ \t\r\n]*endobj")
+_STREAM_OR_END = re.compile(rb"\bstream(?:\r\n|\n|\r)|\bendobj\b")
+_ROOT = re.compile(rb"/Root[ \t\r\n]*(\d+)[ \t\r\n]+(\d+)[ \t\r\n]+R")
+_INFO = re.compile(rb"/Info[ \t\r\n]*(\d+)[ \t\r\n]+(\d+)[ \t\r\n]+R")
+_INHERITED = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+
+class _Parser:
+    """Parser de objetos PDF (dicionário, array, nome, string, número, referência, booleano, null)."""
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def skip(self) -> None:
+        data, n = self.data, len(self.data)
+        while self.pos < n:
+            c = data[self.pos]
+            if c in _WS:
+                self.pos += 1
+            elif c == 0x25:  # % comentário
+                while self.pos < n and data[self.pos] not in b"\r\n":
+                    self.pos += 1
+            else:
+                break
+
+    def _token(self) -> bytes:
+        start = self.pos
+        data, n = self.data, len(self.data)
+        while self.pos < n and data[self.pos] not in _WS and data[self.pos] not in _DELIMS:
+            self.pos += 1
+        return data[start : self.pos]
+
+    def value(self):
+        self.skip()
+        data = self.data
+        if self.pos >= len(data):
+            raise PdfError("fim inesperado do objeto")
+        c = data[self.pos : self.pos + 1]
+        if c == b"/":
+            self.pos += 1
+            return Name(self._token().decode("latin-1"))
+        if data.startswith(b"<<", self.pos):
+            self.pos += 2
+            result = {}
+            while True:
+                self.skip()
+                if data.startswith(b">>", self.pos):
+                    self.pos += 2
+                    return result
+                key = self.value()
+                if not isinstance(key, Name):
+                    raise PdfError(f"chave de dicionário inválida na posição {self.pos}")
+                result[key] = self.value()
+        if c == b"<":
+            end = data.index(b">", self.pos)
+            token, self.pos = data[self.pos : end + 1], end + 1
+            return Raw(token)
+        if c == b"[":
+            self.pos += 1
+            items = []
+            while True:
+                self.skip()
+                if data.startswith(b"]", self.pos):
+                    self.pos += 1
+                    return items
+                items.append(self.value())
+        if c == b"(":
+            return Raw(self._literal_string())
+        token = self._token()
+        if not token:
+            raise PdfError(f"token inválido na posição {self.pos}")
+        if token == b"true":
+            return True
+        if token == b"false":
+            return False
+        if token == b"null":
+            return None
+        if token.isdigit():
+            # "N G R": referência indireta
+            save = self.pos
+            self.skip()
+            gen = self._token()
+            if gen.isdigit():
+                self.skip()
+                if self.data.startswith(b"R", self.pos) and (
+                    self.pos + 1 >= len(data) or data[self.pos + 1] in _WS or data[self.pos + 1] in _DELIMS
+                ):
+                    self.pos += 1
+                    return Ref(int(token), int(gen))
+            self.pos = save
+        return Raw(token)
+
+    def _literal_string(self) -> bytes:
+        data = self.data
+        start = self.pos
+        depth = 0
+        while True:
+            c = data[self.pos]
+            if c == 0x5C:  # \ escape
+                self.pos += 2
+                continue
+            if c == 0x28:
+                depth += 1
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return data[start : self.pos]
+            self.pos += 1
+
+
+def serialize(value, renumber=None) -> bytes:
+    """Objeto -> bytes; renumber(Ref) devolve o novo número (ou None para virar null)."""
+    if isinstance(value, Ref):
+        if renumber is None:
+            return b"%d %d R" % (value.num, value.gen)
+        num = renumber(value)
+        return b"null" if num is None else b"%d 0 R" % num
+    if isinstance(value, Name):
+        return b"/" + value.encode("latin-1")
+    if isinstance(value, Raw):
+        return bytes(value)
+    if isinstance(value, dict):
+        return b"<<" + b"".join(b"/" + k.encode("latin-1") + b" " + serialize(v, renumber) + b" " for k, v in value.items()) + b">>"
+    if isinstance(value, list):
+        return b"[" + b" ".join(serialize(v, renumber) for v in value) + b"]"
+    if value is True:
+        return b"true"
+    if value is False:
+        return b"false"
+    if value is None:
+        return b"null"
+    if isinstance(value, int):
+        return b"%d" % value
+    raise TypeError(f"valor PDF não suportado: {value!r}")
+
+
+def _int(value) -> int | None:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, Raw) and value.lstrip(b"+-").isdigit():
+        return int(value)
+    return None
+
+
+class PdfObject:
+    __slots__ = ("value", "stream")
+
+    def __init__(self, value, stream: bytes | None = None):
+        self.value = value
+        self.stream = stream  # dados do stream como estão no arquivo (ainda codificados)
+
+
+class PdfDocument:
+    """PDF lido em memória: objetos por número, páginas em ordem (com atributos herdados)."""
+
+    def __init__(self, data: bytes):
+        if not data.startswith(b"%PDF"):
+            raise PdfError("não é um arquivo PDF")
+        self.objects: dict[int, PdfObject] = {}
+        self._read_objects(data)
+        root = None
+        for m in _ROOT.finditer(data):
+            root = Ref(int(m.group(1)), int(m.group(2)))
+        if root is None:
+            raise PdfError("PDF sem /Root")
+        if b"/Encrypt" in data and self._is_encrypted(data):
+            raise PdfError("PDF criptografado não é suportado")
+        info = None
+        for m in _INFO.finditer(data):
+            info = Ref(int(m.group(1)), int(m.group(2)))
+        self.info = info if info is not None and info.num in self.objects else None
+        self.catalog = self.resolve(root)
+        if not isinstance(self.catalog, dict) or "Pages" not in self.catalog:
+            raise PdfError("catálogo sem árvore de páginas")
+        # Página: (número do objeto, atributos herdados ausentes na página)
+        self.pages: list[tuple[int, dict]] = []
+        self._walk(self.catalog["Pages"], {}, set())
+
+    @classmethod
+    def open(cls, path) -> "PdfDocument":
+        return cls(Path(path).read_bytes())
+
+    def _is_encrypted(self, data: bytes) -> bool:
+        return any(isinstance(o.value, dict) and "Encrypt" in o.value for o in self.objects.values()) or bool(
+            re.search(rb"trailer[^%]*?/Encrypt", data, re.S)
+        )
+
+    def _read_objects(self, data: bytes) -> None:
+        lengths = {(int(m.group(1)), int(m.group(2))): int(m.group(3)) for m in _INT_OBJECT.finditer(data)}
+        pos = 0
+        object_streams = []
+        while True:
+            m = _OBJ_HEADER.search(data, pos)
+            if m is None:
+                break
+            num = int(m.group(1))
+            parser = _Parser(data, m.end())
+            try:
+                value = parser.value()
+            except (PdfError, ValueError, IndexError):
+                pos = m.end()
+                continue
+            stream = None
+            parser.skip()
+            if data.startswith(b"stream", parser.pos) and isinstance(value, dict):
+                start = parser.pos + 6
+                if data.startswith(b"\r\n", start):
+                    start += 2
+                elif data[start : start + 1] in (b"\n", b"\r"):
+                    start += 1
+                length = value.get("Length")
+                if isinstance(length, Ref):
+                    length = lengths.get((length.num, length.gen))
+                length = _int(length)
+                if length is None or not data.startswith(b"endstream", self._skip_ws(data, start + length)):
+                    end = data.find(b"endstream", start)
+                    if end < 0:
+                        raise PdfError(f"stream sem endstream no objeto {num}")
+                    length = len(data[start:end].rstrip(b"\r\n")) if end > start else 0
+                stream = data[start : start + length]
+                parser.pos = start + length
+                if value.get("Type") == "ObjStm":
+                    object_streams.append((value, stream))
+            end = _STREAM_OR_END.search(data, parser.pos)
+            pos = end.end() if end is not None else parser.pos
+            self.objects[num] = PdfObject(value, stream)
+        for value, stream in object_streams:
+            self._unpack_object_stream(value, stream)
+
+    @staticmethod
+    def _skip_ws(data: bytes, pos: int) -> int:
+        while pos < len(data) and data[pos] in _WS:
+            pos += 1
+        return pos
+
+    def _unpack_object_stream(self, value: dict, stream: bytes) -> None:
+        raw = decode_stream(value, stream)
+        count, first = _int(value.get("N")) or 0, _int(value.get("First")) or 0
+        header = raw[:first].split()
+        for i in range(count):
+            num, offset = int(header[2 * i]), int(header[2 * i + 1])
+            if num in self.objects:
+                continue  # objeto regravado fora do object stream (atualização incremental)
+            self.objects[num] = PdfObject(_Parser(raw, first + offset).value())
+
+    def resolve(self, value):
+        seen = 0
+        while isinstance(value, Ref):
+            obj = self.objects.get(value.num)
+            value = obj.value if obj is not None else None
+            seen += 1
+            if seen > 32:
+                raise PdfError("referências circulares")
+        return value
+
+    def _walk(self, ref, inherited: dict, visiting: set) -> None:
+        if not isinstance(ref, Ref) or ref.num in visiting:
+            return
+        node = self.resolve(ref)
+        if not isinstance(node, dict):
+            return
+        kind = node.get("Type")
+        if kind == "Page" or (kind is None and "Kids" not in node):
+            self.pages.append((ref.num, {k: v for k, v in inherited.items() if k not in node}))
+            return
+        inherited = {**inherited, **{k: node[k] for k in _INHERITED if k in node}}
+        visiting = visiting | {ref.num}
+        for kid in self.resolve(node.get("Kids")) or []:
+            self._walk(kid, inherited, visiting)
+
+    def extract(self, page_indexes: list[int], alias: dict[int, int] | None = None) -> bytes:
+        """
+        PDF novo só com as páginas indicadas (índices base 0, na ordem dada).
+        alias: objeto -> objeto equivalente que o substitui (recursos duplicados gravados uma vez só).
+        """
+        alias = alias or {}
+        selected = [self.pages[i] for i in page_indexes]
+        all_pages = {num for num, _inh in self.pages}
+        chosen = {num for num, _inh in selected}
+
+        writer = PdfWriter()
+        catalog = writer.reserve()
+        pages_node = writer.reserve()
+        mapping: dict[int, int] = {}
+        queue: list[int] = []
+
+        def renumber(ref: Ref) -> int | None:
+            ref = Ref(alias.get(ref.num, ref.num))
+            if ref.num not in self.objects:
+                return None
+            if ref.num in all_pages and ref.num not in chosen:
+                return None  # link/estrutura apontando para página de outro recorte
+            new = mapping.get(ref.num)
+            if new is None:
+                new = mapping[ref.num] = writer.reserve()
+                queue.append(ref.num)
+            return new
+
+        kids = [renumber(Ref(num)) for num, _inh in selected]
+        info = renumber(self.info) if self.info is not None else None
+
+        while queue:
+            num = queue.pop()
+            obj = self.objects[num]
+            value = obj.value
+            if num in chosen:
+                page_inherited = next(inh for n, inh in selected if n == num)
+                value = {k: v for k, v in value.items() if k not in ("Parent", "StructParents")}
+                value.update(page_inherited)
+                body = serialize(value, renumber)[:-2] + b"/Parent %d 0 R>>" % pages_node
+            else:
+                body = serialize(value, renumber)
+            if obj.stream is not None:
+                body += b"\nstream\n" + obj.stream + b"\nendstream"
+            writer.set(mapping[num], body)
+
+        writer.set(pages_node, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+        extra = b""
+        lang = self.catalog.get("Lang")
+        if lang is not None and not isinstance(lang, (dict, list)):
+            extra = b" /Lang " + serialize(self.resolve(lang))
+        writer.set(catalog, b"<< /Type /Catalog /Pages %d 0 R%s >>" % (pages_node, extra))
+        return writer.to_bytes(catalog, info)
+
+
+class _Identities:
+    """
+    Identidade de conteúdo dos objetos de vários documentos: o mesmo número para objetos com o
+    mesmo valor e o mesmo stream cujas referências apontam para objetos de mesma identidade.
+    Páginas (e objetos em ciclo de referências) ficam com identidade própria.
+    """
+
+    def __init__(self, documents: list[PdfDocument]):
+        self.documents = documents
+        self.pages = [{num for num, _inh in doc.pages} for doc in documents]
+        self._ids: dict = {}
+        self._memo: dict[tuple[int, int], int] = {}
+        self._open: set[tuple[int, int]] = set()
+
+    def _unique(self, key) -> int:
+        return self._ids.setdefault(("obj", key), len(self._ids))
+
+    def of(self, d: int, num: int) -> int:
+        key = (d, num)
+        found = self._memo.get(key)
+        if found is not None:
+            return found
+        if num in self.pages[d] or key in self._open:
+            return self._unique(key)
+        obj = self.documents[d].objects[num]
+        self._open.add(key)
+        try:
+            body = serialize(obj.value, lambda ref: self.of(d, ref.num) if ref.num in self.documents[d].objects else None)
+        finally:
+            self._open.discard(key)
+        content = (body, obj.stream)
+        ident = self._ids.setdefault(content, len(self._ids))
+        self._memo[key] = ident
+        return ident
+
+
+def merge_pages(parts: list[tuple[PdfDocument, list[int]]]) -> bytes:
+    """
+    PDF novo com as páginas indicadas de cada documento (índices base 0), na ordem de `parts`.
+    Recursos iguais entre os documentos são gravados uma vez (ver _Identities). Como em extract,
+    referências para páginas que ficaram de fora viram null.
+    """
+    documents = [doc for doc, _indexes in parts]
+    identities = _Identities(documents)
+    writer = PdfWriter()
+    catalog = writer.reserve()
+    pages_node = writer.reserve()
+    page_numbers: dict[tuple[int, int], int] = {}
+    inherited: dict[tuple[int, int], dict] = {}
+    kids = []
+    for d, (doc, indexes) in enumerate(parts):
+        for i in indexes:
+            num, page_inherited = doc.pages[i]
+            new = writer.reserve()
+            page_numbers[(d, num)] = new
+            inherited[(d, num)] = page_inherited
+            kids.append(new)
+
+    written: dict[int, int] = {}
+    queue: list[tuple[int, int, int]] = [(d, num, new) for (d, num), new in page_numbers.items()]
+
+    def renumber_in(d: int):
+        doc = documents[d]
+
+        def renumber(ref: Ref) -> int | None:
+            if ref.num not in doc.objects:
+                return None
+            if ref.num in identities.pages[d]:
+                return page_numbers.get((d, ref.num))
+            ident = identities.of(d, ref.num)
+            new = written.get(ident)
+            if new is None:
+                new = written[ident] = writer.reserve()
+                queue.append((d, ref.num, new))
+            return new
+
+        return renumber
+
+    renumbers = [renumber_in(d) for d in range(len(documents))]
+    while queue:
+        d, num, new = queue.pop()
+        obj = documents[d].objects[num]
+        value = obj.value
+        if (d, num) in page_numbers:
+            value = {k: v for k, v in value.items() if k not in ("Parent", "StructParents")}
+            value.update(inherited[(d, num)])
+            body = serialize(value, renumbers[d])[:-2] + b"/Parent %d 0 R>>" % pages_node
+        else:
+            body = serialize(value, renumbers[d])
+        if obj.stream is not None:
+            body += b"\nstream\n" + obj.stream + b"\nendstream"
+        writer.set(new, body)
+
+    writer.set(pages_node, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    extra = b""
+    first = documents[0] if documents else None
+    lang = first.catalog.get("Lang") if first is not None else None
+    if lang is not None and not isinstance(lang, (dict, list)):
+        extra = b" /Lang " + serialize(first.resolve(lang))
+    writer.set(catalog, b"<< /Type /Catalog /Pages %d 0 R%s >>" % (pages_node, extra))
+    return writer.to_bytes(catalog)
+
+
+def decode_stream(value: dict, stream: bytes) -> bytes:
+    """Decodifica um stream FlateDecode (ou sem filtro); outros filtros -> PdfError."""
+    filters = value.get("Filter")
+    if filters is None:
+        return stream
+    if not isinstance(filters, list):
+        filters = [filters]
+    for name in filters:
+        if name != "FlateDecode":
+            raise PdfError(f"filtro de stream não suportado: {name}")
+        stream = zlib.decompress(stream)
+    return stream
+
+
+def page_count(path) -> int:
+    return len(PdfDocument.open(path).pages)
+
+
+def split_pdf(source, parts: list[tuple[int, int]], outputs: list) -> None:
+    """
+    Grava cada intervalo de páginas [início, fim) (base 0) do PDF `source` no arquivo correspondente
+    de `outputs`. O PDF é lido uma vez.
+    """
+    if len(parts) != len(outputs):
+        raise ValueError("split_pdf: um arquivo de saída por intervalo")
+    document = PdfDocument.open(source)
+    total = len(document.pages)
+    for (start, end), output in zip(parts, outputs):
+        if not 0 <= start < end <= total:
+            raise PdfError(f"intervalo de páginas {start + 1}-{end} fora do PDF ({total} página(s))")
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(document.extract(list(range(start, end))))
+
+
+def _main(argv: list[str]) -> int:
+    if len(argv) < 3:
+        print("Uso: python pdf_tools.py entrada.pdf saida.pdf 1-2 [3 ...]", file=sys.stderr)
+        return 1
+    source, output, specs = argv[0], argv[1], argv[2:]
+    try:
+        document = PdfDocument.open(source)
+        indexes = []
+        for spec in specs:
+            first, _, last = spec.partition("-")
+            indexes.extend(range(int(first) - 1, int(last or first)))
+        Path(output).write_bytes(document.extract(indexes))
+    except (OSError, ValueError, IndexError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""
+Substituição de placeholders em uma passada: cada célula é lida e gravada UMA vez.
+
+O laço antigo fazia, por placeholder, find + leitura de cell.value + str.replace + escrita,
+e só na primeira célula encontrada. Uma célula com vários placeholders ("[Cidade], [Data Atual]",
+a linha do Pergolado com medidas/tubo/policarbonato/cor) era lida e regravada uma vez por
+placeholder, e um placeholder repetido em outra célula ficava sem preencher.
+
+Aqui:
+  - as células-alvo saem do índice (PlaceholderIndex) de uma vez, agrupando os placeholders por célula;
+  - o conjunto de placeholders vira uma única regex (alternância, sem diferenciar maiúsculas,
+    como a busca do índice);
+  - cada célula passa pela regex uma vez, com o valor já transformado de cada placeholder,
+    e recebe uma única escrita (nenhuma, se o texto não mudou).
+
+Os valores ficam prontos antes (ex.: corPolicarbonato em minúsculas no Pergolado); placeholders
+em `as_text` marcam a célula com formato Texto ("@") antes da escrita (dataAtual).
+"""
+
+import re
+from functools import lru_cache
+
+# Idas ao COM por célula: leitura do value e escrita do value (formato Texto à parte)
+_READ_ROUND_TRIPS = 1
+_WRITE_ROUND_TRIPS = 1
+
+
+def compile_matcher(placeholders) -> re.Pattern | None:
+    """Regex única para o conjunto de placeholders (os mais longos primeiro); None se vazio."""
+    return _compile(frozenset(p for p in placeholders if p))
+
+
+@lru_cache(maxsize=32)
+def _compile(placeholders: frozenset) -> re.Pattern | None:
+    # Um mapa de placeholders por tipo de proposta: a regex é montada uma vez por processo
+    texts = sorted(placeholders, key=lambda t: (-len(t), t))
+    if not texts:
+        return None
+    return re.compile("|".join(re.escape(t) for t in texts), re.IGNORECASE)
+
+
+def group_by_cell(index, placeholders) -> tuple[list, list]:
+    """
+    ([(planilha, endereço, [placeholders])], [placeholders não encontrados]), células na ordem
+    em que aparecem no índice.
+    """
+    cells: dict[tuple, tuple] = {}
+    missing = []
+    for placeholder in placeholders:
+        found = index.find_all(placeholder)
+        if not found:
+            missing.append(placeholder)
+            continue
+        for sheet, address in found:
+            key = (sheet.name, address)
+            if key not in cells:
+                cells[key] = (sheet, address, [])
+            cells[key][2].append(placeholder)
+    return list(cells.values()), missing
+
+
+def substitute(index, values: dict, as_text=()) -> dict:
+    """
+    Substitui os placeholders (`values`: placeholder -> texto final) em todas as células onde aparecem.
+    Retorna {cells, writes, round_trips, legacy_round_trips, missing}.
+    """
+    matcher = compile_matcher(values)
+    by_key = {p.lower(): str(v) for p, v in values.items()}
+    text_keys = set(as_text)
+    targets, missing = group_by_cell(index, values)
+
+    def replacement(m):
+        return by_key[m.group().lower()]
+
+    writes = 0
+    round_trips = 0
+    # Laço antigo: leitura + escrita por placeholder encontrado (só na primeira célula de cada um)
+    found = len(values) - len(missing)
+    legacy = found * (_READ_ROUND_TRIPS + _WRITE_ROUND_TRIPS) + len(text_keys.difference(missing))
+    for sheet, address, placeholders in targets:
+        cell = sheet.range(address)
+        current = cell.value
+        current_str = "" if current is None else str(current)
+        new_text = matcher.sub(replacement, current_str)
+        round_trips += _READ_ROUND_TRIPS
+        # Célula de data: formato Texto para o Excel não reinterpretar dd/mm/yyyy como mm/dd/yyyy
+        if not text_keys.isdisjoint(placeholders):
+            try:
+                cell.number_format = "@"
+            except Exception:
+                pass
+            round_trips += 1
+        if new_text != current_str:
+            cell.value = new_text
+            writes += 1
+            round_trips += _WRITE_ROUND_TRIPS
+    return {
+        "cells": len(targets),
+        "writes": writes,
+        "round_trips": round_trips,
+        "legacy_round_trips": legacy,
+        "missing": missing,
+    }
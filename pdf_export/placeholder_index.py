@@ -0,0 +1,170 @@
+"""
+Índice de placeholders da pasta, montado com UMA leitura em lote por planilha.
+
+Em vez de um Cells.Find (+ FindNext) por placeholder, por planilha e por LookIn,
+lê UsedRange.Value e UsedRange.Formula de cada planilha e indexa, numa única passada,
+todo token "[Placeholder]" -> lista de (planilha, endereço). As buscas de célula única
+(placeholders) e de várias células ([Valor Total], [Valor Total Geral]) saem do índice,
+sem novas idas ao COM.
+
+A ordem das ocorrências imita o Find do Excel com After=A1 e busca por linhas:
+da célula seguinte a A1 até o fim da planilha, e A1 por último.
+"""
+
+import re
+
+from xlsx_reader import to_address
+
+# Token entre colchetes, ex.: "[Nome do Cliente]"
+PLACEHOLDER_RE = re.compile(r"\[[^\[\]]*\]")
+
+# Idas ao COM por planilha na leitura em lote: UsedRange, .Value e .Formula
+_ROUND_TRIPS_PER_SHEET = 3
+# Estimativa do caminho antigo: Cells(1, 1) + Find por tentativa; Address por célula achada;
+# FindNext + Address por ocorrência seguinte (inclui a volta à primeira, que encerra o laço)
+_FIND_ROUND_TRIPS = 2
+_ADDRESS_ROUND_TRIPS = 1
+_FINDNEXT_ROUND_TRIPS = 2
+
+
+def _as_2d(values) -> list:
+    """Normaliza o retorno de .value/.formula (escalar, linha ou matriz) para lista de linhas."""
+    if values is None or isinstance(values, (str, int, float, bool)):
+        return [[values]]
+    rows = list(values)
+    if rows and not isinstance(rows[0], (list, tuple)):
+        return [rows]
+    return [list(r) for r in rows]
+
+
+class PlaceholderIndex:
+    """Mapa token (sem diferenciar maiúsculas) -> [(planilha, endereço absoluto)], na ordem do Find."""
+
+    def __init__(self):
+        self._locations: dict[str, list] = {}
+        # (planilha, endereço, texto em minúsculas) de toda célula com texto; usado para buscas que não são tokens
+        self._texts: list | None = []
+        self.sheets: list = []
+        self.round_trips = 0
+
+    @classmethod
+    def build(cls, wb) -> "PlaceholderIndex":
+        index = cls()
+        for sheet in wb.sheets:
+            index.add_sheet(sheet)
+        return index
+
+    @classmethod
+    def from_manifest(cls, wb, manifest: dict) -> "PlaceholderIndex":
+        """
+        Índice a partir do manifesto compilado do modelo (template_manifest): nenhuma leitura no Excel.
+        Buscas por texto que não é token "[..]" leem as planilhas sob demanda.
+        """
+        index = cls()
+        index._texts = None
+        index.sheets = [wb.sheets[i] for i in range(len(manifest["sheets"]))]
+        for token, locations in manifest["placeholders"].items():
+            index._locations.setdefault(token.lower(), []).extend(
+                (index.sheets[sheet_idx], address) for sheet_idx, address in locations
+            )
+        return index
+
+    def add_sheet(self, sheet) -> None:
+        """Lê UsedRange de uma planilha (valores e fórmulas em lote) e indexa seus tokens."""
+        self.sheets.append(sheet)
+        self._read_sheet(sheet, index_tokens=True)
+
+    def _read_sheet(self, sheet, index_tokens: bool) -> None:
+        used = sheet.used_range
+        values = _as_2d(used.options(ndim=2).value)
+        try:
+            formulas = _as_2d(used.formula)
+        except Exception:
+            formulas = []
+        self.round_trips += _ROUND_TRIPS_PER_SHEET
+
+        first_row, first_col = used.row, used.column
+        cells = []
+        for r, row_values in enumerate(values):
+            row_formulas = formulas[r] if r < len(formulas) else ()
+            for c, value in enumerate(row_values):
+                formula = row_formulas[c] if c < len(row_formulas) else None
+                texts = []
+                if value is not None and value != "":
+                    texts.append(str(value))
+                if isinstance(formula, str) and formula and formula not in texts:
+                    texts.append(formula)
+                if texts:
+                    cells.append((first_row + r, first_col + c, texts))
+
+        # A1 por último (Find com After=A1 começa na célula seguinte)
+        cells.sort(key=lambda item: (item[0], item[1]) == (1, 1))
+        for row, col, texts in cells:
+            address = to_address(row, col, absolute=True)
+            combined = "\n".join(texts)
+            if self._texts is not None:
+                self._texts.append((sheet, address, combined.lower()))
+            if not index_tokens:
+                continue
+            seen = set()
+            for token in PLACEHOLDER_RE.findall(combined):
+                key = token.lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                self._locations.setdefault(key, []).append((sheet, address))
+
+    @property
+    def tokens(self) -> list[str]:
+        return list(self._locations)
+
+    def find_all(self, text: str) -> list:
+        """
+        Todas as células que contêm o texto, como o antigo Cells.Find + FindNext por planilha
+        (LookIn valores e fórmulas, parte do conteúdo, sem diferenciar maiúsculas; sem repetir célula).
+        """
+        key = text.lower()
+        if PLACEHOLDER_RE.fullmatch(text):
+            return list(self._locations.get(key, []))
+        if self._texts is None:
+            # Índice vindo do manifesto: lê o texto das planilhas só agora (uma vez)
+            self._texts = []
+            for sheet in self.sheets:
+                self._read_sheet(sheet, index_tokens=False)
+        return [(sheet, address) for sheet, address, content in self._texts if key in content]
+
+    def find(self, text: str):
+        """Primeira célula que contém o texto (o antigo Cells.Find único); (None, None) se não houver."""
+        found = self.find_all(text)
+        return found[0] if found else (None, None)
+
+    def legacy_round_trips(self, single: list[str], multi: list[str]) -> int:
+        """
+        Estimativa das idas ao COM que a busca antiga faria nesta pasta: `single` com um Cells.Find
+        por planilha e LookIn até a primeira célula; `multi` com Find + FindNext em todas as planilhas.
+        """
+        total = 0
+
+        def _per_sheet(text: str) -> dict:
+            counts: dict = {}
+            for sheet, _address in self.find_all(text):
+                counts[id(sheet)] = counts.get(id(sheet), 0) + 1
+            return counts
+
+        for text in single:
+            counts = _per_sheet(text)
+            for sheet in self.sheets:
+                if counts.get(id(sheet)):
+                    total += _FIND_ROUND_TRIPS + _ADDRESS_ROUND_TRIPS
+                    break
+                total += 2 * _FIND_ROUND_TRIPS  # xlValues e xlFormulas sem resultado
+        for text in multi:
+            counts = _per_sheet(text)
+            for sheet in self.sheets:
+                n = counts.get(id(sheet), 0)
+                # Cada LookIn repete a busca; com resultado: Address inicial + FindNext/Address por ocorrência
+                per_look_in = _FIND_ROUND_TRIPS
+                if n:
+                    per_look_in += _ADDRESS_ROUND_TRIPS + n * (_ADDRESS_ROUND_TRIPS + _FINDNEXT_ROUND_TRIPS)
+                total += 2 * per_look_in
+        return total
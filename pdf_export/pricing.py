@@ -0,0 +1,425 @@
+"""
+Cálculo de preço das propostas, sem Excel (e sem importar xlwings).
+
+São as mesmas funções que o gerador usa para os totais do PDF ([Valor Total], [Valor Total Geral],
+[Valor p/ Forma de Pagamento]); ficam aqui para serem chamadas sem gerar o PDF:
+
+  quote(payload)                 -> m², total à vista, parcelas 5x/10x e os textos das células
+  quote_batch(payloads)          -> lista de quote(), para prévias ao vivo em lote
+  sweep(payloads, scenarios)     -> totais de muitos payloads x cenários (tabela do Pergolado,
+                                    valor do forro vinílico), vetorizado com numpy quando instalado
+
+Linha de comando: fill_and_export_pdf.py --price-only [--data payload.json|payloads.jsonl] [--scenario cenario.json]
+(sem --data lê JSON lines do stdin e responde uma linha por payload).
+
+Cenário (JSON): {"forro_vinilico_valor_m2": 150.0, "pergolado_valor_m2": {"Compacto 3mm|150 x 50": 1400.0, ...}};
+chaves ausentes mantêm os valores padrão.
+"""
+
+import re
+
+
+def _numpy():
+    """
+    numpy ou None se não instalado (opcional: sem numpy, sweep() usa o laço em Python).
+    Import tardio: só o sweep vetorizado usa numpy, e o gerador não paga esse import na partida.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def format_currency(raw: str) -> str:
+    """Converte dígitos (ex: '150000') em 'R$ 1.500,00'."""
+    digits = "".join(c for c in (raw or "") if c.isdigit())
+    if not digits:
+        return "R$ 0,00"
+    cents = digits[-2:].rjust(2, "0")
+    int_part = digits[:-2] or "0"
+    if len(int_part) > 3:
+        parts = []
+        while int_part:
+            parts.append(int_part[-3:])
+            int_part = int_part[:-3]
+        int_part = ".".join(reversed(parts))
+    return f"R$ {int_part},{cents}"
+
+
+def raw_to_reais(raw: str) -> float:
+    """Converte string de dígitos (centavos) em valor em reais. Ex: '150000' -> 1500.00"""
+    digits = "".join(c for c in (raw or "") if c.isdigit())
+    if not digits:
+        return 0.0
+    return int(digits) / 100.0
+
+
+def parse_medidas_m2(medidas: str) -> float:
+    """Extrai as duas dimensões de '5,00m x 2,00m' e retorna m² (ex: 5 * 2 = 10.0)."""
+    s = (medidas or "").strip()
+    # Aceita "5,00m x 2,00m" ou "5.00 x 2.00" (opcional: m ou m² entre número e x)
+    m = re.search(r"(\d+[,.]?\d*)\s*m?\s*[xX×]\s*(\d+[,.]?\d*)\s*m?", s, re.IGNORECASE)
+    if not m:
+        return 0.0
+    a = float(m.group(1).replace(",", "."))
+    b = float(m.group(2).replace(",", "."))
+    return round(a * b, 2)
+
+
+def parse_m2_direto(value: str) -> float:
+    """Converte string de m² direto (ex: '25,50' ou '25.50') em float."""
+    s = (value or "").strip().replace(",", ".")
+    if not s:
+        return 0.0
+    try:
+        return round(float(s), 2)
+    except ValueError:
+        return 0.0
+
+
+def get_total_m2(data: dict) -> float:
+    """
+    Retorna a área total em m² a partir do payload.
+    - duas_areas: m²₁ + m²₂.
+    - tres_areas: m²₁ + m²₂ + m²₃.
+    - m2_direto: valor informado diretamente (ex: "25,50").
+    - Caso contrário (área única ou payload antigo): parse_medidas_m2(medidas).
+    """
+    if data.get("tipoMedidas") == "duas_areas":
+        m1 = data.get("medidas1") or ""
+        m2 = data.get("medidas2") or ""
+        if m1 or m2:
+            return round(parse_medidas_m2(m1) + parse_medidas_m2(m2), 2)
+    if data.get("tipoMedidas") == "tres_areas":
+        m1 = data.get("medidas1") or ""
+        m2 = data.get("medidas2") or ""
+        m3 = data.get("medidas3") or ""
+        if m1 or m2 or m3:
+            return round(
+                parse_medidas_m2(m1) + parse_medidas_m2(m2) + parse_medidas_m2(m3), 2
+            )
+    if data.get("tipoMedidas") == "m2_direto":
+        raw = (data.get("m2Direto") or "").strip()
+        if raw:
+            return parse_m2_direto(raw)
+    return parse_medidas_m2(data.get("medidas") or "")
+
+
+# Valor por m² do forro vinílico (R$), somado ao total quando Forro PVC = Vinílico
+FORRO_VINILICO_VALOR_M2 = 120.0
+
+# Acréscimos cartão: 5x = +6%, 10x = +10%
+CARTAO_5X_ACRECIMO = 0.06
+CARTAO_10X_ACRECIMO = 0.10
+
+
+def get_valor_total_reais(data: dict, forro_vinilico_valor_m2: float = FORRO_VINILICO_VALOR_M2) -> float:
+    """
+    Retorna o valor total em reais (float) com a mesma lógica de compute_valor_total.
+    Usado para calcular o texto da forma de pagamento.
+    """
+    valor_m2_raw = data.get("valorM2") or ""
+    valor_pilar_raw = (data.get("valorPilar") or "") if data.get("temPilar") == "Sim" else ""
+    custo_raw = data.get("custoDeslocamento") or ""
+    forro_pvc = (data.get("forroPvc") or "").strip()
+
+    m2 = get_total_m2(data)
+    valor_m2_reais = raw_to_reais(valor_m2_raw)
+    valor_pilar_reais = raw_to_reais(valor_pilar_raw)
+    custo_reais = raw_to_reais(custo_raw)
+
+    parte_area = m2 * valor_m2_reais
+    total_reais = parte_area + valor_pilar_reais + custo_reais
+
+    if forro_pvc == "Vinílico":
+        total_reais += forro_vinilico_valor_m2 * m2
+
+    return round(total_reais, 2)
+
+
+# Tabela fixa valor/m² para Pergolado (tipo policarbonato x dimensão tubo)
+PERGOLADO_VALOR_M2 = {
+    ("Compacto 3mm", "150 x 50"): 1300.0,
+    ("Compacto 3mm", "100 x 50"): 1200.0,
+    ("Alveolar 6mm", "150 x 50"): 800.0,
+    ("Alveolar 6mm", "100 x 50"): 700.0,
+}
+
+
+def get_valor_total_reais_pergolado(data: dict, tabela_valor_m2: dict = PERGOLADO_VALOR_M2) -> float:
+    """
+    Valor total para Pergolado: m² × valor por m² + custo de deslocamento.
+    Se valorM2 veio no payload (dimensão manual), usa esse valor; senão usa a tabela fixa
+    (ou a do cenário informado).
+    """
+    m2 = get_total_m2(data)
+    valor_m2_raw = data.get("valorM2")
+    if valor_m2_raw and str(valor_m2_raw).strip():
+        valor_m2_reais = raw_to_reais(str(valor_m2_raw))
+    else:
+        tipo = (data.get("tipoPolicarbonato") or "").strip()
+        dimensao = (data.get("dimensaoTubo") or "").strip()
+        valor_m2_reais = tabela_valor_m2.get((tipo, dimensao), 0.0)
+    custo_desloc_reais = raw_to_reais(data.get("custoDeslocamento") or "")
+    total_reais = m2 * valor_m2_reais + custo_desloc_reais
+    return round(total_reais, 2)
+
+
+def get_valor_cobertura_retratil_reais(data: dict) -> float:
+    """
+    Valor da cobertura retrátil SEM o custo da abertura automatizada.
+    Usado como base para cálculo de juros (5x/10x) e para [Valor Total].
+    Fórmula: (m² × valor por m²) + custo deslocamento.
+    """
+    m2 = get_total_m2(data)
+    valor_m2_reais = raw_to_reais(data.get("valorM2") or "")
+    custo_desloc_reais = raw_to_reais(data.get("custoDeslocamento") or "")
+    return round(m2 * valor_m2_reais + custo_desloc_reais, 2)
+
+
+def get_valor_total_reais_cobertura_retratil(data: dict) -> float:
+    """
+    Valor total para Cobertura Retrátil (cobertura + automatização):
+    (m² × valor por m²) + custo deslocamento + custo da abertura automatizada.
+    Em modo Manual, custo da abertura é 0. Valores no JSON em centavos.
+    """
+    valor_cobertura = get_valor_cobertura_retratil_reais(data)
+    custo_abertura_reais = raw_to_reais(data.get("custoAberturaAutomatizada") or "")
+    return round(valor_cobertura + custo_abertura_reais, 2)
+
+
+def get_m2_porta(data: dict) -> float:
+    """
+    m² para Porta: (alturaPorta + alturaBandeirola) × (larguraPorta + larguraBandeirola).
+    Valores vêm em metros (número). Se não houver bandeirola, usa só porta.
+    """
+    alt_porta = float(data.get("alturaPorta") or 0)
+    larg_porta = float(data.get("larguraPorta") or 0)
+    if data.get("bandeirola"):
+        alt_band = float(data.get("alturaBandeirola") or 0)
+        larg_band = float(data.get("larguraBandeirola") or 0)
+        return round((alt_porta + alt_band) * (larg_porta + larg_band), 2)
+    return round(alt_porta * larg_porta, 2)
+
+
+def get_valor_total_reais_porta(data: dict) -> float:
+    """
+    Valor total para Porta: m² × valor por m² + custo de deslocamento.
+    Valores no JSON: valorM2 e custoDeslocamento em centavos.
+    """
+    m2 = get_m2_porta(data)
+    valor_m2_reais = raw_to_reais(data.get("valorM2") or "")
+    custo_reais = raw_to_reais(data.get("custoDeslocamento") or "")
+    return round(m2 * valor_m2_reais + custo_reais, 2)
+
+
+def build_texto_forma_pagamento(
+    total_a_vista_reais: float,
+    total_a_vista_geral: float | None = None,
+) -> str:
+    """
+    Monta o texto para [Valor p/ Forma de Pagamento]:
+    "5x de R$ X,XX, 10x de R$ Y,YY ou R$ Z,ZZ A Vista"
+    - 5x: total_a_vista_reais * 1.06 / 5
+    - 10x: total_a_vista_reais * 1.10 / 10
+    - À vista: total_a_vista_geral se informado, senão total_a_vista_reais (Cobertura Retrátil: juros só na cobertura; à vista = total geral).
+    """
+    total_5x = total_a_vista_reais * (1 + CARTAO_5X_ACRECIMO)
+    total_10x = total_a_vista_reais * (1 + CARTAO_10X_ACRECIMO)
+    parcela_5x = total_5x / 5
+    parcela_10x = total_10x / 10
+
+    avista_reais = total_a_vista_geral if total_a_vista_geral is not None else total_a_vista_reais
+    s_avista = format_currency(str(int(round(avista_reais * 100))))
+    s_5x = format_currency(str(int(round(parcela_5x * 100))))
+    s_10x = format_currency(str(int(round(parcela_10x * 100))))
+
+    return f"5x de {s_5x}, 10x de {s_10x} ou {s_avista} A Vista"
+
+
+def load_scenario(raw: dict | None) -> dict:
+    """
+    Normaliza um cenário JSON para os parâmetros do cálculo:
+    {"forro_vinilico_valor_m2": float, "pergolado_valor_m2": {(tipo, dimensão): float}}.
+    Na tabela do Pergolado a chave JSON é "tipo|dimensão" e completa (não substitui) a tabela padrão.
+    """
+    raw = raw or {}
+    tabela = dict(PERGOLADO_VALOR_M2)
+    for key, valor in (raw.get("pergolado_valor_m2") or {}).items():
+        tipo, _, dimensao = str(key).partition("|")
+        tabela[(tipo.strip(), dimensao.strip())] = float(valor)
+    return {
+        "forro_vinilico_valor_m2": float(raw.get("forro_vinilico_valor_m2", FORRO_VINILICO_VALOR_M2)),
+        "pergolado_valor_m2": tabela,
+    }
+
+
+_DEFAULT_SCENARIO = load_scenario(None)
+
+
+def _centavos(valor_reais: float) -> int:
+    return int(round(valor_reais * 100))
+
+
+def quote(data: dict, scenario: dict | None = None) -> dict:
+    """
+    Cotação de um payload, com os mesmos valores que o PDF mostra. Não altera `data`.
+    scenario: resultado de load_scenario (None = tabelas padrão).
+    """
+    scenario = scenario or _DEFAULT_SCENARIO
+    tipo = data.get("tipoProposta") or "cobertura"
+    total_geral_reais = None
+    if tipo == "pergolado":
+        m2 = get_total_m2(data)
+        total_a_vista_reais = get_valor_total_reais_pergolado(data, scenario["pergolado_valor_m2"])
+        base_reais = total_a_vista_reais
+    elif tipo == "cobertura_retratil":
+        m2 = get_total_m2(data)
+        # Juros (5x/10x e [Valor Total]) só sobre a cobertura; à vista = cobertura + automatização
+        base_reais = get_valor_cobertura_retratil_reais(data)
+        total_a_vista_reais = get_valor_total_reais_cobertura_retratil(data)
+        custo_abertura_reais = raw_to_reais(data.get("custoAberturaAutomatizada") or "")
+        total_geral_reais = round(base_reais * (1 + CARTAO_10X_ACRECIMO) + custo_abertura_reais, 2)
+    elif tipo == "porta":
+        m2 = get_m2_porta(data)
+        total_a_vista_reais = get_valor_total_reais_porta(data)
+        base_reais = total_a_vista_reais
+    else:
+        m2 = get_total_m2(data)
+        total_a_vista_reais = get_valor_total_reais(data, scenario["forro_vinilico_valor_m2"])
+        base_reais = total_a_vista_reais
+
+    parcela_5x = _centavos(base_reais * (1 + CARTAO_5X_ACRECIMO) / 5)
+    parcela_10x = _centavos(base_reais * (1 + CARTAO_10X_ACRECIMO) / 10)
+    valor_total = _centavos(base_reais * (1 + CARTAO_10X_ACRECIMO))
+    return {
+        "tipoProposta": tipo,
+        "m2": m2,
+        "total_a_vista": total_a_vista_reais,
+        "base_parcelamento": base_reais,
+        "parcela_5x": parcela_5x / 100,
+        "parcela_10x": parcela_10x / 100,
+        "valor_total": format_currency(str(valor_total)),
+        "valor_total_geral": (
+            format_currency(str(_centavos(total_geral_reais))) if total_geral_reais is not None else None
+        ),
+        "valor_forma_pagamento": build_texto_forma_pagamento(
+            base_reais, total_a_vista_reais if tipo == "cobertura_retratil" else None
+        ),
+    }
+
+
+def quote_batch(payloads, scenario: dict | None = None) -> list[dict]:
+    """quote() de cada payload (iterável), com o mesmo cenário."""
+    scenario = scenario or _DEFAULT_SCENARIO
+    return [quote(data, scenario) for data in payloads]
+
+
+# Códigos de tipo nas colunas do sweep
+_COBERTURA, _PERGOLADO, _RETRATIL, _PORTA = range(4)
+_TIPOS = {"pergolado": _PERGOLADO, "cobertura_retratil": _RETRATIL, "porta": _PORTA}
+
+
+def _sweep_columns(payloads) -> dict:
+    """Lê os payloads UMA vez: tudo o que não depende do cenário vira coluna."""
+    cols = {name: [] for name in ("tipo", "m2", "valor_m2", "pilar", "custo", "forro", "abertura", "chave")}
+    for data in payloads:
+        tipo = _TIPOS.get(data.get("tipoProposta"), _COBERTURA)
+        m2 = get_m2_porta(data) if tipo == _PORTA else get_total_m2(data)
+        valor_m2_raw = data.get("valorM2")
+        chave = None
+        if tipo == _PERGOLADO and not (valor_m2_raw and str(valor_m2_raw).strip()):
+            # Sem valorM2 no payload: o valor/m² vem da tabela do cenário
+            chave = ((data.get("tipoPolicarbonato") or "").strip(), (data.get("dimensaoTubo") or "").strip())
+            valor_m2 = 0.0
+        else:
+            valor_m2 = raw_to_reais(str(valor_m2_raw or ""))
+        is_cobertura = tipo == _COBERTURA
+        cols["tipo"].append(tipo)
+        cols["m2"].append(m2)
+        cols["valor_m2"].append(valor_m2)
+        cols["pilar"].append(
+            raw_to_reais(data.get("valorPilar") or "") if is_cobertura and data.get("temPilar") == "Sim" else 0.0
+        )
+        cols["custo"].append(raw_to_reais(data.get("custoDeslocamento") or ""))
+        cols["forro"].append(1.0 if is_cobertura and (data.get("forroPvc") or "").strip() == "Vinílico" else 0.0)
+        cols["abertura"].append(
+            raw_to_reais(data.get("custoAberturaAutomatizada") or "") if tipo == _RETRATIL else 0.0
+        )
+        cols["chave"].append(chave)
+    return cols
+
+
+def _round2(values):
+    """round(x, 2) do Python elemento a elemento (np.round arredonda diferente em empates)."""
+    return [round(v, 2) for v in values]
+
+
+def _sweep_numpy(cols: dict, scenario: dict) -> tuple:
+    np = _numpy()
+    tipo = np.asarray(cols["tipo"])
+    m2 = np.asarray(cols["m2"])
+    tabela = scenario["pergolado_valor_m2"]
+    valor_m2 = np.asarray([
+        tabela.get(chave, 0.0) if chave is not None else v for chave, v in zip(cols["chave"], cols["valor_m2"])
+    ])
+    area = m2 * valor_m2
+    bruto = area + np.asarray(cols["pilar"]) + np.asarray(cols["custo"])
+    bruto = bruto + np.asarray(cols["forro"]) * (scenario["forro_vinilico_valor_m2"] * m2)
+    base = np.asarray(_round2(bruto.tolist()))
+    retratil = tipo == _RETRATIL
+    total = base.copy()
+    if retratil.any():
+        total[retratil] = _round2((base[retratil] + np.asarray(cols["abertura"])[retratil]).tolist())
+    return base, total
+
+
+def _sweep_python(cols: dict, scenario: dict) -> tuple:
+    tabela = scenario["pergolado_valor_m2"]
+    forro_m2 = scenario["forro_vinilico_valor_m2"]
+    base, total = [], []
+    for i, tipo in enumerate(cols["tipo"]):
+        chave = cols["chave"][i]
+        valor_m2 = tabela.get(chave, 0.0) if chave is not None else cols["valor_m2"][i]
+        m2 = cols["m2"][i]
+        bruto = m2 * valor_m2 + cols["pilar"][i] + cols["custo"][i] + cols["forro"][i] * (forro_m2 * m2)
+        b = round(bruto, 2)
+        base.append(b)
+        total.append(round(b + cols["abertura"][i], 2) if tipo == _RETRATIL else b)
+    return base, total
+
+
+def sweep(payloads, scenarios: list, vectorized: bool | None = None) -> list[dict]:
+    """
+    Simulação "e se": os mesmos payloads sob vários cenários (dicts JSON, ver load_scenario).
+    Os payloads são lidos uma vez; por cenário, o cálculo é vetorizado com numpy
+    (vectorized=None: numpy quando instalado e o lote tem 256+ payloads).
+    Devolve, por cenário: total à vista, parcelas 5x/10x por payload e a soma à vista.
+    """
+    cols = _sweep_columns(payloads)
+    np = _numpy() if vectorized or (vectorized is None and len(cols["tipo"]) >= 256) else None
+    if vectorized is None:
+        vectorized = np is not None
+    if vectorized and np is None:
+        raise ImportError("numpy não instalado. Execute: pip install numpy")
+    results = []
+    for raw in scenarios:
+        scenario = load_scenario(raw)
+        base, total = (_sweep_numpy if vectorized else _sweep_python)(cols, scenario)
+        if vectorized:
+            # Mesma ordem de operações de quote(); rint = round() do Python (meio para o par)
+            parcela_5x = (np.rint(base * (1 + CARTAO_5X_ACRECIMO) / 5 * 100) / 100).tolist()
+            parcela_10x = (np.rint(base * (1 + CARTAO_10X_ACRECIMO) / 10 * 100) / 100).tolist()
+            total = total.tolist()
+        else:
+            parcela_5x = [_centavos(b * (1 + CARTAO_5X_ACRECIMO) / 5) / 100 for b in base]
+            parcela_10x = [_centavos(b * (1 + CARTAO_10X_ACRECIMO) / 10) / 100 for b in base]
+        results.append({
+            "scenario": raw,
+            "total_a_vista": total,
+            "parcela_5x": parcela_5x,
+            "parcela_10x": parcela_10x,
+            "soma_a_vista": round(sum(total), 2),
+        })
+    return results
@@ -0,0 +1,331 @@
+"""
+Rich text de uma célula (D43, D44) aplicado com o mínimo de idas ao COM.
+
+Um trecho formatado é (início, fim, estilo), com estilo = {"bold": True, "italic": True,
+"size": 9, "color": (89, 89, 89)} (qualquer subconjunto). O caminho antigo gravava o texto,
+ligava WrapText e fazia characters[a:b].font.<atributo> = valor por trecho e por atributo:
+Characters + Font + a propriedade, três round-trips cada — os rótulos em negrito da D43
+(primeira linha, "Item N:", "Porta:", ...) são trechos separados e custavam 20+ round-trips.
+
+write_rich_text grava a célula de uma vez pelo Range.Value(xlRangeValueXMLSpreadsheet): lê
+o XML Spreadsheet 2003 da área mesclada (MergeArea), troca o <Data> da célula pelo texto com
+os trechos marcados (<B>, <I>, <Font html:Size html:Color>) e liga WrapText no estilo lido,
+e grava o XML de volta. São 3 round-trips para qualquer número de trechos; o estilo da célula
+(fonte, bordas, mesclagem) volta como foi lido.
+
+Se o Excel recusar o XML, ou se algum trecho desligar negrito/itálico (o XML só sabe ligar),
+a célula é gravada pelo caminho direto: value, WrapText e um plano de Characters/Font:
+  - por atributo, trechos sobrepostos ou vizinhos com o mesmo valor viram um só;
+  - atributos com o mesmo intervalo saem do MESMO objeto Font (uma busca, várias propriedades);
+  - negrito/itálico que cobrem mais do que deixam de fora são aplicados na célula inteira e
+    desligados só nas lacunas, quando isso dá menos operações.
+O caminho direto também é usado quando ele mesmo custa até 3 round-trips (célula sem trechos).
+write_rich_text devolve as contas (calls / legacy_calls) para o log e as métricas.
+
+Marcação da descrição adicional (D44): **negrito** e __itálico__ (mesma ideia do ** dos modelos
+da D43); o payload pode trazer estiloDescricaoAdicional = {"negrito", "italico", "tamanho", "cor"}
+aplicado ao texto inteiro (cor "#RRGGBB").
+"""
+
+import re
+
+# Atributos aceitos, na ordem em que são gravados
+STYLE_ATTRS = ("bold", "italic", "size", "color")
+# Atributos liga/desliga: podem ir para a célula inteira e ser desligados só nas lacunas
+_TOGGLES = ("bold", "italic")
+
+# Round-trips: Characters(a, b) + .Font por operação, mais uma escrita por atributo
+_FETCH_ROUND_TRIPS = 2
+_SET_ROUND_TRIPS = 1
+
+# Range.Value(RangeValueDataType): texto e formatação da área em XML Spreadsheet 2003
+XL_RANGE_VALUE_XML = 11
+# MergeArea + Value(11) lido + Value(11) gravado
+_XML_ROUND_TRIPS = 3
+_HTML_NS = "http://www.w3.org/TR/REC-html40"
+_XML_CELL = re.compile(r"<Cell\b([^>]*?)(?:/>|>(.*?)</Cell>)", re.S)
+_XML_DATA = re.compile(r"<(?:ss:)?Data\b.*?</(?:ss:)?Data>|<(?:ss:)?Data\b[^>]*/>", re.S)
+_XML_CELL_VALUE_ATTRS = re.compile(r'\s+ss:(?:Formula|ArrayRange|HRef)="[^"]*"')
+_XML_STYLE_ID = re.compile(r'\bss:StyleID="([^"]*)"')
+
+_MARKUP = re.compile(r"\*\*|__")
+_HEX_COLOR = re.compile(r"^#?([0-9A-Fa-f]{6})$")
+
+# Chaves do estiloDescricaoAdicional -> atributo
+_STYLE_KEYS = {"negrito": "bold", "italico": "italic", "itálico": "italic", "tamanho": "size", "cor": "color"}
+
+
+def parse_color(value) -> tuple[int, int, int]:
+    """"#RRGGBB" ou [r, g, b] -> (r, g, b); ValueError se não for cor."""
+    if isinstance(value, str):
+        m = _HEX_COLOR.match(value.strip())
+        if not m:
+            raise ValueError(f"cor inválida: {value!r} (use #RRGGBB)")
+        h = m.group(1)
+        return (int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16))
+    r, g, b = value
+    return (int(r), int(g), int(b))
+
+
+def style_from_payload(spec) -> dict:
+    """estiloDescricaoAdicional do payload -> estilo (chaves desconhecidas e valores vazios são ignorados)."""
+    if not isinstance(spec, dict):
+        return {}
+    style = {}
+    for key, value in spec.items():
+        attr = _STYLE_KEYS.get(str(key).strip().lower())
+        if attr is None or value in (None, ""):
+            continue
+        if attr == "size":
+            style[attr] = float(str(value).replace(",", "."))
+        elif attr == "color":
+            style[attr] = parse_color(value)
+        else:
+            style[attr] = bool(value)
+    return style
+
+
+def parse_markup(text: str) -> tuple[str, list[tuple[int, int, dict]]]:
+    """
+    Tira a marcação **negrito** / __itálico__ e devolve (texto, trechos). Marcador sem par
+    fica no texto como veio.
+    """
+    markers = list(_MARKUP.finditer(text))
+    if not markers:
+        return text, []
+    # Só os marcadores com par (do mesmo tipo) contam
+    paired, open_at = set(), {}
+    for i, m in enumerate(markers):
+        tok = m.group()
+        if tok in open_at:
+            paired.update((open_at.pop(tok), i))
+        else:
+            open_at[tok] = i
+    parts, runs, pos, out_len, start_of = [], [], 0, 0, {}
+    for i, m in enumerate(markers):
+        if i not in paired:
+            continue
+        chunk = text[pos:m.start()]
+        parts.append(chunk)
+        out_len += len(chunk)
+        pos = m.end()
+        tok = m.group()
+        if tok in start_of:
+            start = start_of.pop(tok)
+            if out_len > start:
+                runs.append((start, out_len, {"bold" if tok == "**" else "italic": True}))
+        else:
+            start_of[tok] = out_len
+    parts.append(text[pos:])
+    return "".join(parts), runs
+
+
+def _attr_spans(runs, attr: str, length: int) -> list[tuple[int, int, object]]:
+    """Intervalos [a, b) com o valor do atributo (o último trecho prevalece), vizinhos iguais unidos."""
+    values = [None] * length
+    for start, stop, style in runs:
+        if attr in style:
+            for i in range(max(0, start), min(length, stop)):
+                values[i] = style[attr]
+    spans = []
+    i = 0
+    while i < length:
+        if values[i] is None:
+            i += 1
+            continue
+        j = i
+        while j < length and values[j] == values[i]:
+            j += 1
+        spans.append((i, j, values[i]))
+        i = j
+    return spans
+
+
+def plan(runs, length: int) -> list[tuple[int, int, dict]]:
+    """Operações (início, fim, {atributo: valor}) que levam o texto aos trechos pedidos."""
+    by_range: dict[tuple[int, int], dict] = {}
+    for attr in STYLE_ATTRS:
+        spans = _attr_spans(runs, attr, length)
+        if not spans:
+            continue
+        if attr in _TOGGLES and all(value is True for _a, _b, value in spans):
+            gaps, pos = [], 0
+            for start, stop, _v in spans:
+                if start > pos:
+                    gaps.append((pos, start))
+                pos = stop
+            if pos < length:
+                gaps.append((pos, length))
+            if len(gaps) + 1 < len(spans):
+                by_range.setdefault((0, length), {})[attr] = True
+                for start, stop in gaps:
+                    by_range.setdefault((start, stop), {})[attr] = False
+                continue
+        for start, stop, value in spans:
+            by_range.setdefault((start, stop), {})[attr] = value
+    # Célula inteira primeiro: as lacunas desligam depois
+    return [(a, b, style) for (a, b), style in sorted(by_range.items(), key=lambda kv: (kv[0][0], -kv[0][1]))]
+
+
+def legacy_calls(runs) -> int:
+    """Round-trips do caminho antigo: characters[a:b].font.<atributo> por trecho e por atributo."""
+    return sum(len(style) for _a, _b, style in runs) * (_FETCH_ROUND_TRIPS + _SET_ROUND_TRIPS)
+
+
+def apply_runs(rng, runs, length: int) -> dict:
+    """Aplica os trechos a uma célula que já tem o texto; retorna as contas de round-trips."""
+    ops = plan(runs, length)
+    calls = 0
+    for start, stop, style in ops:
+        font = rng.characters[start:stop].font
+        for attr in STYLE_ATTRS:
+            if attr in style:
+                setattr(font, attr, style[attr])
+        calls += _FETCH_ROUND_TRIPS + _SET_ROUND_TRIPS * len(style)
+    legacy = legacy_calls(runs)
+    return {"runs": len(runs), "operations": len(ops), "calls": calls, "legacy_calls": legacy}
+
+
+def spreadsheet_data(text: str, runs) -> str:
+    """<ss:Data> do XML Spreadsheet com o texto e os trechos (negrito/itálico ligados, tamanho, cor)."""
+    out = []
+    for piece, style in pieces(text, runs):
+        chunk = _xml_text(piece)
+        attrs = []
+        if style.get("size") is not None:
+            attrs.append(f'html:Size="{float(style["size"]):g}"')
+        if style.get("color") is not None:
+            attrs.append('html:Color="#%02X%02X%02X"' % tuple(style["color"]))
+        if attrs:
+            chunk = f"<Font {' '.join(attrs)}>{chunk}</Font>"
+        if style.get("italic"):
+            chunk = f"<I>{chunk}</I>"
+        if style.get("bold"):
+            chunk = f"<B>{chunk}</B>"
+        out.append(chunk)
+    return f'<ss:Data ss:Type="String" xmlns="{_HTML_NS}">{"".join(out)}</ss:Data>'
+
+
+def _xml_text(text: str) -> str:
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    # Referências numéricas: quebras de linha literais seriam normalizadas pelo parser XML
+    return text.replace("\r", "&#13;").replace("\n", "&#10;")
+
+
+def rich_cell_xml(xml: str, text: str, runs, wrap: bool) -> str:
+    """
+    XML lido de Range.Value(11) com o conteúdo da primeira célula trocado pelo texto com os
+    trechos (fórmula e hiperlink dela saem) e, com wrap, WrapText ligado no estilo dela.
+    ValueError se o XML não tiver a célula (ou o estilo, com wrap).
+    """
+    m = _XML_CELL.search(xml)
+    if m is None:
+        raise ValueError("XML Spreadsheet sem célula")
+    attrs = _XML_CELL_VALUE_ATTRS.sub("", m.group(1))
+    inner = _XML_DATA.sub("", m.group(2) or "", count=1)
+    xml = f"{xml[:m.start()]}<Cell{attrs}>{spreadsheet_data(text, runs)}{inner}</Cell>{xml[m.end():]}"
+    if wrap:
+        style_id = _XML_STYLE_ID.search(attrs)
+        if style_id is None:
+            raise ValueError("célula sem estilo no XML Spreadsheet")
+        xml = _with_wrap(xml, style_id.group(1))
+    return xml
+
+
+def _with_wrap(xml: str, style_id: str) -> str:
+    m = re.search(r'<Style\b[^>]*\bss:ID="%s"[^>]*?(/>|>(.*?)</Style>)' % re.escape(style_id), xml, re.S)
+    if m is None:
+        raise ValueError(f"estilo {style_id} ausente no XML Spreadsheet")
+    head = xml[m.start():m.start(1)]
+    body = m.group(2) or ""
+    alignment = re.search(r"<Alignment\b[^>]*?/?>", body)
+    if alignment is None:
+        body = '<Alignment ss:WrapText="1"/>' + body
+    else:
+        tag = re.sub(r'\s+ss:WrapText="[^"]*"', "", alignment.group())
+        tag = tag.replace("<Alignment", '<Alignment ss:WrapText="1"', 1)
+        body = body[:alignment.start()] + tag + body[alignment.end():]
+    return f"{xml[:m.start()]}{head}>{body}</Style>{xml[m.end():]}"
+
+
+def _direct_calls(runs, length: int, wrap: bool) -> int:
+    """Round-trips do caminho direto: value + WrapText + o plano de Characters/Font."""
+    ops = plan(runs, length)
+    return 1 + int(wrap) + sum(_FETCH_ROUND_TRIPS + _SET_ROUND_TRIPS * len(style) for _a, _b, style in ops)
+
+
+def write_rich_text(rng, text: str, runs, wrap: bool = True, clear_bold: bool = False) -> dict:
+    """
+    Grava o texto, os trechos e (wrap) WrapText na célula; retorna as contas de round-trips
+    (legacy_calls: value + WrapText + um Characters/Font por trecho e atributo) e o método usado.
+    clear_bold: no caminho direto, desliga o negrito que o Excel mantém nos caracteres reescritos
+    (o XML troca o conteúdo inteiro e não precisa).
+    Falha no value sobe; falha só na formatação do caminho direto volta em "error".
+    """
+    legacy = 1 + int(wrap) + legacy_calls(runs)
+    stats = {"runs": len(runs), "legacy_calls": legacy}
+    calls = 0
+    xml_ok = all(style.get(attr) is not False for _a, _b, style in runs for attr in _TOGGLES)
+    if xml_ok and _direct_calls(runs, len(text), wrap) > _XML_ROUND_TRIPS:
+        try:
+            area = rng.api.MergeArea
+            calls += 1
+            xml = area.GetValue(XL_RANGE_VALUE_XML)
+            calls += 1
+            area.SetValue(XL_RANGE_VALUE_XML, rich_cell_xml(xml, text, runs, wrap))
+            calls += 1
+            stats.update(method="xml", operations=1, calls=calls)
+            return stats
+        except Exception as e:
+            stats["xml_error"] = str(e)
+    rng.value = text
+    calls += 1
+    if wrap:
+        try:
+            rng.api.WrapText = True
+        except Exception:
+            pass
+        calls += 1
+    stats.update(method="characters", operations=0)
+    if runs or clear_bold:
+        try:
+            if clear_bold:
+                rng.characters[0:len(text)].font.bold = False
+                calls += _FETCH_ROUND_TRIPS + _SET_ROUND_TRIPS
+            applied = apply_runs(rng, runs, len(text))
+            stats["operations"] = applied["operations"]
+            calls += applied["calls"]
+        except Exception as e:
+            stats["error"] = str(e)
+    stats["calls"] = calls
+    return stats
+
+
+def pieces(text: str, runs) -> list[tuple[str, dict]]:
+    """Texto + trechos -> [(pedaço, estilo)] com estilo constante em cada pedaço (para XML e PDF)."""
+    length = len(text)
+    cuts = {0, length}
+    for start, stop, _style in runs:
+        cuts.add(max(0, min(length, start)))
+        cuts.add(max(0, min(length, stop)))
+    bounds = sorted(cuts)
+    result = []
+    for a, b in zip(bounds, bounds[1:]):
+        if b <= a:
+            continue
+        style = {}
+        for start, stop, run_style in runs:
+            if start <= a and b <= stop:
+                style.update(run_style)
+        if result and result[-1][1] == style:
+            result[-1] = (result[-1][0] + text[a:b], style)
+        else:
+            result.append((text[a:b], style))
+    return result
+
+
+def cell_runs(cell) -> list[tuple[int, int, dict]]:
+    """Trechos de uma MemoryCell: negrito (bold_spans) e demais atributos (font_runs)."""
+    runs = [(a, b, {"bold": True}) for a, b in cell.bold_spans]
+    runs.extend((a, b, {attr: value}) for a, b, attr, value in cell.font_runs)
+    return runs
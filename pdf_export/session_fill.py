@@ -0,0 +1,244 @@
+"""
+Re-preenchimento incremental (sessões do modo --serve): a pasta preenchida fica aberta
+entre jobs da mesma sessão e só as células cujo conteúdo mudou são regravadas.
+
+O estado de cada sessão é um "plano": o resultado final de fill_workbook aplicado a uma
+cópia em memória do modelo (MemoryBook), célula a célula — valor, formato de número,
+quebra de texto e rich text (negrito, itálico, tamanho, cor). Assim os valores derivados (valorFormaPagamento,
+[Valor Total], texto da D43) entram no plano sem regra à parte: mudou o valorM2, mudam
+as células que dependem dele e nada mais.
+
+Novo payload na sessão: calcula o plano novo, compara com o anterior e grava no Excel
+só a diferença; depois recalcula e exporta. Se o conjunto de células muda (ex.: a
+descrição adicional some) a pasta é reaberta e preenchida do zero, porque o estado
+original dessas células no Excel não é conhecido aqui.
+
+Pré-preenchimento especulativo: job com "export": false só aplica o plano (enquanto o
+usuário ainda está na confirmação); o clique final, com o mesmo payload, paga só o export.
+"""
+
+import time
+from pathlib import Path
+
+import fill_and_export_pdf as gen
+import metrics
+from excel_backend import MemoryApp, apply_session_profile, recalculate
+from rich_text import write_rich_text
+from xlsx_reader import to_address
+
+# Sessões abertas ao mesmo tempo (cada uma mantém uma pasta aberta no Excel do worker)
+MAX_SESSIONS = 4
+# Sessão sem uso por mais que isto (s) é fechada no próximo job
+SESSION_IDLE_TTL = 15 * 60.0
+
+
+def _template_id(template_path: Path) -> tuple:
+    st = template_path.stat()
+    return (str(template_path.resolve()), st.st_mtime_ns, st.st_size)
+
+
+def _cell_state(cell) -> tuple:
+    return (cell.value, cell.number_format, cell.wrap_text, tuple(cell.bold_spans), tuple(cell.font_runs))
+
+
+class FillSession:
+    """Uma sessão: pasta aberta no Excel, cópia intocada do modelo em memória e último plano aplicado."""
+
+    def __init__(self, session_id: str, template_path: Path):
+        self.id = session_id
+        self.template_path = template_path
+        self.template_id = _template_id(template_path)
+        with metrics.span("session.shadow"):
+            self.shadow = MemoryApp().books.open(str(template_path))
+        self.wb = None
+        self.plan: dict | None = None
+        self.used = time.monotonic()
+
+    def compute_plan(self, data: dict, totais: dict, manifest: dict | None) -> dict:
+        """
+        Estado final das células que o preenchimento grava, por (planilha, linha, coluna).
+        A cópia em memória volta ao estado do modelo logo depois (células gravadas são restauradas).
+        """
+        pristine = {sheet.name: dict(sheet._cells) for sheet in self.shadow.sheets}
+        for sheet in self.shadow.sheets:
+            # Células gravadas são objetos novos a partir daqui: o original fica em `pristine`
+            sheet._cells = {pos: _clone(cell) for pos, cell in sheet._cells.items()}
+            sheet._dirty = set()
+        gen._fill_workbook(self.shadow, data, totais, manifest)
+        plan = {}
+        for sheet in self.shadow.sheets:
+            for row, col in sheet._dirty:
+                plan[(sheet.name, row, col)] = _cell_state(sheet._cells[(row, col)])
+            sheet._cells = pristine[sheet.name]
+            sheet._dirty = set()
+        return plan
+
+    def close(self) -> None:
+        if self.wb is not None:
+            try:
+                self.wb.close()
+            except Exception:
+                pass
+            self.wb = None
+        self.plan = None
+
+
+def _clone(cell):
+    copied = type(cell)(cell.value, cell.formula, cell.style)
+    copied.number_format = cell.number_format
+    copied.wrap_text = cell.wrap_text
+    copied.bold_spans = list(cell.bold_spans)
+    copied.font_runs = list(cell.font_runs)
+    return copied
+
+
+class SessionStore:
+    """Sessões do worker por id, com limite (LRU) e tempo máximo ocioso."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: dict[str, FillSession] = {}
+
+    def get(self, session_id: str, template_path: Path) -> FillSession:
+        """Sessão existente para o mesmo modelo (inalterado) ou uma nova; fecha as ociosas e as excedentes."""
+        now = time.monotonic()
+        for sid, session in list(self.sessions.items()):
+            if sid != session_id and now - session.used > self.idle_ttl:
+                self.drop(sid)
+        session = self.sessions.pop(session_id, None)
+        if session is not None and session.template_id != _template_id(template_path):
+            session.close()
+            session = None
+        if session is None:
+            session = FillSession(session_id, template_path)
+        session.used = now
+        self.sessions[session_id] = session  # reinsere no fim: ordem = uso mais recente
+        while len(self.sessions) > self.max_sessions:
+            self.drop(next(iter(self.sessions)))
+        return session
+
+    def drop(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def close(self) -> None:
+        for session_id in list(self.sessions):
+            self.drop(session_id)
+
+
+def _write_cell(wb, key: tuple, state: tuple, previous: tuple | None) -> None:
+    sheet_name, row, col = key
+    value, number_format, wrap_text, bold_spans, font_runs = state
+    rng = wb.sheets[sheet_name].range(to_address(row, col))
+    if previous is None or previous[0] != value or previous[3:] != state[3:]:
+        runs = [(a, b, {"bold": True}) for a, b in bold_spans] + [(a, b, {attr: v}) for a, b, attr, v in font_runs]
+        # O Excel pode manter o negrito anterior nos caracteres reescritos
+        clear_bold = previous is not None and bool(previous[3]) and isinstance(value, str)
+        if runs and isinstance(value, str):
+            # WrapText fica com o bloco abaixo (só quando muda)
+            write_rich_text(rng, value, runs, wrap=False, clear_bold=clear_bold)
+        else:
+            rng.value = value
+            if clear_bold:
+                rng.characters[0:len(value)].font.bold = False
+    if number_format is not None and (previous is None or previous[1] != number_format):
+        rng.number_format = number_format
+    if wrap_text and (previous is None or previous[2] != wrap_text):
+        try:
+            rng.api.WrapText = True
+        except Exception:
+            pass
+
+
+def _apply_plan(
+    app, session: FillSession, plan: dict, data: dict, totais: dict, manifest: dict | None
+) -> tuple[int, bool]:
+    """Leva a pasta da sessão ao plano; retorna (células gravadas, se a pasta aberta foi reaproveitada)."""
+    if session.wb is not None and session.plan is not None and set(plan) == set(session.plan):
+        changed = [key for key, state in plan.items() if session.plan[key] != state]
+    else:
+        changed = None
+    # Itálico/tamanho/cor aplicados antes não têm como voltar ao da fonte do modelo: reabre
+    if changed is not None and not any(session.plan[key][4] for key in changed):
+        wb = metrics.instrument(session.wb)
+        with metrics.span("fill"):
+            metrics.step("diff")
+            for key in changed:
+                _write_cell(wb, key, plan[key], session.plan[key])
+        session.plan = plan
+        return len(changed), True
+
+    if session.wb is not None:
+        gen._log(f"Sessão {session.id!r}: células preenchidas mudaram; reabrindo o modelo.")
+        session.close()
+    with metrics.span("workbook.open"):
+        session.wb = app.books.open(str(session.template_path.resolve()))
+    apply_session_profile(app)
+    gen.fill_workbook(session.wb, data, totais, manifest)
+    session.plan = plan
+    return len(plan), False
+
+
+def run_session_job(
+    app,
+    sessions: SessionStore,
+    session_id: str,
+    template_path: Path,
+    data: dict,
+    output_path: Path | None,
+    manifest: dict | None = None,
+    output_profile: str | None = None,
+    totais: dict | None = None,
+) -> dict:
+    """
+    Como run_job, mas na pasta mantida aberta pela sessão: grava só as células que mudaram.
+    output_path None: pré-preenchimento (sem recalcular nem exportar). totais: os de prepare_data,
+    quando `data` já foi preparado.
+    Qualquer erro fecha a sessão (o estado da pasta deixa de ser conhecido) e é repassado.
+    Retorna os tempos em ms e o número de células gravadas (cells_written).
+    """
+    t0 = time.perf_counter()
+    if manifest is None:
+        with metrics.span("template.check"):
+            manifest = gen.check_template(template_path, data)
+    if totais is None:
+        with metrics.span("prepare"):
+            totais = gen.prepare_data(data)
+    t1 = time.perf_counter()
+    try:
+        session = sessions.get(session_id, template_path)
+        with metrics.span("session.plan"):
+            plan = session.compute_plan(data, totais, manifest)
+        t2 = time.perf_counter()
+        written, reused = _apply_plan(app, session, plan, data, totais, manifest)
+        t3 = time.perf_counter()
+        if output_path is not None:
+            with metrics.span("recalculate"):
+                recalculate(app)
+            with metrics.span("export"):
+                gen.export_pdf(session.wb, output_path, output_profile, template_path)
+    except Exception:
+        sessions.drop(session_id)
+        raise
+    t4 = time.perf_counter()
+    metrics.annotate(session=session_id, session_reused=reused, cells_written=written)
+    gen._log(
+        f"Sessão {session_id!r}: {written} de {len(plan)} célula(s) gravada(s)"
+        + (" (pasta reaproveitada)" if reused else "")
+        + ("" if output_path is not None else "; pré-preenchimento, sem export")
+    )
+    timings = {
+        "prepare_ms": gen._ms(t0, t1),
+        "plan_ms": gen._ms(t1, t2),
+        "fill_ms": gen._ms(t2, t3),
+        "export_ms": gen._ms(t3, t4),
+        "total_ms": gen._ms(t0, t4),
+        "cells_written": written,
+    }
+    if output_path is not None and output_profile and output_path.suffix.lower() == ".pdf":
+        report = gen.optimize_output(output_path, output_profile)
+        timings["optimize_ms"] = report["ms"]
+        timings["total_ms"] = round(timings["total_ms"] + report["ms"], 2)
+    return timings
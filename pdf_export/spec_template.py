@@ -0,0 +1,210 @@
+"""
+Modelos dos textos de especificação (D43): compilados uma vez e renderizados numa única passada,
+que devolve o texto e os trechos em negrito (intervalos [início, fim) no texto final).
+
+Sintaxe:
+  {campo}                  valor do payload (ausente/vazio -> "")
+  {campo|strip|lower}      transformações em cadeia (TRANSFORMS): strip, lower, upper, sem_prefixo_medidas
+  {#}                      número do próximo item (1, 2, 3...; itens de blocos omitidos não contam)
+  **texto**                trecho em negrito
+  {% if cond %} ... {% elif cond %} ... {% else %} ... {% endif %}
+      cond: campo | not campo | campo == "x" | campo != "x" | campo in ("x", "y") | campo not in (...)
+      Comparações usam o valor sem espaços nas pontas; "campo" sozinho = preenchido.
+  {{ e }}                  chaves literais
+
+Uma tag {% ... %} sozinha na linha é removida junto com a quebra de linha, para os modelos
+poderem ser escritos um bloco por linha.
+"""
+
+import ast
+import re
+from functools import lru_cache
+
+
+class SpecTemplateError(ValueError):
+    """Modelo de texto inválido (tag desconhecida, bloco sem {% endif %}, transformação inexistente...)."""
+
+
+def _sem_prefixo_medidas(value: str) -> str:
+    """Evita "medidas: medidas ..." quando o payload já traz o prefixo "medidas "."""
+    return value[8:].strip() if value.lower().startswith("medidas ") else value
+
+
+TRANSFORMS = {
+    "strip": str.strip,
+    "lower": str.lower,
+    "upper": str.upper,
+    "sem_prefixo_medidas": _sem_prefixo_medidas,
+}
+
+_STANDALONE_TAG = re.compile(r"^[ \t]*(\{%.*?%\})[ \t]*(?:\n|\Z)", re.M)
+_TOKEN = re.compile(r"\{%\s*(.*?)\s*%\}|\{\{|\}\}|\{#\}|\{([A-Za-z_]\w*)((?:\|\w+)*)\}|\*\*")
+_CONDITION = re.compile(r"^(not\s+)?([A-Za-z_]\w*)(?:\s*(==|!=|not\s+in\b|in\b)\s*(.+))?$")
+
+
+class _State:
+    __slots__ = ("parts", "pos", "item", "bold_start", "bold")
+
+    def __init__(self):
+        self.parts = []
+        self.pos = 0
+        self.item = 0
+        self.bold_start = None
+        self.bold = []
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.pos += len(text)
+
+
+def _field_text(data: dict, field: str) -> str:
+    value = data.get(field) or ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _compile_condition(expr: str):
+    m = _CONDITION.match(expr.strip())
+    if not m:
+        raise SpecTemplateError(f"condição inválida: {expr!r}")
+    negate, field, op, literal = m.groups()
+    if op is None:
+        def test(data):
+            value = data.get(field)
+            return bool(value.strip()) if isinstance(value, str) else bool(value)
+        return (lambda data: not test(data)) if negate else test
+    if negate:
+        raise SpecTemplateError(f"'not' antes de comparação não é suportado: {expr!r}")
+    try:
+        expected = ast.literal_eval(literal.strip())
+    except (ValueError, SyntaxError) as e:
+        raise SpecTemplateError(f"literal inválido em {expr!r}: {e}") from None
+    op = " ".join(op.split())
+    if op in ("in", "not in"):
+        if not isinstance(expected, (tuple, list, set, frozenset)):
+            raise SpecTemplateError(f"'{op}' espera uma tupla de textos: {expr!r}")
+        options = frozenset(str(v) for v in expected)
+        if op == "in":
+            return lambda data: _field_text(data, field).strip() in options
+        return lambda data: _field_text(data, field).strip() not in options
+    expected = str(expected)
+    if op == "==":
+        return lambda data: _field_text(data, field).strip() == expected
+    return lambda data: _field_text(data, field).strip() != expected
+
+
+def _literal_node(text: str):
+    def emit(data, state):
+        state.write(text)
+    return emit
+
+
+def _field_node(field: str, transforms: list, newline: str):
+    def emit(data, state):
+        value = _field_text(data, field)
+        for transform in transforms:
+            value = transform(value)
+        if newline != "\n" and "\n" in value:
+            value = value.replace("\n", newline)
+        state.write(value)
+    return emit
+
+
+def _item_node(data, state):
+    state.item += 1
+    state.write(str(state.item))
+
+
+def _bold_node(data, state):
+    if state.bold_start is None:
+        state.bold_start = state.pos
+    else:
+        if state.pos > state.bold_start:
+            state.bold.append((state.bold_start, state.pos))
+        state.bold_start = None
+
+
+def _if_node(branches: list):
+    def emit(data, state):
+        for test, body in branches:
+            if test is None or test(data):
+                for node in body:
+                    node(data, state)
+                return
+    return emit
+
+
+def _parse(source: str, newline: str) -> list:
+    source = _STANDALONE_TAG.sub(r"\1", source)
+    root: list = []
+    # Pilha de blocos if abertos: [ramos [(teste, corpo)], corpo atual]
+    stack: list = []
+    body = root
+    pos = 0
+    for m in _TOKEN.finditer(source):
+        if m.start() > pos:
+            body.append(_literal_node(source[pos : m.start()].replace("\n", newline)))
+        pos = m.end()
+        token = m.group(0)
+        tag, field = m.group(1), m.group(2)
+        if tag is not None:
+            keyword, _, rest = tag.partition(" ")
+            if keyword == "if":
+                branch_body: list = []
+                block = [[(_compile_condition(rest), branch_body)], body]
+                stack.append(block)
+                body.append(_if_node(block[0]))
+                body = branch_body
+            elif keyword in ("elif", "else"):
+                if not stack:
+                    raise SpecTemplateError(f"{{% {keyword} %}} fora de um bloco if")
+                branches = stack[-1][0]
+                if branches[-1][0] is None:
+                    raise SpecTemplateError(f"{{% {keyword} %}} depois de {{% else %}}")
+                body = []
+                branches.append((_compile_condition(rest) if keyword == "elif" else None, body))
+            elif keyword == "endif":
+                if not stack:
+                    raise SpecTemplateError("{% endif %} sem {% if %}")
+                body = stack.pop()[1]
+            else:
+                raise SpecTemplateError(f"tag desconhecida: {{% {tag} %}}")
+        elif field is not None:
+            names = [t for t in m.group(3).split("|") if t]
+            unknown = [t for t in names if t not in TRANSFORMS]
+            if unknown:
+                raise SpecTemplateError(f"transformação desconhecida em {token}: {', '.join(unknown)}")
+            body.append(_field_node(field, [TRANSFORMS[t] for t in names], newline))
+        elif token == "{#}":
+            body.append(_item_node)
+        elif token == "**":
+            body.append(_bold_node)
+        else:
+            body.append(_literal_node(token[0]))
+    if stack:
+        raise SpecTemplateError("bloco {% if %} sem {% endif %}")
+    if pos < len(source):
+        root.append(_literal_node(source[pos:].replace("\n", newline)))
+    return root
+
+
+class SpecTemplate:
+    """Modelo compilado: render(data) -> (texto, [(início, fim) em negrito])."""
+
+    def __init__(self, source: str, newline: str = "\n"):
+        self.source = source
+        self.newline = newline
+        self._nodes = _parse(source, newline)
+
+    def render(self, data: dict) -> tuple[str, list[tuple[int, int]]]:
+        state = _State()
+        for node in self._nodes:
+            node(data, state)
+        if state.bold_start is not None and state.pos > state.bold_start:
+            state.bold.append((state.bold_start, state.pos))
+        return "".join(state.parts), state.bold
+
+
+@lru_cache(maxsize=None)
+def compile_template(source: str, newline: str = "\n") -> SpecTemplate:
+    """Compila (uma vez por modelo e quebra de linha) e guarda em cache."""
+    return SpecTemplate(source, newline)
@@ -0,0 +1,147 @@
+"""
+Tempo de partida do gerador (--startup-report): de quando o processo foi criado até os
+argumentos lidos, antes de qualquer trabalho.
+
+Importado PRIMEIRO por fill_and_export_pdf: marca o primeiro código Python do gerador e,
+só quando --startup-report está na linha de comando, mede cada import de primeiro nível
+(tempo acumulado, com os imports que ele puxa). Sem a flag, custa um time.perf_counter().
+
+Partes do relatório (ms):
+  unpack       .exe one-file do PyInstaller: do bootloader (processo pai) ao processo Python,
+               que só nasce depois de extrair o pacote para uma pasta temporária
+  interpreter  criação do processo Python -> primeira linha do gerador (inicialização do
+               interpretador e, no .exe, carga do PYZ)
+  imports      primeira linha -> main(); `imports` lista os módulos mais caros
+  args         main() -> argumentos lidos (montagem do argparse)
+
+O relatório diz também se xlwings e numpy foram carregados (não devem: só o Excel e o sweep
+vetorizado precisam deles).
+"""
+
+import builtins
+import os
+import sys
+import time
+
+# Primeiro código do gerador: relógio de parede (para comparar com a criação do processo) e monotônico
+_WALL0 = time.time()
+_T0 = time.perf_counter()
+FLAG = "--startup-report"
+
+_marks: dict[str, float] = {}
+_imports: list[tuple[str, float]] = []
+_original_import = builtins.__import__
+_depth = 0
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global _depth
+    new = _depth == 0 and level == 0 and name not in sys.modules
+    _depth += 1
+    t0 = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+        if new:
+            _imports.append((name, (time.perf_counter() - t0) * 1000.0))
+
+
+if FLAG in sys.argv[1:]:
+    builtins.__import__ = _timed_import
+
+
+def mark(name: str) -> None:
+    """Registra o instante de uma etapa da partida ("main", "args")."""
+    _marks[name] = time.perf_counter()
+
+
+def bundle_kind() -> str:
+    """"script" (python fill_and_export_pdf.py), "onefile" ou "onedir" (.exe do PyInstaller)."""
+    if not getattr(sys, "frozen", False):
+        return "script"
+    bundle_dir = getattr(sys, "_MEIPASS", None) or ""
+    # One-file extrai para %TEMP%\_MEIxxxxxx a cada execução; one-dir roda da própria pasta
+    return "onefile" if os.path.basename(bundle_dir.rstrip("\\/")).startswith("_MEI") else "onedir"
+
+
+def process_start(pid: int) -> float | None:
+    """Criação do processo (time.time()), ou None se ele já terminou ou o sistema não informar."""
+    try:
+        if sys.platform == "win32":
+            return _process_start_windows(pid)
+        if os.path.exists(f"/proc/{pid}/stat"):
+            return _process_start_linux(pid)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    return None
+
+
+def _process_start_windows(pid: int) -> float | None:
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return None
+    try:
+        code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) or code.value != 259:  # STILL_ACTIVE
+            return None
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in times)):
+            return None
+        created = (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+        # FILETIME: intervalos de 100 ns desde 1601-01-01
+        return created / 1e7 - 11644473600.0
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _process_start_linux(pid: int) -> float | None:
+    with open(f"/proc/{pid}/stat", encoding="ascii") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    if fields[0] in ("Z", "X"):  # terminou, só falta o pai recolher
+        return None
+    started = int(fields[19]) / os.sysconf("SC_CLK_TCK")  # campo 22: starttime (ticks desde o boot)
+    with open("/proc/uptime", encoding="ascii") as f:
+        uptime = float(f.read().split()[0])
+    return time.time() - (uptime - started)
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000.0, 1)
+
+
+def report(top: int = 15) -> dict:
+    """Resumo da partida até agora (ver o docstring do módulo)."""
+    now = time.perf_counter()
+    kind = bundle_kind()
+    created = process_start(os.getpid())
+    parent = process_start(os.getppid()) if kind == "onefile" else None
+    main_at = _marks.get("main", now)
+    args_at = _marks.get("args", now)
+    first_line = _WALL0
+    origin = parent if parent is not None else created
+    return {
+        "event": "startup",
+        "bundle": kind,
+        "executable": sys.executable,
+        "bundle_dir": getattr(sys, "_MEIPASS", None),
+        "python": sys.version.split()[0],
+        "ms": {
+            "unpack": _ms(created - parent) if parent is not None and created is not None else None,
+            "interpreter": _ms(first_line - created) if created is not None else None,
+            "imports": _ms(main_at - _T0),
+            "args": _ms(args_at - main_at),
+            "total": _ms(first_line + (now - _T0) - origin) if origin is not None else _ms(now - _T0),
+        },
+        "imports": [
+            {"module": name, "ms": round(ms, 2)} for name, ms in sorted(_imports, key=lambda item: -item[1])[:top]
+        ],
+        "modules_loaded": len(sys.modules),
+        "loaded": {name: name in sys.modules for name in ("xlwings", "numpy")},
+    }
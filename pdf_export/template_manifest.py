@@ -0,0 +1,201 @@
+"""
+Manifesto do modelo .xlsx: posição de todos os placeholders, compilada sem Excel.
+
+Os modelos de resources/ quase nunca mudam; em vez de redescobrir os placeholders
+dentro do Excel a cada geração, o .xlsx é lido direto do zip (sharedStrings.xml e
+XML das planilhas, com parser incremental) e o resultado vira um manifesto JSON
+compacto, guardado em cache com o SHA-256 do modelo como chave. Na geração o
+manifesto é só carregado (e recompilado quando o hash muda).
+
+Formato:
+  {"version": 1, "sha256": "...", "sheets": ["CONTRATO DE SERVIÇOS"],
+   "placeholders": {"[Nome do Cliente]": [[0, "$D$14"]], ...},
+   "fixed_cells": {"D43": true, "D44": true, "M44": true, "N44": true}}
+Cada ocorrência é [índice da planilha, endereço absoluto], na ordem do Cells.Find.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+from placeholder_index import PLACEHOLDER_RE
+from xlsx_reader import NS_MAIN, sheet_parts, split_address, to_address
+
+MANIFEST_VERSION = 1
+
+# Cache dos manifestos (um arquivo por hash de modelo)
+MANIFEST_DIR = Path(os.environ.get("TEMP", os.path.expanduser("~"))) / "pdf_export_cache" / "manifests"
+
+# Células fixas que o gerador escreve na primeira planilha
+FIXED_CELLS = ("D43", "D44", "M44", "N44")
+
+_M = "{%s}" % NS_MAIN
+
+# Cache em processo (modo --serve): (caminho, tamanho, mtime) -> manifesto
+_memo: dict = {}
+
+
+class TemplateError(Exception):
+    """Modelo inválido para o tipo de proposta (placeholder ou célula fixa ausente)."""
+
+
+def template_hash(path) -> str:
+    """SHA-256 do conteúdo do modelo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _shared_string_tokens(zf: zipfile.ZipFile) -> dict[int, list[str]]:
+    """Índice da string compartilhada -> tokens [..] que ela contém (só as que têm token)."""
+    tokens: dict[int, list[str]] = {}
+    try:
+        fh = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return tokens
+    with fh:
+        i = 0
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag != _M + "si":
+                continue
+            text = "".join(t.text or "" for t in elem.iter(_M + "t"))
+            found = PLACEHOLDER_RE.findall(text)
+            if found:
+                tokens[i] = found
+            i += 1
+            elem.clear()
+    return tokens
+
+
+def _sheet_tokens(zf: zipfile.ZipFile, part: str, shared_tokens: dict[int, list[str]]):
+    """Percorre uma planilha: gera (linha, coluna, tokens) e devolve o conjunto de endereços existentes."""
+    cells = []
+    present = set()
+    with zf.open(part) as fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag != _M + "c":
+                continue
+            address = elem.get("r")
+            present.add(address)
+            cell_type = elem.get("t")
+            found = []
+            if cell_type == "s":
+                v = elem.find(_M + "v")
+                if v is not None and v.text:
+                    found = shared_tokens.get(int(v.text), [])
+            else:
+                texts = [t.text or "" for t in elem.iter(_M + "t")]
+                v = elem.find(_M + "v")
+                if cell_type == "str" and v is not None and v.text:
+                    texts.append(v.text)
+                f = elem.find(_M + "f")
+                if f is not None and f.text:
+                    texts.append(f.text)
+                found = PLACEHOLDER_RE.findall("\n".join(texts))
+            if found:
+                row, col = split_address(address)
+                cells.append((row, col, found))
+            elem.clear()
+    return cells, present
+
+
+def compile_manifest(path) -> dict:
+    """Lê o .xlsx (sem Excel) e monta o manifesto de placeholders e células fixas."""
+    path = Path(path)
+    with zipfile.ZipFile(path) as zf:
+        shared_tokens = _shared_string_tokens(zf)
+        sheets = []
+        placeholders: dict[str, list] = {}
+        fixed = {}
+        for sheet_idx, (name, part) in enumerate(sheet_parts(zf)):
+            sheets.append(name)
+            cells, present = _sheet_tokens(zf, part, shared_tokens)
+            if sheet_idx == 0:
+                fixed = {cell: cell in present for cell in FIXED_CELLS}
+            # Ordem do Find com After=A1: por linhas, A1 por último
+            cells.sort(key=lambda item: ((item[0], item[1]) == (1, 1), item[0], item[1]))
+            for row, col, found in cells:
+                address = to_address(row, col, absolute=True)
+                seen = set()
+                for token in found:
+                    if token.lower() in seen:
+                        continue
+                    seen.add(token.lower())
+                    placeholders.setdefault(token, []).append([sheet_idx, address])
+    return {
+        "version": MANIFEST_VERSION,
+        "sha256": template_hash(path),
+        "sheets": sheets,
+        "placeholders": placeholders,
+        "fixed_cells": fixed,
+    }
+
+
+def manifest_path(sha256: str, cache_dir=None) -> Path:
+    return Path(cache_dir or MANIFEST_DIR) / f"{sha256}.json"
+
+
+def save_manifest(manifest: dict, cache_dir=None) -> Path:
+    """Grava o manifesto compacto no cache (escrita atômica: .tmp + replace)."""
+    target = manifest_path(manifest["sha256"], cache_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+def load_manifest(path, cache_dir=None) -> dict:
+    """
+    Manifesto do modelo: memória do processo -> cache em disco (por hash) -> compilação.
+    Só recompila quando o hash do modelo muda (ou o formato do manifesto).
+    """
+    path = Path(path)
+    st = path.stat()
+    memo_key = (str(path.resolve()), st.st_size, st.st_mtime_ns, str(cache_dir or MANIFEST_DIR))
+    cached = _memo.get(memo_key)
+    if cached is not None:
+        return cached
+
+    sha = template_hash(path)
+    target = manifest_path(sha, cache_dir)
+    manifest = None
+    try:
+        manifest = json.loads(target.read_text(encoding="utf-8"))
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("sha256") != sha:
+            manifest = None
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is None:
+        manifest = compile_manifest(path)
+        try:
+            save_manifest(manifest, cache_dir)
+        except OSError:
+            pass  # sem cache em disco: segue com o manifesto em memória
+    _memo[memo_key] = manifest
+    return manifest
+
+
+def manifest_gaps(manifest: dict, placeholders: list[str], fixed_cells: tuple = ()) -> tuple[list[str], list[str]]:
+    """Placeholders e células fixas da lista que o manifesto não tem (placeholders sem distinguir caixa)."""
+    present = {token.lower() for token in manifest.get("placeholders", {})}
+    missing = [p for p in placeholders if p.lower() not in present]
+    missing_cells = [c for c in fixed_cells if not manifest.get("fixed_cells", {}).get(c)]
+    return missing, missing_cells
+
+
+def validate_manifest(manifest: dict, required: list[str], fixed_cells: tuple = ()) -> None:
+    """Levanta TemplateError se faltar algum placeholder obrigatório ou célula fixa no modelo."""
+    missing, missing_cells = manifest_gaps(manifest, required, fixed_cells)
+    problems = []
+    if missing:
+        problems.append("placeholder(s) ausente(s): " + ", ".join(missing))
+    if missing_cells:
+        problems.append("célula(s) fixa(s) ausente(s) na primeira planilha: " + ", ".join(missing_cells))
+    if problems:
+        raise TemplateError("modelo incompatível — " + "; ".join(problems))
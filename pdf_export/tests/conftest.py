@@ -0,0 +1,86 @@
+"""
+Testes do gerador no Linux, sem Excel: backend em memória (--backend memory), preenchimento XML
+(--fill-backend xml) e os módulos que não dependem do Excel.
+
+  pip install pytest
+  python -m pytest pdf_export/tests
+
+Os payloads são os do benchmark (os quatro tipoProposta) e os modelos, os de resources/.
+"""
+
+import copy
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+PDF_EXPORT_DIR = Path(__file__).resolve().parent.parent
+GENERATOR = PDF_EXPORT_DIR / "fill_and_export_pdf.py"
+
+# Antes de importar o gerador: log, manifestos, caches, arquivo e instâncias do Excel numa pasta só dos testes
+SCRATCH = tempfile.mkdtemp(prefix="pdf_export_tests_")
+os.environ["TEMP"] = SCRATCH
+for _var in (
+    "PDF_EXPORT_ARCHIVE",
+    "PDF_EXPORT_ARCHIVE_RUNS",
+    "PDF_EXPORT_ASSEMBLE_PAGES",
+    "PDF_EXPORT_CACHE_DIR",
+    "PDF_EXPORT_DEADLINES",
+    "PDF_EXPORT_EXCEL_STATE",
+    "PDF_EXPORT_PAGES_DIR",
+):
+    os.environ.pop(_var, None)
+sys.path.insert(0, str(PDF_EXPORT_DIR))
+
+from batch import default_templates_dir, template_for  # noqa: E402
+from benchmark import FIXTURES  # noqa: E402
+
+TIPOS = tuple(FIXTURES)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+def template(tipo: str) -> Path:
+    path = template_for(tipo, default_templates_dir())
+    if not path.exists():
+        pytest.skip(f"modelo ausente: {path}")
+    return path
+
+
+def payload(tipo: str) -> dict:
+    """Cópia do payload do tipo (prepare_data altera o dict)."""
+    return copy.deepcopy(FIXTURES[tipo])
+
+
+def start_generator(*args, env: dict | None = None, stdin=None) -> subprocess.Popen:
+    """Inicia fill_and_export_pdf.py num processo próprio (stdout/stderr em texto); env soma ao ambiente dos testes."""
+    return subprocess.Popen(
+        [sys.executable, str(GENERATOR), *map(str, args)],
+        cwd=PDF_EXPORT_DIR,
+        env={**os.environ, **(env or {})},
+        stdin=stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+    )
+
+
+def run_generator(
+    *args, env: dict | None = None, input: str | None = None, timeout: float = 60.0
+) -> subprocess.CompletedProcess:
+    """Como start_generator, esperando o fim; input vai para o stdin (--data -)."""
+    stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+    with start_generator(*args, env=env, stdin=stdin) as proc:
+        try:
+            stdout, stderr = proc.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+    return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
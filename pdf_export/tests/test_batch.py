@@ -0,0 +1,124 @@
+"""Geração em lote (--batch) no backend em memória: colunas do CSV -> payload com os tipos do app."""
+
+import csv
+import json
+import sys
+
+import pytest
+from conftest import payload, template
+
+import fill_and_export_pdf as gen
+import pricing
+from batch import (
+    DEFAULT_TEMPLATE_FILE,
+    RESULTS_FILE,
+    column_aliases,
+    coerce_value,
+    default_templates_dir,
+    row_payload,
+    run_batch,
+)
+from excel_backend import MemoryApp
+
+
+def _cell(value) -> str:
+    """Como o CRM exporta: sim/não e decimal com vírgula."""
+    if isinstance(value, bool):
+        return "sim" if value else "não"
+    if isinstance(value, float):
+        return f"{value:g}".replace(".", ",")
+    return str(value)
+
+
+def _porta_rows() -> list[dict]:
+    """Payloads da Porta (JSON do app) que viram as linhas do CSV: com e sem bandeirola/alizar."""
+    com = payload("porta")
+    sem = payload("porta")
+    sem.update(bandeirola=False, alizar=False, nomeCliente="Carla Mendes", alturaPorta=2.25, larguraPorta=0.9)
+    return [com, sem]
+
+
+def _write_csv(path, rows: list[dict]) -> None:
+    header = list(rows[0])
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([_cell(row[key]) for key in header])
+
+
+@pytest.mark.parametrize(
+    ("key", "text", "expected"),
+    [
+        ("bandeirola", "Não", False),
+        ("bandeirola", "false", False),
+        ("bandeirola", "0", False),
+        ("bandeirola", "", False),
+        ("alizar", "SIM", True),
+        ("alizar", "1", True),
+        ("alturaPorta", "2,10", 2.1),
+        ("alturaPorta", "2.10", 2.1),
+        ("larguraBandeirola", "1,00m", 1.0),
+        ("alturaBandeirola", "", ""),
+        ("medidasPorta", "porta 2,10m x 1,00m", "porta 2,10m x 1,00m"),
+    ],
+)
+def test_coerce_value(key, text, expected):
+    assert coerce_value(key, text) == expected
+
+
+@pytest.mark.parametrize(("key", "text"), [("bandeirola", "talvez"), ("alturaPorta", "dois metros")])
+def test_coerce_value_rejects(key, text):
+    with pytest.raises(ValueError, match=key):
+        coerce_value(key, text)
+
+
+def test_alizar_column_reaches_payload():
+    data = row_payload(["Alizar", "Medida Alizar"], ["sim", "10cm"], column_aliases(), {})
+    assert data == {"alizar": True, "medidaAlizar": "10cm"}
+
+
+def test_porta_csv_prices_like_json(tmp_path):
+    rows = _porta_rows()
+    source = tmp_path / "clientes.csv"
+    _write_csv(source, rows)
+    summary = run_batch(source, tmp_path / "saida", backend="memory")
+    assert (summary["ok"], summary["failed"]) == (2, 0)
+
+    results = [json.loads(line) for line in (tmp_path / "saida" / RESULTS_FILE).read_text(encoding="utf-8").splitlines()]
+    aliases = column_aliases()
+    with open(source, encoding="utf-8", newline="") as f:
+        header, *lines = list(csv.reader(f, delimiter=";"))
+    for data, values, record in zip(rows, lines, results):
+        from_csv = row_payload(header, values, aliases, {})
+        assert pricing.quote(from_csv) == pricing.quote(data)
+        # O PDF do lote é o da geração com o JSON do app (preço e D43 sem o bloco da bandeirola)
+        expected = tmp_path / f"json-{record['row']}.pdf"
+        gen.run_job(MemoryApp(), template("porta"), dict(data), expected)
+        with open(record["output"], "rb") as f:
+            assert f.read() == expected.read_bytes()
+    assert pricing.quote(rows[1])["m2"] == round(2.25 * 0.9, 2)
+
+
+def test_invalid_cell_fails_only_its_row(tmp_path):
+    rows = _porta_rows()
+    rows[0]["alturaPorta"] = "dois metros"
+    source = tmp_path / "clientes.csv"
+    _write_csv(source, rows)
+    summary = run_batch(source, tmp_path / "saida", backend="memory")
+    assert (summary["ok"], summary["failed"]) == (1, 1)
+    first = json.loads((tmp_path / "saida" / RESULTS_FILE).read_text(encoding="utf-8").splitlines()[0])
+    assert first["status"] == "failed" and "alturaPorta" in first["error"]
+    assert first["nomeCliente"] == rows[0]["nomeCliente"]
+
+
+@pytest.mark.parametrize("exe_dir", ["pdf_export/fill_and_export_pdf", "pdf_export"])
+def test_default_templates_dir_in_installed_app(tmp_path, monkeypatch, exe_dir):
+    # Instalação: <app>/resources/ (extraResources) com pdf_export/ e os modelos em resources/
+    install = tmp_path / "resources"
+    (install / "resources").mkdir(parents=True)
+    (install / "resources" / DEFAULT_TEMPLATE_FILE).write_bytes(b"")
+    (install / exe_dir).mkdir(parents=True)
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    monkeypatch.setattr(sys, "executable", str(install / exe_dir / "fill_and_export_pdf.exe"))
+    assert default_templates_dir() == (install / "resources").resolve()
@@ -0,0 +1,179 @@
+"""Supervisão do Excel (excel_watchdog): escalonamento por prazo, órfãs e o lock do arquivo de instâncias."""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+from conftest import PDF_EXPORT_DIR, payload, start_generator, template
+
+import excel_watchdog
+from excel_watchdog import EXIT_TIMEOUT, parse_deadlines, process_alive, reap_orphans, track, untrack
+from startup import process_start
+
+# Sem "launch": o Excel simulado travado na abertura ainda não tem PID para o watchdog encerrar
+HUNG_PHASES = ("open", "fill", "export", "quit")
+
+
+def _state(path) -> list[dict]:
+    return json.loads(path.read_text(encoding="utf-8"))["instances"] if path.exists() else []
+
+
+def _sleeper(seconds: float = 60.0) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", f"import time; time.sleep({seconds})"])
+
+
+@pytest.fixture(scope="module")
+def hung_runs(tmp_path_factory):
+    """fase -> (código de saída, stderr, arquivo de instâncias); as quatro em paralelo (~1 s + 2 x GRACE_S cada)."""
+    folder = tmp_path_factory.mktemp("hung")
+    data = folder / "dados.json"
+    data.write_text(json.dumps(payload("porta")), encoding="utf-8")
+    runs = {}
+    for phase in HUNG_PHASES:
+        state = folder / f"{phase}.json"
+        proc = start_generator(
+            "--template", template("porta"), "--data", data, "--output", folder / f"{phase}.pdf",
+            "--backend", "memory", "--no-cache", "--fake-hang", phase, "--deadlines", f"{phase}=1",
+            env={"PDF_EXPORT_EXCEL_STATE": str(state)},
+        )
+        runs[phase] = (proc, state)
+    results = {}
+    for phase, (proc, state) in runs.items():
+        try:
+            _stdout, stderr = proc.communicate(timeout=60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+        results[phase] = (proc.returncode, stderr, state)
+    return results
+
+
+@pytest.mark.parametrize("phase", HUNG_PHASES)
+def test_deadline_escalates_and_exits_124(hung_runs, phase):
+    returncode, stderr, state = hung_runs[phase]
+    assert returncode == EXIT_TIMEOUT, stderr
+    lines = stderr.strip().splitlines()
+    assert any(line.startswith(f"Erro: Excel não respondeu na fase '{phase}'") for line in lines)
+    info = json.loads(lines[-1])
+    assert info["event"] == "timeout"
+    assert info["phase"] == phase
+    assert info["deadline_s"] == 1.0
+    # O Excel simulado ignora o pedido para sair: quit e depois kill
+    assert info["escalation"] == ["quit", "kill"]
+    assert info["excel_pid"] and process_start(info["excel_pid"]) is None
+    assert _state(state) == []
+
+
+def test_parse_deadlines():
+    assert parse_deadlines(None) == excel_watchdog.DEFAULT_DEADLINES
+    deadlines = parse_deadlines("export=300, open=2.5")
+    assert (deadlines["export"], deadlines["open"], deadlines["fill"]) == (300.0, 2.5, 120.0)
+    assert set(parse_deadlines("off").values()) == {0.0}
+    for spec in ("abrir=10", "export", "export=-1", "export=x"):
+        with pytest.raises(ValueError):
+            parse_deadlines(spec)
+
+
+def test_reap_orphans(tmp_path):
+    state = tmp_path / "instances.json"
+    gone = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.3)"])
+    gone_created = None
+    while gone_created is None:
+        gone_created = process_start(gone.pid)
+    gone.wait()
+    orphan, kept, reused = _sleeper(), _sleeper(), _sleeper()
+    try:
+        me = {"owner": os.getpid(), "owner_created": process_start(os.getpid())}
+        dead_owner = {"owner": gone.pid, "owner_created": gone_created}
+        entries = [
+            {"pid": orphan.pid, "created": process_start(orphan.pid), **dead_owner},
+            {"pid": kept.pid, "created": process_start(kept.pid), **me},
+            # Excel que já saiu e PID reaproveitado por outro processo: só saem do arquivo
+            {"pid": gone.pid, "created": gone_created, **dead_owner},
+            {"pid": reused.pid, "created": process_start(reused.pid) - 100, **dead_owner},
+        ]
+        state.write_text(json.dumps({"instances": entries}), encoding="utf-8")
+
+        assert reap_orphans(state) == [orphan.pid]
+        assert orphan.wait(5) is not None
+        assert kept.poll() is None and reused.poll() is None
+        assert _state(state) == [entries[1]]
+        assert reap_orphans(state) == []
+    finally:
+        for proc in (orphan, kept, reused):
+            proc.kill()
+            proc.wait()
+
+
+def test_track_and_untrack(tmp_path):
+    state = tmp_path / "instances.json"
+    excel = _sleeper()
+    try:
+        track(excel.pid, state)
+        (entry,) = _state(state)
+        assert (entry["pid"], entry["owner"]) == (excel.pid, os.getpid())
+        assert process_alive(entry["pid"], entry["created"])
+        track(excel.pid, state)
+        assert len(_state(state)) == 1
+        untrack(excel.pid, state)
+        assert _state(state) == []
+    finally:
+        excel.kill()
+        excel.wait()
+
+
+def test_concurrent_track_keeps_every_entry(tmp_path):
+    # Geradores em paralelo anotando e retirando instâncias: sem o lock, gravações se perdiam
+    state = tmp_path / "instances.json"
+    script = (
+        "import sys, excel_watchdog as wd\n"
+        "from pathlib import Path\n"
+        "base, path = int(sys.argv[1]), Path(sys.argv[2])\n"
+        "for pid in range(base, base + 40):\n"
+        "    wd.track(pid, path)\n"
+        "for pid in range(base, base + 40, 2):\n"
+        "    wd.untrack(pid, path)\n"
+    )
+    bases = [10_000_000 + 1000 * i for i in range(6)]
+    procs = [
+        subprocess.Popen([sys.executable, "-c", script, str(base), str(state)], cwd=PDF_EXPORT_DIR)
+        for base in bases
+    ]
+    assert [proc.wait(60) for proc in procs] == [0] * len(procs)
+    pids = sorted(entry["pid"] for entry in _state(state))
+    assert pids == sorted(pid for base in bases for pid in range(base + 1, base + 40, 2))
+
+
+def _http(method: str, url: str, body: dict | None = None) -> dict:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def test_server_expires_job_on_hung_worker(tmp_path):
+    data = tmp_path / "dados.json"
+    data.write_text(json.dumps(payload("porta")), encoding="utf-8")
+    server = start_generator(
+        "--server", "--port", "0", "--workers", "1", "--backend", "memory", "--no-cache",
+        "--fake-hang", "fill=60", "--job-timeout", "2",
+        env={"PDF_EXPORT_EXCEL_STATE": str(tmp_path / "instances.json")},
+    )
+    try:
+        listening = json.loads(server.stdout.readline())
+        base = f"http://127.0.0.1:{listening['port']}"
+        started = time.monotonic()
+        job = _http("POST", f"{base}/jobs", {
+            "template": str(template("porta")), "data": str(data), "output": str(tmp_path / "proposta.pdf"),
+        })
+        job = _http("GET", f"{base}/jobs/{job['id']}?wait=20")
+        assert job["status"] == "expired", job
+        assert time.monotonic() - started < 20
+        assert not (tmp_path / "proposta.pdf").exists()
+    finally:
+        server.terminate()
+        server.communicate(timeout=30)
@@ -0,0 +1,71 @@
+"""Arquivo de log compartilhado entre processos (export_log): buffer, fechamento e rotação."""
+
+import logging
+
+import pytest
+
+import export_log
+from export_log import LOG_BACKUPS, SharedRotatingFileHandler, logger
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_log, "LOG_MAX_BYTES", 2000)
+    path = tmp_path / "log.txt"
+    export_log.configure("info", mask=False, path=path)
+    yield path
+    export_log.configure("error", mask=False, path=tmp_path / "fim.txt")
+
+
+def _file_handler() -> SharedRotatingFileHandler:
+    (buffer,) = [h for h in logger.handlers if isinstance(h, logging.handlers.MemoryHandler)]
+    return buffer.target
+
+
+def _flush() -> None:
+    for handler in logger.handlers:
+        handler.flush()
+
+
+def test_file_is_closed_between_flushes(log_path):
+    logger.info("primeira linha")
+    _flush()
+    assert "primeira linha" in log_path.read_text(encoding="utf-8")
+    assert _file_handler().stream is None
+
+
+def test_rotation_keeps_backups(log_path):
+    for i in range(200):
+        logger.info(f"linha {i:03d} " + "x" * 40)
+    _flush()
+    backups = sorted(p.name for p in log_path.parent.glob("log.txt.*"))
+    assert backups == [f"log.txt.{i}" for i in range(1, LOG_BACKUPS + 1)]
+    assert log_path.stat().st_size < 2000
+    assert "linha 199" in log_path.read_text(encoding="utf-8")
+
+
+def test_refused_rotation_keeps_logging(log_path, capsys):
+    # Windows: outro processo com o arquivo aberto -> a renomeação falha com PermissionError
+    handler = _file_handler()
+    calls = []
+
+    def refuse(source, dest):
+        calls.append(dest)
+        raise PermissionError(13, "arquivo em uso", source)
+
+    handler.rotate = refuse
+    for i in range(200):
+        logger.info(f"linha {i:03d} " + "x" * 40)
+    _flush()
+    text = log_path.read_text(encoding="utf-8")
+    assert "linha 000" in text and "linha 199" in text
+    # Uma tentativa e a espera de ROLLOVER_RETRY_S, sem "--- Logging error ---" a cada linha
+    assert len(calls) == 1
+    assert "Logging error" not in capsys.readouterr().err
+
+    del handler.rotate
+    handler._retry_at = 0.0
+    logger.info("depois da espera")
+    _flush()
+    assert (log_path.parent / "log.txt.1").exists()
+    assert log_path.read_text(encoding="utf-8").strip().endswith("depois da espera")
@@ -0,0 +1,97 @@
+"""Preenchimento XML (--fill-backend xml) contra o caminho COM (fill_workbook no backend em memória)."""
+
+import io
+import re
+import zipfile
+
+import pytest
+from conftest import TIPOS, payload, template
+
+import fill_and_export_pdf as gen
+from excel_backend import MemoryApp, _RangeApi
+from rich_text import cell_runs, pieces
+from xlsx_reader import decode_ooxml_text
+from xlsx_writer import semantic_diff
+
+
+def _fill_both(tipo: str, data: dict):
+    path = template(tipo)
+    totais = gen.prepare_data(data)
+    manifest = gen.check_template(path, data)
+    xlsx = gen.fill_xlsx_bytes(path, dict(data), totais, manifest)
+    com_book = MemoryApp().books.open(str(path))
+    gen.fill_workbook(com_book, dict(data), totais, manifest)
+    return xlsx, com_book
+
+
+@pytest.mark.parametrize("rich_text_path", ["xml_spreadsheet", "characters"])
+@pytest.mark.parametrize("tipo", TIPOS)
+def test_xml_fill_matches_com_fill(tipo, rich_text_path, monkeypatch):
+    if rich_text_path == "characters":
+        # Excel recusando o Range.Value(11): D43/D44 pelo caminho direto (value + Characters/Font)
+        def refuse(self, *args):
+            raise RuntimeError("Value(11) recusado")
+
+        monkeypatch.setattr(_RangeApi, "GetValue", refuse)
+    xlsx, com_book = _fill_both(tipo, payload(tipo))
+    assert any(sheet._dirty for sheet in com_book.sheets)
+    assert semantic_diff(xlsx, com_book) == []
+
+
+@pytest.mark.parametrize("tipo", TIPOS)
+def test_xml_and_com_fill_export_the_same_pdf(tipo, tmp_path):
+    data = payload(tipo)
+    totais = gen.prepare_data(data)
+    outputs = {}
+    for fill_backend in ("excel", "xml"):
+        outputs[fill_backend] = tmp_path / f"{fill_backend}.pdf"
+        gen.run_job(MemoryApp(), template(tipo), dict(data), outputs[fill_backend], fill_backend=fill_backend, totais=totais)
+    assert outputs["excel"].read_bytes() == outputs["xml"].read_bytes()
+
+
+def _shared_string_runs(xlsx: bytes, text: str) -> list[tuple[str, dict]]:
+    """Trechos (texto, estilo) do <si> de sharedStrings com o texto; estilo só com i/sz/color/b do <rPr>."""
+    shared = zipfile.ZipFile(io.BytesIO(xlsx)).read("xl/sharedStrings.xml").decode("utf-8")
+    for si in re.findall(r"<si>(.*?)</si>", shared, re.S):
+        runs = []
+        for rpr, body in re.findall(r"<r>(?:<rPr>(.*?)</rPr>)?(.*?)</r>", si, re.S):
+            style = {}
+            if re.search(r"<b\s*/>", rpr):
+                style["bold"] = True
+            if re.search(r"<i\s*/>", rpr):
+                style["italic"] = True
+            size = re.search(r'<sz val="([\d.]+)"', rpr)
+            if size:
+                style["size"] = float(size.group(1))
+            color = re.search(r'<color rgb="FF([0-9A-F]{6})"', rpr)
+            if color:
+                style["color"] = tuple(int(color.group(1)[i:i + 2], 16) for i in (0, 2, 4))
+            piece = re.sub(r"<[^>]+>", "", body).replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+            runs.append((decode_ooxml_text(piece), style))
+        if "".join(piece for piece, _style in runs) == text:
+            return runs
+    raise AssertionError(f"texto não encontrado em sharedStrings: {text[:40]!r}")
+
+
+def test_d44_rich_text_matches_com_fill():
+    data = payload("cobertura")
+    data["descricaoAdicional"] = "Calha **embutida** no lado da __garagem__.\nRetirada **inclusa**."
+    data["estiloDescricaoAdicional"] = {"tamanho": 9, "cor": "#595959"}
+    xlsx, com_book = _fill_both("cobertura", data)
+    assert semantic_diff(xlsx, com_book) == []
+
+    cell = com_book.sheets[0]._cells[(44, 4)]
+    expected = pieces(cell.value, cell_runs(cell))
+    assert {"italic", "size", "color"} <= {attr for _text, style in expected for attr in style}
+    written = _shared_string_runs(xlsx, cell.value)
+    # Por caractere: o XML pode repetir a fonte da célula nos trechos sem estilo próprio
+    by_char = [style for piece, style in written for _c in piece]
+    pos = 0
+    for piece, style in expected:
+        for written_style in by_char[pos:pos + len(piece)]:
+            for attr in ("bold", "italic"):
+                assert written_style.get(attr, False) == style.get(attr, False), (piece, attr)
+            for attr in ("size", "color"):
+                if attr in style:
+                    assert written_style.get(attr) == style[attr], (piece, attr)
+        pos += len(piece)
@@ -0,0 +1,36 @@
+"""Execução única com payload inválido: "Erro: ..." no stderr e código 1, sem traceback."""
+
+import pytest
+from conftest import run_generator, template
+
+
+@pytest.mark.parametrize(
+    ("data", "message"),
+    [
+        ("[1, 2]", "Erro: os dados da proposta devem ser um objeto JSON (recebido: list)"),
+        ('"texto"', "Erro: os dados da proposta devem ser um objeto JSON (recebido: str)"),
+        ('{"tipoProposta": ', "Erro: JSON inválido em stdin: "),
+        ("", "Erro: JSON inválido em stdin: "),
+    ],
+)
+def test_invalid_stdin_payload(tmp_path, data, message):
+    result = run_generator(
+        "--template", template("porta"), "--data", "-", "--output", tmp_path / "proposta.pdf",
+        "--backend", "memory", "--no-cache", input=data,
+    )
+    assert result.returncode == 1
+    assert result.stderr.strip().splitlines()[-1].startswith(message)
+    assert "Traceback" not in result.stderr
+    assert not (tmp_path / "proposta.pdf").exists()
+
+
+def test_invalid_payload_file(tmp_path):
+    data = tmp_path / "dados.json"
+    data.write_text("[1, 2]", encoding="utf-8")
+    result = run_generator(
+        "--template", template("porta"), "--data", data, "--output", tmp_path / "proposta.pdf",
+        "--backend", "memory", "--no-cache",
+    )
+    assert result.returncode == 1
+    assert "Erro: os dados da proposta devem ser um objeto JSON" in result.stderr
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,141 @@
+"""Montagem de páginas (--assemble-pages) num modelo de várias páginas gerado aqui a partir do da porta."""
+
+import re
+import zipfile
+
+import pytest
+from conftest import payload, template
+
+import fill_and_export_pdf as gen
+import page_assembly
+from excel_backend import MemoryApp
+from pdf_optimize import PdfOptimizer
+from pdf_tools import PdfDocument
+
+# Termos fixos depois do bloco da proposta, com quebras manuais antes e no meio deles
+TERM_ROWS = range(61, 131)
+ROW_BREAKS = (59, 100)
+
+
+def _with_terms(source, target) -> None:
+    """Cópia do modelo com as linhas de termos, a área de impressão até elas e as quebras manuais."""
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                xml = data.decode("utf-8")
+                rows = "".join(
+                    f'<row r="{r}"><c r="B{r}" t="inlineStr"><is><t>Termo {r}: garantia e condições gerais '
+                    f"da proposta</t></is></c></row>"
+                    for r in TERM_ROWS
+                )
+                breaks = "".join(f'<brk id="{r}" max="16383" man="1"/>' for r in ROW_BREAKS)
+                xml = xml.replace("</sheetData>", rows + "</sheetData>", 1)
+                # <rowBreaks> vem antes de <colBreaks> no esquema
+                xml = xml.replace(
+                    "<colBreaks",
+                    f'<rowBreaks count="{len(ROW_BREAKS)}" manualBreakCount="{len(ROW_BREAKS)}">{breaks}</rowBreaks>'
+                    "<colBreaks",
+                    1,
+                )
+                data = xml.encode("utf-8")
+            elif item.filename == "xl/workbook.xml":
+                xml = data.decode("utf-8")
+                xml = re.sub(r"(_xlnm\.Print_Area[^>]*>[^<]*\$)\d+(</definedName>)", rf"\g<1>{TERM_ROWS[-1]}\2", xml)
+                data = xml.encode("utf-8")
+            zout.writestr(item, data)
+
+
+@pytest.fixture(scope="module")
+def multipage(tmp_path_factory):
+    target = tmp_path_factory.mktemp("modelo") / "PROPOSTA - PORTA TERMOS.xlsx"
+    _with_terms(template("porta"), target)
+    return target
+
+
+@pytest.fixture
+def assembly(tmp_path, monkeypatch):
+    """Montagem ligada com o cache de páginas em tmp_path; devolve os relatórios de cada export."""
+    reports = []
+    export = page_assembly.export
+
+    def recording(*args, **kwargs):
+        report = export(*args, **kwargs)
+        reports.append(report)
+        return report
+
+    monkeypatch.setattr(page_assembly, "export", recording)
+    monkeypatch.setattr(gen, "_assemble_pages", True)
+    page_assembly.configure(True, tmp_path / "pages")
+    yield reports
+    page_assembly.configure(False)
+
+
+def _contents(path) -> list[bytes]:
+    document = PdfDocument(path.read_bytes())
+    reader = PdfOptimizer(document)
+    return [reader._page_content(reader._page(i)[0]) for i in range(len(document.pages))]
+
+
+def _full_export(template_path, data, target):
+    book = MemoryApp().books.open(str(template_path))
+    gen.fill_workbook(book, data, gen.prepare_data(data))
+    book.api.ExportAsFixedFormat(0, str(target))
+    return _contents(target)
+
+
+def _other_proposal() -> dict:
+    data = payload("porta")
+    data["nomeCliente"] = "Outro Cliente Ltda"
+    data["descricaoAdicional"] = "Instalação **em dois dias** com retirada __inclusa__."
+    return data
+
+
+def test_plan_marks_terms_static(multipage, tmp_path):
+    page_assembly.configure(False, tmp_path)
+    try:
+        plan = page_assembly.load_plan(multipage)
+    finally:
+        page_assembly.configure(False)
+    (sheet,) = plan["sheets"]
+    assert sheet["area"] == [1, TERM_ROWS[-1]]
+    assert sheet["segments"] == [[1, 59, True], [60, 100, False], [101, 130, False]]
+    assert plan["static_segments"] == 2 and plan["reason"] is None
+
+
+def test_assembled_pdf_reuses_cached_static_pages(multipage, assembly, tmp_path):
+    first = tmp_path / "primeira.pdf"
+    gen.run_job(MemoryApp(), multipage, payload("porta"), first)
+    assert assembly[-1]["mode"] == "full"
+    assert assembly[-1]["pages"] == 3 and assembly[-1]["cached"] == 2
+    (static_pdf,) = (tmp_path / "pages").glob("*.q0.pdf")
+    stored = static_pdf.stat().st_mtime_ns
+    assert _contents(first) == _full_export(multipage, payload("porta"), tmp_path / "ref.pdf")
+
+    # Outra proposta no mesmo modelo: só a página do bloco do cliente passa pelo export
+    second = tmp_path / "segunda.pdf"
+    gen.run_job(MemoryApp(), multipage, _other_proposal(), second)
+    report = assembly[-1]
+    assert report["mode"] == "assembled"
+    assert (report["pages"], report["static"], report["dynamic"], report["exports"]) == (3, 2, 1, 1)
+    assert static_pdf.stat().st_mtime_ns == stored
+
+    assert _contents(second) == _full_export(multipage, _other_proposal(), tmp_path / "ref2.pdf")
+    assert _contents(second)[1:] == _contents(first)[1:]
+    assert _contents(second)[0] != _contents(first)[0]
+
+
+def test_profile_page_range_uses_cache(multipage, assembly, tmp_path):
+    # Perfil de saída: From/To a partir da página 1 (só cortam o fim) e a mesma qualidade usam o cache
+    gen.run_job(MemoryApp(), multipage, payload("porta"), tmp_path / "cache.pdf")
+    output = tmp_path / "perfil.pdf"
+    gen.run_job(MemoryApp(), multipage, payload("porta"), output, output_profile="print")
+    assert assembly[-1]["mode"] == "assembled"
+    assert len(PdfDocument(output.read_bytes()).pages) == 3
+
+
+def test_single_page_templates_export_normally(assembly, tmp_path):
+    output = tmp_path / "porta.pdf"
+    gen.run_job(MemoryApp(), template("porta"), payload("porta"), output)
+    assert assembly == [None]
+    assert _contents(output) == _full_export(template("porta"), payload("porta"), tmp_path / "ref.pdf")
@@ -0,0 +1,118 @@
+"""Perfis de saída (pdf_optimize.apply_profile) sobre PDFs gerados sem Excel."""
+
+import shutil
+
+import pytest
+from conftest import TIPOS, payload, template
+
+import fill_and_export_pdf as gen
+from excel_backend import MemoryApp
+from pdf_optimize import PROFILES, PdfOptimizer, apply_profile
+from pdf_tools import PdfDocument, _int
+
+
+@pytest.fixture(scope="module")
+def native_pdfs(tmp_path_factory):
+    """Um PDF por tipo pelo renderer nativo (fontes embutidas e o logo como imagem)."""
+    folder = tmp_path_factory.mktemp("native")
+    pdfs = {}
+    for tipo in TIPOS:
+        pdfs[tipo] = folder / f"{tipo}.pdf"
+        gen.run_job(None, template(tipo), payload(tipo), pdfs[tipo], renderer="native")
+    return pdfs
+
+
+@pytest.fixture(scope="module")
+def optimized(native_pdfs, tmp_path_factory):
+    """(tipo, perfil) -> (PDF otimizado, relatório); cada combinação é otimizada uma vez no módulo."""
+    folder = tmp_path_factory.mktemp("optimized")
+    done = {}
+
+    def get(tipo, profile):
+        if (tipo, profile) not in done:
+            done[tipo, profile] = _optimized(native_pdfs[tipo], folder / tipo, profile)
+        return done[tipo, profile]
+
+    return get
+
+
+def _optimized(source, tmp_path, profile):
+    target = tmp_path / f"{profile}.pdf"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, target)
+    return target, apply_profile(target, profile)
+
+
+def _contents(document: PdfDocument) -> list[bytes]:
+    reader = PdfOptimizer(document)
+    return [reader._page_content(reader._page(i)[0]) for i in range(len(document.pages))]
+
+
+def test_output_profiles_are_the_optimizer_profiles():
+    assert set(gen.OUTPUT_PROFILES) == set(PROFILES)
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+@pytest.mark.parametrize("tipo", TIPOS)
+def test_profile_shrinks_pdf_and_keeps_pages(native_pdfs, optimized, tipo, profile):
+    source = native_pdfs[tipo]
+    target, report = optimized(tipo, profile)
+
+    assert report["profile"] == profile
+    assert report["bytes_before"] == source.stat().st_size
+    assert report["bytes_after"] == target.stat().st_size < report["bytes_before"]
+    assert report["pages_before"] == report["pages_after"] == 1
+    assert report["images_downsampled"] >= 1
+
+    before, after = PdfDocument(source.read_bytes()), PdfDocument(target.read_bytes())
+    assert _contents(after) == _contents(before)
+    # Depois da redução nenhuma imagem passa do dobro do DPI do perfil (fator de redução inteiro)
+    max_dpi = PROFILES[profile]["max_dpi"]
+    reader = PdfOptimizer(after)
+    for num, (w_pt, _h_pt) in reader._image_sizes([0]).items():
+        width = _int(after.objects[num].value["Width"])
+        assert width / (w_pt / 72.0) < 2 * max_dpi
+
+
+@pytest.mark.parametrize("tipo", TIPOS)
+def test_profiles_order_by_size(optimized, tipo):
+    sizes = {p: optimized(tipo, p)[1]["bytes_after"] for p in PROFILES}
+    assert sizes["preview"] <= sizes["email"] <= sizes["print"]
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_profile_trims_trailing_blank_pages(tmp_path, profile):
+    book = MemoryApp().books.open(str(template("porta")))
+    data = payload("porta")
+    gen.fill_workbook(book, data, gen.prepare_data(data))
+    # Área de impressão maior que o conteúdo: duas páginas vazias no fim
+    last_row = max(row for row, _col in book.sheets[0]._cells)
+    book.sheets[0]._breaks = [last_row + 10, last_row + 20]
+    source = tmp_path / "source.pdf"
+    book.api.ExportAsFixedFormat(0, str(source))
+
+    target, report = _optimized(source, tmp_path, profile)
+    assert (report["pages_before"], report["pages_after"], report["trimmed_pages"]) == (3, 1, 2)
+    assert len(PdfDocument(target.read_bytes()).pages) == 1
+    assert _contents(PdfDocument(target.read_bytes())) == _contents(PdfDocument(source.read_bytes()))[:1]
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_profile_is_stable_on_optimized_pdf(optimized, tmp_path, profile):
+    once, _report = optimized("porta", profile)
+    again = tmp_path / "again.pdf"
+    shutil.copyfile(once, again)
+    report = apply_profile(again, profile)
+    assert report["images_downsampled"] == 0
+    assert report["bytes_after"] <= report["bytes_before"]
+    assert _contents(PdfDocument(again.read_bytes())) == _contents(PdfDocument(once.read_bytes()))
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_run_job_applies_profile(tmp_path, profile):
+    # Caminho do Excel (backend em memória): qualidade e páginas do export, depois o pós-processamento
+    plain, output = tmp_path / "plain.pdf", tmp_path / "profile.pdf"
+    gen.run_job(MemoryApp(), template("cobertura"), payload("cobertura"), plain)
+    timings = gen.run_job(MemoryApp(), template("cobertura"), payload("cobertura"), output, output_profile=profile)
+    assert "optimize_ms" in timings
+    assert _contents(PdfDocument(output.read_bytes())) == _contents(PdfDocument(plain.read_bytes()))
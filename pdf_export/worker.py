@@ -0,0 +1,268 @@
+"""
+Modo worker (--serve): mantém UMA instância do Excel aberta e processa vários jobs.
+
+Protocolo (JSON lines, UTF-8):
+  stdin  -> um job por linha:
+            {"id": "1", "template": "modelo.xlsx", "data": {...} ou "dados.json", "output": "saida.pdf"}
+            ("profile": "email" | "print" | "preview" | null troca o --output-profile do worker neste job)
+            Com "session": "<id>" a pasta preenchida fica aberta entre os jobs da sessão e só as células
+            que mudaram são regravadas (session_fill); "export": false só pré-preenche (sem "output")
+            e o job seguinte da sessão paga apenas o export.
+  stdout <- uma resposta por job, na mesma ordem:
+            {"id": "1", "ok": true, "output": "...", "timings": {"prepare_ms": ..., "total_ms": ...}}
+            {"id": "1", "ok": false, "error": "..."}
+            (jobs de sessão trazem "session" e timings.cells_written)
+            (com o cache de saída ativo, a resposta traz "cache": "hit" ou "miss")
+          Job com "progress": true recebe antes da resposta um evento por fase:
+            {"id": "1", "event": "phase", "phase": "fill/placeholders"}
+Com --archive, cada job concluído (não o pré-preenchimento) é registrado no arquivo local de
+propostas (archive.py).
+Com --metrics / --metrics-file, cada job gera uma linha de métricas (stderr / arquivo), nunca em stdout.
+A primeira linha de stdout é {"event": "ready", ...} com o tempo de abertura do Excel e os PIDs
+do worker e do Excel (usados pelo job_server para encerrar uma instância travada).
+Logs continuam indo para stderr; stdout carrega só o protocolo. EOF no stdin encerra o worker.
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import excel_watchdog
+import fill_and_export_pdf as gen
+import metrics
+from excel_backend import start_app
+from session_fill import SessionStore, run_session_job
+
+
+def _emit(stdout, obj: dict) -> None:
+    stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    stdout.flush()
+
+
+def _load_job_data(job: dict) -> dict:
+    data = job.get("data")
+    if isinstance(data, dict):
+        # Cópia: prepare_data altera o payload no lugar
+        return dict(data)
+    if isinstance(data, str) and data:
+        data_path = Path(data)
+        if not data_path.exists():
+            raise FileNotFoundError(f"arquivo de dados não encontrado: {data_path}")
+        with open(data_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    raise ValueError("job sem 'data' (objeto JSON ou caminho do .json)")
+
+
+def handle_job(
+    app,
+    job: dict,
+    fill_backend: str = "excel",
+    renderer: str = "excel",
+    cache=None,
+    sink=None,
+    progress=None,
+    mode: str = "serve",
+    output_profile: str | None = None,
+    sessions: SessionStore | None = None,
+    archive=None,
+) -> dict:
+    """
+    Executa um job do protocolo e devolve a resposta (nunca levanta exceção).
+    progress(fase): chamado no início de cada fase do job. mode: rótulo do resumo de métricas.
+    output_profile: perfil de saída padrão (o job pode trocar com "profile").
+    sessions: pastas mantidas abertas para os jobs com "session" (sem ele, "session" é ignorado).
+    archive: arquivo de propostas (archive.Archive) onde os jobs concluídos são registrados.
+    """
+    with metrics.collecting(
+        sink,
+        progress,
+        mode=mode,
+        id=job.get("id"),
+        generator=gen.GENERATOR_VERSION,
+        fill_backend=fill_backend,
+        renderer=renderer,
+    ):
+        response = _handle_job(app, job, fill_backend, renderer, cache, output_profile, sessions, archive, mode)
+        metrics.annotate(ok=response["ok"], cache=response.get("cache"))
+        return response
+
+
+def _handle_job(
+    app,
+    job: dict,
+    fill_backend: str,
+    renderer: str,
+    cache,
+    output_profile: str | None,
+    sessions: SessionStore | None,
+    archive,
+    mode: str,
+) -> dict:
+    job_id = job.get("id")
+    try:
+        template = job.get("template")
+        output = job.get("output")
+        session_id = job.get("session") if sessions is not None else None
+        # Sessão só no caminho Excel -> PDF (a pasta aberta é a do Excel do worker)
+        if session_id is not None and (fill_backend != "excel" or renderer != "excel"):
+            session_id = None
+        prefill = job.get("export") is False
+        if prefill and session_id is None:
+            raise ValueError("'export': false exige 'session' (e o preenchimento pelo Excel)")
+        if not template or not (output or prefill):
+            raise ValueError("job sem 'template' ou 'output'")
+        if session_id is not None and output and Path(output).suffix.lower() != ".pdf":
+            session_id = None
+        output_profile = job.get("profile", output_profile)
+        if output_profile is not None and output_profile not in gen.OUTPUT_PROFILES:
+            raise ValueError(f"perfil de saída desconhecido: {output_profile!r} (use {', '.join(gen.OUTPUT_PROFILES)})")
+        template_path = Path(template)
+        if not template_path.exists():
+            raise FileNotFoundError(f"modelo não encontrado: {template_path}")
+        with metrics.span("json.load"):
+            data = _load_job_data(job)
+        metrics.annotate(template=template_path.name, tipoProposta=data.get("tipoProposta"))
+        if prefill:
+            timings = run_session_job(app, sessions, str(session_id), template_path, data, None)
+            return {"id": job_id, "ok": True, "session": session_id, "prefilled": True, "timings": timings}
+        output_path = Path(output)
+        archive_meta = {
+            "generator": gen.GENERATOR_VERSION,
+            "mode": mode,
+            "renderer": renderer,
+            "fill_backend": fill_backend,
+            "output_profile": output_profile,
+        }
+        t0 = time.perf_counter()
+        with metrics.span("template.check"):
+            manifest = gen.check_template(template_path, data)
+        with metrics.span("prepare"):
+            totais = gen.prepare_data(data)
+        key = None
+        if cache is not None:
+            with metrics.span("cache.lookup"):
+                key = gen.output_cache_key(manifest, data, output_path, fill_backend, renderer, output_profile)
+                hit = bool(key) and gen.fetch_cached(cache, key, output_path)
+            if hit:
+                timings = {"total_ms": gen._ms(t0, time.perf_counter())}
+                if archive is not None:
+                    archive.record_run(
+                        template_path, data, totais, output_path, manifest, cache="hit", **archive_meta
+                    )
+                return {"id": job_id, "ok": True, "output": str(output), "cache": "hit", "timings": timings}
+        if session_id is not None:
+            timings = run_session_job(
+                app, sessions, str(session_id), template_path, data, output_path, manifest, output_profile, totais
+            )
+        else:
+            timings = gen.run_job(
+                app,
+                template_path,
+                data,
+                output_path,
+                manifest,
+                fill_backend=fill_backend,
+                renderer=renderer,
+                output_profile=output_profile,
+                totais=totais,
+            )
+        if key:
+            try:
+                with metrics.span("cache.store"):
+                    cache.store(key, output_path)
+            except OSError as e:
+                gen._log(f"Cache de saída não gravado (ignorado): {e}", logging.WARNING)
+        if archive is not None:
+            archive.record_run(
+                template_path, data, totais, output_path, manifest, timings, cache="miss" if key else None,
+                **archive_meta,
+            )
+        response = {"id": job_id, "ok": True, "output": str(output), "timings": timings}
+        if session_id is not None:
+            response["session"] = session_id
+        if key:
+            response["cache"] = "miss"
+        return response
+    except Exception as e:
+        gen._log(f"Erro no job {job_id!r}: {e}", logging.ERROR)
+        return {"id": job_id, "ok": False, "error": str(e)}
+
+
+def serve(
+    stdin,
+    stdout,
+    backend: str = "excel",
+    fill_backend: str = "excel",
+    renderer: str = "excel",
+    cache=None,
+    sink=None,
+    output_profile: str | None = None,
+    archive=None,
+    hang: dict | None = None,
+) -> int:
+    """
+    Loop do worker: abre o Excel uma vez e atende jobs até EOF (renderer nativo: sem Excel).
+    hang: --fake-hang repassado ao backend memory (excel_backend.start_app).
+    A instância é anotada para limpeza de órfãs (excel_watchdog) sem prazos por fase: o prazo
+    por job fica com quem controla o worker (job_server mata worker e Excel).
+    """
+    t0 = time.perf_counter()
+    wd = excel_watchdog.Watchdog(deadlines={}) if renderer != "native" else None
+    if wd is not None:
+        excel_watchdog.reap_orphans(wd.state_path)
+    try:
+        app = wd.launch(start_app, backend, hang) if wd is not None else None
+    except ImportError:
+        _emit(stdout, {"event": "error", "error": "xlwings não instalado. Execute: pip install xlwings"})
+        return 1
+    except Exception as e:
+        _emit(stdout, {"event": "error", "error": f"falha ao abrir o Excel: {e}"})
+        return 1
+    sessions = SessionStore() if app is not None else None
+    _emit(
+        stdout,
+        {
+            "event": "ready",
+            "backend": backend if app is not None else None,
+            "renderer": renderer,
+            "startup_ms": gen._ms(t0, time.perf_counter()),
+            "pid": os.getpid(),
+            "excel_pid": getattr(app, "pid", None),
+        },
+    )
+
+    try:
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                _emit(stdout, {"id": None, "ok": False, "error": f"JSON inválido: {e}"})
+                continue
+            if not isinstance(job, dict):
+                _emit(stdout, {"id": None, "ok": False, "error": "job deve ser um objeto JSON"})
+                continue
+            progress = None
+            if job.get("progress"):
+                def progress(phase, job_id=job.get("id")):
+                    _emit(stdout, {"id": job_id, "event": "phase", "phase": phase})
+            _emit(
+                stdout,
+                handle_job(
+                    app, job, fill_backend, renderer, cache, sink, progress, output_profile=output_profile, sessions=sessions,
+                    archive=archive,
+                ),
+            )
+    finally:
+        if sessions is not None:
+            sessions.close()
+        if app is not None:
+            try:
+                wd.quit(app)
+            except Exception:
+                pass
+    return 0
@@ -0,0 +1,182 @@
+"""
+Leitura do .xlsx (zip + XML) sem Excel, apenas com a biblioteca padrão.
+
+Usado pelo backend em memória (stand-in do Excel) para carregar os modelos de
+resources/ no Linux. Lê sharedStrings.xml e o XML de cada planilha em modo
+incremental (iterparse), sem montar a árvore inteira em memória.
+"""
+
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_M = "{%s}" % NS_MAIN
+
+_ADDRESS_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+# Notação _xHHHH_ do OOXML para caracteres que o XML não preserva (ex.: _x000D_ = \r)
+_OOXML_ESCAPE_RE = re.compile(r"_x([0-9A-Fa-f]{4})_")
+_BREAK_RE = re.compile(rb"<(?:\w+:)?brk\b[^>]*?\bid=\"(\d+)\"")
+
+
+def col_letter(col: int) -> str:
+    """Converte índice de coluna (1 = A) em letras. Ex: 4 -> 'D', 28 -> 'AB'."""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def col_index(letters: str) -> int:
+    """Converte letras de coluna em índice (A = 1). Ex: 'D' -> 4."""
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def split_address(address: str) -> tuple[int, int]:
+    """'D43' ou '$D$43' -> (linha, coluna) = (43, 4)."""
+    m = _ADDRESS_RE.match(address.strip())
+    if not m:
+        raise ValueError(f"Endereço de célula inválido: {address!r}")
+    return int(m.group(2)), col_index(m.group(1))
+
+
+def to_address(row: int, col: int, absolute: bool = False) -> str:
+    """(43, 4) -> 'D43' (ou '$D$43' com absolute=True, formato de Range.Address)."""
+    if absolute:
+        return f"${col_letter(col)}${row}"
+    return f"{col_letter(col)}{row}"
+
+
+def decode_ooxml_text(text: str) -> str:
+    """Decodifica _xHHHH_ (ex.: '_x000D_' -> '\\r'); '_x005F_' protege um '_x' literal."""
+    if "_x" not in text:
+        return text
+    return _OOXML_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), text)
+
+
+def _text_of(elem) -> str:
+    """Concatena o texto de todos os <t> de um <si>/<is> (texto simples ou rich text)."""
+    parts = []
+    for t in elem.iter(_M + "t"):
+        if t.text:
+            parts.append(t.text)
+    return decode_ooxml_text("".join(parts))
+
+
+def read_shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    """Lista de strings compartilhadas (índice = valor de <v> nas células t="s")."""
+    try:
+        fh = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag == _M + "si":
+                strings.append(_text_of(elem))
+                elem.clear()
+    return strings
+
+
+def sheet_parts(zf: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """Lista (nome da planilha, caminho do XML no zip), na ordem do workbook."""
+    rels = {}
+    with zf.open("xl/_rels/workbook.xml.rels") as fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag == "{%s}Relationship" % NS_PKG_REL:
+                target = elem.get("Target", "")
+                if target.startswith("/"):
+                    target = target[1:]
+                elif not target.startswith("xl/"):
+                    target = "xl/" + target
+                rels[elem.get("Id")] = target
+    result = []
+    with zf.open("xl/workbook.xml") as fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag == _M + "sheet":
+                rid = elem.get("{%s}id" % NS_REL)
+                if rid in rels:
+                    result.append((elem.get("name", ""), rels[rid]))
+    return result
+
+
+def iter_sheet_cells(zf: zipfile.ZipFile, part: str, shared: list[str]):
+    """
+    Percorre as células de uma planilha em modo incremental.
+    Gera (endereço, valor, fórmula, estilo): valor já convertido (str, float, bool ou None);
+    fórmula no formato '=...' ou None; estilo = índice s (int) ou None.
+    """
+    with zf.open(part) as fh:
+        for _event, elem in iterparse(fh, events=("end",)):
+            if elem.tag != _M + "c":
+                continue
+            address = elem.get("r")
+            cell_type = elem.get("t")
+            style = elem.get("s")
+            v = elem.find(_M + "v")
+            f = elem.find(_M + "f")
+            raw = v.text if v is not None else None
+            if cell_type == "s" and raw is not None:
+                value = shared[int(raw)]
+            elif cell_type == "inlineStr":
+                is_elem = elem.find(_M + "is")
+                value = _text_of(is_elem) if is_elem is not None else ""
+            elif cell_type == "b" and raw is not None:
+                value = raw == "1"
+            elif cell_type in ("str", "e"):
+                value = raw
+            elif raw is not None:
+                try:
+                    value = float(raw)
+                except ValueError:
+                    value = raw
+            else:
+                value = None
+            formula = ("=" + f.text) if f is not None and f.text else None
+            yield address, value, formula, int(style) if style is not None else None
+            elem.clear()
+
+
+def read_workbook(path) -> list[tuple[str, list]]:
+    """
+    Carrega todas as planilhas do .xlsx.
+    Retorna lista de (nome da planilha, [(endereço, valor, fórmula, estilo), ...]).
+    """
+    with zipfile.ZipFile(path) as zf:
+        shared = read_shared_strings(zf)
+        return [
+            (name, list(iter_sheet_cells(zf, part, shared)))
+            for name, part in sheet_parts(zf)
+        ]
+
+
+def read_row_breaks(zf: zipfile.ZipFile, part: str) -> list[int]:
+    """
+    Quebras de página manuais da planilha (<rowBreaks>): a primeira linha de cada página nova,
+    em ordem. Busca direta nos bytes do XML, sem parse.
+    """
+    data = zf.read(part)
+    start = data.find(b"rowBreaks")
+    if start < 0:
+        return []
+    end = data.find(b"rowBreaks", start + 9)
+    # brk id="N": quebra depois da linha N (a página seguinte começa na linha N + 1)
+    return sorted({int(n) + 1 for n in _BREAK_RE.findall(data, start, end if end > 0 else len(data))})
+
+
+def read_page_breaks(path) -> dict[str, list[int]]:
+    """{nome da planilha: read_row_breaks} das planilhas que têm quebras manuais."""
+    with zipfile.ZipFile(path) as zf:
+        result = {}
+        for name, part in sheet_parts(zf):
+            rows = read_row_breaks(zf, part)
+            if rows:
+                result[name] = rows
+        return result
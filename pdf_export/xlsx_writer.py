@@ -0,0 +1,486 @@
+"""
+Backend de preenchimento em XML puro: grava o .xlsx preenchido sem Excel.
+
+O preenchimento roda sobre o stand-in em memória (excel_backend.MemoryBook), com a
+mesma lógica do caminho COM (fill_workbook). Depois, só as partes afetadas do zip
+são reescritas: o XML das planilhas alteradas (apenas as células tocadas),
+sharedStrings.xml (textos novos, incluindo rich text com trechos em negrito) e
+styles.xml (formatos de número e quebra de texto, clonando o estilo original da célula).
+O resultado é um .xlsx em memória; o Excel só é necessário para exportar o PDF.
+
+semantic_diff() relê o .xlsx gerado e compara, célula a célula, com o estado do
+caminho COM emulado (valor, formato de número, quebra de texto e negrito).
+
+Verificação manual (Linux, sem Excel):
+  python xlsx_writer.py modelo.xlsx dados.json [saida.xlsx]
+"""
+
+import io
+import re
+import zipfile
+from xml.etree.ElementTree import fromstring
+
+from rich_text import cell_runs, pieces
+from xlsx_reader import NS_MAIN, col_index, decode_ooxml_text, sheet_parts, split_address, to_address
+
+_M = "{%s}" % NS_MAIN
+
+# Formatos de número embutidos do Excel (numFmtId fixo, sem <numFmt> em styles.xml)
+BUILTIN_NUM_FMTS = {
+    "General": 0,
+    "0": 1,
+    "0.00": 2,
+    "#,##0": 3,
+    "#,##0.00": 4,
+    "0%": 9,
+    "0.00%": 10,
+    "@": 49,
+}
+_BUILTIN_BY_ID = {v: k for k, v in BUILTIN_NUM_FMTS.items()}
+
+_XF_RE = re.compile(r"<xf\b[^>]*/>|<xf\b[^>]*>.*?</xf>", re.S)
+_FONT_RE = re.compile(r"<font\b[^>]*/>|<font\b[^>]*>.*?</font>", re.S)
+_ESCAPE_RE = re.compile(r"_x[0-9A-Fa-f]{4}_")
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f]")
+
+
+def _xml_attr(value: str) -> str:
+    return (
+        value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    )
+
+
+def escape_text(text: str) -> str:
+    """
+    Texto de célula para <t>: escapa XML e usa a notação _xHHHH_ do OOXML para
+    caracteres de controle (inclusive \\r, que o parser XML normalizaria).
+    """
+    text = _ESCAPE_RE.sub(lambda m: "_x005F" + m.group(0), text)
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    text = text.replace("\r", "_x000D_")
+    return _CONTROL_RE.sub(lambda m: "_x%04X_" % ord(m.group(0)), text)
+
+
+def _section(xml: str, tag: str) -> tuple[int, int]:
+    """(início do conteúdo, fim do conteúdo) de <tag ...>...</tag>; (-1, -1) se não existir."""
+    m = re.search(r"<%s\b[^>]*>" % tag, xml)
+    if not m:
+        return -1, -1
+    end = xml.index("</%s>" % tag, m.end())
+    return m.end(), end
+
+
+def _set_attr(tag_xml: str, name: str, value: str) -> str:
+    """Define (ou troca) um atributo na tag de abertura de um elemento XML."""
+    head_end = tag_xml.index(">")
+    if tag_xml[head_end - 1] == "/":
+        head_end -= 1
+    head = tag_xml[:head_end]
+    pattern = re.compile(r'\s%s="[^"]*"' % re.escape(name))
+    if pattern.search(head):
+        head = pattern.sub(f' {name}="{value}"', head, count=1)
+    else:
+        head = f'{head} {name}="{value}"'
+    return head + tag_xml[head_end:]
+
+
+class _Styles:
+    """styles.xml: formatos de número, cellXfs (clonados sob demanda) e fontes (para rich text)."""
+
+    def __init__(self, xml: str):
+        self.xml = xml
+        self.changed = False
+        self.num_fmts: dict[str, int] = {}
+        for m in re.finditer(r'<numFmt\b[^>]*numFmtId="(\d+)"[^>]*formatCode="([^"]*)"', xml):
+            code = m.group(2).replace("&quot;", '"').replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+            self.num_fmts[code] = int(m.group(1))
+        self._new_num_fmts: list[tuple[int, str]] = []
+        start, end = _section(xml, "cellXfs")
+        self.xfs = _XF_RE.findall(xml[start:end]) if start >= 0 else ['<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>']
+        self._base_xf_count = len(self.xfs)
+        start, end = _section(xml, "fonts")
+        self.fonts = _FONT_RE.findall(xml[start:end]) if start >= 0 else []
+        self._clones: dict[tuple, int] = {}
+
+    def num_fmt_id(self, code: str) -> int:
+        if code in BUILTIN_NUM_FMTS:
+            return BUILTIN_NUM_FMTS[code]
+        if code not in self.num_fmts:
+            next_id = max([163] + list(self.num_fmts.values())) + 1
+            self.num_fmts[code] = next_id
+            self._new_num_fmts.append((next_id, code))
+            self.changed = True
+        return self.num_fmts[code]
+
+    def num_fmt_code(self, xf_index: int) -> str:
+        m = re.search(r'numFmtId="(\d+)"', self.xfs[xf_index] if xf_index < len(self.xfs) else "")
+        fmt_id = int(m.group(1)) if m else 0
+        if fmt_id in _BUILTIN_BY_ID:
+            return _BUILTIN_BY_ID[fmt_id]
+        for code, i in self.num_fmts.items():
+            if i == fmt_id:
+                return code
+        return "General"
+
+    def wrap_text(self, xf_index: int) -> bool:
+        xf = self.xfs[xf_index] if xf_index < len(self.xfs) else ""
+        return bool(re.search(r'<alignment\b[^>]*wrapText="(1|true)"', xf))
+
+    def xf_for(self, base: int, number_format: str | None, wrap_text: bool | None) -> int:
+        """Índice de cellXfs com o estilo `base` + formato de número / quebra de texto (clona uma vez por combinação)."""
+        if number_format is None and wrap_text is None:
+            return base
+        key = (base, number_format, wrap_text)
+        if key in self._clones:
+            return self._clones[key]
+        xf = self.xfs[base] if base < len(self.xfs) else self.xfs[0]
+        if number_format is not None:
+            xf = _set_attr(xf, "numFmtId", str(self.num_fmt_id(number_format)))
+            xf = _set_attr(xf, "applyNumberFormat", "1")
+        if wrap_text is not None:
+            flag = "1" if wrap_text else "0"
+            m = re.search(r"<alignment\b[^>]*/>|<alignment\b[^>]*>.*?</alignment>", xf, re.S)
+            if m:
+                xf = xf[: m.start()] + _set_attr(m.group(0), "wrapText", flag) + xf[m.end():]
+            elif xf.endswith("/>"):
+                xf = xf[:-2] + f'><alignment wrapText="{flag}"/></xf>'
+            else:
+                head_end = xf.index(">") + 1
+                xf = xf[:head_end] + f'<alignment wrapText="{flag}"/>' + xf[head_end:]
+            xf = _set_attr(xf, "applyAlignment", "1")
+        if xf == self.xfs[base if base < len(self.xfs) else 0]:
+            self._clones[key] = base
+            return base
+        self.xfs.append(xf)
+        self.changed = True
+        self._clones[key] = len(self.xfs) - 1
+        return self._clones[key]
+
+    def run_properties(self, xf_index: int, style: dict) -> str:
+        """
+        <rPr> de um trecho de rich text: a fonte da célula com o estilo do trecho por cima
+        (bold/italic liga ou desliga; size e color (r, g, b) trocam o da fonte).
+        """
+        xf = self.xfs[xf_index] if xf_index < len(self.xfs) else self.xfs[0]
+        m = re.search(r'fontId="(\d+)"', xf)
+        font_id = int(m.group(1)) if m else 0
+        font = self.fonts[font_id] if font_id < len(self.fonts) else "<font/>"
+        inner = ""
+        if not font.endswith("/>"):
+            inner = font[font.index(">") + 1: font.rindex("</font>")]
+        inner = inner.replace("<name ", "<rFont ")
+        for attr, tag in (("bold", "b"), ("italic", "i")):
+            if attr not in style:
+                continue
+            on = re.search(r"<%s\s*/>|<%s\s+val=\"(1|true)\"\s*/>" % (tag, tag), inner) is not None
+            if style[attr] and not on:
+                inner = f"<{tag}/>" + re.sub(r"<%s\s[^>]*/>" % tag, "", inner)
+            elif not style[attr] and on:
+                inner = re.sub(r"<%s(\s[^>]*)?/>" % tag, "", inner)
+        if "size" in style:
+            inner = re.sub(r"<sz\s[^>]*/>", "", inner) + f'<sz val="{style["size"]:g}"/>'
+        if "color" in style:
+            rgb = "FF%02X%02X%02X" % tuple(style["color"])
+            inner = re.sub(r"<color\s[^>]*/>", "", inner) + f'<color rgb="{rgb}"/>'
+        return f"<rPr>{inner}</rPr>" if inner else ""
+
+    def serialize(self) -> str:
+        xml = self.xml
+        if self._new_num_fmts:
+            new = "".join(
+                f'<numFmt numFmtId="{i}" formatCode="{_xml_attr(code)}"/>' for i, code in self._new_num_fmts
+            )
+            start, end = _section(xml, "numFmts")
+            if start >= 0:
+                xml = xml[:end] + new + xml[end:]
+                total = len(self.num_fmts) - sum(1 for c in self.num_fmts if c in BUILTIN_NUM_FMTS)
+                xml = re.sub(r'<numFmts count="\d+"', f'<numFmts count="{total}"', xml, count=1)
+            else:
+                m = re.search(r"<styleSheet\b[^>]*>", xml)
+                xml = xml[: m.end()] + f'<numFmts count="{len(self._new_num_fmts)}">{new}</numFmts>' + xml[m.end():]
+        if len(self.xfs) > self._base_xf_count:
+            start, end = _section(xml, "cellXfs")
+            xml = xml[:end] + "".join(self.xfs[self._base_xf_count:]) + xml[end:]
+            xml = re.sub(r'<cellXfs count="\d+"', f'<cellXfs count="{len(self.xfs)}"', xml, count=1)
+        return xml
+
+
+class _SharedStrings:
+    """sharedStrings.xml: anexa novas strings (simples ou rich text) ao final da tabela."""
+
+    def __init__(self, xml: str | None):
+        if xml is None:
+            xml = (
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<sst xmlns="{NS_MAIN}" count="0" uniqueCount="0"></sst>'
+            )
+        self.xml = xml
+        self.unique = len(re.findall(r"<si\b", xml))
+        m = re.search(r'<sst\b[^>]*\scount="(\d+)"', xml)
+        self.count = int(m.group(1)) if m else self.unique
+        self._new: list[str] = []
+        self._lookup: dict[str, int] = {}
+
+    def add(self, si_inner: str) -> int:
+        self.count += 1
+        if si_inner in self._lookup:
+            return self._lookup[si_inner]
+        index = self.unique + len(self._new)
+        self._new.append(f"<si>{si_inner}</si>")
+        self._lookup[si_inner] = index
+        return index
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._new)
+
+    def serialize(self) -> str:
+        unique = self.unique + len(self._new)
+        xml = self.xml
+        if xml.rstrip().endswith("/>") and "</sst>" not in xml:
+            xml = re.sub(r"<sst\b([^>]*)/>", r"<sst\1></sst>", xml)
+        end = xml.rindex("</sst>")
+        xml = xml[:end] + "".join(self._new) + xml[end:]
+        xml = _set_attr_sst(xml, "count", str(self.count))
+        return _set_attr_sst(xml, "uniqueCount", str(unique))
+
+
+def _set_attr_sst(xml: str, name: str, value: str) -> str:
+    m = re.search(r"<sst\b[^>]*>", xml)
+    return xml[: m.start()] + _set_attr(m.group(0), name, value) + xml[m.end():]
+
+
+def _merge_spans(spans, length: int) -> list[tuple[int, int]]:
+    merged = []
+    for start, stop in sorted((max(0, a), min(length, b)) for a, b in spans):
+        if stop <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _text_run(text: str) -> str:
+    return f'<t xml:space="preserve">{escape_text(text)}</t>'
+
+
+def _cell_xml(address: str, cell, styles: _Styles, sst: _SharedStrings) -> str:
+    base = cell.style or 0
+    style = styles.xf_for(base, cell.number_format, cell.wrap_text)
+    s_attr = f' s="{style}"' if style else ""
+    value = cell.value
+    if value is None or value == "":
+        return f'<c r="{address}"{s_attr}/>'
+    if isinstance(value, bool):
+        return f'<c r="{address}"{s_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{address}"{s_attr}><v>{repr(float(value)) if isinstance(value, float) else value}</v></c>'
+    text = str(value)
+    parts = pieces(text, cell_runs(cell))
+    if any(piece_style for _piece, piece_style in parts):
+        index = sst.add(
+            "".join(f"<r>{styles.run_properties(style, piece_style)}{_text_run(piece)}</r>" for piece, piece_style in parts)
+        )
+    else:
+        index = sst.add(_text_run(text))
+    return f'<c r="{address}"{s_attr} t="s"><v>{index}</v></c>'
+
+
+def _rewrite_sheet(xml: str, changes: dict[tuple[int, int], str]) -> str:
+    """Troca (ou insere) só os elementos <c> alterados no XML da planilha."""
+    by_row: dict[int, list[tuple[int, str]]] = {}
+    for (row, col), cell_xml in changes.items():
+        address = to_address(row, col)
+        pattern = re.compile(r'<c r="%s"(?:\s[^>]*?)?(?:/>|>.*?</c>)' % address, re.S)
+        m = pattern.search(xml)
+        if m:
+            xml = xml[: m.start()] + cell_xml + xml[m.end():]
+        else:
+            by_row.setdefault(row, []).append((col, cell_xml))
+
+    for row, cells in sorted(by_row.items()):
+        cells.sort()
+        row_match = re.search(r'<row r="%d"(?:\s[^>]*?)?(/>|>)' % row, xml)
+        if row_match is None:
+            # Linha inexistente: cria antes da primeira linha de número maior (ou no fim de sheetData)
+            new_row = f'<row r="{row}">' + "".join(c for _col, c in cells) + "</row>"
+            insert_at = None
+            for m in re.finditer(r'<row r="(\d+)"', xml):
+                if int(m.group(1)) > row:
+                    insert_at = m.start()
+                    break
+            if insert_at is None:
+                if "<sheetData/>" in xml:
+                    xml = xml.replace("<sheetData/>", f"<sheetData>{new_row}</sheetData>", 1)
+                    continue
+                insert_at = xml.index("</sheetData>")
+            xml = xml[:insert_at] + new_row + xml[insert_at:]
+            continue
+        if row_match.group(1) == "/>":
+            head = row_match.group(0)[:-2] + ">"
+            xml = xml[: row_match.start()] + head + "".join(c for _col, c in cells) + "</row>" + xml[row_match.end():]
+            continue
+        row_end = xml.index("</row>", row_match.end())
+        body = xml[row_match.end(): row_end]
+        for col, cell_xml in cells:
+            insert_at = len(body)
+            for m in re.finditer(r'<c r="([A-Z]+)\d+"', body):
+                if col_index(m.group(1)) > col:
+                    insert_at = m.start()
+                    break
+            body = body[:insert_at] + cell_xml + body[insert_at:]
+        xml = xml[: row_match.end()] + body + xml[row_end:]
+    return xml
+
+
+def write_filled_xlsx(template_path, book) -> bytes:
+    """
+    Gera o .xlsx preenchido (bytes) a partir do modelo e do MemoryBook já preenchido.
+    Só as células alteradas (sheet._dirty) são regravadas; as demais partes do zip são copiadas.
+    """
+    out = io.BytesIO()
+    with zipfile.ZipFile(template_path) as zin:
+        names = zin.namelist()
+        parts = dict(sheet_parts(zin))
+        styles = _Styles(zin.read("xl/styles.xml").decode("utf-8"))
+        sst = _SharedStrings(
+            zin.read("xl/sharedStrings.xml").decode("utf-8") if "xl/sharedStrings.xml" in names else None
+        )
+        rewritten: dict[str, bytes] = {}
+        for sheet in book.sheets:
+            dirty = getattr(sheet, "_dirty", ())
+            if not dirty:
+                continue
+            part = parts[sheet.name]
+            changes = {
+                pos: _cell_xml(to_address(*pos), sheet._cells[pos], styles, sst)
+                for pos in sorted(dirty)
+                if pos in sheet._cells
+            }
+            xml = zin.read(part).decode("utf-8")
+            rewritten[part] = _rewrite_sheet(xml, changes).encode("utf-8")
+        if styles.changed:
+            rewritten["xl/styles.xml"] = styles.serialize().encode("utf-8")
+        if sst.changed:
+            rewritten["xl/sharedStrings.xml"] = sst.serialize().encode("utf-8")
+            if "xl/sharedStrings.xml" not in names:
+                raise ValueError("modelo sem sharedStrings.xml não é suportado pelo backend XML")
+
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zin.infolist():
+                data = rewritten.get(info.filename)
+                if data is None:
+                    data = zin.read(info.filename)
+                zout.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+    return out.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Verificação semântica contra o caminho COM (emulado pelo MemoryBook)
+# ---------------------------------------------------------------------------
+
+
+def _read_back(xlsx_bytes: bytes) -> dict:
+    """(planilha, linha, coluna) -> (texto, formato de número, quebra de texto, trechos em negrito)."""
+    result = {}
+    with zipfile.ZipFile(io.BytesIO(xlsx_bytes)) as zf:
+        styles = _Styles(zf.read("xl/styles.xml").decode("utf-8"))
+        shared = []
+        if "xl/sharedStrings.xml" in zf.namelist():
+            root = fromstring(zf.read("xl/sharedStrings.xml"))
+            for si in root.iter(_M + "si"):
+                runs = si.findall(_M + "r")
+                if not runs:
+                    t = si.find(_M + "t")
+                    shared.append((decode_ooxml_text(t.text or "") if t is not None else "", []))
+                    continue
+                text, bold = "", []
+                for r in runs:
+                    piece = decode_ooxml_text("".join(t.text or "" for t in r.iter(_M + "t")))
+                    rpr = r.find(_M + "rPr")
+                    if rpr is not None and rpr.find(_M + "b") is not None and rpr.find(_M + "b").get("val") not in ("0", "false"):
+                        bold.append((len(text), len(text) + len(piece)))
+                    text += piece
+                shared.append((text, bold))
+        for name, part in sheet_parts(zf):
+            root = fromstring(zf.read(part))
+            for c in root.iter(_M + "c"):
+                row, col = split_address(c.get("r"))
+                style = int(c.get("s") or 0)
+                v = c.find(_M + "v")
+                text, bold = None, []
+                if c.get("t") == "s" and v is not None:
+                    text, bold = shared[int(v.text)]
+                elif v is not None:
+                    text = v.text
+                result[(name, row, col)] = (text, styles.num_fmt_code(style), styles.wrap_text(style), bold)
+    return result
+
+
+def semantic_diff(xlsx_bytes: bytes, book) -> list[str]:
+    """Diferenças entre o .xlsx gerado e o estado das células alteradas no MemoryBook (lista vazia = equivalentes)."""
+    written = _read_back(xlsx_bytes)
+    problems = []
+    for sheet in book.sheets:
+        for pos in sorted(getattr(sheet, "_dirty", ())):
+            cell = sheet._cells.get(pos)
+            if cell is None:
+                continue
+            where = f"{sheet.name}!{to_address(*pos)}"
+            got = written.get((sheet.name, pos[0], pos[1]))
+            if got is None:
+                problems.append(f"{where}: célula ausente no .xlsx")
+                continue
+            text, num_fmt, wrap, bold = got
+            expected = None if cell.value in (None, "") else cell.value
+            if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+                same = text is not None and float(text) == float(expected)
+            else:
+                same = (text if text is not None else None) == (None if expected is None else str(expected))
+            if not same:
+                problems.append(f"{where}: valor {text!r} != {expected!r}")
+            if cell.number_format is not None and num_fmt != cell.number_format:
+                problems.append(f"{where}: formato {num_fmt!r} != {cell.number_format!r}")
+            if cell.wrap_text is not None and wrap != cell.wrap_text:
+                problems.append(f"{where}: quebra de texto {wrap} != {cell.wrap_text}")
+            length = len(str(expected or ""))
+            if _merge_spans(bold, length) != _merge_spans(cell.bold_spans, length):
+                problems.append(f"{where}: negrito {_merge_spans(bold, length)} != {_merge_spans(cell.bold_spans, length)}")
+    return problems
+
+
+def _check(argv: list[str]) -> int:
+    """Preenche pelo backend XML e compara com um preenchimento independente pelo caminho COM emulado."""
+    import json
+    import sys
+    from pathlib import Path
+
+    import fill_and_export_pdf as gen
+    from excel_backend import MemoryApp
+
+    if len(argv) not in (2, 3):
+        print("Uso: python xlsx_writer.py modelo.xlsx dados.json [saida.xlsx]", file=sys.stderr)
+        return 2
+    template_path = Path(argv[0])
+    with open(argv[1], "r", encoding="utf-8") as f:
+        data = json.load(f)
+    totais = gen.prepare_data(data)
+    xlsx_bytes = gen.fill_xlsx_bytes(template_path, data, totais, gen.check_template(template_path, data))
+    # Caminho COM emulado: descoberta pelo UsedRange, sem manifesto
+    com_book = MemoryApp().books.open(str(template_path))
+    gen.fill_workbook(com_book, data, totais)
+    problems = semantic_diff(xlsx_bytes, com_book)
+    if len(argv) == 3:
+        Path(argv[2]).write_bytes(xlsx_bytes)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} diferença(s)", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(_check(sys.argv[1:]))